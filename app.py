@@ -3,7 +3,6 @@ from flask import Flask, redirect, url_for, flash, render_template, session, req
 from flask_login import current_user, login_required
 from extensions import db, login_manager, migrate, socketio
 import logging
-import stripe
 
 def create_app(config_name='development'):
     """Factory pour créer l'application Flask"""
@@ -20,6 +19,10 @@ def create_app(config_name='development'):
             print("sentry-sdk not installed, skipping Sentry init")
 
     app = Flask(__name__)
+
+    # Profil du démarrage (utils/startup.py)
+    from utils.startup import get_profile, register_blueprints, finish_startup
+    startup = get_profile(app)
     
     # Configuration
     if config_name == 'production':
@@ -28,9 +31,11 @@ def create_app(config_name='development'):
     else:
         app.config.from_object(Config)
 
-    # Forcer le rechargement des templates en production pour éviter le cache
-    app.config['TEMPLATES_AUTO_RELOAD'] = True
-    app.jinja_env.auto_reload = True
+    # Rendu des templates : rechargement automatique en développement
+    # seulement, cache de bytecode facultatif (utils/template_cache.py)
+    from utils.template_cache import configure_templates, register_template_commands
+    configure_templates(app)
+    register_template_commands(app)
 
     # ------------------------------------------------------------------
     # Internationalisation (Flask-Babel)
@@ -94,6 +99,11 @@ def create_app(config_name='development'):
     # Initialisation des extensions
     db.init_app(app)
     migrate.init_app(app, db)
+
+    # Requêtes SQL et latence par requête HTTP (N+1, requêtes lentes)
+    from utils.query_stats import init_query_stats
+    init_query_stats(app)
+
     login_manager.init_app(app)
     socketio.init_app(app, cors_allowed_origins="*", async_mode='eventlet',
                        ping_timeout=60, ping_interval=25)
@@ -137,200 +147,20 @@ def create_app(config_name='development'):
             return ''
         return _dt.fromtimestamp(ts).strftime('%d/%m/%Y')
 
-    # Enregistrement des blueprints
-    from routes.auth import auth_bp
-    from routes.planning import planning_bp
-    from routes.schedule import schedule_bp
-    from routes.setup import setup_bp
-    
-    app.register_blueprint(auth_bp)
-    app.register_blueprint(planning_bp)
-    app.register_blueprint(schedule_bp)
-    app.register_blueprint(setup_bp)
-    
-    # Blueprints additionnels avec gestion d'erreur
-    try:
-        from routes.parent_auth import parent_auth_bp
-        app.register_blueprint(parent_auth_bp)
-    except ImportError:
-        print("parent_auth blueprint non trouvé")
-
-    try:
-        from routes.student_auth import student_auth_bp  
-        app.register_blueprint(student_auth_bp)
-    except ImportError:
-        print("student_auth blueprint non trouvé")
+    # Enregistrement des blueprints, chacun chronométré (utils/startup.py)
+    blueprints = register_blueprints(app)
 
-    try:
-        from routes.collaboration import collaboration_bp
-        app.register_blueprint(collaboration_bp)
-    except ImportError:
-        print("collaboration blueprint non trouvé")
-        
-    try:
-        from routes.evaluations import evaluations_bp
-        app.register_blueprint(evaluations_bp)
-    except ImportError:
-        print("evaluations blueprint non trouvé")
-
-    try:
-        from routes.announcements import announcements_bp
-        app.register_blueprint(announcements_bp)
-    except ImportError:
-        print("announcements blueprint non trouvé")
-
-    try:
-        from routes.devoirs import devoirs_bp
-        app.register_blueprint(devoirs_bp)
-    except ImportError as _e:
-        print(f"devoirs blueprint non trouvé: {_e}")
-
-    try:
-        from routes.attendance import attendance_bp
-        app.register_blueprint(attendance_bp)
-    except ImportError:
-        print("attendance blueprint non trouvé")
-        
-    try:
-        from routes.sanctions import sanctions_bp
-        app.register_blueprint(sanctions_bp)
-    except ImportError:
-        print("sanctions blueprint non trouvé")
-        
-    try:
-        from routes.settings import settings_bp
-        app.register_blueprint(settings_bp)
-    except ImportError:
-        print("settings blueprint non trouvé")
-        
-    try:
-        from routes.file_manager import file_manager_bp
-        app.register_blueprint(file_manager_bp)
-        print("✅ file_manager blueprint ajouté")
-    except ImportError:
-        print("❌ file_manager blueprint non trouvé")
-        
-    try:
-        from routes.class_files import class_files_bp
-        app.register_blueprint(class_files_bp)
-        print("✅ class_files blueprint ajouté")
-    except ImportError:
-        print("❌ class_files blueprint non trouvé")
-        
-    # Blueprint temporaire pour migration schedule
-    try:
-        from migrate_schedule_fields import migrate_schedule_bp
-        app.register_blueprint(migrate_schedule_bp)
-        print("✅ migrate_schedule blueprint ajouté (temporaire)")
-    except ImportError:
-        print("❌ migrate_schedule blueprint non trouvé")
-
-    # Blueprint push tokens
-    try:
-        from routes.push import push_bp
-        app.register_blueprint(push_bp)
-        print("✅ push blueprint ajouté")
-    except ImportError:
-        print("❌ push blueprint non trouvé")
-
-    # Debug blueprint
-    try:
-        from routes.debug_constraint import debug_bp
-        app.register_blueprint(debug_bp)
-        print("✅ debug blueprint ajouté")
-    except ImportError:
-        print("❌ debug blueprint non trouvé")
-
-    # Blueprint diagnostic (réception des erreurs/freeze client → logs Render)
-    try:
-        from routes.diagnostic import diagnostic_bp
-        app.register_blueprint(diagnostic_bp)
-        print("✅ diagnostic blueprint ajouté (client-log)")
-    except ImportError:
-        print("❌ diagnostic blueprint non trouvé")
-
-    # Blueprint send to students
-    try:
-        from routes.send_to_students import send_to_students_bp
-        app.register_blueprint(send_to_students_bp)
-        print("✅ send_to_students blueprint ajouté")
-    except ImportError:
-        print("❌ send_to_students blueprint non trouvé")
-
-    # Blueprint API mobile (JWT)
-    try:
-        from routes.api import api_bp
-        app.register_blueprint(api_bp)
-        print("✅ api blueprint ajouté")
-    except ImportError:
-        print("❌ api blueprint non trouvé")
-
-    # Blueprint fin d'année scolaire
-    try:
-        from routes.year_end import year_end_bp
-        app.register_blueprint(year_end_bp)
-        print("✅ year_end blueprint ajouté")
-    except ImportError:
-        print("❌ year_end blueprint non trouvé")
-
-    # Blueprint abonnements
-    try:
-        from routes.subscription import subscription_bp
-        app.register_blueprint(subscription_bp)
-        print("✅ subscription blueprint ajouté")
-    except ImportError:
-        print("❌ subscription blueprint non trouvé")
-
-    # Blueprint In-App Purchase Apple (StoreKit 2)
-    try:
-        from routes.iap import iap_bp
-        app.register_blueprint(iap_bp)
-        print("✅ iap blueprint ajouté")
-    except ImportError as e:
-        print(f"❌ iap blueprint non chargé: {e}")
-
-    # Blueprint Ressources gratuites (pages SEO publiques : calendriers scolaires…)
-    try:
-        from routes.resources import resources_bp
-        app.register_blueprint(resources_bp)
-        print("✅ resources blueprint ajouté")
-    except ImportError as e:
-        print(f"❌ resources blueprint non chargé: {e}")
+    # Événements SocketIO du combat
+    if 'routes.combat' in blueprints:
+        with startup.phase('combat socketio events'):
+            blueprints['routes.combat'].register_combat_events(socketio, app)
 
     # Context processor : expose `is_ios_native_app` dans tous les templates
     # afin de masquer les flux d'abonnement Stripe dans les apps iOS natives
     # (conformité guideline 3.1.1 de l'App Store).
-    try:
+    with startup.phase('platform_context', optional=True):
         from utils.platform_detection import platform_context
         app.context_processor(platform_context)
-        print("✅ platform_context processor ajouté")
-    except ImportError as e:
-        print(f"❌ platform_context processor non chargé: {e}")
-
-    # Blueprint exercices interactifs
-    try:
-        from routes.exercises import exercises_bp
-        app.register_blueprint(exercises_bp)
-        print("✅ exercises blueprint ajouté")
-    except ImportError:
-        print("❌ exercises blueprint non trouvé")
-
-    # Blueprint combat (SocketIO + REST)
-    try:
-        from routes.combat import combat_bp, register_combat_events
-        app.register_blueprint(combat_bp)
-        register_combat_events(socketio, app)
-        print("✅ combat blueprint ajouté")
-    except ImportError as e:
-        print(f"❌ combat blueprint non trouvé: {e}")
-
-    # Blueprint administration
-    try:
-        from routes.admin import admin_bp
-        app.register_blueprint(admin_bp)
-        print("✅ admin blueprint ajouté")
-    except ImportError:
-        print("❌ admin blueprint non trouvé")
 
     # Commandes CLI pour les données de test
     try:
@@ -347,6 +177,13 @@ def create_app(config_name='development'):
     except ImportError as _e:
         print(f"❌ Commande seed-demo-class non trouvée: {_e}")
 
+    try:
+        from scripts.seed_large_dataset import register_large_dataset_command
+        register_large_dataset_command(app)
+        print("✅ Commande seed-large-data enregistrée")
+    except ImportError as _e:
+        print(f"❌ Commande seed-large-data non trouvée: {_e}")
+
     try:
         from routes.devoirs import register_devoir_commands
         register_devoir_commands(app)
@@ -393,8 +230,8 @@ def create_app(config_name='development'):
         print(f"❌ Commande funnel-stats non chargée : {e}")
 
     # Commande CLI d'envoi des relances d'essai Premium par email.
-    # Usage : flask send-trial-reminders  (aussi appelée toutes les 6h par
-    # le greenthread de render_production.py).
+    # Usage : flask send-trial-reminders  (aussi exécutée toutes les 6h par
+    # l'exécuteur de tâches).
     try:
         from commands.trial_reminders_cmd import register_trial_reminders_command
         register_trial_reminders_command(app)
@@ -402,871 +239,85 @@ def create_app(config_name='development'):
     except ImportError as e:
         print(f"❌ Commande send-trial-reminders non chargée : {e}")
 
-    # Démarrage de la boucle de relance d'essai au 1er request reçu. Robuste
-    # au point d'entrée : fonctionne aussi bien sous `python render_production.py`
-    # que sous `gunicorn app:app` (où le bloc __main__ de render_production ne
-    # s'exécute pas). La fonction est gardée → un seul démarrage par process,
-    # et elle ne se déclenche jamais pendant une commande CLI (pas de request).
-    @app.before_request
-    def _ensure_trial_reminder_loop():
-        try:
-            from services.trial_reminders import start_background_loop
-            start_background_loop(app)
-        except Exception:
-            pass
-
-    # Initialisation Stripe
-    stripe.api_key = app.config.get('STRIPE_SECRET_KEY')
-
-    # Migration: ajouter les colonnes si elles n'existent pas
-    with app.app_context():
-        try:
-            # Colonnes TOTP
-            db.session.execute(db.text(
-                "ALTER TABLE users ADD COLUMN IF NOT EXISTS totp_secret VARCHAR(32)"
-            ))
-            db.session.execute(db.text(
-                "ALTER TABLE users ADD COLUMN IF NOT EXISTS totp_enabled BOOLEAN DEFAULT FALSE"
-            ))
-            # Colonnes abonnement/premium
-            db.session.execute(db.text(
-                "ALTER TABLE users ADD COLUMN IF NOT EXISTS is_admin BOOLEAN DEFAULT FALSE"
-            ))
-            db.session.execute(db.text(
-                "ALTER TABLE users ADD COLUMN IF NOT EXISTS subscription_tier VARCHAR(20) DEFAULT 'freemium'"
-            ))
-            db.session.execute(db.text(
-                "ALTER TABLE users ADD COLUMN IF NOT EXISTS stripe_customer_id VARCHAR(255)"
-            ))
-            db.session.execute(db.text(
-                "ALTER TABLE users ADD COLUMN IF NOT EXISTS stripe_subscription_id VARCHAR(255)"
-            ))
-            db.session.execute(db.text(
-                "ALTER TABLE users ADD COLUMN IF NOT EXISTS premium_until TIMESTAMP"
-            ))
-            # Colonne préférence de tri des élèves
-            db.session.execute(db.text(
-                "ALTER TABLE users ADD COLUMN IF NOT EXISTS student_sort_pref VARCHAR(20) DEFAULT 'last_name'"
-            ))
-            # Suivi des relances d'essai par email (phase 2) : 0=aucune,
-            # 1=relance J-5 envoyée, 2=relance J-1 envoyée, 3=email d'expiration envoyé.
-            db.session.execute(db.text(
-                "ALTER TABLE users ADD COLUMN IF NOT EXISTS trial_reminder_stage INTEGER DEFAULT 0"
-            ))
-            # Checklist d'onboarding « 3 étapes » fermée manuellement par le prof.
-            db.session.execute(db.text(
-                "ALTER TABLE users ADD COLUMN IF NOT EXISTS onboarding_dismissed BOOLEAN DEFAULT FALSE"
-            ))
-            db.session.commit()
-        except Exception:
-            db.session.rollback()
-
-        # Filet de sécurité : colonnes Exercise (badge_pattern, badge_color)
-        # ajoutées par la migration 20260504_badge_image_001. Si l'arbre
-        # Alembic est dans un état multi-head sur Render, la migration peut
-        # ne jamais s'appliquer alors que le code Python lit déjà ces
-        # colonnes — ce qui empoisonne les transactions Postgres
-        # (psycopg.errors.InFailedSqlTransaction). Cet ALTER idempotent
-        # garantit que les colonnes existent à chaque démarrage de l'app,
-        # indépendamment de l'état Alembic.
-        try:
-            db.session.execute(db.text(
-                "ALTER TABLE exercises ADD COLUMN IF NOT EXISTS badge_pattern VARCHAR(25)"
-            ))
-            db.session.execute(db.text(
-                "ALTER TABLE exercises ADD COLUMN IF NOT EXISTS badge_color VARCHAR(7)"
-            ))
-            db.session.commit()
-            print("✅ Colonnes badge_pattern/badge_color vérifiées sur exercises")
-        except Exception as e:
-            db.session.rollback()
-            print(f"⚠️ Vérification colonnes badge échouée: {e}")
-
-        # Filet de sécurité : table apple_subscriptions (In-App Purchase).
-        # Idempotent — créé si absent. Évite que User.has_premium_access()
-        # crashe sur "relation apple_subscriptions does not exist" si la
-        # migration n'a pas (encore) tourné.
-        try:
-            db.session.execute(db.text("""
-                CREATE TABLE IF NOT EXISTS apple_subscriptions (
-                    id SERIAL PRIMARY KEY,
-                    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                    original_transaction_id VARCHAR(64) UNIQUE NOT NULL,
-                    latest_transaction_id VARCHAR(64),
-                    product_id VARCHAR(120) NOT NULL,
-                    bundle_id VARCHAR(120),
-                    environment VARCHAR(20) DEFAULT 'production',
-                    status VARCHAR(20) DEFAULT 'active',
-                    purchase_date TIMESTAMP,
-                    expires_date TIMESTAMP,
-                    cancelled_at TIMESTAMP,
-                    revoked_at TIMESTAMP,
-                    auto_renew_status BOOLEAN DEFAULT TRUE,
-                    in_trial_period BOOLEAN DEFAULT FALSE,
-                    in_intro_offer_period BOOLEAN DEFAULT FALSE,
-                    last_signed_payload TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """))
-            db.session.execute(db.text(
-                "CREATE INDEX IF NOT EXISTS ix_apple_subscriptions_user_id "
-                "ON apple_subscriptions (user_id)"
-            ))
-            db.session.commit()
-            print("✅ Table apple_subscriptions vérifiée")
-        except Exception as e:
-            db.session.rollback()
-            print(f"⚠️ Vérification table apple_subscriptions échouée: {e}")
-
-        # Filet de sécurité : table announcements (annonces de classe -> parents).
-        # Idempotent — créée si absente. Contenu de diffusion (non chiffré).
-        try:
-            db.session.execute(db.text("""
-                CREATE TABLE IF NOT EXISTS announcements (
-                    id SERIAL PRIMARY KEY,
-                    classroom_id INTEGER NOT NULL REFERENCES classrooms(id) ON DELETE CASCADE,
-                    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                    title VARCHAR(255) NOT NULL,
-                    content TEXT NOT NULL,
-                    email_sent BOOLEAN DEFAULT FALSE,
-                    email_recipients INTEGER DEFAULT 0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """))
-            db.session.execute(db.text(
-                "CREATE INDEX IF NOT EXISTS ix_announcements_classroom_id "
-                "ON announcements (classroom_id)"
-            ))
-            db.session.commit()
-            print("✅ Table announcements vérifiée")
-        except Exception as e:
-            db.session.rollback()
-            print(f"⚠️ Vérification table announcements échouée: {e}")
-
-        # Filet de sécurité : table devoirs (devoirs prof -> élèves).
-        # title/instructions sont chiffrés côté ORM -> stockés en TEXT.
-        try:
-            db.session.execute(db.text("""
-                CREATE TABLE IF NOT EXISTS devoirs (
-                    id SERIAL PRIMARY KEY,
-                    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                    classroom_id INTEGER NOT NULL REFERENCES classrooms(id) ON DELETE CASCADE,
-                    devoir_type VARCHAR(20) NOT NULL DEFAULT 'submission',
-                    title TEXT NOT NULL,
-                    instructions TEXT,
-                    due_date DATE NOT NULL,
-                    due_period INTEGER,
-                    document_key VARCHAR(255),
-                    document_name VARCHAR(255),
-                    exercise_id INTEGER REFERENCES exercises(id) ON DELETE SET NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """))
-            db.session.execute(db.text(
-                "CREATE INDEX IF NOT EXISTS ix_devoirs_user_due "
-                "ON devoirs (user_id, due_date)"
-            ))
-            db.session.commit()
-            print("✅ Table devoirs vérifiée")
-        except Exception as e:
-            db.session.rollback()
-            print(f"⚠️ Vérification table devoirs échouée: {e}")
-
-        # Filet de sécurité : mode de découpage + semaines sélectionnées.
-        try:
-            db.session.execute(db.text("ALTER TABLE decoupages ADD COLUMN IF NOT EXISTS mode VARCHAR(10) DEFAULT 'duration'"))
-            db.session.execute(db.text("ALTER TABLE decoupage_periods ADD COLUMN IF NOT EXISTS weeks_json TEXT"))
-            db.session.commit()
-            print("✅ Colonnes decoupages.mode / decoupage_periods.weeks_json vérifiées")
-        except Exception as e:
-            db.session.rollback()
-            print(f"⚠️ Vérification mode/weeks_json échouée: {e}")
-
-        # Filet de sécurité : objectifs facultatifs des thèmes de découpage.
-        try:
-            db.session.execute(db.text("ALTER TABLE decoupage_periods ADD COLUMN IF NOT EXISTS objectives TEXT"))
-            db.session.commit()
-            print("✅ Colonne decoupage_periods.objectives vérifiée")
-        except Exception as e:
-            db.session.rollback()
-            print(f"⚠️ Vérification objectives échouée: {e}")
-
-        # Filet de sécurité : horaire facultatif des tâches personnalisées.
-        try:
-            db.session.execute(db.text("ALTER TABLE plannings ADD COLUMN IF NOT EXISTS task_start TIME"))
-            db.session.execute(db.text("ALTER TABLE plannings ADD COLUMN IF NOT EXISTS task_end TIME"))
-            db.session.commit()
-            print("✅ Colonnes plannings.task_start/task_end vérifiées")
-        except Exception as e:
-            db.session.rollback()
-            print(f"⚠️ Vérification task_start/task_end échouée: {e}")
-
-        # Filet de sécurité : salle de classe optionnelle de l'horaire type.
-        try:
-            db.session.execute(db.text("ALTER TABLE schedules ADD COLUMN IF NOT EXISTS room VARCHAR(50)"))
-            db.session.commit()
-            print("✅ Colonne schedules.room vérifiée")
-        except Exception as _e_room:
-            db.session.rollback()
-            try:
-                db.session.execute(db.text("ALTER TABLE schedules ADD COLUMN room VARCHAR(50)"))
-                db.session.commit()
-                print("✅ Colonne schedules.room ajoutée (SQLite)")
-            except Exception:
-                db.session.rollback()
-                print(f"⚠️ Vérification schedules.room échouée: {_e_room}")
-
-        # Filet de sécurité : horaire exact optionnel des tâches d'horaire type.
-        try:
-            db.session.execute(db.text("ALTER TABLE schedules ADD COLUMN IF NOT EXISTS task_start TIME"))
-            db.session.execute(db.text("ALTER TABLE schedules ADD COLUMN IF NOT EXISTS task_end TIME"))
-            db.session.commit()
-            print("✅ Colonnes schedules.task_start/task_end vérifiées")
-        except Exception as _e_stt:
-            db.session.rollback()
-            try:
-                db.session.execute(db.text("ALTER TABLE schedules ADD COLUMN task_start TIME"))
-                db.session.execute(db.text("ALTER TABLE schedules ADD COLUMN task_end TIME"))
-                db.session.commit()
-                print("✅ Colonnes schedules.task_start/task_end ajoutées (SQLite)")
-            except Exception:
-                db.session.rollback()
-                print(f"⚠️ Vérification schedules.task_start/task_end échouée: {_e_stt}")
-
-        # Filet de sécurité : table des fichiers éphémères (purgés au lendemain).
-        try:
-            db.session.execute(db.text(
-                "CREATE TABLE IF NOT EXISTS ephemeral_files ("
-                "id SERIAL PRIMARY KEY, "
-                "user_id INTEGER NOT NULL REFERENCES users(id), "
-                "planning_id INTEGER REFERENCES plannings(id), "
-                "original_filename VARCHAR(255) NOT NULL, "
-                "file_type VARCHAR(10), mime_type VARCHAR(100), file_size INTEGER, "
-                "r2_key VARCHAR(500), file_content BYTEA, "
-                "expires_on DATE NOT NULL, uploaded_at TIMESTAMP)"))
-            db.session.execute(db.text(
-                "CREATE INDEX IF NOT EXISTS ix_ephemeral_files_expires_on "
-                "ON ephemeral_files (expires_on)"))
-            db.session.commit()
-            print("✅ Table ephemeral_files vérifiée")
-        except Exception as _e_eph:
-            db.session.rollback()
-            try:
-                db.session.execute(db.text(
-                    "CREATE TABLE IF NOT EXISTS ephemeral_files ("
-                    "id INTEGER PRIMARY KEY AUTOINCREMENT, "
-                    "user_id INTEGER NOT NULL REFERENCES users(id), "
-                    "planning_id INTEGER REFERENCES plannings(id), "
-                    "original_filename VARCHAR(255) NOT NULL, "
-                    "file_type VARCHAR(10), mime_type VARCHAR(100), file_size INTEGER, "
-                    "r2_key VARCHAR(500), file_content BLOB, "
-                    "expires_on DATE NOT NULL, uploaded_at TIMESTAMP)"))
-                db.session.execute(db.text(
-                    "CREATE INDEX IF NOT EXISTS ix_ephemeral_files_expires_on "
-                    "ON ephemeral_files (expires_on)"))
-                db.session.commit()
-                print("✅ Table ephemeral_files créée (SQLite)")
-            except Exception:
-                db.session.rollback()
-                print(f"⚠️ Vérification ephemeral_files échouée: {_e_eph}")
-
-        # Filet de sécurité : tâches à cocher du tableau de bord (todo simple).
-        try:
-            db.session.execute(db.text(
-                "CREATE TABLE IF NOT EXISTS dashboard_tasks ("
-                "id SERIAL PRIMARY KEY, "
-                "user_id INTEGER NOT NULL REFERENCES users(id), "
-                "title VARCHAR(300) NOT NULL, "
-                "is_done BOOLEAN NOT NULL DEFAULT FALSE, "
-                "position INTEGER NOT NULL DEFAULT 0, "
-                "created_at TIMESTAMP, done_at TIMESTAMP)"))
-            db.session.execute(db.text(
-                "CREATE INDEX IF NOT EXISTS ix_dashboard_tasks_user ON dashboard_tasks (user_id)"))
-            db.session.commit()
-            print("✅ Table dashboard_tasks vérifiée")
-        except Exception as _e_dt:
-            db.session.rollback()
-            try:
-                db.session.execute(db.text(
-                    "CREATE TABLE IF NOT EXISTS dashboard_tasks ("
-                    "id INTEGER PRIMARY KEY AUTOINCREMENT, "
-                    "user_id INTEGER NOT NULL REFERENCES users(id), "
-                    "title VARCHAR(300) NOT NULL, "
-                    "is_done BOOLEAN NOT NULL DEFAULT 0, "
-                    "position INTEGER NOT NULL DEFAULT 0, "
-                    "created_at TIMESTAMP, done_at TIMESTAMP)"))
-                db.session.execute(db.text(
-                    "CREATE INDEX IF NOT EXISTS ix_dashboard_tasks_user ON dashboard_tasks (user_id)"))
-                db.session.commit()
-                print("✅ Table dashboard_tasks créée (SQLite)")
-            except Exception:
-                db.session.rollback()
-                print(f"⚠️ Vérification dashboard_tasks échouée: {_e_dt}")
-
-        # Filet de sécurité : disposition du tableau de bord mémorisée par utilisateur.
-        try:
-            db.session.execute(db.text(
-                "ALTER TABLE user_preferences ADD COLUMN IF NOT EXISTS dashboard_layout VARCHAR(30)"))
-            db.session.commit()
-            print("✅ Colonne user_preferences.dashboard_layout vérifiée")
-        except Exception as _e_dl:
-            db.session.rollback()
-            try:
-                db.session.execute(db.text(
-                    "ALTER TABLE user_preferences ADD COLUMN dashboard_layout VARCHAR(30)"))
-                db.session.commit()
-                print("✅ Colonne user_preferences.dashboard_layout ajoutée (SQLite)")
-            except Exception:
-                db.session.rollback()
-                print(f"⚠️ Vérification user_preferences.dashboard_layout échouée: {_e_dl}")
-
-        # Filet de sécurité : jeton push Expo des élèves (app mobile).
-        try:
-            db.session.execute(db.text(
-                "ALTER TABLE students ADD COLUMN IF NOT EXISTS expo_push_token VARCHAR(255)"
-            ))
-            db.session.commit()
-            print("✅ Colonne students.expo_push_token vérifiée")
-        except Exception as e:
-            db.session.rollback()
-            print(f"⚠️ Vérification expo_push_token échouée: {e}")
-
-        # Filet de sécurité : table devoir_submissions (rendus des élèves).
-        try:
-            db.session.execute(db.text("""
-                CREATE TABLE IF NOT EXISTS devoir_submissions (
-                    id SERIAL PRIMARY KEY,
-                    devoir_id INTEGER NOT NULL REFERENCES devoirs(id) ON DELETE CASCADE,
-                    student_id INTEGER NOT NULL REFERENCES students(id) ON DELETE CASCADE,
-                    status VARCHAR(20) NOT NULL DEFAULT 'submitted',
-                    pdf_filename VARCHAR(255),
-                    page_count INTEGER DEFAULT 1,
-                    submitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    corrected_filename VARCHAR(255),
-                    corrected_at TIMESTAMP,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    CONSTRAINT _devoir_student_uc UNIQUE (devoir_id, student_id)
-                )
-            """))
-            db.session.commit()
-            print("✅ Table devoir_submissions vérifiée")
-        except Exception as e:
-            db.session.rollback()
-            print(f"⚠️ Vérification table devoir_submissions échouée: {e}")
-
-        # Filet de sécurité : table deleted_classrooms (corbeille 30 jours).
-        try:
-            db.session.execute(db.text("""
-                CREATE TABLE IF NOT EXISTS deleted_classrooms (
-                    id SERIAL PRIMARY KEY,
-                    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                    original_classroom_id INTEGER,
-                    name VARCHAR(100),
-                    subject VARCHAR(100),
-                    color VARCHAR(7),
-                    class_group VARCHAR(100),
-                    student_count INTEGER DEFAULT 0,
-                    payload TEXT,
-                    deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """))
-            db.session.execute(db.text(
-                "CREATE INDEX IF NOT EXISTS ix_deleted_classrooms_user_id "
-                "ON deleted_classrooms (user_id)"
-            ))
-            db.session.commit()
-            print("✅ Table deleted_classrooms vérifiée")
-            # Purge des entrées corbeille de plus de 30 jours (au démarrage).
-            try:
-                from services.classroom_trash import purge_expired_trash
-                _purged = purge_expired_trash()
-                if _purged:
-                    print(f"🗑️ Corbeille : {_purged} classe(s) expirée(s) purgée(s)")
-            except Exception as _e:
-                print(f"⚠️ Purge corbeille échouée: {_e}")
-        except Exception as e:
-            db.session.rollback()
-            print(f"⚠️ Vérification table deleted_classrooms échouée: {e}")
-
-        # Table subscriptions
-        try:
-            db.session.execute(db.text("""
-                CREATE TABLE IF NOT EXISTS subscriptions (
-                    id SERIAL PRIMARY KEY,
-                    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                    stripe_subscription_id VARCHAR(255),
-                    stripe_customer_id VARCHAR(255),
-                    status VARCHAR(50) DEFAULT 'active',
-                    billing_cycle VARCHAR(20),
-                    price_id VARCHAR(255),
-                    amount INTEGER,
-                    currency VARCHAR(10) DEFAULT 'chf',
-                    current_period_start TIMESTAMP,
-                    current_period_end TIMESTAMP,
-                    canceled_at TIMESTAMP,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """))
-            db.session.commit()
-        except Exception:
-            db.session.rollback()
-
-        # Table vouchers
-        try:
-            db.session.execute(db.text("""
-                CREATE TABLE IF NOT EXISTS vouchers (
-                    id SERIAL PRIMARY KEY,
-                    code VARCHAR(50) UNIQUE NOT NULL,
-                    voucher_type VARCHAR(50) NOT NULL,
-                    duration_days INTEGER,
-                    max_uses INTEGER,
-                    current_uses INTEGER DEFAULT 0,
-                    created_by_id INTEGER NOT NULL REFERENCES users(id),
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    expires_at TIMESTAMP,
-                    is_active BOOLEAN DEFAULT TRUE
-                )
-            """))
-            db.session.commit()
-        except Exception:
-            db.session.rollback()
-
-        # Table d'association user_voucher_redemptions
-        try:
-            db.session.execute(db.text("""
-                CREATE TABLE IF NOT EXISTS user_voucher_redemptions (
-                    user_id INTEGER NOT NULL REFERENCES users(id),
-                    voucher_id INTEGER NOT NULL REFERENCES vouchers(id),
-                    redeemed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    PRIMARY KEY (user_id, voucher_id)
-                )
-            """))
-            db.session.commit()
-        except Exception:
-            db.session.rollback()
+    # Commandes CLI de l'exécuteur de tâches.
+    # Usage : flask jobs-worker (processus dédié) / flask jobs-status
+    try:
+        from commands.jobs_cmd import register_jobs_commands
+        register_jobs_commands(app)
+        print("✅ Commandes jobs-worker / jobs-status enregistrées")
+    except ImportError as e:
+        print(f"❌ Commandes jobs non chargées : {e}")
 
-        # Tables exercices interactifs + RPG
-        try:
-            db.session.execute(db.text("""
-                CREATE TABLE IF NOT EXISTS exercises (
-                    id SERIAL PRIMARY KEY,
-                    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                    title VARCHAR(200) NOT NULL,
-                    description TEXT,
-                    subject VARCHAR(100),
-                    level VARCHAR(50),
-                    accept_typos BOOLEAN DEFAULT FALSE,
-                    is_published BOOLEAN DEFAULT FALSE,
-                    is_draft BOOLEAN DEFAULT TRUE,
-                    total_points INTEGER DEFAULT 0,
-                    bonus_gold_threshold INTEGER DEFAULT 80,
-                    badge_threshold INTEGER DEFAULT 100,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """))
-            db.session.execute(db.text("""
-                CREATE TABLE IF NOT EXISTS exercise_blocks (
-                    id SERIAL PRIMARY KEY,
-                    exercise_id INTEGER NOT NULL REFERENCES exercises(id) ON DELETE CASCADE,
-                    block_type VARCHAR(30) NOT NULL,
-                    position INTEGER DEFAULT 0,
-                    title VARCHAR(200),
-                    duration INTEGER,
-                    config_json JSONB DEFAULT '{}',
-                    points INTEGER DEFAULT 10,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """))
-            db.session.execute(db.text("""
-                CREATE TABLE IF NOT EXISTS exercise_publications (
-                    id SERIAL PRIMARY KEY,
-                    exercise_id INTEGER NOT NULL REFERENCES exercises(id) ON DELETE CASCADE,
-                    classroom_id INTEGER NOT NULL REFERENCES classrooms(id),
-                    planning_id INTEGER REFERENCES plannings(id),
-                    published_by INTEGER NOT NULL REFERENCES users(id),
-                    published_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """))
-            db.session.execute(db.text("""
-                CREATE TABLE IF NOT EXISTS student_exercise_attempts (
-                    id SERIAL PRIMARY KEY,
-                    student_id INTEGER NOT NULL REFERENCES students(id),
-                    exercise_id INTEGER NOT NULL REFERENCES exercises(id) ON DELETE CASCADE,
-                    publication_id INTEGER REFERENCES exercise_publications(id),
-                    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    completed_at TIMESTAMP,
-                    score INTEGER DEFAULT 0,
-                    max_score INTEGER DEFAULT 0,
-                    xp_earned INTEGER DEFAULT 0,
-                    gold_earned INTEGER DEFAULT 0
-                )
-            """))
-            db.session.execute(db.text("""
-                CREATE TABLE IF NOT EXISTS student_block_answers (
-                    id SERIAL PRIMARY KEY,
-                    attempt_id INTEGER NOT NULL REFERENCES student_exercise_attempts(id) ON DELETE CASCADE,
-                    block_id INTEGER NOT NULL REFERENCES exercise_blocks(id) ON DELETE CASCADE,
-                    answer_json JSONB DEFAULT '{}',
-                    is_correct BOOLEAN DEFAULT FALSE,
-                    points_earned INTEGER DEFAULT 0,
-                    answered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """))
-            db.session.execute(db.text("""
-                CREATE TABLE IF NOT EXISTS student_rpg_profiles (
-                    id SERIAL PRIMARY KEY,
-                    student_id INTEGER NOT NULL UNIQUE REFERENCES students(id),
-                    avatar_class VARCHAR(20) DEFAULT 'guerrier',
-                    avatar_accessories_json JSONB DEFAULT '{}',
-                    xp_total INTEGER DEFAULT 0,
-                    level INTEGER DEFAULT 1,
-                    gold INTEGER DEFAULT 0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """))
-            db.session.execute(db.text("""
-                CREATE TABLE IF NOT EXISTS badges (
-                    id SERIAL PRIMARY KEY,
-                    name VARCHAR(100) NOT NULL,
-                    description VARCHAR(300),
-                    icon VARCHAR(50) DEFAULT 'trophy',
-                    color VARCHAR(7) DEFAULT '#FFD700',
-                    category VARCHAR(50),
-                    condition_type VARCHAR(50),
-                    condition_value INTEGER DEFAULT 1,
-                    condition_extra VARCHAR(100),
-                    is_active BOOLEAN DEFAULT TRUE
-                )
-            """))
-            db.session.execute(db.text("""
-                CREATE TABLE IF NOT EXISTS student_badges (
-                    id SERIAL PRIMARY KEY,
-                    student_id INTEGER NOT NULL REFERENCES students(id),
-                    badge_id INTEGER NOT NULL REFERENCES badges(id),
-                    earned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(student_id, badge_id)
-                )
-            """))
-            db.session.commit()
-            print("✅ Tables exercices/RPG créées")
-        except Exception as e:
-            db.session.rollback()
-            print(f"⚠️ Tables exercices/RPG: {e}")
+    # Démarrage de l'exécuteur de tâches (relances d'essai, outbox, purges,
+    # conversions, exports…) au 1er request reçu. Robuste au point d'entrée :
+    # fonctionne aussi bien sous `python render_production.py` que sous
+    # `gunicorn app:app`. Gardé → un seul démarrage par process, jamais pendant
+    # une commande CLI (pas de request), et sans effet avec JOB_RUNNER=worker
+    # (processus séparé : python worker.py).
+    job_runner_started = []
 
-        # Migrations colonnes exercices (v2: durée par question, typos, badge_threshold)
-        try:
-            db.session.execute(db.text("ALTER TABLE exercise_blocks ADD COLUMN IF NOT EXISTS duration INTEGER"))
-            db.session.execute(db.text("ALTER TABLE exercises ADD COLUMN IF NOT EXISTS accept_typos BOOLEAN DEFAULT FALSE"))
-            db.session.execute(db.text("ALTER TABLE exercises ADD COLUMN IF NOT EXISTS badge_threshold INTEGER DEFAULT 100"))
-            db.session.execute(db.text("ALTER TABLE exercises ADD COLUMN IF NOT EXISTS folder_id INTEGER"))
-            db.session.execute(db.text("ALTER TABLE exercises ADD COLUMN IF NOT EXISTS classroom_id INTEGER REFERENCES classrooms(id)"))
-            db.session.commit()
-        except Exception:
-            db.session.rollback()
-
-        # Table exercise_folders (gestionnaire d'exercices séparé)
+    @app.before_request
+    def _ensure_job_runner():
+        if job_runner_started:
+            return
+        job_runner_started.append(True)
         try:
-            db.session.execute(db.text("""
-                CREATE TABLE IF NOT EXISTS exercise_folders (
-                    id SERIAL PRIMARY KEY,
-                    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                    parent_id INTEGER REFERENCES exercise_folders(id) ON DELETE CASCADE,
-                    name VARCHAR(255) NOT NULL,
-                    color VARCHAR(7) DEFAULT '#667eea',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """))
-            db.session.execute(db.text("ALTER TABLE exercises ADD COLUMN IF NOT EXISTS exercise_folder_id INTEGER REFERENCES exercise_folders(id)"))
-            db.session.commit()
+            from services.job_runner import start_in_process
+            start_in_process(app)
         except Exception:
-            db.session.rollback()
-
-        # Insérer les badges par défaut
-        try:
-            from models.rpg import Badge, DEFAULT_BADGES
-            existing_count = db.session.execute(db.text("SELECT COUNT(*) FROM badges")).scalar()
-            if existing_count == 0:
-                for badge_data in DEFAULT_BADGES:
-                    badge = Badge(**badge_data)
-                    db.session.add(badge)
-                db.session.commit()
-                print(f"✅ {len(DEFAULT_BADGES)} badges par défaut insérés")
-        except Exception as e:
-            db.session.rollback()
-            print(f"⚠️ Badges par défaut: {e}")
-
-        # Créer les tables RPG items + insérer les objets par défaut
-        try:
-            db.session.execute(db.text("""
-                CREATE TABLE IF NOT EXISTS rpg_items (
-                    id SERIAL PRIMARY KEY,
-                    name VARCHAR(100) NOT NULL,
-                    description VARCHAR(300),
-                    icon VARCHAR(50) DEFAULT 'box',
-                    color VARCHAR(7) DEFAULT '#6b7280',
-                    category VARCHAR(50),
-                    rarity VARCHAR(20) DEFAULT 'common',
-                    is_active BOOLEAN DEFAULT TRUE
-                )
-            """))
-            db.session.execute(db.text("""
-                CREATE TABLE IF NOT EXISTS student_items (
-                    id SERIAL PRIMARY KEY,
-                    student_id INTEGER NOT NULL REFERENCES students(id),
-                    item_id INTEGER NOT NULL REFERENCES rpg_items(id),
-                    quantity INTEGER DEFAULT 1,
-                    obtained_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """))
-            db.session.commit()
-        except Exception as e:
-            db.session.rollback()
-            print(f"⚠️ Tables RPG items: {e}")
-
-        # Migration: ajouter colonnes stats, évolutions, compétences, équipement au profil RPG
-        try:
-            for col_name, col_type, col_default in [
-                ('stat_force', 'INTEGER', '5'),
-                ('stat_defense', 'INTEGER', '5'),
-                ('stat_defense_magique', 'INTEGER', '5'),
-                ('stat_vie', 'INTEGER', '5'),
-                ('stat_intelligence', 'INTEGER', '5'),
-                ('evolutions_json', 'JSONB', "'[]'"),
-                ('active_skills_json', 'JSONB', "'[]'"),
-                ('equipment_json', 'JSONB', "'{}'"),
-            ]:
-                try:
-                    db.session.execute(db.text(
-                        f"ALTER TABLE student_rpg_profiles ADD COLUMN IF NOT EXISTS {col_name} {col_type} DEFAULT {col_default}"
-                    ))
-                except Exception:
-                    pass
-            db.session.commit()
-        except Exception as e:
-            db.session.rollback()
-            print(f"⚠️ Migration stats RPG: {e}")
-
-        # Migration: ajouter colonnes stat_bonus_json, special_ability, equip_slot, class_restriction aux rpg_items
-        try:
-            for col_name, col_type in [
-                ('stat_bonus_json', 'JSONB'),
-                ('special_ability', 'VARCHAR(200)'),
-                ('equip_slot', 'VARCHAR(20)'),
-                ('class_restriction', 'VARCHAR(50)'),
-            ]:
-                try:
-                    db.session.execute(db.text(
-                        f"ALTER TABLE rpg_items ADD COLUMN IF NOT EXISTS {col_name} {col_type}"
-                    ))
-                except Exception:
-                    pass
-            db.session.commit()
-        except Exception as e:
-            db.session.rollback()
-            print(f"⚠️ Migration rpg_items: {e}")
+            pass
 
-        # Re-seed RPG items si les nouveaux champs sont vides (mise à jour avec stat_bonus)
-        try:
-            from models.rpg import RPGItem, DEFAULT_ITEMS
-            existing_items = db.session.execute(db.text("SELECT COUNT(*) FROM rpg_items")).scalar()
-            if existing_items == 0:
-                for item_data in DEFAULT_ITEMS:
-                    item = RPGItem(**item_data)
-                    db.session.add(item)
-                db.session.commit()
-                print(f"✅ {len(DEFAULT_ITEMS)} objets RPG par défaut insérés")
-            else:
-                # Mettre à jour les items existants avec les nouveaux champs
-                for item_data in DEFAULT_ITEMS:
-                    existing = RPGItem.query.filter_by(name=item_data['name']).first()
-                    if existing:
-                        if 'stat_bonus_json' in item_data and not existing.stat_bonus_json:
-                            existing.stat_bonus_json = item_data.get('stat_bonus_json')
-                        if 'special_ability' in item_data and not existing.special_ability:
-                            existing.special_ability = item_data.get('special_ability')
-                        if 'equip_slot' in item_data and not existing.equip_slot:
-                            existing.equip_slot = item_data.get('equip_slot')
-                    else:
-                        item = RPGItem(**item_data)
-                        db.session.add(item)
-                db.session.commit()
-                print("✅ Objets RPG mis à jour avec bonus stats")
-        except Exception as e:
-            db.session.rollback()
-            print(f"⚠️ Objets RPG par défaut: {e}")
-
-        # Seed équipements de classe de base et évolutions
-        try:
-            from models.rpg import seed_class_equipment
-            msg = seed_class_equipment(db.session)
-            print(msg)
-        except Exception as e:
-            db.session.rollback()
-            print(f"⚠️ Équipements de classe: {e}")
-
-        # Table planning_resources (pour les ressources ajoutées aux planifications)
-        try:
-            db.session.execute(db.text("""
-                CREATE TABLE IF NOT EXISTS planning_resources (
-                    id SERIAL PRIMARY KEY,
-                    planning_id INTEGER NOT NULL REFERENCES plannings(id) ON DELETE CASCADE,
-                    resource_type VARCHAR(20) NOT NULL,
-                    resource_id INTEGER NOT NULL,
-                    display_name VARCHAR(255) NOT NULL,
-                    display_icon VARCHAR(50),
-                    status VARCHAR(20) DEFAULT 'linked',
-                    mode VARCHAR(20),
-                    publication_id INTEGER,
-                    position INTEGER DEFAULT 0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """))
-            db.session.commit()
-        except Exception:
-            db.session.rollback()
+    # Schéma : appliqué par `flask db upgrade` ; au démarrage, une seule
+    # vérification de la révision (utils/schema_version.py)
+    if app.config.get('SCHEMA_CHECK_AT_BOOT'):
+        with startup.phase('schema version'):
+            from utils.schema_version import check_schema
+            check_schema(app)
+
+    @app.cli.command('schema-status')
+    def _schema_status_cmd():
+        """Révision de la base et têtes des migrations (code 1 si en retard)."""
+        from utils.schema_version import schema_status
+        status = schema_status(app)
+        print(f"base : {', '.join(status['current']) or '(aucune)'}")
+        print(f"migrations : {', '.join(status['heads'])}")
+        if not status['is_current']:
+            raise SystemExit("Schéma en retard : lancer `flask db upgrade`")
+        print("✅ Schéma à jour")
+
+    # Middlewares de requête : politique par endpoint (premium, session,
+    # cache, type d'utilisateur) compilée une fois, voir utils/request_policy.py.
+    # Le statut Premium est mis en cache par services/premium_status.py
+    # (importé ici : ses événements ORM d'invalidation sont enregistrés au
+    # démarrage, avant la première écriture).
+    from utils.request_policy import PolicySessionInterface, compile_policies, policy_for
+    from services.premium_status import has_premium
+    app.session_interface = PolicySessionInterface()
 
-        # Migration: ajouter mode et is_active sur exercise_publications + fix NULL published_by
-        try:
-            db.session.execute(db.text(
-                "ALTER TABLE exercise_publications ADD COLUMN IF NOT EXISTS mode VARCHAR(20) DEFAULT 'classique'"
-            ))
-            db.session.execute(db.text(
-                "ALTER TABLE exercise_publications ADD COLUMN IF NOT EXISTS is_active BOOLEAN DEFAULT FALSE"
-            ))
-            # Fix NULL published_by : mettre le premier user trouvé
-            db.session.execute(db.text(
-                "UPDATE exercise_publications SET published_by = (SELECT id FROM users LIMIT 1) WHERE published_by IS NULL"
-            ))
-            # Rendre published_by nullable pour éviter les crashs futurs
-            db.session.execute(db.text(
-                "ALTER TABLE exercise_publications ALTER COLUMN published_by DROP NOT NULL"
-            ))
-            db.session.commit()
-        except Exception:
-            db.session.rollback()
+    @app.before_request
+    def apply_endpoint_policy():
+        """Session permanente (PERMANENT_SESSION_LIFETIME) et redirection des
+        utilisateurs freemium vers la page pricing pour les routes premium"""
+        from models.user import User
 
-        # Tables combat (SocketIO combat system)
-        try:
-            db.session.execute(db.text("""
-                CREATE TABLE IF NOT EXISTS combat_sessions (
-                    id SERIAL PRIMARY KEY,
-                    classroom_id INTEGER NOT NULL REFERENCES classrooms(id),
-                    exercise_id INTEGER NOT NULL REFERENCES exercises(id),
-                    teacher_id INTEGER NOT NULL REFERENCES users(id),
-                    status VARCHAR(20) DEFAULT 'waiting',
-                    current_round INTEGER DEFAULT 0,
-                    current_phase VARCHAR(20) DEFAULT 'waiting',
-                    difficulty VARCHAR(20) DEFAULT 'medium',
-                    map_config_json JSONB DEFAULT '{}',
-                    current_block_id INTEGER,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    ended_at TIMESTAMP
-                )
-            """))
-            db.session.execute(db.text("""
-                CREATE TABLE IF NOT EXISTS combat_participants (
-                    id SERIAL PRIMARY KEY,
-                    combat_session_id INTEGER NOT NULL REFERENCES combat_sessions(id) ON DELETE CASCADE,
-                    student_id INTEGER NOT NULL REFERENCES students(id),
-                    snapshot_json JSONB DEFAULT '{}',
-                    current_hp INTEGER DEFAULT 100,
-                    current_mana INTEGER DEFAULT 50,
-                    max_hp INTEGER DEFAULT 100,
-                    max_mana INTEGER DEFAULT 50,
-                    grid_x INTEGER DEFAULT 0,
-                    grid_y INTEGER DEFAULT 0,
-                    is_alive BOOLEAN DEFAULT TRUE,
-                    answered BOOLEAN DEFAULT FALSE,
-                    is_correct BOOLEAN DEFAULT FALSE,
-                    selected_action_json JSONB,
-                    action_submitted BOOLEAN DEFAULT FALSE,
-                    has_moved BOOLEAN DEFAULT FALSE,
-                    UNIQUE(combat_session_id, student_id)
-                )
-            """))
-            db.session.execute(db.text("""
-                CREATE TABLE IF NOT EXISTS combat_monsters (
-                    id SERIAL PRIMARY KEY,
-                    combat_session_id INTEGER NOT NULL REFERENCES combat_sessions(id) ON DELETE CASCADE,
-                    monster_type VARCHAR(20) NOT NULL,
-                    name VARCHAR(100) NOT NULL,
-                    level INTEGER DEFAULT 1,
-                    max_hp INTEGER DEFAULT 50,
-                    current_hp INTEGER DEFAULT 50,
-                    attack INTEGER DEFAULT 5,
-                    defense INTEGER DEFAULT 3,
-                    magic_defense INTEGER DEFAULT 3,
-                    grid_x INTEGER DEFAULT 5,
-                    grid_y INTEGER DEFAULT 0,
-                    is_alive BOOLEAN DEFAULT TRUE,
-                    skills_json JSONB DEFAULT '[]'
-                )
-            """))
-            db.session.commit()
-            print("✅ Tables combat créées")
-        except Exception as e:
-            db.session.rollback()
-            print(f"⚠️ Tables combat: {e}")
+        policy = policy_for(app, request.endpoint)
+        if policy.session and not session.permanent:
+            session.permanent = True
 
-        # Migration: ajouter has_moved aux combat_participants existants
-        try:
-            db.session.execute(db.text(
-                "ALTER TABLE combat_participants ADD COLUMN IF NOT EXISTS has_moved BOOLEAN DEFAULT FALSE"
-            ))
-            db.session.commit()
-        except Exception:
-            db.session.rollback()
+        if not policy.premium:
+            return
 
-        # Migration: changer la FK de student_file_shares de class_files vers class_files_v2
-        try:
-            # Vérifier si la contrainte pointe encore vers class_files (legacy)
-            result = db.session.execute(db.text("""
-                SELECT tc.constraint_name
-                FROM information_schema.table_constraints tc
-                JOIN information_schema.constraint_column_usage ccu
-                    ON tc.constraint_name = ccu.constraint_name
-                WHERE tc.table_name = 'student_file_shares'
-                    AND tc.constraint_type = 'FOREIGN KEY'
-                    AND ccu.table_name = 'class_files'
-                    AND ccu.column_name = 'id'
-            """))
-            old_fk = result.fetchone()
-            if old_fk:
-                constraint_name = old_fk[0]
-                db.session.execute(db.text(
-                    f"ALTER TABLE student_file_shares DROP CONSTRAINT {constraint_name}"
-                ))
-                db.session.execute(db.text(
-                    "ALTER TABLE student_file_shares ADD CONSTRAINT student_file_shares_file_id_fkey "
-                    "FOREIGN KEY (file_id) REFERENCES class_files_v2(id)"
-                ))
-                db.session.commit()
-                print("✅ Migration FK student_file_shares: class_files → class_files_v2")
-            else:
-                db.session.commit()
-        except Exception:
-            db.session.rollback()
+        # Vérifier l'authentification et le type d'utilisateur
+        if not current_user.is_authenticated:
+            return
 
-    # Middleware : contrôle d'accès premium
-    PREMIUM_ENDPOINTS = {
-        'evaluations.', 'attendance.', 'sanctions.',
-        'collaboration.', 'file_manager.', 'class_files.',
-        'exercises.'
-    }
-    PREMIUM_EXACT = {'planning.manage_classes', 'planning.decoupage'}
+        if not isinstance(current_user, User):
+            return
 
-    @app.before_request
-    def make_session_permanent():
-        """Rend la session permanente pour que PERMANENT_SESSION_LIFETIME soit respecté"""
-        session.permanent = True
+        # Vérifier l'accès premium
+        if not has_premium(current_user):
+            flash('Cette fonctionnalité nécessite un abonnement Premium.', 'warning')
+            return redirect(url_for('subscription.pricing'))
 
     @app.after_request
     def no_cache_viewer_pages(response):
@@ -1279,45 +330,12 @@ def create_app(config_name='development'):
         En forcant ces pages a ne jamais etre mises en cache, chaque rechargement
         regenere le cache-bust -> le tout dernier JS est toujours charge.
         """
-        from flask import request
-        if request.endpoint in ('planning.lesson_view', 'planning.calendar_view'):
+        if policy_for(app, request.endpoint).no_cache:
             response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
             response.headers['Pragma'] = 'no-cache'
             response.headers['Expires'] = '0'
         return response
 
-    @app.before_request
-    def check_premium_access():
-        """Redirige les utilisateurs freemium vers la page pricing pour les routes premium"""
-        from flask import request
-        from models.user import User
-
-        if not request.endpoint:
-            return
-
-        # Vérifier si c'est un endpoint premium
-        is_premium_route = request.endpoint in PREMIUM_EXACT
-        if not is_premium_route:
-            for prefix in PREMIUM_ENDPOINTS:
-                if request.endpoint.startswith(prefix):
-                    is_premium_route = True
-                    break
-
-        if not is_premium_route:
-            return
-
-        # Vérifier l'authentification et le type d'utilisateur
-        if not current_user.is_authenticated:
-            return
-
-        if not isinstance(current_user, User):
-            return
-
-        # Vérifier l'accès premium
-        if not current_user.has_premium_access():
-            flash('Cette fonctionnalité nécessite un abonnement Premium.', 'warning')
-            return redirect(url_for('subscription.pricing'))
-
     @app.errorhandler(404)
     def not_found_error(error):
         return render_template('errors/404.html'), 404
@@ -1591,33 +609,13 @@ def create_app(config_name='development'):
                                referral_url=referral_url,
                                referral_count=current_user.referral_count())
 
-    # --- Filet de sécurité schéma (parrainage) ---
-    # L'historique de ce repo a connu des `flask db upgrade` silencieusement
-    # sans effet (cf. migration merge_heads). Or le modèle User lit désormais
-    # referral_code / referred_by_id : si ces colonnes manquent, TOUTE requête
-    # User échoue (login → 500). On garantit donc leur existence au démarrage,
-    # de façon idempotente et sur la base réellement utilisée par l'app.
-    try:
-        from sqlalchemy import text
-        with app.app_context():
-            db.session.execute(text(
-                "ALTER TABLE users ADD COLUMN IF NOT EXISTS referral_code VARCHAR(12)"))
-            db.session.execute(text(
-                "ALTER TABLE users ADD COLUMN IF NOT EXISTS referred_by_id "
-                "INTEGER REFERENCES users(id) ON DELETE SET NULL"))
-            db.session.execute(text(
-                "CREATE UNIQUE INDEX IF NOT EXISTS ix_users_referral_code "
-                "ON users (referral_code)"))
-            db.session.commit()
-    except Exception as e:
-        try:
-            db.session.rollback()
-        except Exception:
-            pass
-        print(f"[schema-safety] colonnes parrainage: {e}", flush=True)
+    # Table des politiques d'endpoint, une fois toutes les routes enregistrées
+    compile_policies(app)
 
+    finish_startup(app)
     return app
 
+
 # Création de l'instance par défaut (sauf si importé par render_production.py)
 import os as _os
 if _os.environ.get('FLASK_ENV') != 'production':
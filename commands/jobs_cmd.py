@@ -0,0 +1,55 @@
+"""Commandes CLI de l'exécuteur de tâches de fond (services/job_runner.py).
+
+Usage :
+    flask jobs-worker          # processus exécuteur dédié (JOB_RUNNER=worker)
+    flask jobs-status          # tâches par file et par statut
+    flask jobs-run-pending     # exécute ici les tâches dues, puis rend la main
+"""
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+
+@click.command('jobs-worker')
+@with_appcontext
+def jobs_worker_command():
+    """Exécute les tâches de fond jusqu'à l'arrêt (Ctrl+C)."""
+    from services.job_runner import run_worker
+
+    click.echo("⚙️  Exécuteur de tâches démarré (Ctrl+C pour arrêter)")
+    run_worker(current_app._get_current_object())
+
+
+@click.command('jobs-status')
+@with_appcontext
+def jobs_status_command():
+    """Affiche les tâches par file et par statut."""
+    from services.job_runner import queue_stats
+
+    stats = queue_stats()
+    click.echo(f"Mode : {stats['mode']}")
+    for queue, counts in sorted(stats['queues'].items()):
+        late = f" (plus ancienne due : {counts['oldest_due_seconds']} s)" if 'oldest_due_seconds' in counts else ''
+        click.echo(f"  {queue:<14} en attente {counts['queued']:>4}  en cours {counts['running']:>3}  "
+                   f"terminées {counts['done']:>6}  échecs {counts['failed']:>4}{late}")
+    click.echo("Tâches périodiques :")
+    for name, info in stats['periodic'].items():
+        click.echo(f"  {name:<24} toutes les {info['every_seconds']} s, "
+                   f"dernière : {info['last_run'] or 'jamais'}")
+
+
+@click.command('jobs-run-pending')
+@with_appcontext
+def jobs_run_pending_command():
+    """Exécute dans ce processus les tâches dues puis s'arrête."""
+    from services.job_runner import run_pending
+
+    count = run_pending(current_app._get_current_object())
+    click.echo(f"✅ {count} tâche(s) exécutée(s)")
+
+
+def register_jobs_commands(app):
+    app.cli.add_command(jobs_worker_command)
+    app.cli.add_command(jobs_status_command)
+    app.cli.add_command(jobs_run_pending_command)
@@ -2,10 +2,11 @@
 
 Usage (shell Render de PROD) :
     flask send-trial-reminders
+    flask send-trial-reminders --dry-run   (compte sans envoyer)
 
 Utile pour tester manuellement / forcer un envoi. Le déclenchement
-automatique (toutes les 6 h) est géré par un greenthread dans
-render_production.py qui appelle la même fonction.
+automatique (toutes les 6 h) est la tâche périodique
+« trial_reminders.send » de l'exécuteur de tâches (services/job_runner.py).
 """
 
 import click
@@ -13,21 +14,22 @@ from flask.cli import with_appcontext
 
 
 @click.command('send-trial-reminders')
+@click.option('--dry-run', is_flag=True, help="Compte les relances dues sans rien envoyer.")
 @with_appcontext
-def send_trial_reminders_command():
+def send_trial_reminders_command(dry_run):
     """Envoie les emails de relance d'essai dus (idempotent)."""
     from services.trial_reminders import send_due_trial_reminders
 
-    result = send_due_trial_reminders()
+    result = send_due_trial_reminders(dry_run=dry_run)
     s = result['sent']
-    click.echo("✅ Relances d'essai traitées :")
-    click.echo(f"   candidats examinés : {result['candidates']}")
-    click.echo(f"   J-5 envoyés        : {s['j5']}")
-    click.echo(f"   J-1 envoyés        : {s['j1']}")
-    click.echo(f"   expiration envoyés : {s['expired']}")
-    click.echo(f"   échecs d'envoi     : {result['failed']}")
-    total = s['j5'] + s['j1'] + s['expired']
-    if total == 0:
+    if dry_run:
+        click.echo("🔎 Relances d'essai dues (dry-run, rien n'est envoyé) :")
+    else:
+        click.echo("✅ Relances d'essai traitées (déposées dans l'outbox) :")
+    click.echo(f"   J-5        : {s['j5']}")
+    click.echo(f"   J-1        : {s['j1']}")
+    click.echo(f"   expiration : {s['expired']}")
+    if result['candidates'] == 0:
         click.echo("   (aucune relance due pour le moment)")
 
 
@@ -34,6 +34,16 @@ class Config:
     REMEMBER_COOKIE_HTTPONLY = True
     REMEMBER_COOKIE_SAMESITE = 'Lax'
 
+    # Démarrage : vérification de la révision du schéma (utils/schema_version.py)
+    # et détail du profil de démarrage (utils/startup.py)
+    SCHEMA_CHECK_AT_BOOT = os.environ.get('SCHEMA_CHECK_AT_BOOT', '1') == '1'
+    STARTUP_PROFILE = os.environ.get('STARTUP_PROFILE') == '1'
+
+    # Templates (utils/template_cache.py) : rechargement automatique en développement,
+    # cache de bytecode sur disque facultatif (`flask compile-templates`)
+    TEMPLATES_AUTO_RELOAD = os.environ.get('TEMPLATES_AUTO_RELOAD', '1') == '1'
+    JINJA_BYTECODE_CACHE_DIR = os.environ.get('JINJA_BYTECODE_CACHE_DIR')
+
     # Configuration WTForms
     WTF_CSRF_ENABLED = True
     WTF_CSRF_TIME_LIMIT = None
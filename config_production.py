@@ -48,6 +48,16 @@ class ProductionConfig:
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = 'Lax'
 
+    # Démarrage : vérification de la révision du schéma (utils/schema_version.py)
+    # et détail du profil de démarrage (utils/startup.py)
+    SCHEMA_CHECK_AT_BOOT = os.environ.get('SCHEMA_CHECK_AT_BOOT', '1') == '1'
+    STARTUP_PROFILE = os.environ.get('STARTUP_PROFILE', '1') == '1'
+
+    # Templates (utils/template_cache.py) : compilés une fois par processus,
+    # cache de bytecode sur disque facultatif (`flask compile-templates`)
+    TEMPLATES_AUTO_RELOAD = os.environ.get('TEMPLATES_AUTO_RELOAD') == '1'
+    JINJA_BYTECODE_CACHE_DIR = os.environ.get('JINJA_BYTECODE_CACHE_DIR')
+
     # Analytics & Monitoring
     GA_MEASUREMENT_ID = os.environ.get('GA_MEASUREMENT_ID')  # ex: G-XXXXXXXXXX
     # Vérification Google Search Console (méthode "balise HTML"). Coller ici
@@ -7,6 +7,7 @@ Create Date: 2026-03-02
 """
 from alembic import op
 import sqlalchemy as sa
+from sqlalchemy import inspect
 from sqlalchemy.dialects import postgresql
 
 # revision identifiers, used by Alembic.
@@ -16,11 +17,23 @@ branch_labels = None
 depends_on = None
 
 
+def _column_exists(table_name, column_name):
+    """Vérifie si une colonne existe déjà dans la table (créée par les ALTER
+    de l'ancien render_production.init_db, qui stampait add_encryption_001)."""
+    bind = op.get_bind()
+    insp = inspect(bind)
+    columns = [col['name'] for col in insp.get_columns(table_name)]
+    return column_name in columns
+
+
 def upgrade():
+    if _column_exists('combat_sessions', 'used_block_ids_json'):
+        return
     op.add_column('combat_sessions',
         sa.Column('used_block_ids_json', postgresql.JSON(astext_type=sa.Text()), nullable=True, server_default='[]')
     )
 
 
 def downgrade():
-    op.drop_column('combat_sessions', 'used_block_ids_json')
+    if _column_exists('combat_sessions', 'used_block_ids_json'):
+        op.drop_column('combat_sessions', 'used_block_ids_json')
@@ -0,0 +1,49 @@
+"""Add file_annotation_pages table (annotations PDF stockées page par page)
+
+Revision ID: annotation_pages_20261019
+Revises: add_referral_20260619
+Create Date: 2026-10-19
+
+L'autosave du lecteur PDF réécrivait tout FileAnnotation.annotations_data à
+chaque trait. Les annotations sont désormais stockées une ligne par page
+(avec un compteur de version) : seules les pages modifiées sont réécrites.
+Les anciens documents JSON sont éclatés en pages au premier accès par
+services/annotation_store.py — aucune reprise de données ici.
+
+SQL brut + IF NOT EXISTS : idempotent (même style que les autres migrations).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'annotation_pages_20261019'
+down_revision = 'add_referral_20260619'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS file_annotation_pages (
+            id SERIAL PRIMARY KEY,
+            annotation_id INTEGER NOT NULL REFERENCES file_annotations(id) ON DELETE CASCADE,
+            page_key VARCHAR(64) NOT NULL,
+            page_number INTEGER,
+            data JSON NOT NULL,
+            version INTEGER NOT NULL DEFAULT 1,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            CONSTRAINT uq_file_annotation_pages_page UNIQUE (annotation_id, page_key)
+        )
+    """)
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_file_annotation_pages_annotation_id "
+        "ON file_annotation_pages (annotation_id)"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_file_annotation_pages_range "
+        "ON file_annotation_pages (annotation_id, page_number)"
+    )
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS file_annotation_pages")
@@ -0,0 +1,53 @@
+"""Add attendance_daily_rollup table and attendance (classroom_id, date) index
+
+Revision ID: attendance_rollup_20261019
+Revises: export_jobs_20261019
+Create Date: 2026-10-19
+
+Les statistiques de présence comptaient toutes les lignes ``attendance`` en
+Python. Elles sont désormais agrégées en SQL (GROUP BY) ; la table
+attendance_daily_rollup garde un compte par (classe, date, période, statut)
+pour les tableaux de bord. Elle est remplie ici à partir de l'existant puis
+maintenue par services/attendance_stats.py.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'attendance_rollup_20261019'
+down_revision = 'export_jobs_20261019'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS ix_attendance_classroom_date
+        ON attendance (classroom_id, date)
+    """)
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS attendance_daily_rollup (
+            id SERIAL PRIMARY KEY,
+            classroom_id INTEGER NOT NULL REFERENCES classrooms(id) ON DELETE CASCADE,
+            date DATE NOT NULL,
+            period_number INTEGER NOT NULL,
+            status VARCHAR(20) NOT NULL,
+            record_count INTEGER NOT NULL DEFAULT 0,
+            late_minutes INTEGER NOT NULL DEFAULT 0,
+            CONSTRAINT _attendance_rollup_uc UNIQUE (classroom_id, date, period_number, status)
+        )
+    """)
+    op.execute("DELETE FROM attendance_daily_rollup")
+    op.execute("""
+        INSERT INTO attendance_daily_rollup
+            (classroom_id, date, period_number, status, record_count, late_minutes)
+        SELECT classroom_id, date, period_number, status,
+               COUNT(*), COALESCE(SUM(late_minutes), 0)
+        FROM attendance
+        GROUP BY classroom_id, date, period_number, status
+    """)
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS attendance_daily_rollup")
+    op.execute("DROP INDEX IF EXISTS ix_attendance_classroom_date")
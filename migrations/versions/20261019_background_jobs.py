@@ -0,0 +1,75 @@
+"""Add background_jobs table (exécuteur de tâches de fond)
+
+Revision ID: background_jobs_20261019
+Revises: notification_outbox_20261019
+Create Date: 2026-10-19
+
+File persistante de services/job_runner.py. Les conversions, exports et
+passages à la nouvelle année encore en attente ou en cours (exécutés jusqu'ici
+par des pools de threads propres à chaque service) y sont déposés pour que
+l'exécuteur les reprenne.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'background_jobs_20261019'
+down_revision = 'notification_outbox_20261019'
+branch_labels = None
+depends_on = None
+
+
+_PENDING_DOMAIN_JOBS = (
+    # (table, file, tâche, préfixe de unique_key)
+    ('conversion_jobs', 'conversions', 'conversions.run', 'conversion'),
+    ('export_jobs', 'exports', 'exports.run', 'export'),
+    ('year_end_jobs', 'year_end', 'year_end.run', 'year_end'),
+)
+
+
+def upgrade():
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS background_jobs (
+            id SERIAL PRIMARY KEY,
+            queue VARCHAR(30) NOT NULL DEFAULT 'default',
+            name VARCHAR(100) NOT NULL,
+            payload TEXT,
+            status VARCHAR(20) NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            run_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            unique_key VARCHAR(150),
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            worker VARCHAR(100),
+            heartbeat_at TIMESTAMP,
+            result TEXT,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    """)
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_background_jobs_due "
+        "ON background_jobs (status, queue, run_at)"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_background_jobs_unique_key "
+        "ON background_jobs (unique_key)"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_background_jobs_user_id "
+        "ON background_jobs (user_id)"
+    )
+    for table, queue, name, prefix in _PENDING_DOMAIN_JOBS:
+        op.execute(f"""
+            INSERT INTO background_jobs (queue, name, payload, status, attempts, max_attempts,
+                                         run_at, unique_key, user_id, created_at)
+            SELECT '{queue}', '{name}', '{{"job_id": ' || id || '}}', 'queued', 0, 3,
+                   CURRENT_TIMESTAMP, '{prefix}:' || id, user_id, CURRENT_TIMESTAMP
+            FROM {table} WHERE status IN ('queued', 'running')
+        """)
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS background_jobs")
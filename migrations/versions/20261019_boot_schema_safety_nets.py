@@ -0,0 +1,520 @@
+"""Fold the boot-time schema safety nets into the revision history
+
+Revision ID: boot_schema_20261019
+Revises: users_premium_until_idx_20261019
+Create Date: 2026-10-19
+
+create_app (run_schema_checks) et render_production.init_db rejouaient à
+chaque démarrage une centaine d'ALTER TABLE / CREATE TABLE idempotents,
+chacun suivi d'un commit ou d'un rollback : latence au démarrage et verrous
+sur des tables chaudes (users, students, plannings…) pendant les
+déploiements. Ils sont regroupés ici, appliqués une seule fois par
+`flask db upgrade` ; le démarrage ne fait plus que vérifier que la base est
+à la tête des migrations (utils/schema_version.py).
+
+SQL brut + IF NOT EXISTS comme les autres migrations du projet : sans effet
+sur une base où les filets de sécurité sont déjà passés. Les données
+(objets RPG par défaut, published_by manquants) sont dans la révision
+suivante (schema_backfills_20261019).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'boot_schema_20261019'
+down_revision = 'users_premium_until_idx_20261019'
+branch_labels = None
+depends_on = None
+
+
+COLUMNS = [
+    # users : TOTP, abonnement, préférences, relances d'essai, onboarding
+    ('users', 'totp_secret', 'VARCHAR(32)'),
+    ('users', 'totp_enabled', 'BOOLEAN DEFAULT FALSE'),
+    ('users', 'is_admin', 'BOOLEAN DEFAULT FALSE'),
+    ('users', 'subscription_tier', "VARCHAR(20) DEFAULT 'freemium'"),
+    ('users', 'stripe_customer_id', 'VARCHAR(255)'),
+    ('users', 'stripe_subscription_id', 'VARCHAR(255)'),
+    ('users', 'premium_until', 'TIMESTAMP'),
+    ('users', 'student_sort_pref', "VARCHAR(20) DEFAULT 'last_name'"),
+    ('users', 'trial_reminder_stage', 'INTEGER DEFAULT 0'),
+    ('users', 'onboarding_dismissed', 'BOOLEAN DEFAULT FALSE'),
+    ('users', 'referral_code', 'VARCHAR(12)'),
+    ('users', 'referred_by_id', 'INTEGER REFERENCES users(id) ON DELETE SET NULL'),
+    ('user_preferences', 'dashboard_layout', 'VARCHAR(30)'),
+    ('students', 'expo_push_token', 'VARCHAR(255)'),
+    # Planification
+    ('decoupages', 'mode', "VARCHAR(10) DEFAULT 'duration'"),
+    ('decoupage_periods', 'weeks_json', 'TEXT'),
+    ('decoupage_periods', 'objectives', 'TEXT'),
+    ('plannings', 'task_start', 'TIME'),
+    ('plannings', 'task_end', 'TIME'),
+    ('schedules', 'room', 'VARCHAR(50)'),
+    ('schedules', 'task_start', 'TIME'),
+    ('schedules', 'task_end', 'TIME'),
+    # Fichiers de classe (duplication R2, indépendance du fichier source)
+    ('class_files_v2', 'r2_key', 'VARCHAR(500)'),
+    ('class_files_v2', 'own_original_filename', 'VARCHAR(500)'),
+    ('class_files_v2', 'own_filename', 'VARCHAR(500)'),
+    ('class_files_v2', 'own_file_type', 'VARCHAR(50)'),
+    ('class_files_v2', 'own_file_size', 'INTEGER'),
+    ('class_files_v2', 'own_mime_type', 'VARCHAR(200)'),
+]
+
+# Colonnes ajoutées après la création des tables exercices / RPG / combat
+LATE_COLUMNS = [
+    ('exercises', 'accept_typos', 'BOOLEAN DEFAULT FALSE'),
+    ('exercises', 'badge_threshold', 'INTEGER DEFAULT 100'),
+    ('exercises', 'badge_pattern', 'VARCHAR(25)'),
+    ('exercises', 'badge_color', 'VARCHAR(7)'),
+    ('exercises', 'folder_id', 'INTEGER'),
+    ('exercises', 'classroom_id', 'INTEGER REFERENCES classrooms(id)'),
+    ('exercises', 'exercise_folder_id', 'INTEGER REFERENCES exercise_folders(id)'),
+    ('exercise_blocks', 'duration', 'INTEGER'),
+    ('exercise_publications', 'mode', "VARCHAR(20) DEFAULT 'classique'"),
+    ('exercise_publications', 'is_active', 'BOOLEAN DEFAULT FALSE'),
+    ('student_rpg_profiles', 'stat_force', 'INTEGER DEFAULT 5'),
+    ('student_rpg_profiles', 'stat_defense', 'INTEGER DEFAULT 5'),
+    ('student_rpg_profiles', 'stat_defense_magique', 'INTEGER DEFAULT 5'),
+    ('student_rpg_profiles', 'stat_vie', 'INTEGER DEFAULT 5'),
+    ('student_rpg_profiles', 'stat_intelligence', 'INTEGER DEFAULT 5'),
+    ('student_rpg_profiles', 'evolutions_json', "JSONB DEFAULT '[]'"),
+    ('student_rpg_profiles', 'active_skills_json', "JSONB DEFAULT '[]'"),
+    ('student_rpg_profiles', 'equipment_json', "JSONB DEFAULT '{}'"),
+    ('rpg_items', 'stat_bonus_json', 'JSONB'),
+    ('rpg_items', 'special_ability', 'VARCHAR(200)'),
+    ('rpg_items', 'equip_slot', 'VARCHAR(20)'),
+    ('rpg_items', 'class_restriction', 'VARCHAR(50)'),
+    ('combat_participants', 'has_moved', 'BOOLEAN DEFAULT FALSE'),
+]
+
+TABLES = [
+    # Exercices interactifs + RPG
+    """
+    CREATE TABLE IF NOT EXISTS exercise_folders (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        parent_id INTEGER REFERENCES exercise_folders(id) ON DELETE CASCADE,
+        name VARCHAR(255) NOT NULL,
+        color VARCHAR(7) DEFAULT '#667eea',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS exercises (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        title VARCHAR(200) NOT NULL,
+        description TEXT,
+        subject VARCHAR(100),
+        level VARCHAR(50),
+        accept_typos BOOLEAN DEFAULT FALSE,
+        is_published BOOLEAN DEFAULT FALSE,
+        is_draft BOOLEAN DEFAULT TRUE,
+        total_points INTEGER DEFAULT 0,
+        bonus_gold_threshold INTEGER DEFAULT 80,
+        badge_threshold INTEGER DEFAULT 100,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS exercise_blocks (
+        id SERIAL PRIMARY KEY,
+        exercise_id INTEGER NOT NULL REFERENCES exercises(id) ON DELETE CASCADE,
+        block_type VARCHAR(30) NOT NULL,
+        position INTEGER DEFAULT 0,
+        title VARCHAR(200),
+        duration INTEGER,
+        config_json JSONB DEFAULT '{}',
+        points INTEGER DEFAULT 10,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS exercise_publications (
+        id SERIAL PRIMARY KEY,
+        exercise_id INTEGER NOT NULL REFERENCES exercises(id) ON DELETE CASCADE,
+        classroom_id INTEGER NOT NULL REFERENCES classrooms(id),
+        planning_id INTEGER REFERENCES plannings(id),
+        published_by INTEGER REFERENCES users(id),
+        published_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS student_exercise_attempts (
+        id SERIAL PRIMARY KEY,
+        student_id INTEGER NOT NULL REFERENCES students(id),
+        exercise_id INTEGER NOT NULL REFERENCES exercises(id) ON DELETE CASCADE,
+        publication_id INTEGER REFERENCES exercise_publications(id),
+        started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        completed_at TIMESTAMP,
+        score INTEGER DEFAULT 0,
+        max_score INTEGER DEFAULT 0,
+        xp_earned INTEGER DEFAULT 0,
+        gold_earned INTEGER DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS student_block_answers (
+        id SERIAL PRIMARY KEY,
+        attempt_id INTEGER NOT NULL REFERENCES student_exercise_attempts(id) ON DELETE CASCADE,
+        block_id INTEGER NOT NULL REFERENCES exercise_blocks(id) ON DELETE CASCADE,
+        answer_json JSONB DEFAULT '{}',
+        is_correct BOOLEAN DEFAULT FALSE,
+        points_earned INTEGER DEFAULT 0,
+        answered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS student_rpg_profiles (
+        id SERIAL PRIMARY KEY,
+        student_id INTEGER NOT NULL UNIQUE REFERENCES students(id),
+        avatar_class VARCHAR(20) DEFAULT 'guerrier',
+        avatar_accessories_json JSONB DEFAULT '{}',
+        xp_total INTEGER DEFAULT 0,
+        level INTEGER DEFAULT 1,
+        gold INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS badges (
+        id SERIAL PRIMARY KEY,
+        name VARCHAR(100) NOT NULL,
+        description VARCHAR(300),
+        icon VARCHAR(50) DEFAULT 'trophy',
+        color VARCHAR(7) DEFAULT '#FFD700',
+        category VARCHAR(50),
+        condition_type VARCHAR(50),
+        condition_value INTEGER DEFAULT 1,
+        condition_extra VARCHAR(100),
+        is_active BOOLEAN DEFAULT TRUE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS student_badges (
+        id SERIAL PRIMARY KEY,
+        student_id INTEGER NOT NULL REFERENCES students(id),
+        badge_id INTEGER NOT NULL REFERENCES badges(id),
+        earned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE(student_id, badge_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS rpg_items (
+        id SERIAL PRIMARY KEY,
+        name VARCHAR(100) NOT NULL,
+        description VARCHAR(300),
+        icon VARCHAR(50) DEFAULT 'box',
+        color VARCHAR(7) DEFAULT '#6b7280',
+        category VARCHAR(50),
+        rarity VARCHAR(20) DEFAULT 'common',
+        is_active BOOLEAN DEFAULT TRUE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS student_items (
+        id SERIAL PRIMARY KEY,
+        student_id INTEGER NOT NULL REFERENCES students(id),
+        item_id INTEGER NOT NULL REFERENCES rpg_items(id),
+        quantity INTEGER DEFAULT 1,
+        obtained_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    # Combat (SocketIO)
+    """
+    CREATE TABLE IF NOT EXISTS combat_sessions (
+        id SERIAL PRIMARY KEY,
+        classroom_id INTEGER NOT NULL REFERENCES classrooms(id),
+        exercise_id INTEGER NOT NULL REFERENCES exercises(id),
+        teacher_id INTEGER NOT NULL REFERENCES users(id),
+        status VARCHAR(20) DEFAULT 'waiting',
+        current_round INTEGER DEFAULT 0,
+        current_phase VARCHAR(20) DEFAULT 'waiting',
+        difficulty VARCHAR(20) DEFAULT 'medium',
+        map_config_json JSONB DEFAULT '{}',
+        current_block_id INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        ended_at TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS combat_participants (
+        id SERIAL PRIMARY KEY,
+        combat_session_id INTEGER NOT NULL REFERENCES combat_sessions(id) ON DELETE CASCADE,
+        student_id INTEGER NOT NULL REFERENCES students(id),
+        snapshot_json JSONB DEFAULT '{}',
+        current_hp INTEGER DEFAULT 100,
+        current_mana INTEGER DEFAULT 50,
+        max_hp INTEGER DEFAULT 100,
+        max_mana INTEGER DEFAULT 50,
+        grid_x INTEGER DEFAULT 0,
+        grid_y INTEGER DEFAULT 0,
+        is_alive BOOLEAN DEFAULT TRUE,
+        answered BOOLEAN DEFAULT FALSE,
+        is_correct BOOLEAN DEFAULT FALSE,
+        selected_action_json JSONB,
+        action_submitted BOOLEAN DEFAULT FALSE,
+        has_moved BOOLEAN DEFAULT FALSE,
+        UNIQUE(combat_session_id, student_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS combat_monsters (
+        id SERIAL PRIMARY KEY,
+        combat_session_id INTEGER NOT NULL REFERENCES combat_sessions(id) ON DELETE CASCADE,
+        monster_type VARCHAR(20) NOT NULL,
+        name VARCHAR(100) NOT NULL,
+        level INTEGER DEFAULT 1,
+        max_hp INTEGER DEFAULT 50,
+        current_hp INTEGER DEFAULT 50,
+        attack INTEGER DEFAULT 5,
+        defense INTEGER DEFAULT 3,
+        magic_defense INTEGER DEFAULT 3,
+        grid_x INTEGER DEFAULT 5,
+        grid_y INTEGER DEFAULT 0,
+        is_alive BOOLEAN DEFAULT TRUE,
+        skills_json JSONB DEFAULT '[]'
+    )
+    """,
+    # Abonnements (Stripe, In-App Purchase, bons)
+    """
+    CREATE TABLE IF NOT EXISTS subscriptions (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        stripe_subscription_id VARCHAR(255),
+        stripe_customer_id VARCHAR(255),
+        status VARCHAR(50) DEFAULT 'active',
+        billing_cycle VARCHAR(20),
+        price_id VARCHAR(255),
+        amount INTEGER,
+        currency VARCHAR(10) DEFAULT 'chf',
+        current_period_start TIMESTAMP,
+        current_period_end TIMESTAMP,
+        canceled_at TIMESTAMP,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS apple_subscriptions (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        original_transaction_id VARCHAR(64) UNIQUE NOT NULL,
+        latest_transaction_id VARCHAR(64),
+        product_id VARCHAR(120) NOT NULL,
+        bundle_id VARCHAR(120),
+        environment VARCHAR(20) DEFAULT 'production',
+        status VARCHAR(20) DEFAULT 'active',
+        purchase_date TIMESTAMP,
+        expires_date TIMESTAMP,
+        cancelled_at TIMESTAMP,
+        revoked_at TIMESTAMP,
+        auto_renew_status BOOLEAN DEFAULT TRUE,
+        in_trial_period BOOLEAN DEFAULT FALSE,
+        in_intro_offer_period BOOLEAN DEFAULT FALSE,
+        last_signed_payload TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS vouchers (
+        id SERIAL PRIMARY KEY,
+        code VARCHAR(50) UNIQUE NOT NULL,
+        voucher_type VARCHAR(50) NOT NULL,
+        duration_days INTEGER,
+        max_uses INTEGER,
+        current_uses INTEGER DEFAULT 0,
+        created_by_id INTEGER NOT NULL REFERENCES users(id),
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        expires_at TIMESTAMP,
+        is_active BOOLEAN DEFAULT TRUE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_voucher_redemptions (
+        user_id INTEGER NOT NULL REFERENCES users(id),
+        voucher_id INTEGER NOT NULL REFERENCES vouchers(id),
+        redeemed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (user_id, voucher_id)
+    )
+    """,
+    # Communication avec les classes (annonces, devoirs)
+    """
+    CREATE TABLE IF NOT EXISTS announcements (
+        id SERIAL PRIMARY KEY,
+        classroom_id INTEGER NOT NULL REFERENCES classrooms(id) ON DELETE CASCADE,
+        user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        title VARCHAR(255) NOT NULL,
+        content TEXT NOT NULL,
+        email_sent BOOLEAN DEFAULT FALSE,
+        email_recipients INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS devoirs (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        classroom_id INTEGER NOT NULL REFERENCES classrooms(id) ON DELETE CASCADE,
+        devoir_type VARCHAR(20) NOT NULL DEFAULT 'submission',
+        title TEXT NOT NULL,
+        instructions TEXT,
+        due_date DATE NOT NULL,
+        due_period INTEGER,
+        document_key VARCHAR(255),
+        document_name VARCHAR(255),
+        exercise_id INTEGER REFERENCES exercises(id) ON DELETE SET NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS devoir_submissions (
+        id SERIAL PRIMARY KEY,
+        devoir_id INTEGER NOT NULL REFERENCES devoirs(id) ON DELETE CASCADE,
+        student_id INTEGER NOT NULL REFERENCES students(id) ON DELETE CASCADE,
+        status VARCHAR(20) NOT NULL DEFAULT 'submitted',
+        pdf_filename VARCHAR(255),
+        page_count INTEGER DEFAULT 1,
+        submitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        corrected_filename VARCHAR(255),
+        corrected_at TIMESTAMP,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        CONSTRAINT _devoir_student_uc UNIQUE (devoir_id, student_id)
+    )
+    """,
+    # Tableau de bord et planification
+    """
+    CREATE TABLE IF NOT EXISTS planning_resources (
+        id SERIAL PRIMARY KEY,
+        planning_id INTEGER NOT NULL REFERENCES plannings(id) ON DELETE CASCADE,
+        resource_type VARCHAR(20) NOT NULL,
+        resource_id INTEGER NOT NULL,
+        display_name VARCHAR(255) NOT NULL,
+        display_icon VARCHAR(50),
+        status VARCHAR(20) DEFAULT 'linked',
+        mode VARCHAR(20),
+        publication_id INTEGER,
+        position INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ephemeral_files (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES users(id),
+        planning_id INTEGER REFERENCES plannings(id),
+        original_filename VARCHAR(255) NOT NULL,
+        file_type VARCHAR(10),
+        mime_type VARCHAR(100),
+        file_size INTEGER,
+        r2_key VARCHAR(500),
+        file_content BYTEA,
+        expires_on DATE NOT NULL,
+        uploaded_at TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS dashboard_tasks (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES users(id),
+        title VARCHAR(300) NOT NULL,
+        is_done BOOLEAN NOT NULL DEFAULT FALSE,
+        position INTEGER NOT NULL DEFAULT 0,
+        created_at TIMESTAMP,
+        done_at TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS deleted_classrooms (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        original_classroom_id INTEGER,
+        name VARCHAR(100),
+        subject VARCHAR(100),
+        color VARCHAR(7),
+        class_group VARCHAR(100),
+        student_count INTEGER DEFAULT 0,
+        payload TEXT,
+        deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS deleted_classroom_chunks (
+        id SERIAL PRIMARY KEY,
+        entry_id INTEGER NOT NULL REFERENCES deleted_classrooms(id) ON DELETE CASCADE,
+        seq INTEGER NOT NULL,
+        kind VARCHAR(20) NOT NULL,
+        row_count INTEGER NOT NULL DEFAULT 0,
+        data TEXT NOT NULL
+    )
+    """,
+]
+
+INDEXES = [
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_users_referral_code ON users (referral_code)",
+    "CREATE INDEX IF NOT EXISTS ix_apple_subscriptions_user_id ON apple_subscriptions (user_id)",
+    "CREATE INDEX IF NOT EXISTS ix_announcements_classroom_id ON announcements (classroom_id)",
+    "CREATE INDEX IF NOT EXISTS ix_devoirs_user_due ON devoirs (user_id, due_date)",
+    "CREATE INDEX IF NOT EXISTS ix_ephemeral_files_expires_on ON ephemeral_files (expires_on)",
+    "CREATE INDEX IF NOT EXISTS ix_dashboard_tasks_user ON dashboard_tasks (user_id)",
+    "CREATE INDEX IF NOT EXISTS ix_deleted_classrooms_user_id ON deleted_classrooms (user_id)",
+    "CREATE INDEX IF NOT EXISTS ix_deleted_classroom_chunks_entry_id "
+    "ON deleted_classroom_chunks (entry_id, seq)",
+]
+
+
+def _add_columns(columns):
+    for table, column, ddl in columns:
+        op.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {ddl}")
+
+
+def _retarget_student_file_shares():
+    """FK student_file_shares.file_id : class_files (legacy) -> class_files_v2."""
+    old_fk = op.get_bind().execute(sa.text("""
+        SELECT tc.constraint_name
+        FROM information_schema.table_constraints tc
+        JOIN information_schema.constraint_column_usage ccu
+            ON tc.constraint_name = ccu.constraint_name
+        WHERE tc.table_name = 'student_file_shares'
+            AND tc.constraint_type = 'FOREIGN KEY'
+            AND ccu.table_name = 'class_files'
+            AND ccu.column_name = 'id'
+    """)).scalar()
+    if old_fk:
+        op.execute(f'ALTER TABLE student_file_shares DROP CONSTRAINT "{old_fk}"')
+        op.execute(
+            "ALTER TABLE student_file_shares ADD CONSTRAINT student_file_shares_file_id_fkey "
+            "FOREIGN KEY (file_id) REFERENCES class_files_v2(id)"
+        )
+
+
+def upgrade():
+    _add_columns(COLUMNS)
+    for ddl in TABLES:
+        op.execute(ddl)
+    _add_columns(LATE_COLUMNS)
+    for ddl in INDEXES:
+        op.execute(ddl)
+
+    # published_by facultatif (complété par schema_backfills_20261019)
+    op.execute("ALTER TABLE exercise_publications ALTER COLUMN published_by DROP NOT NULL")
+    # Fichiers de classe indépendants du fichier source de l'enseignant
+    op.execute("ALTER TABLE class_files_v2 ALTER COLUMN user_file_id DROP NOT NULL")
+    op.execute("ALTER TABLE class_files_v2 DROP CONSTRAINT IF EXISTS class_files_v2_user_file_id_fkey")
+    # Unicité portée par parents.email_hash (add_encryption_001)
+    op.execute("ALTER TABLE parents DROP CONSTRAINT IF EXISTS parents_email_key")
+    _retarget_student_file_shares()
+
+
+def downgrade():
+    # Ces filets de sécurité tournaient au démarrage avant d'être des
+    # migrations : les défaire supprimerait des données en production.
+    pass
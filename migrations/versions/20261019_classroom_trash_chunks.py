@@ -0,0 +1,39 @@
+"""Add deleted_classroom_chunks table (archives de corbeille par morceaux)
+
+Revision ID: trash_chunks_20261019
+Revises: year_end_jobs_20261019
+Create Date: 2026-10-19
+
+Les classes mises à la corbeille sont archivées par morceaux compressés et
+chiffrés (services/classroom_trash.py) au lieu d'un seul payload JSON ; le
+payload de deleted_classrooms ne garde que l'en-tête.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'trash_chunks_20261019'
+down_revision = 'year_end_jobs_20261019'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS deleted_classroom_chunks (
+            id SERIAL PRIMARY KEY,
+            entry_id INTEGER NOT NULL REFERENCES deleted_classrooms(id) ON DELETE CASCADE,
+            seq INTEGER NOT NULL,
+            kind VARCHAR(20) NOT NULL,
+            row_count INTEGER NOT NULL DEFAULT 0,
+            data TEXT NOT NULL
+        )
+    """)
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_deleted_classroom_chunks_entry_id "
+        "ON deleted_classroom_chunks (entry_id, seq)"
+    )
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS deleted_classroom_chunks")
@@ -0,0 +1,45 @@
+"""Add conversion_jobs table (conversions Word/Pages → PDF en arrière-plan)
+
+Revision ID: conversion_jobs_20261019
+Revises: pdf_previews_20261019
+Create Date: 2026-10-19
+
+Les uploads du gestionnaire de fichiers ne convertissent plus dans la requête :
+un job est créé puis exécuté par services/conversion_queue.py, le navigateur
+interroge son statut.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'conversion_jobs_20261019'
+down_revision = 'pdf_previews_20261019'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS conversion_jobs (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            folder_id INTEGER REFERENCES file_folders(id) ON DELETE SET NULL,
+            original_filename VARCHAR(255) NOT NULL,
+            source_hash VARCHAR(64) NOT NULL,
+            source_key VARCHAR(500) NOT NULL,
+            status VARCHAR(20) NOT NULL DEFAULT 'queued',
+            error TEXT,
+            result_user_file_id INTEGER REFERENCES user_files(id) ON DELETE SET NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    """)
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_conversion_jobs_user_status "
+        "ON conversion_jobs (user_id, status)"
+    )
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS conversion_jobs")
@@ -0,0 +1,43 @@
+"""Add export_jobs table (export ZIP de toutes les classes en arrière-plan)
+
+Revision ID: export_jobs_20261019
+Revises: conversion_jobs_20261019
+Create Date: 2026-10-19
+
+L'export notes + présences de toutes les classes est produit par un job
+(services/export_jobs.py) au lieu de la requête HTTP ; le navigateur
+interroge son statut puis télécharge le ZIP.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'export_jobs_20261019'
+down_revision = 'conversion_jobs_20261019'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS export_jobs (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            status VARCHAR(20) NOT NULL DEFAULT 'queued',
+            classes_total INTEGER NOT NULL DEFAULT 0,
+            classes_done INTEGER NOT NULL DEFAULT 0,
+            storage_key VARCHAR(500),
+            file_size INTEGER,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP,
+            expires_at TIMESTAMP
+        )
+    """)
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_export_jobs_user_id ON export_jobs (user_id)"
+    )
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS export_jobs")
@@ -0,0 +1,61 @@
+"""Add notification outbox tables (emails et push envoyés par un worker)
+
+Revision ID: notification_outbox_20261019
+Revises: trash_chunks_20261019
+Create Date: 2026-10-19
+
+Les emails d'annonce et les notifications push partaient de threads
+« fire-and-forget » (perdus au redémarrage). Ils sont maintenant déposés dans
+l'outbox (services/notification_outbox.py) : un message par notification, un
+envoi par destinataire avec son statut et ses tentatives.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'notification_outbox_20261019'
+down_revision = 'trash_chunks_20261019'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS notification_messages (
+            id SERIAL PRIMARY KEY,
+            channel VARCHAR(10) NOT NULL,
+            source VARCHAR(100),
+            subject VARCHAR(255) NOT NULL,
+            body TEXT NOT NULL,
+            data TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS notification_deliveries (
+            id SERIAL PRIMARY KEY,
+            message_id INTEGER NOT NULL REFERENCES notification_messages(id) ON DELETE CASCADE,
+            recipient TEXT NOT NULL,
+            status VARCHAR(20) NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at TIMESTAMP,
+            claim_token VARCHAR(32),
+            claimed_at TIMESTAMP,
+            sent_at TIMESTAMP,
+            provider_id VARCHAR(100),
+            last_error VARCHAR(500)
+        )
+    """)
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_notification_deliveries_message_id "
+        "ON notification_deliveries (message_id)"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_notification_deliveries_status "
+        "ON notification_deliveries (status, next_attempt_at)"
+    )
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS notification_deliveries")
+    op.execute("DROP TABLE IF EXISTS notification_messages")
@@ -0,0 +1,37 @@
+"""Version and status of pdf_previews rows (aperçus générés en tâche de fond)
+
+Revision ID: pdf_preview_versions_20261019
+Revises: schema_backfills_20261019
+Create Date: 2026-10-19
+
+Les aperçus ne sont plus rendus dans la requête mais par la tâche
+« pdf_previews.generate » : une ligne existe dès le dépôt (status
+'pending'), content_hash et les métadonnées ne sont connus qu'une fois la
+tâche terminée. source_version (ETag R2, sinon taille et date d'import)
+permet de régénérer les aperçus d'un fichier remplacé. Les lignes existantes
+n'ont pas de version : elles sont régénérées à la prochaine ouverture.
+"""
+from alembic import op
+
+
+revision = 'pdf_preview_versions_20261019'
+down_revision = 'schema_backfills_20261019'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("ALTER TABLE pdf_previews ADD COLUMN IF NOT EXISTS source_version VARCHAR(200)")
+    op.execute("ALTER TABLE pdf_previews ADD COLUMN IF NOT EXISTS status VARCHAR(20) NOT NULL DEFAULT 'ready'")
+    op.execute("ALTER TABLE pdf_previews ALTER COLUMN status SET DEFAULT 'pending'")
+    op.execute("ALTER TABLE pdf_previews ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP")
+    op.execute("ALTER TABLE pdf_previews ALTER COLUMN content_hash DROP NOT NULL")
+    op.execute("ALTER TABLE pdf_previews ALTER COLUMN page_count DROP NOT NULL")
+    op.execute("ALTER TABLE pdf_previews ALTER COLUMN page_sizes DROP NOT NULL")
+
+
+def downgrade():
+    op.execute("DELETE FROM pdf_previews WHERE status <> 'ready'")
+    op.execute("ALTER TABLE pdf_previews DROP COLUMN IF EXISTS updated_at")
+    op.execute("ALTER TABLE pdf_previews DROP COLUMN IF EXISTS status")
+    op.execute("ALTER TABLE pdf_previews DROP COLUMN IF EXISTS source_version")
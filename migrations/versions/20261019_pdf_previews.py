@@ -0,0 +1,39 @@
+"""Add pdf_previews table (aperçus PDF rastérisés côté serveur)
+
+Revision ID: pdf_previews_20261019
+Revises: annotation_pages_20261019
+Create Date: 2026-10-19
+
+Associe chaque source de fichier (« v2:12 », « userfile:5 »…) au sha256 de
+son contenu PDF. Les images de pages et couches texte sont stockées hors base
+(R2 ou disque), adressées par ce hash : voir services/pdf_previews.py.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'pdf_previews_20261019'
+down_revision = 'annotation_pages_20261019'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS pdf_previews (
+            id SERIAL PRIMARY KEY,
+            source_key VARCHAR(100) NOT NULL UNIQUE,
+            content_hash VARCHAR(64) NOT NULL,
+            page_count INTEGER NOT NULL,
+            page_sizes JSON NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_pdf_previews_content_hash "
+        "ON pdf_previews (content_hash)"
+    )
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS pdf_previews")
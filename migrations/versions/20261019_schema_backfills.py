@@ -0,0 +1,105 @@
+"""Default RPG data and published_by backfill (formerly run at every boot)
+
+Revision ID: schema_backfills_20261019
+Revises: boot_schema_20261019
+Create Date: 2026-10-19
+
+Deux traitements de données que create_app rejouait à chaque démarrage :
+
+    - badges et objets RPG par défaut (models/rpg.py) : insérés s'ils
+      manquent, champs bonus/capacité/emplacement complétés s'ils sont vides ;
+    - exercise_publications.published_by NULL : renseigné avec l'auteur de
+      l'exercice, par lots de BATCH_SIZE lignes validés un par un (hors de la
+      transaction de la migration) pour ne jamais verrouiller la table
+      pendant toute la mise à jour.
+
+Seules les listes de données par défaut viennent de models/rpg.py ; les
+tables sont décrites ici (sa.table) pour que la migration reste valable
+quand les modèles évoluent.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'schema_backfills_20261019'
+down_revision = 'boot_schema_20261019'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+badges = sa.table(
+    'badges',
+    sa.column('id', sa.Integer), sa.column('name', sa.String),
+    sa.column('description', sa.String), sa.column('icon', sa.String),
+    sa.column('color', sa.String), sa.column('category', sa.String),
+    sa.column('condition_type', sa.String), sa.column('condition_value', sa.Integer),
+    sa.column('condition_extra', sa.String),
+)
+
+rpg_items = sa.table(
+    'rpg_items',
+    sa.column('id', sa.Integer), sa.column('name', sa.String),
+    sa.column('description', sa.String), sa.column('icon', sa.String),
+    sa.column('color', sa.String), sa.column('category', sa.String),
+    sa.column('rarity', sa.String), sa.column('stat_bonus_json', sa.JSON),
+    sa.column('special_ability', sa.String), sa.column('equip_slot', sa.String),
+    sa.column('class_restriction', sa.String),
+)
+
+# Champs complétés sur les objets par défaut existants
+FILLED_FIELDS = ('stat_bonus_json', 'special_ability', 'equip_slot')
+
+
+def _rows(items):
+    """bulk_insert exige les mêmes clés pour chaque ligne."""
+    items = list(items)
+    keys = {key for item in items for key in item}
+    return [{key: item.get(key) for key in keys} for item in items]
+
+
+def _seed_rpg_defaults(bind):
+    from models.rpg import (DEFAULT_BADGES, DEFAULT_ITEMS, BASE_CLASS_EQUIPMENT,
+                            EVOLUTION_EQUIPMENT)
+
+    if not bind.execute(sa.select(sa.func.count()).select_from(badges)).scalar():
+        op.bulk_insert(badges, _rows(DEFAULT_BADGES))
+
+    existing = {row.name: row for row in bind.execute(sa.select(rpg_items))}
+    default_names = {item['name'] for item in DEFAULT_ITEMS}
+    missing = {}
+    for item in DEFAULT_ITEMS + BASE_CLASS_EQUIPMENT + EVOLUTION_EQUIPMENT:
+        current = existing.get(item['name'])
+        if current is None:
+            missing.setdefault(item['name'], item)
+        elif item['name'] in default_names:
+            values = {field: item[field] for field in FILLED_FIELDS
+                      if item.get(field) and not getattr(current, field)}
+            if values:
+                bind.execute(rpg_items.update().where(rpg_items.c.id == current.id).values(**values))
+    if missing:
+        op.bulk_insert(rpg_items, _rows(missing.values()))
+
+
+def _backfill_published_by(bind):
+    update = sa.text("""
+        UPDATE exercise_publications p SET published_by = e.user_id
+        FROM exercises e
+        WHERE e.id = p.exercise_id AND p.id IN (
+            SELECT id FROM exercise_publications
+            WHERE published_by IS NULL ORDER BY id LIMIT :batch
+        )
+    """)
+    while bind.execute(update, {'batch': BATCH_SIZE}).rowcount == BATCH_SIZE:
+        pass
+
+
+def upgrade():
+    bind = op.get_bind()
+    _seed_rpg_defaults(bind)
+    with op.get_context().autocommit_block():
+        _backfill_published_by(bind)
+
+
+def downgrade():
+    pass
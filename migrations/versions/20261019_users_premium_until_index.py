@@ -0,0 +1,21 @@
+"""Index users.premium_until (sélection SQL des relances d'essai)
+
+Revision ID: users_premium_until_idx_20261019
+Revises: background_jobs_20261019
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+
+revision = 'users_premium_until_idx_20261019'
+down_revision = 'background_jobs_20261019'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("CREATE INDEX IF NOT EXISTS ix_users_premium_until ON users (premium_until)")
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_users_premium_until")
@@ -0,0 +1,44 @@
+"""Add year_end_jobs table (passage à la nouvelle année en arrière-plan)
+
+Revision ID: year_end_jobs_20261019
+Revises: attendance_rollup_20261019
+Create Date: 2026-10-19
+
+Le nettoyage de fin d'année est exécuté par un job (services/year_end_jobs.py)
+découpé en étapes (une par classe) commitées séparément ; la table garde la
+progression pour reprendre après une interruption.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'year_end_jobs_20261019'
+down_revision = 'attendance_rollup_20261019'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS year_end_jobs (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            status VARCHAR(20) NOT NULL DEFAULT 'queued',
+            options TEXT NOT NULL,
+            steps TEXT NOT NULL,
+            steps_done INTEGER NOT NULL DEFAULT 0,
+            current_step VARCHAR(200),
+            summary TEXT,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    """)
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_year_end_jobs_user_id ON year_end_jobs (user_id)"
+    )
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS year_end_jobs")
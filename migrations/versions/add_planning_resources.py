@@ -7,6 +7,7 @@ Create Date: 2026-02-24
 """
 from alembic import op
 import sqlalchemy as sa
+from sqlalchemy import inspect
 
 # revision identifiers, used by Alembic.
 revision = 'add_planning_resources_001'
@@ -16,6 +17,15 @@ depends_on = None
 
 
 def upgrade():
+    # La table peut déjà exister (db.create_all() sur une base que l'ancien
+    # render_production.init_db stampait à add_encryption_001)
+    inspector = inspect(op.get_bind())
+    if 'planning_resources' in inspector.get_table_names():
+        indexes = {index['name'] for index in inspector.get_indexes('planning_resources')}
+        if 'ix_planning_resources_planning_id' not in indexes:
+            op.create_index(op.f('ix_planning_resources_planning_id'), 'planning_resources', ['planning_id'])
+        return
+
     # Créer la table planning_resources
     op.create_table('planning_resources',
         sa.Column('id', sa.Integer(), nullable=False),
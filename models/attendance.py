@@ -32,7 +32,33 @@ class Attendance(db.Model):
 
     __table_args__ = (
         db.UniqueConstraint('student_id', 'date', 'period_number', name='_student_date_period_uc'),
+        db.Index('ix_attendance_classroom_date', 'classroom_id', 'date'),
     )
 
     def __repr__(self):
         return f'<Attendance {self.student_id} - {self.date} P{self.period_number} - {self.status}>'
+
+
+class AttendanceDailyRollup(db.Model):
+    """Nombre d'enregistrements de présence par (classe, date, période, statut).
+
+    Table dérivée de ``attendance``, tenue à jour par services/attendance_stats.py
+    (événements ORM) : les tableaux de bord lisent quelques lignes par jour au
+    lieu de toutes les présences de l'année."""
+    __tablename__ = 'attendance_daily_rollup'
+
+    id = db.Column(db.Integer, primary_key=True)
+    classroom_id = db.Column(db.Integer, db.ForeignKey('classrooms.id', ondelete='CASCADE'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    period_number = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    record_count = db.Column(db.Integer, nullable=False, default=0)
+    late_minutes = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('classroom_id', 'date', 'period_number', 'status',
+                            name='_attendance_rollup_uc'),
+    )
+
+    def __repr__(self):
+        return f'<AttendanceDailyRollup {self.classroom_id} - {self.date} P{self.period_number} - {self.status}: {self.record_count}>'
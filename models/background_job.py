@@ -0,0 +1,58 @@
+import json
+from datetime import datetime
+from extensions import db
+
+
+class BackgroundJob(db.Model):
+    """Tâche de fond persistante (services/job_runner.py) : une exécution de
+    la tâche enregistrée ``name`` avec ``payload``, sur la file ``queue``.
+
+    ``unique_key`` (facultatif) : au plus une tâche en attente ou en cours
+    par clé (job métier, créneau d'une tâche périodique)."""
+    __tablename__ = 'background_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    queue = db.Column(db.String(30), nullable=False, default='default')
+    name = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=True)         # JSON : arguments nommés
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued | running | done | failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    unique_key = db.Column(db.String(150), nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=True)
+    worker = db.Column(db.String(100), nullable=True)   # processus qui l'exécute
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    result = db.Column(db.Text, nullable=True)          # JSON : valeur de retour
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_background_jobs_due', 'status', 'queue', 'run_at'),
+        db.Index('ix_background_jobs_unique_key', 'unique_key'),
+        db.Index('ix_background_jobs_user_id', 'user_id'),
+    )
+
+    @property
+    def is_active(self):
+        return self.status in ('queued', 'running')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'queue': self.queue,
+            'name': self.name,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'run_at': self.run_at.isoformat() if self.run_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'result': json.loads(self.result) if self.result else None,
+            'error': self.error,
+        }
+
+    def __repr__(self):
+        return f'<BackgroundJob {self.id} {self.name} {self.status}>'
@@ -0,0 +1,45 @@
+from datetime import datetime
+from extensions import db
+
+
+class ConversionJob(db.Model):
+    """Conversion Word/Pages → PDF exécutée en arrière-plan.
+
+    Le fichier source est déposé sous ``source_key`` (R2 ou disque) le temps
+    de la conversion ; une fois terminée, le PDF devient un UserFile
+    (``result_user_file_id``) et la source est supprimée.
+    """
+    __tablename__ = 'conversion_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    folder_id = db.Column(db.Integer, db.ForeignKey('file_folders.id', ondelete='SET NULL'), nullable=True)
+    original_filename = db.Column(db.String(255), nullable=False)
+    source_hash = db.Column(db.String(64), nullable=False)  # sha256 du fichier source
+    source_key = db.Column(db.String(500), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued | running | done | failed
+    error = db.Column(db.Text, nullable=True)
+    result_user_file_id = db.Column(db.Integer, db.ForeignKey('user_files.id', ondelete='SET NULL'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_conversion_jobs_user_status', 'user_id', 'status'),
+    )
+
+    @property
+    def is_active(self):
+        return self.status in ('queued', 'running')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'name': self.original_filename,
+            'error': self.error,
+            'file_id': self.result_user_file_id,
+        }
+
+    def __repr__(self):
+        return f'<ConversionJob {self.id} {self.status} {self.original_filename}>'
@@ -13,6 +13,10 @@ class DeletedClassroom(db.Model):
 
     Champs dénormalisés (name/subject/…) : permettent d'afficher la corbeille
     sans déchiffrer le payload.
+
+    Format 2 (services/classroom_trash.py) : le payload ne contient plus que
+    l'en-tête (classe, nombres de lignes, aperçu) ; les lignes sont dans
+    deleted_classroom_chunks, par morceaux compressés et chiffrés.
     """
     __tablename__ = 'deleted_classrooms'
 
@@ -24,10 +28,33 @@ class DeletedClassroom(db.Model):
     color = db.Column(db.String(7))
     class_group = db.Column(db.String(100))
     student_count = db.Column(db.Integer, default=0)
-    payload = db.Column(EncryptedText)  # JSON chiffré : classe + élèves + évals + notes
+    payload = db.Column(EncryptedText)  # JSON chiffré : en-tête (format 2) ou archive complète (format 1)
     deleted_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     user = db.relationship('User', backref=db.backref('deleted_classrooms', lazy='dynamic'))
 
     def __repr__(self):
         return f'<DeletedClassroom {self.name} deleted_at={self.deleted_at}>'
+
+
+class DeletedClassroomChunk(db.Model):
+    """Morceau d'archive d'une classe en corbeille : jusqu'à CHUNK_ROWS lignes
+    d'un même type (élèves, évaluations, notes, présences), en JSON lines
+    compressé (zlib) puis chiffré (Fernet). Relus dans l'ordre de ``seq``.
+    """
+    __tablename__ = 'deleted_classroom_chunks'
+
+    id = db.Column(db.Integer, primary_key=True)
+    entry_id = db.Column(db.Integer, db.ForeignKey('deleted_classrooms.id', ondelete='CASCADE'),
+                         nullable=False)
+    seq = db.Column(db.Integer, nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # students, evaluations, grades, attendance
+    row_count = db.Column(db.Integer, nullable=False, default=0)
+    data = db.Column(db.Text, nullable=False)  # jeton chiffré (encryption_engine.encrypt_bytes)
+
+    __table_args__ = (
+        db.Index('ix_deleted_classroom_chunks_entry_id', 'entry_id', 'seq'),
+    )
+
+    def __repr__(self):
+        return f'<DeletedClassroomChunk {self.entry_id}#{self.seq} {self.kind}>'
@@ -0,0 +1,39 @@
+from datetime import datetime
+from extensions import db
+
+
+class ExportJob(db.Model):
+    """Export « toutes les classes » (ZIP notes + présences) exécuté en
+    arrière-plan. Le ZIP est déposé sous ``storage_key`` (R2 ou disque) et
+    téléchargeable jusqu'à ``expires_at``."""
+    __tablename__ = 'export_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued | running | done | failed
+    classes_total = db.Column(db.Integer, nullable=False, default=0)
+    classes_done = db.Column(db.Integer, nullable=False, default=0)
+    storage_key = db.Column(db.String(500), nullable=True)
+    file_size = db.Column(db.Integer, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=True)
+
+    @property
+    def is_active(self):
+        return self.status in ('queued', 'running')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'classes_total': self.classes_total,
+            'classes_done': self.classes_done,
+            'file_size': self.file_size,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+        }
+
+    def __repr__(self):
+        return f'<ExportJob {self.id} {self.status}>'
@@ -20,28 +20,19 @@ class FileFolder(db.Model):
     files = db.relationship('UserFile', backref='folder', lazy='dynamic', cascade='all, delete-orphan')
 
     def get_path(self):
-        """Retourne le chemin complet du dossier"""
-        if self.parent:
-            return f"{self.parent.get_path()}/{self.name}"
-        return self.name
+        """Retourne le chemin complet du dossier (une requête, CTE récursive)"""
+        from services.folder_tree import folder_path
+        return folder_path(self.id)
 
     def get_size(self):
-        """Calcule la taille totale du dossier"""
-        total_size = 0
-        # Taille des fichiers directs
-        for file in self.files:
-            total_size += file.file_size or 0
-        # Taille des sous-dossiers
-        for subfolder in self.subfolders:
-            total_size += subfolder.get_size()
-        return total_size
+        """Calcule la taille totale du dossier (sous-dossiers compris, une requête)"""
+        from services.folder_tree import subtree_stats
+        return subtree_stats(self.id)[0]
 
     def get_file_count(self):
-        """Compte le nombre total de fichiers dans le dossier et ses sous-dossiers"""
-        count = self.files.count()
-        for subfolder in self.subfolders:
-            count += subfolder.get_file_count()
-        return count
+        """Compte le nombre total de fichiers dans le dossier et ses sous-dossiers (une requête)"""
+        from services.folder_tree import subtree_stats
+        return subtree_stats(self.id)[1]
 
     def __repr__(self):
         return f'<FileFolder {self.name}>'
@@ -140,3 +131,33 @@ class FileAnnotation(db.Model):
     
     def __repr__(self):
         return f'<FileAnnotation {self.file_type}:{self.file_id} by user {self.user_id}>'
+
+
+class FileAnnotationPage(db.Model):
+    """Annotations d'UNE page d'un fichier (stockage incrémental).
+
+    Une ligne par (annotation, page) : l'autosave du lecteur PDF ne réécrit
+    que les pages modifiées au lieu du document JSON complet de
+    FileAnnotation.annotations_data. `version` est incrémenté à chaque
+    écriture de la page (détection de conflits entre deux onglets/appareils).
+    """
+    __tablename__ = 'file_annotation_pages'
+    __table_args__ = (
+        db.UniqueConstraint('annotation_id', 'page_key', name='uq_file_annotation_pages_page'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    annotation_id = db.Column(db.Integer, db.ForeignKey('file_annotations.id', ondelete='CASCADE'),
+                              nullable=False, index=True)
+    page_key = db.Column(db.String(64), nullable=False)  # pageId du lecteur (« 3 », « blank_… »)
+    page_number = db.Column(db.Integer, nullable=True)  # Renseigné si page_key est numérique (plages)
+    data = db.Column(db.JSON, nullable=False)  # Liste des annotations de la page
+    version = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Relations
+    annotation = db.relationship('FileAnnotation', backref=db.backref(
+        'pages', lazy='dynamic', cascade='all, delete-orphan', passive_deletes=True))
+
+    def __repr__(self):
+        return f'<FileAnnotationPage {self.annotation_id}:{self.page_key} v{self.version}>'
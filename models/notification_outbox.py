@@ -0,0 +1,49 @@
+from datetime import datetime
+from extensions import db
+from utils.custom_types import EncryptedString
+
+
+class OutboxMessage(db.Model):
+    """Notification à envoyer (email ou push), déposée dans l'outbox dans la
+    même transaction que l'action qui la déclenche
+    (services/notification_outbox.py). Le contenu est stocké une fois ; les
+    destinataires sont des OutboxDelivery."""
+    __tablename__ = 'notification_messages'
+
+    id = db.Column(db.Integer, primary_key=True)
+    channel = db.Column(db.String(10), nullable=False)    # email | push
+    source = db.Column(db.String(100), nullable=True)     # ex. 'announcement:12'
+    subject = db.Column(db.String(255), nullable=False)   # sujet (email) / titre (push)
+    body = db.Column(db.Text, nullable=False)             # HTML (email) / texte (push)
+    data = db.Column(db.Text, nullable=True)              # JSON : données push
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<OutboxMessage {self.id} {self.channel}>'
+
+
+class OutboxDelivery(db.Model):
+    """Envoi d'une notification à un destinataire, avec son statut
+    (pending → sending → sent | failed) et ses tentatives. Un envoi
+    ``sending`` est réservé par un worker (``claim_token``)."""
+    __tablename__ = 'notification_deliveries'
+
+    id = db.Column(db.Integer, primary_key=True)
+    message_id = db.Column(db.Integer, db.ForeignKey('notification_messages.id', ondelete='CASCADE'),
+                           nullable=False, index=True)
+    recipient = db.Column(EncryptedString(), nullable=False)  # email ou jeton Expo
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=True)   # pending : pas avant
+    claim_token = db.Column(db.String(32), nullable=True)
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    provider_id = db.Column(db.String(100), nullable=True)    # id Resend / ticket Expo
+    last_error = db.Column(db.String(500), nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_notification_deliveries_status', 'status', 'next_attempt_at'),
+    )
+
+    def __repr__(self):
+        return f'<OutboxDelivery {self.id} {self.status}>'
@@ -0,0 +1,26 @@
+from datetime import datetime
+from extensions import db
+
+
+class PdfPreview(db.Model):
+    """Aperçus rastérisés d'un PDF : source de fichier → hash du contenu.
+
+    Les images et couches texte sont stockées hors base, adressées par
+    content_hash (voir services/pdf_previews.py) : plusieurs sources au
+    contenu identique partagent les mêmes aperçus. source_version (ETag R2,
+    sinon taille et date d'import) change quand la source est remplacée.
+    """
+    __tablename__ = 'pdf_previews'
+
+    id = db.Column(db.Integer, primary_key=True)
+    source_key = db.Column(db.String(100), nullable=False, unique=True)  # « v2:12 », « userfile:5 »
+    source_version = db.Column(db.String(200), nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, ready, failed
+    content_hash = db.Column(db.String(64), nullable=True, index=True)  # sha256 du PDF (une fois prêt)
+    page_count = db.Column(db.Integer, nullable=True)
+    page_sizes = db.Column(db.JSON, nullable=True)  # [[largeur, hauteur], …] en points PDF
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<PdfPreview {self.source_key} {self.status}>'
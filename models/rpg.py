@@ -619,7 +619,7 @@ class StudentItem(db.Model):
 def seed_class_equipment(db_session):
     """
     Ajouter les équipements de base et d'évolution des classes si n'existent pas.
-    Appelé depuis app.py pendant les migrations.
+    Les bases existantes sont complétées par la migration schema_backfills_20261019.
     """
     try:
         all_equipment = BASE_CLASS_EQUIPMENT + EVOLUTION_EQUIPMENT
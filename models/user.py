@@ -22,7 +22,7 @@ class User(UserMixin, db.Model):
     subscription_tier = db.Column(db.String(20), default='freemium')  # 'freemium' ou 'premium'
     stripe_customer_id = db.Column(db.String(255), nullable=True)
     stripe_subscription_id = db.Column(db.String(255), nullable=True)
-    premium_until = db.Column(db.DateTime, nullable=True)  # Date d'expiration premium
+    premium_until = db.Column(db.DateTime, nullable=True, index=True)  # Date d'expiration premium
     # Suivi des relances d'essai par email : 0=aucune, 1=J-5 envoyée,
     # 2=J-1 envoyée, 3=email d'expiration envoyé. Évite les doublons.
     trial_reminder_stage = db.Column(db.Integer, default=0)
@@ -92,8 +92,10 @@ class User(UserMixin, db.Model):
         return False
 
     def has_premium_access(self):
-        """Alias pour is_premium()"""
-        return self.is_premium()
+        """is_premium(), mis en cache par services/premium_status.py (appelée
+        à chaque requête par le middleware premium et les templates)."""
+        from services.premium_status import has_premium
+        return has_premium(self)
 
     def grant_premium_access(self, days=None):
         """Accorder l'accès premium (days=None = illimité)"""
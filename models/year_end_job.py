@@ -0,0 +1,50 @@
+import json
+from datetime import datetime
+from extensions import db
+
+
+class YearEndJob(db.Model):
+    """Passage à la nouvelle année exécuté en arrière-plan, étape par étape
+    (services/year_end_jobs.py). ``steps`` liste les étapes planifiées,
+    ``steps_done`` le nombre d'étapes commitées : une reprise repart de
+    ``steps[steps_done]``."""
+    __tablename__ = 'year_end_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued | running | done | failed
+    options = db.Column(db.Text, nullable=False)      # JSON : class_actions, dates, holiday_action
+    steps = db.Column(db.Text, nullable=False)        # JSON : liste des clés d'étapes
+    steps_done = db.Column(db.Integer, nullable=False, default=0)
+    current_step = db.Column(db.String(200), nullable=True)
+    summary = db.Column(db.Text, nullable=True)       # JSON : compteurs cumulés
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    @property
+    def is_active(self):
+        return self.status in ('queued', 'running')
+
+    @property
+    def step_list(self):
+        return json.loads(self.steps) if self.steps else []
+
+    @property
+    def summary_dict(self):
+        return json.loads(self.summary) if self.summary else {}
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'steps_total': len(self.step_list),
+            'steps_done': self.steps_done,
+            'current_step': self.current_step,
+            'summary': self.summary_dict,
+            'error': self.error,
+        }
+
+    def __repr__(self):
+        return f'<YearEndJob {self.id} {self.status}>'
@@ -11,7 +11,7 @@ eventlet.monkey_patch()
 
 import os
 from app import create_app
-from extensions import db, socketio
+from extensions import socketio
 
 # Configuration pour la production
 os.environ['FLASK_ENV'] = 'production'
@@ -21,136 +21,32 @@ app = create_app('production')
 
 
 def init_db():
-    """Initialise la base de données et applique les migrations"""
-    with app.app_context():
-        from sqlalchemy import text
-
-        # Approche directe : ajouter les colonnes manquantes via SQL
-        migrations = [
-            # --- Email verification migrations ---
-            ("email_verified sur users",
-             "ALTER TABLE users ADD COLUMN email_verified BOOLEAN DEFAULT FALSE"),
-            ("email_verified sur parents",
-             "ALTER TABLE parents ADD COLUMN email_verified BOOLEAN DEFAULT FALSE"),
-            ("email_verified sur students",
-             "ALTER TABLE students ADD COLUMN email_verified BOOLEAN DEFAULT FALSE"),
-            ("table email_verifications",
-             """CREATE TABLE IF NOT EXISTS email_verifications (
-                id SERIAL PRIMARY KEY,
-                email VARCHAR(120) NOT NULL,
-                code VARCHAR(6) NOT NULL,
-                user_type VARCHAR(20) NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                expires_at TIMESTAMP NOT NULL,
-                is_used BOOLEAN DEFAULT FALSE
-             )"""),
-            ("index sur email_verifications",
-             "CREATE INDEX IF NOT EXISTS ix_email_verifications_email ON email_verifications (email)"),
-            # NOTE: Les comptes existants avant la feature email_verified ont été
-            # marqués comme vérifiés lors du premier déploiement. Ne PAS refaire
-            # cet UPDATE à chaque démarrage car ça écraserait le statut des
-            # nouveaux comptes qui n'ont pas encore vérifié leur email.
-
-            # --- Encryption migrations (add_encryption_001) ---
-            ("email_hash sur students",
-             "ALTER TABLE students ADD COLUMN email_hash VARCHAR(64)"),
-            ("index email_hash students",
-             "CREATE INDEX IF NOT EXISTS ix_students_email_hash ON students (email_hash)"),
-            ("students.first_name vers Text",
-             "ALTER TABLE students ALTER COLUMN first_name TYPE TEXT"),
-            ("students.last_name vers Text",
-             "ALTER TABLE students ALTER COLUMN last_name TYPE TEXT"),
-            ("students.email vers Text",
-             "ALTER TABLE students ALTER COLUMN email TYPE TEXT"),
-            ("students.date_of_birth vers Text",
-             "ALTER TABLE students ALTER COLUMN date_of_birth TYPE TEXT USING date_of_birth::TEXT"),
-            ("students.parent_email_mother vers Text",
-             "ALTER TABLE students ALTER COLUMN parent_email_mother TYPE TEXT"),
-            ("students.parent_email_father vers Text",
-             "ALTER TABLE students ALTER COLUMN parent_email_father TYPE TEXT"),
-            ("email_hash sur parents",
-             "ALTER TABLE parents ADD COLUMN email_hash VARCHAR(64)"),
-            ("parents.email vers Text",
-             "ALTER TABLE parents ALTER COLUMN email TYPE TEXT"),
-            ("parents.first_name vers Text",
-             "ALTER TABLE parents ALTER COLUMN first_name TYPE TEXT"),
-            ("parents.last_name vers Text",
-             "ALTER TABLE parents ALTER COLUMN last_name TYPE TEXT"),
-            ("index unique email_hash parents",
-             "CREATE UNIQUE INDEX IF NOT EXISTS ix_parents_email_hash ON parents (email_hash)"),
-            ("grades.title vers Text",
-             "ALTER TABLE grades ALTER COLUMN title TYPE TEXT"),
-            ("student_accommodations.custom_name vers Text",
-             "ALTER TABLE student_accommodations ALTER COLUMN custom_name TYPE TEXT"),
-            ("sanction_templates.name vers Text",
-             "ALTER TABLE sanction_templates ALTER COLUMN name TYPE TEXT"),
-
-            # --- Combat question cycling (20260302) ---
-            ("used_block_ids_json sur combat_sessions",
-             "ALTER TABLE combat_sessions ADD COLUMN used_block_ids_json JSON DEFAULT '[]'"),
-
-            # --- Class file duplication R2 (20260331) ---
-            ("r2_key sur class_files_v2",
-             "ALTER TABLE class_files_v2 ADD COLUMN r2_key VARCHAR(500)"),
-
-            # --- Class file independence (20260331b) ---
-            ("own_original_filename sur class_files_v2",
-             "ALTER TABLE class_files_v2 ADD COLUMN own_original_filename VARCHAR(500)"),
-            ("own_filename sur class_files_v2",
-             "ALTER TABLE class_files_v2 ADD COLUMN own_filename VARCHAR(500)"),
-            ("own_file_type sur class_files_v2",
-             "ALTER TABLE class_files_v2 ADD COLUMN own_file_type VARCHAR(50)"),
-            ("own_file_size sur class_files_v2",
-             "ALTER TABLE class_files_v2 ADD COLUMN own_file_size INTEGER"),
-            ("own_mime_type sur class_files_v2",
-             "ALTER TABLE class_files_v2 ADD COLUMN own_mime_type VARCHAR(200)"),
-            ("class_files_v2 user_file_id nullable",
-             "ALTER TABLE class_files_v2 ALTER COLUMN user_file_id DROP NOT NULL"),
-            ("drop FK cascade class_files_v2",
-             "ALTER TABLE class_files_v2 DROP CONSTRAINT IF EXISTS class_files_v2_user_file_id_fkey"),
-        ]
-
-        for description, sql in migrations:
-            try:
-                db.session.execute(text(sql))
-                db.session.commit()
-                print(f"OK: {description}")
-            except Exception as e:
-                db.session.rollback()
-                if "already exists" in str(e) or "duplicate column" in str(e).lower():
-                    print(f"SKIP (deja fait): {description}")
-                else:
-                    print(f"ERREUR {description}: {e}")
-
-        # Supprimer l'ancienne contrainte unique sur parents.email si elle existe
-        try:
-            db.session.execute(text("ALTER TABLE parents DROP CONSTRAINT IF EXISTS parents_email_key"))
-            db.session.commit()
-            print("OK: suppression contrainte unique parents.email")
-        except Exception as e:
-            db.session.rollback()
-            print(f"SKIP contrainte parents.email: {e}")
-
-        # Stamper Alembic à la dernière migration appliquée
-        try:
-            from flask_migrate import stamp
-            stamp(revision='add_encryption_001')
-            print("Alembic stampe a add_encryption_001")
-        except Exception as e:
-            print(f"Stamp alembic: {e}")
+    """Applique les migrations manquantes (entrée Procfile sans
+    `flask db upgrade`). Le schéma n'est plus modifié en dehors de
+    migrations/versions/ : plus d'ALTER rejoués ni de stamp Alembic forcé.
+    Un échec arrête le démarrage (comme `flask db upgrade && …` dans
+    render.yaml) : servir sur un schéma en retard casserait les pages."""
+    from utils.schema_version import upgrade_if_behind
+    try:
+        if upgrade_if_behind(app):
+            print("OK: migrations appliquées")
+    except Exception as e:
+        print(f"ERREUR migrations: {e}", flush=True)
+        raise SystemExit(1)
 
 if __name__ == "__main__":
-    # Initialiser la base de données au démarrage
+    # Mettre le schéma à jour au démarrage (une fois, avant le service)
     init_db()
 
-    # Démarrer la boucle de relance d'essai (greenthread eventlet, gardé contre
-    # le double démarrage). Aussi déclenché par un before_request dans create_app
-    # au cas où l'entrée serait gunicorn app:app au lieu de ce fichier.
+    # Démarrer l'exécuteur de tâches dans ce processus (mode JOB_RUNNER
+    # « thread », par défaut ; sans effet avec un worker séparé). Aussi
+    # déclenché par un before_request dans create_app au cas où l'entrée
+    # serait gunicorn app:app au lieu de ce fichier.
     try:
-        from services.trial_reminders import start_background_loop
-        start_background_loop(app)
+        from services.job_runner import start_in_process
+        start_in_process(app)
     except Exception as e:
-        print(f"[trial_reminders] démarrage boucle ignoré: {e}", flush=True)
+        print(f"[job_runner] démarrage ignoré: {e}", flush=True)
 
     # Récupérer le port depuis les variables d'environnement
     port = int(os.environ.get("PORT", 5000))
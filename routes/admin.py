@@ -180,3 +180,16 @@ def grant_premium(user_id):
 
     user.grant_premium_access(days=int(days) if days else None)
     return jsonify({'success': True, 'message': f'Accès premium accordé à {user.username}'})
+
+
+@admin_bp.route('/query-stats')
+@admin_required
+def query_stats():
+    """Requêtes SQL et latence par endpoint depuis le démarrage du processus
+    (utils/query_stats.py). ?reset=1 remet les compteurs à zéro."""
+    from utils.query_stats import endpoint_stats, reset_endpoint_stats
+
+    stats = endpoint_stats()
+    if request.args.get('reset') == '1':
+        reset_endpoint_stats()
+    return jsonify({'success': True, 'endpoints': stats})
@@ -6,7 +6,6 @@ portail parent et, en option, déclenche une notification email aux parents des
 """
 import re
 import html as _html
-import threading
 
 from flask import Blueprint, request, jsonify
 from flask_login import login_required, current_user
@@ -16,6 +15,7 @@ from models.announcement import Announcement
 from models.classroom import Classroom
 from models.student import Student
 from routes.evaluations import user_can_access_classroom
+from services.notification_outbox import delivery_counts, enqueue_email
 
 announcements_bp = Blueprint('announcements', __name__, url_prefix='/api/announcements')
 
@@ -92,12 +92,12 @@ def create_announcement(classroom_id):
         email_recipients=len(recipients),
     )
     db.session.add(announcement)
-    db.session.commit()
-
     if notify and recipients:
-        _send_announcement_emails_async(
-            recipients, classroom.name, current_user.username, title, content
-        )
+        # Outbox : l'email n'est déposé que si l'annonce est commitée
+        db.session.flush()
+        subject, body = _announcement_email(classroom.name, current_user.username, title, content)
+        enqueue_email(recipients, subject, body, source=f'announcement:{announcement.id}')
+    db.session.commit()
 
     return jsonify({'success': True, 'announcement': _serialize(announcement, author=current_user.username)})
 
@@ -114,14 +114,18 @@ def delete_announcement(announcement_id):
     return jsonify({'success': True})
 
 
-def _send_announcement_emails_async(recipients, class_name, teacher, title, content):
-    """Envoie la notification email en tâche de fond.
+@announcements_bp.route('/<int:announcement_id>/deliveries', methods=['GET'])
+@login_required
+def announcement_deliveries(announcement_id):
+    """Suivi de la notification email d'une annonce (envois par statut)."""
+    announcement = Announcement.query.get_or_404(announcement_id)
+    if not user_can_access_classroom(current_user.id, announcement.classroom_id):
+        return jsonify({'success': False, 'message': 'Accès refusé'}), 403
+    return jsonify({'success': True, 'deliveries': delivery_counts(f'announcement:{announcement.id}')})
 
-    send_email() ne dépend que de variables d'environnement (Resend) — aucun
-    contexte Flask/DB n'est requis dans le thread.
-    """
-    from services.email_service import send_email
 
+def _announcement_email(class_name, teacher, title, content):
+    """Sujet et corps HTML de la notification email d'une annonce."""
     safe_title = _html.escape(title)
     safe_content = _html.escape(content).replace('\n', '<br>')
     safe_class = _html.escape(class_name or '')
@@ -140,12 +144,4 @@ def _send_announcement_emails_async(recipients, class_name, teacher, title, cont
     Vous recevez cet email car votre enfant est inscrit dans cette classe sur ProfCalendar.
   </p>
 </div>"""
-
-    def _worker():
-        for to_email in recipients:
-            try:
-                send_email(to_email, subject, body)
-            except Exception:
-                pass
-
-    threading.Thread(target=_worker, daemon=True).start()
+    return subject, body
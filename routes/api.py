@@ -718,41 +718,59 @@ def student_grades():
 
     from models.evaluation import EvaluationGrade, Evaluation
     from models.classroom import Classroom
+    from services.grade_matrix import get_class_matrix
 
-    grades = EvaluationGrade.query.join(Evaluation).join(Classroom).filter(
-        EvaluationGrade.student_id.in_(all_ids),
-        EvaluationGrade.points.isnot(None)
-    ).order_by(Evaluation.date.desc()).all()
+    # Classes où l'élève a des notes, puis leurs matrices (en cache tant
+    # que les notes de la classe n'ont pas changé)
+    classrooms = Classroom.query.filter(Classroom.id.in_(
+        db.session.query(Evaluation.classroom_id).join(
+            EvaluationGrade, EvaluationGrade.evaluation_id == Evaluation.id
+        ).filter(EvaluationGrade.student_id.in_(all_ids)).distinct()
+    )).all()
+
+    entries = []
+    for classroom in classrooms:
+        matrix = get_class_matrix(classroom.id)
+        for sid in all_ids:
+            for grade_id, evaluation, points in matrix.student_grades(sid):
+                if points is not None:
+                    entries.append((classroom, grade_id, evaluation, points))
+    entries.sort(key=lambda e: e[2].date, reverse=True)
 
     subjects = {}
-    for g in grades:
-        subject = g.evaluation.classroom.subject
+    for classroom, grade_id, evaluation, points in entries:
+        subject = classroom.subject
         if subject not in subjects:
             subjects[subject] = {
                 'subject': subject,
-                'classroom_name': g.evaluation.classroom.name,
+                'classroom_name': classroom.name,
                 'grades': [],
                 'total_significatif': 0, 'count_significatif': 0,
                 'total_ta': 0, 'count_ta': 0
             }
 
         subjects[subject]['grades'].append({
-            'id': g.id,
-            'title': g.evaluation.title,
-            'type': g.evaluation.type,
-            'ta_group': g.evaluation.ta_group_name,
-            'points': g.points,
-            'max_points': g.evaluation.max_points,
-            'date': g.evaluation.date.isoformat()
+            'id': grade_id,
+            'title': evaluation.title,
+            'type': evaluation.type,
+            'ta_group': evaluation.ta_group_name,
+            'points': points,
+            'max_points': evaluation.max_points,
+            'date': evaluation.date.isoformat()
         })
 
-        if g.points is not None:
-            if g.evaluation.type == 'significatif':
-                subjects[subject]['total_significatif'] += g.points
-                subjects[subject]['count_significatif'] += 1
-            elif g.evaluation.type == 'ta':
-                subjects[subject]['total_ta'] += g.points
-                subjects[subject]['count_ta'] += 1
+    # Sommes par type depuis la matrice (items TA comptés à plat, comme avant)
+    for classroom in classrooms:
+        matrix = get_class_matrix(classroom.id)
+        data = subjects.get(classroom.subject)
+        if data is None:
+            continue
+        for sid in all_ids:
+            sig_sum, sig_count, ta_sum, ta_count = matrix.type_totals(sid)
+            data['total_significatif'] += sig_sum
+            data['count_significatif'] += sig_count
+            data['total_ta'] += ta_sum
+            data['count_ta'] += ta_count
 
     # Calculer moyennes
     result = {}
@@ -947,33 +965,26 @@ def parent_dashboard():
         return jsonify({'error': 'Parent non trouvé'}), 404
 
     from models.parent import ParentChild
-    from models.student import Student
-    from models.lesson_memo import StudentRemark
+    from services.student_report import get_student_reports
 
-    children_data = []
     links = ParentChild.query.filter_by(parent_id=parent.id).all()
+    reports = get_student_reports([link.student_id for link in links])
 
+    children_data = []
+    unread = 0
     for link in links:
-        student = Student.query.get(link.student_id)
-        if not student:
+        report = reports.get(link.student_id)
+        if not report:
             continue
         children_data.append({
-            'id': student.id,
-            'first_name': student.first_name,
-            'last_name': student.last_name,
-            'classroom': student.classroom.name if student.classroom else None,
+            'id': report.student_id,
+            'first_name': report.first_name,
+            'last_name': report.last_name,
+            'classroom': report.classroom_name,
             'relationship': link.relationship
         })
-
-    # Remarques non lues
-    student_ids = [c['id'] for c in children_data]
-    unread = 0
-    if student_ids:
-        unread = StudentRemark.query.filter(
-            StudentRemark.student_id.in_(student_ids),
-            StudentRemark.send_to_parent_and_student == True,
-            StudentRemark.is_viewed_by_parent == False
-        ).count()
+        # Remarques non lues
+        unread += sum(1 for r in report.remarks if not r.is_viewed_by_parent)
 
     return jsonify({
         'parent': {
@@ -1000,19 +1011,17 @@ def parent_child_attendance(student_id):
     if not pc:
         return jsonify({'error': 'Accès non autorisé'}), 403
 
-    from models.student import Student
-    from models.attendance import Attendance
-    from routes.parent_auth import get_all_linked_students
+    from services.student_report import get_linked_reports
 
-    student = Student.query.get_or_404(student_id)
-    linked = get_all_linked_students(student_id)
-    linked_ids = [s.id for s in linked]
+    reports = get_linked_reports(student_id)
+    if not reports:
+        return jsonify({'error': 'Élève non trouvé'}), 404
+    student = reports[0]
 
-    attendances = Attendance.query.filter(
-        Attendance.student_id.in_(linked_ids)
-    ).filter(
-        Attendance.status.in_(['absent', 'late'])
-    ).order_by(Attendance.date.desc(), Attendance.period_number).limit(100).all()
+    attendances = sorted(
+        (a for report in reports for a in report.attendance),
+        key=lambda a: (-a.date.toordinal(), a.period_number)
+    )[:100]
 
     by_date = {}
     for a in attendances:
@@ -1024,7 +1033,7 @@ def parent_child_attendance(student_id):
             'status': a.status,
             'note': a.comment or '',
             'late_minutes': a.late_minutes if a.status == 'late' else None,
-            'subject': a.classroom.subject if a.classroom else ''
+            'subject': a.subject or ''
         })
 
     data = sorted(by_date.values(), key=lambda x: x['date_iso'], reverse=True)
@@ -1048,52 +1057,45 @@ def parent_child_grades(student_id):
     if not pc:
         return jsonify({'error': 'Accès non autorisé'}), 403
 
-    from models.student import Student
-    from models.evaluation import EvaluationGrade, Evaluation
-    from models.classroom import Classroom
-    from routes.parent_auth import get_all_linked_students
+    from services.student_report import get_linked_reports
 
-    student = Student.query.get_or_404(student_id)
-    linked = get_all_linked_students(student_id)
-    linked_ids = [s.id for s in linked]
+    reports = get_linked_reports(student_id)
+    if not reports:
+        return jsonify({'error': 'Élève non trouvé'}), 404
+    student = reports[0]
 
-    grades_query = db.session.query(EvaluationGrade, Evaluation, Classroom).join(
-        Evaluation, EvaluationGrade.evaluation_id == Evaluation.id
-    ).join(
-        Classroom, Evaluation.classroom_id == Classroom.id
-    ).filter(
-        EvaluationGrade.student_id.in_(linked_ids),
-        EvaluationGrade.points.isnot(None)
-    ).order_by(Classroom.subject, Evaluation.date).all()
+    grades = sorted(
+        (g for report in reports for g in report.grades if g.points is not None),
+        key=lambda g: (g.subject, g.date)
+    )
 
     subjects_data = {}
-    for grade, evaluation, classroom in grades_query:
-        subject = classroom.subject
+    for grade in grades:
+        subject = grade.subject
         if subject not in subjects_data:
             subjects_data[subject] = {
                 'subject_name': subject,
-                'classroom_name': classroom.name,
+                'classroom_name': grade.classroom_name,
                 'grades': [],
                 'total_significatif': 0, 'count_significatif': 0,
                 'total_ta': 0, 'count_ta': 0
             }
 
         subjects_data[subject]['grades'].append({
-            'title': evaluation.title,
-            'type': evaluation.type,
-            'ta_group': evaluation.ta_group_name,
+            'title': grade.title,
+            'type': grade.type,
+            'ta_group': grade.ta_group_name,
             'points': round(grade.points, 2) if grade.points else None,
-            'max_points': evaluation.max_points,
-            'date': evaluation.date.isoformat()
+            'max_points': grade.max_points,
+            'date': grade.date.isoformat()
         })
 
-        if grade.points is not None:
-            if evaluation.type == 'significatif':
-                subjects_data[subject]['total_significatif'] += grade.points
-                subjects_data[subject]['count_significatif'] += 1
-            elif evaluation.type == 'ta':
-                subjects_data[subject]['total_ta'] += grade.points
-                subjects_data[subject]['count_ta'] += 1
+        if grade.type == 'significatif':
+            subjects_data[subject]['total_significatif'] += grade.points
+            subjects_data[subject]['count_significatif'] += 1
+        elif grade.type == 'ta':
+            subjects_data[subject]['total_ta'] += grade.points
+            subjects_data[subject]['count_ta'] += 1
 
     # Moyennes
     for data in subjects_data.values():
@@ -1138,43 +1140,37 @@ def parent_child_sanctions(student_id):
     if not pc:
         return jsonify({'error': 'Accès non autorisé'}), 403
 
-    from models.student import Student
-    from models.student_sanctions import StudentSanctionCount
-    from models.sanctions import SanctionTemplate, ClassroomSanctionImport
-    from models.classroom import Classroom
-    from routes.parent_auth import get_all_linked_students
+    from services.student_report import get_linked_reports
 
-    student = Student.query.get_or_404(student_id)
-    linked = get_all_linked_students(student_id)
-    linked_ids = [s.id for s in linked]
+    reports = get_linked_reports(student_id)
+    if not reports:
+        return jsonify({'error': 'Élève non trouvé'}), 404
+    student = reports[0]
 
-    classrooms = Classroom.query.join(Student).filter(Student.id.in_(linked_ids)).all()
+    # Coches de l'élève, pour les modèles importés dans chacune de ses classes
+    counts = {s.template_id: s.count for s in student.sanctions}
+    classrooms = {}
+    for report in reports:
+        if report.classroom_id is not None:
+            classrooms.setdefault(report.classroom_id, report)
 
     sanctions_by_subject = {}
     total_checks = 0
 
-    for classroom in classrooms:
-        subject = classroom.subject
-        imports = ClassroomSanctionImport.query.filter_by(
-            classroom_id=classroom.id, is_active=True
-        ).all()
+    for classroom_id in sorted(classrooms):
+        report = classrooms[classroom_id]
+        subject = report.subject
 
         if subject not in sanctions_by_subject:
             sanctions_by_subject[subject] = {
                 'subject_name': subject,
-                'classroom_name': classroom.name,
+                'classroom_name': report.classroom_name,
                 'total_checks': 0,
                 'templates': []
             }
 
-        for imp in imports:
-            template = SanctionTemplate.query.get(imp.template_id)
-            if not template:
-                continue
-            sc = StudentSanctionCount.query.filter_by(
-                student_id=student_id, template_id=template.id
-            ).first()
-            cc = sc.check_count if sc else 0
+        for template in report.sanction_imports:
+            cc = counts.get(template.template_id, 0)
 
             sanctions_by_subject[subject]['templates'].append({
                 'template_name': template.name,
@@ -1250,8 +1246,7 @@ def parent_remarks():
         return jsonify({'error': 'Parent non trouvé'}), 404
 
     from models.parent import ParentChild
-    from models.lesson_memo import StudentRemark
-    from models.student import Student
+    from services.student_report import get_student_reports
 
     links = ParentChild.query.filter_by(parent_id=parent.id).all()
     student_ids = [l.student_id for l in links]
@@ -1259,30 +1254,23 @@ def parent_remarks():
     if not student_ids:
         return jsonify({'remarks': [], 'unread_count': 0})
 
-    remarks = StudentRemark.query.filter(
-        StudentRemark.student_id.in_(student_ids),
-        StudentRemark.send_to_parent_and_student == True
-    ).order_by(StudentRemark.created_at.desc()).limit(50).all()
-
-    remarks_data = []
-    for r in remarks:
-        st = Student.query.get(r.student_id)
-        remarks_data.append({
-            'id': r.id,
-            'student_name': f'{st.first_name} {st.last_name}' if st else 'Inconnu',
-            'student_id': r.student_id,
-            'content': r.content,
-            'date': r.source_date.isoformat(),
-            'period': r.source_period,
-            'is_read': r.is_viewed_by_parent,
-            'created_at': r.created_at.isoformat()
-        })
+    remarks = sorted(
+        (r for report in get_student_reports(student_ids).values() for r in report.remarks),
+        key=lambda r: r.created_at or datetime.min, reverse=True
+    )
 
-    unread = StudentRemark.query.filter(
-        StudentRemark.student_id.in_(student_ids),
-        StudentRemark.send_to_parent_and_student == True,
-        StudentRemark.is_viewed_by_parent == False
-    ).count()
+    remarks_data = [{
+        'id': r.id,
+        'student_name': r.student_name,
+        'student_id': r.student_id,
+        'content': r.content,
+        'date': r.source_date.isoformat(),
+        'period': r.source_period,
+        'is_read': r.is_viewed_by_parent,
+        'created_at': r.created_at.isoformat()
+    } for r in remarks[:50]]
+
+    unread = sum(1 for r in remarks if not r.is_viewed_by_parent)
 
     return jsonify({'remarks': remarks_data, 'unread_count': unread})
 
@@ -1,10 +1,14 @@
 from flask import Blueprint, render_template, request, jsonify, redirect, url_for
 from flask_login import login_required, current_user
 from extensions import db
-from models.attendance import Attendance
 from models.student import Student
 from models.classroom import Classroom
 from models.absence_justification import AbsenceJustification
+# Importé au chargement : enregistre aussi le maintien de attendance_daily_rollup
+from services.attendance_stats import (
+    daily_summary, grouped_listing, matching_student_ids, school_year_window, status_counts,
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE,
+)
 from datetime import datetime, date, time, timedelta
 
 attendance_bp = Blueprint('attendance', __name__, url_prefix='/attendance')
@@ -14,9 +18,11 @@ def get_user_periods_schedule(user):
     from routes.schedule import calculate_periods
     return calculate_periods(user)
 
-def get_period_time_range(periods_numbers, user):
-    """Récupère les horaires pour une liste de numéros de périodes"""
-    periods_schedule = get_user_periods_schedule(user)
+def get_period_time_range(periods_numbers, user, periods_schedule=None):
+    """Récupère les horaires pour une liste de numéros de périodes
+    (``periods_schedule`` : horaire déjà calculé, pour les listes)"""
+    if periods_schedule is None:
+        periods_schedule = get_user_periods_schedule(user)
     period_schedule_map = {p['number']: p for p in periods_schedule}
     
     if not periods_numbers:
@@ -50,97 +56,92 @@ def index():
     
     return render_template('attendance/index.html', classrooms=classrooms)
 
+@attendance_bp.route('/export/<int:classroom_id>.csv')
+@login_required
+def export_attendance_csv(classroom_id):
+    """Absences et retards d'une classe en CSV, streamés ligne par ligne."""
+    from flask import Response, abort, stream_with_context
+    from routes.evaluations import user_can_access_classroom
+    from services.grade_exports import attendance_csv_lines, safe_export_name, sorted_students
+
+    if not user_can_access_classroom(current_user.id, classroom_id):
+        abort(403)
+    classroom = Classroom.query.get_or_404(classroom_id)
+    students = sorted_students(classroom_id, getattr(current_user, 'student_sort_pref', None) or 'last_name')
+    safe_name = safe_export_name(classroom, prefix='presences')
+    return Response(stream_with_context(attendance_csv_lines(classroom_id, students)),
+                    mimetype='text/csv; charset=utf-8',
+                    headers={'Content-Disposition': f'attachment; filename="{safe_name}.csv"'})
+
+def _parse_date_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+def _listing_window():
+    """Fenêtre de dates des listes : celle demandée, sinon l'année scolaire."""
+    default_start, default_end = school_year_window()
+    return _parse_date_arg('start_date') or default_start, _parse_date_arg('end_date') or default_end
+
+def _grouped_attendance_page(status):
+    """Page d'absences/retards regroupés par élève et date, avec horaires.
+
+    Retourne ``(lignes, pagination)``. Seuls les enregistrements de la page
+    demandée sont chargés (et leurs commentaires déchiffrés)."""
+    start_date, end_date = _listing_window()
+    classroom_id = request.args.get('classroom_id', type=int)
+    student_name = request.args.get('student_name', '').strip()
+    page = max(1, request.args.get('page', 1, type=int) or 1)
+    per_page = min(MAX_PAGE_SIZE, max(1, request.args.get('per_page', DEFAULT_PAGE_SIZE, type=int)
+                                      or DEFAULT_PAGE_SIZE))
+
+    student_ids = matching_student_ids(current_user.id, student_name) if student_name else None
+    groups, total = grouped_listing(
+        current_user.id, status, start_date, end_date,
+        classroom_id=classroom_id, student_ids=student_ids, page=page, per_page=per_page,
+    )
+
+    rows = []
+    periods_schedule = get_user_periods_schedule(current_user) if groups else None
+    for group in groups:
+        periods_str, time_range = get_period_time_range(group['periods'], current_user, periods_schedule)
+        row = {
+            'date': group['date'].strftime('%d/%m/%Y'),
+            'date_iso': group['date'].isoformat(),
+            'student_name': group['student'].full_name if group['student'] else '',
+            'classroom_name': group['classroom'].name if group['classroom'] else '',
+            'periods': periods_str,
+            'time_range': time_range,
+            'comment': ' | '.join(group['comments']) if group['comments'] else ''
+        }
+        if status == 'late':
+            row['late_minutes'] = group['late_minutes']
+        rows.append(row)
+
+    pagination = {
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'pages': (total + per_page - 1) // per_page,
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+    }
+    return rows, pagination
+
 @attendance_bp.route('/api/absences')
 @login_required
 def get_absences():
-    """API pour récupérer les absences avec filtres"""
+    """API pour récupérer les absences avec filtres (paginée)"""
     try:
-        # Paramètres de filtrage
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
-        classroom_id = request.args.get('classroom_id', type=int)
-        student_name = request.args.get('student_name', '').strip()
-        
-        # Query de base pour les absences
-        query = db.session.query(Attendance, Student, Classroom).join(
-            Student, Attendance.student_id == Student.id
-        ).join(
-            Classroom, Attendance.classroom_id == Classroom.id
-        ).filter(
-            Classroom.user_id == current_user.id,
-            Attendance.status == 'absent'
-        )
-        
-        # Appliquer les filtres
-        if start_date:
-            try:
-                start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
-                query = query.filter(Attendance.date >= start_date_obj)
-            except ValueError:
-                pass
-        
-        if end_date:
-            try:
-                end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
-                query = query.filter(Attendance.date <= end_date_obj)
-            except ValueError:
-                pass
-        
-        if classroom_id:
-            query = query.filter(Attendance.classroom_id == classroom_id)
-        
-        if student_name:
-            query = query.filter(
-                db.or_(
-                    Student.first_name.ilike(f'%{student_name}%'),
-                    Student.last_name.ilike(f'%{student_name}%')
-                )
-            )
-        
-        # Trier par date décroissante puis par élève et période
-        results = query.order_by(Attendance.date.desc(), Student.last_name, Student.first_name, Attendance.period_number).all()
-        
-        # Regrouper les absences par élève et date
-        grouped_absences = {}
-        for attendance, student, classroom in results:
-            key = f"{attendance.date}_{student.id}_{classroom.id}"
-            
-            if key not in grouped_absences:
-                grouped_absences[key] = {
-                    'date': attendance.date,
-                    'date_str': attendance.date.strftime('%d/%m/%Y'),
-                    'date_iso': attendance.date.isoformat(),
-                    'student_name': student.full_name,
-                    'classroom_name': classroom.name,
-                    'periods': [],
-                    'comments': []
-                }
-            
-            grouped_absences[key]['periods'].append(attendance.period_number)
-            if attendance.comment:
-                grouped_absences[key]['comments'].append(attendance.comment)
-        
-        # Formater les données avec horaires
-        absences_data = []
-        for key, group in grouped_absences.items():
-            periods_str, time_range = get_period_time_range(group['periods'], current_user)
-            
-            absences_data.append({
-                'date': group['date_str'],
-                'date_iso': group['date_iso'],
-                'student_name': group['student_name'],
-                'classroom_name': group['classroom_name'],
-                'periods': periods_str,
-                'time_range': time_range,
-                'comment': ' | '.join(group['comments']) if group['comments'] else ''
-            })
-        
-        # Trier par date décroissante
-        absences_data.sort(key=lambda x: x['date_iso'], reverse=True)
-        
+        absences_data, pagination = _grouped_attendance_page('absent')
         return jsonify({
             'success': True,
-            'absences': absences_data
+            'absences': absences_data,
+            'pagination': pagination
         })
         
     except Exception as e:
@@ -149,98 +150,13 @@ def get_absences():
 @attendance_bp.route('/api/late-arrivals')
 @login_required
 def get_late_arrivals():
-    """API pour récupérer les retards avec filtres"""
+    """API pour récupérer les retards avec filtres (paginée)"""
     try:
-        # Paramètres de filtrage
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
-        classroom_id = request.args.get('classroom_id', type=int)
-        student_name = request.args.get('student_name', '').strip()
-        
-        # Query de base pour les retards
-        query = db.session.query(Attendance, Student, Classroom).join(
-            Student, Attendance.student_id == Student.id
-        ).join(
-            Classroom, Attendance.classroom_id == Classroom.id
-        ).filter(
-            Classroom.user_id == current_user.id,
-            Attendance.status == 'late'
-        )
-        
-        # Appliquer les filtres
-        if start_date:
-            try:
-                start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
-                query = query.filter(Attendance.date >= start_date_obj)
-            except ValueError:
-                pass
-        
-        if end_date:
-            try:
-                end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
-                query = query.filter(Attendance.date <= end_date_obj)
-            except ValueError:
-                pass
-        
-        if classroom_id:
-            query = query.filter(Attendance.classroom_id == classroom_id)
-        
-        if student_name:
-            query = query.filter(
-                db.or_(
-                    Student.first_name.ilike(f'%{student_name}%'),
-                    Student.last_name.ilike(f'%{student_name}%')
-                )
-            )
-        
-        # Trier par date décroissante puis par élève et période
-        results = query.order_by(Attendance.date.desc(), Student.last_name, Student.first_name, Attendance.period_number).all()
-        
-        # Regrouper les retards par élève et date
-        grouped_late = {}
-        for attendance, student, classroom in results:
-            key = f"{attendance.date}_{student.id}_{classroom.id}"
-            
-            if key not in grouped_late:
-                grouped_late[key] = {
-                    'date': attendance.date,
-                    'date_str': attendance.date.strftime('%d/%m/%Y'),
-                    'date_iso': attendance.date.isoformat(),
-                    'student_name': student.full_name,
-                    'classroom_name': classroom.name,
-                    'periods': [],
-                    'late_minutes': [],
-                    'comments': []
-                }
-            
-            grouped_late[key]['periods'].append(attendance.period_number)
-            grouped_late[key]['late_minutes'].append(attendance.late_minutes or 0)
-            if attendance.comment:
-                grouped_late[key]['comments'].append(attendance.comment)
-        
-        # Formater les données avec horaires
-        late_arrivals_data = []
-        for key, group in grouped_late.items():
-            periods_str, time_range = get_period_time_range(group['periods'], current_user)
-            total_late_minutes = sum(group['late_minutes'])
-            
-            late_arrivals_data.append({
-                'date': group['date_str'],
-                'date_iso': group['date_iso'],
-                'student_name': group['student_name'],
-                'classroom_name': group['classroom_name'],
-                'periods': periods_str,
-                'time_range': time_range,
-                'late_minutes': total_late_minutes,
-                'comment': ' | '.join(group['comments']) if group['comments'] else ''
-            })
-        
-        # Trier par date décroissante
-        late_arrivals_data.sort(key=lambda x: x['date_iso'], reverse=True)
-        
+        late_arrivals_data, pagination = _grouped_attendance_page('late')
         return jsonify({
             'success': True,
-            'late_arrivals': late_arrivals_data
+            'late_arrivals': late_arrivals_data,
+            'pagination': pagination
         })
         
     except Exception as e:
@@ -251,44 +167,18 @@ def get_late_arrivals():
 def get_attendance_stats():
     """API pour récupérer les statistiques d'absences"""
     try:
-        # Paramètres de filtrage
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
-        classroom_id = request.args.get('classroom_id', type=int)
-        
-        # Query de base
-        query = db.session.query(Attendance).join(
-            Classroom, Attendance.classroom_id == Classroom.id
-        ).filter(
-            Classroom.user_id == current_user.id
+        counts = status_counts(
+            current_user.id,
+            start=_parse_date_arg('start_date'),
+            end=_parse_date_arg('end_date'),
+            classroom_id=request.args.get('classroom_id', type=int),
         )
         
-        # Appliquer les filtres de date
-        if start_date:
-            try:
-                start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
-                query = query.filter(Attendance.date >= start_date_obj)
-            except ValueError:
-                pass
-        
-        if end_date:
-            try:
-                end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
-                query = query.filter(Attendance.date <= end_date_obj)
-            except ValueError:
-                pass
-        
-        if classroom_id:
-            query = query.filter(Attendance.classroom_id == classroom_id)
-        
-        # Compter les différents statuts
-        all_records = query.all()
-        
         stats = {
-            'total_records': len(all_records),
-            'present': len([r for r in all_records if r.status == 'present']),
-            'absent': len([r for r in all_records if r.status == 'absent']),
-            'late': len([r for r in all_records if r.status == 'late'])
+            'total_records': counts['total'],
+            'present': counts['present'],
+            'absent': counts['absent'],
+            'late': counts['late']
         }
         
         # Calculer les pourcentages
@@ -309,6 +199,30 @@ def get_attendance_stats():
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
+@attendance_bp.route('/api/daily-summary')
+@login_required
+def get_daily_summary():
+    """Présences / absences / retards par jour (table de cumul), pour les
+    tableaux de bord"""
+    try:
+        start_date, end_date = _listing_window()
+        classroom_id = request.args.get('classroom_id', type=int)
+        classroom_ids = [c.id for c in current_user.classrooms.with_entities(Classroom.id)]
+        if classroom_id:
+            classroom_ids = [cid for cid in classroom_ids if cid == classroom_id]
+        
+        days = daily_summary(classroom_ids, start_date, end_date)
+        for day in days:
+            day['date'] = day['date'].isoformat()
+        
+        return jsonify({
+            'success': True,
+            'days': days
+        })
+        
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
 @attendance_bp.route('/api/justifications')
 @login_required
 def get_justifications():
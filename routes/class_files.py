@@ -14,7 +14,8 @@ from routes.file_manager import (
     MAX_FILE_SIZE,
     MAX_TOTAL_STORAGE,
     get_user_total_storage,
-    copy_single_file_to_class,
+    _resume_folder_copy,
+    _partial_copy_response,
     _find_class_file_candidates,
     _serve_class_file_candidate,
 )
@@ -206,9 +207,14 @@ def copy_folder_to_class():
         if not classroom:
             return jsonify({'success': False, 'message': 'Classe introuvable'}), 404
 
-        # Copier le dossier récursivement (duplication R2 + class_files_v2)
-        copied_count, already_exists_count, failed_count = copy_folder_recursive(
-            folder, class_id, target_path
+        # Copier le dossier récursivement (duplication R2 + class_files_v2).
+        # Une copie trop longue s'arrête en cours de route (partial) ; le
+        # client la relance avec le « resume » reçu pour continuer.
+        progress = copy_folder_recursive(folder, class_id, target_path, data)
+        if progress['remaining']:
+            return _partial_copy_response(folder, progress)
+        copied_count, already_exists_count, failed_count = (
+            progress['copied'], progress['exists'], progress['failed']
         )
 
         db.session.commit()
@@ -244,8 +250,9 @@ def copy_folder_to_class():
         db.session.rollback()
         return jsonify({'success': False, 'message': f'Erreur lors de la copie du dossier: {str(e)}'}), 500
 
-def copy_folder_recursive(folder, class_id, base_path):
-    """Copie récursive d'un dossier vers une classe, via le système moderne.
+def copy_folder_recursive(folder, class_id, base_path, data=None):
+    """Copie d'un dossier et de ses sous-dossiers vers une classe, via le
+    système moderne.
 
     Alignée sur routes/file_manager.py copy_folder_to_class (commit 479403f).
     L'ancienne version avait deux défauts :
@@ -256,50 +263,16 @@ def copy_folder_recursive(folder, class_id, base_path):
          alors que le reste de l'app duplique sur R2 et écrit `class_files_v2`
          (métadonnées own_* + r2_key).
 
-    Ici : itération sur les ids, chargement à la demande avec defer() des
-    blobs, expunge après chaque fichier (mémoire bornée à UN fichier), et
-    copy_single_file_to_class fait la duplication R2 (server-side si la
-    source y est déjà) + la ligne class_files_v2.
+    Délègue à copy_folder_tree_to_class : arborescence et doublons résolus
+    en quelques requêtes, duplications R2 en parallèle, INSERT groupé des
+    lignes class_files_v2. Même budget de temps et même reprise que
+    file_manager : ``data`` est le JSON de la requête (``resume`` renvoyé
+    par le client après une réponse partielle).
 
-    Retourne (copied_count, already_exists_count, failed_count).
+    Retourne le dict de progression (``copied``, ``exists``, ``failed``,
+    ``remaining``…) ; ``remaining`` non nul = copie à relancer.
     """
-    from sqlalchemy.orm import defer
-
-    copied_count = 0
-    already_exists_count = 0
-    failed_count = 0
-
-    # Construire le chemin de destination
-    if base_path:
-        current_path = f"{base_path}/{folder.name}"
-    else:
-        current_path = folder.name
-
-    file_ids = [row.id for row in folder.files.with_entities(UserFile.id).all()]
-    for fid in file_ids:
-        user_file = db.session.query(UserFile).options(
-            defer(UserFile.file_content), defer(UserFile.thumbnail_content)
-        ).get(fid)
-        if not user_file:
-            failed_count += 1
-            continue
-        result = copy_single_file_to_class(user_file, class_id, current_path)
-        db.session.expunge(user_file)
-        if result is True:
-            copied_count += 1
-        elif result == 'exists':
-            already_exists_count += 1
-        else:
-            failed_count += 1
-
-    # Copier récursivement les sous-dossiers
-    for subfolder in folder.subfolders:
-        sub_copied, sub_exists, sub_failed = copy_folder_recursive(subfolder, class_id, current_path)
-        copied_count += sub_copied
-        already_exists_count += sub_exists
-        failed_count += sub_failed
-
-    return copied_count, already_exists_count, failed_count
+    return _resume_folder_copy(data or {}, folder, class_id, base_path or None)
 
 @class_files_bp.route('/list/<int:class_id>')
 @login_required
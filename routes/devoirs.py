@@ -19,6 +19,7 @@ from models.devoir import Devoir
 from models.classroom import Classroom
 from models.exercise import Exercise
 from routes.evaluations import user_can_access_classroom
+from services.job_runner import periodic
 
 devoirs_bp = Blueprint('devoirs', __name__, url_prefix='/api/devoirs')
 
@@ -162,22 +163,21 @@ def create_devoir():
                     exercise_id=exercise_id, classroom_id=cid,
                     published_by=current_user.id, mode='classique', is_active=False))
 
+    # Notification push aux élèves de la classe (app mobile), déposée dans
+    # l'outbox avec le devoir.
+    from services.notification_outbox import enqueue_push
+    db.session.flush()
+    tokens = [s.expo_push_token for s in devoir.get_students()
+              if getattr(s, 'expo_push_token', None)]
+    enqueue_push(
+        tokens,
+        'Nouveau devoir 📚',
+        f"{title} — à rendre le {devoir.due_date.strftime('%d.%m.%Y')}",
+        {'kind': 'devoir_new', 'devoir_id': devoir.id},
+        source=f'devoir:{devoir.id}',
+    )
     db.session.commit()
 
-    # Notification push aux élèves de la classe (app mobile) — best effort.
-    try:
-        from services.push_service import send_push_async
-        tokens = [s.expo_push_token for s in devoir.get_students()
-                  if getattr(s, 'expo_push_token', None)]
-        send_push_async(
-            tokens,
-            'Nouveau devoir 📚',
-            f"{title} — à rendre le {devoir.due_date.strftime('%d.%m.%Y')}",
-            {'kind': 'devoir_new', 'devoir_id': devoir.id},
-        )
-    except Exception:
-        pass
-
     return jsonify({'success': True, 'devoir': devoir.to_dict()})
 
 
@@ -394,28 +394,26 @@ def correct_submission(submission_id):
     sub.corrected_filename = filename
     sub.corrected_at = _dt.utcnow()
     sub.status = 'corrected'
-    db.session.commit()
 
     # Notifier l'élève que sa correction est disponible (app mobile).
-    try:
-        from services.push_service import send_push_async
-        token = getattr(sub.student, 'expo_push_token', None)
-        if token:
-            send_push_async(
-                [token],
-                'Correction reçue ✅',
-                f"Ton devoir « {devoir.title} » a été corrigé.",
-                {'kind': 'devoir_corrected', 'devoir_id': devoir.id},
-            )
-    except Exception:
-        pass
+    from services.notification_outbox import enqueue_push
+    token = getattr(sub.student, 'expo_push_token', None)
+    enqueue_push(
+        [token],
+        'Correction reçue ✅',
+        f"Ton devoir « {devoir.title} » a été corrigé.",
+        {'kind': 'devoir_corrected', 'devoir_id': devoir.id},
+        source=f'devoir:{devoir.id}',
+    )
+    db.session.commit()
 
     return jsonify({'success': True})
 
 
 def purge_old_devoir_files(days=7):
     """Supprime (R2 + DB) les rendus dont le devoir a une date de rendu de plus
-    de `days` jours. À planifier (cron Render : flask purge-devoir-files)."""
+    de `days` jours. Exécutée chaque jour par purge_devoir_files_job (aussi en
+    CLI : flask purge-devoir-files)."""
     from datetime import date, timedelta
     from models.devoir import Devoir, DevoirSubmission
     from services.r2_storage import delete_file_from_r2
@@ -466,18 +464,29 @@ def purge_expired_ephemeral_files():
             resource_type='ephemeral', resource_id=eph.id
         ).delete()
         from models.file_manager import FileAnnotation
-        FileAnnotation.query.filter_by(
+        from services.annotation_store import delete_pages_for
+        eph_annotations = FileAnnotation.query.filter_by(
             file_type='ephemeral_file', file_id=eph.id
-        ).delete()
+        )
+        delete_pages_for(eph_annotations)
+        eph_annotations.delete(synchronize_session=False)
         db.session.delete(eph)
         n += 1
     db.session.commit()
     return n
 
 
+@periodic('devoirs.purge_files', every=timedelta(days=1))
+def purge_devoir_files_job():
+    """Tâche quotidienne (services/job_runner.py) : rendus de plus de 7 jours
+    et fichiers éphémères expirés."""
+    return {'submissions': purge_old_devoir_files(7),
+            'ephemeral_files': purge_expired_ephemeral_files()}
+
+
 def register_devoir_commands(app):
-    """Commande CLI `flask purge-devoir-files` (à planifier via cron Render).
-    Purge aussi les fichiers éphémères — même cron, aucune config en plus."""
+    """Commande CLI `flask purge-devoir-files` (la même purge tourne chaque
+    jour dans l'exécuteur de tâches). Purge aussi les fichiers éphémères."""
     @app.cli.command('purge-devoir-files')
     def _purge_cmd():
         """Purge les rendus de devoirs > 7 jours et les fichiers éphémères expirés."""
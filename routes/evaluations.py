@@ -5,89 +5,7 @@ from models.evaluation import Evaluation, EvaluationGrade
 from models.classroom import Classroom
 from models.student import Student
 from datetime import datetime
-
-def user_can_access_classroom(user_id, classroom_id):
-    """Vérifie si un utilisateur peut accéder à une classe (directement ou via collaboration)"""
-    try:
-        classroom_id = int(classroom_id)
-    except (TypeError, ValueError):
-        return False
-
-    classroom = Classroom.query.filter_by(id=classroom_id).first()
-    if not classroom:
-        print(f"DEBUG user_can_access_classroom: classroom {classroom_id} not found")
-        return False
-    
-    print(f"DEBUG user_can_access_classroom: classroom owner is user {classroom.user_id}")
-    
-    # 1. Vérifier si c'est sa propre classe
-    if classroom.user_id == user_id:
-        print(f"DEBUG user_can_access_classroom: user {user_id} owns classroom {classroom_id}")
-        return True
-    
-    # 2. Vérifier si c'est une classe dérivée et l'utilisateur est maître de classe
-    from models.class_collaboration import SharedClassroom, ClassMaster, TeacherCollaboration
-    shared_classroom = SharedClassroom.query.filter_by(derived_classroom_id=classroom_id).first()
-    
-    print(f"DEBUG user_can_access_classroom: shared_classroom found: {shared_classroom is not None}")
-    
-    if shared_classroom:
-        # Vérifier si l'utilisateur actuel est maître de la classe originale
-        class_master = ClassMaster.query.filter_by(
-            classroom_id=shared_classroom.original_classroom_id,
-            master_teacher_id=user_id
-        ).first()
-        
-        print(f"DEBUG user_can_access_classroom: class_master found: {class_master is not None}")
-        
-        if class_master:
-            print(f"DEBUG user_can_access_classroom: user {user_id} is master of original classroom")
-            return True
-    
-    # 3. Vérifier si l'utilisateur est enseignant spécialisé avec accès à cette classe originale
-    # Chercher si l'utilisateur a une collaboration active donnant accès à la classe originale de classroom_id
-    collaborations = TeacherCollaboration.query.filter_by(
-        specialized_teacher_id=user_id,
-        is_active=True
-    ).all()
-    
-    print(f"DEBUG user_can_access_classroom: found {len(collaborations)} active collaborations for specialized teacher {user_id}")
-    
-    for collaboration in collaborations:
-        shared_classrooms = SharedClassroom.query.filter_by(
-            collaboration_id=collaboration.id
-        ).all()
-        
-        for shared_classroom in shared_classrooms:
-            print(f"DEBUG user_can_access_classroom: checking shared classroom - original: {shared_classroom.original_classroom_id}, derived: {shared_classroom.derived_classroom_id}")
-            if shared_classroom.original_classroom_id == classroom_id:
-                print(f"DEBUG user_can_access_classroom: specialized teacher {user_id} has access to original classroom {classroom_id}")
-                return True
-    
-    # 4. Vérifier si l'utilisateur est maître et cette classe appartient à un enseignant spécialisé dans son groupe
-    master_classes = ClassMaster.query.filter_by(master_teacher_id=user_id).all()
-    
-    print(f"DEBUG user_can_access_classroom: user {user_id} is master of {len(master_classes)} classes")
-    
-    for master_class in master_classes:
-        # Vérifier s'il y a des classes dérivées pour ce maître
-        collaborations = TeacherCollaboration.query.filter_by(
-            master_teacher_id=user_id,
-            is_active=True
-        ).all()
-        
-        for collaboration in collaborations:
-            shared_classrooms = SharedClassroom.query.filter_by(
-                collaboration_id=collaboration.id,
-                derived_classroom_id=classroom_id
-            ).all()
-            
-            if shared_classrooms:
-                print(f"DEBUG user_can_access_classroom: master {user_id} has access to derived classroom {classroom_id}")
-                return True
-    
-    print(f"DEBUG user_can_access_classroom: user {user_id} has NO access to classroom {classroom_id}")
-    return False
+from services.access_control import user_can_access_classroom
 
 evaluations_bp = Blueprint('evaluations', __name__, url_prefix='/api/evaluations')
 
@@ -100,23 +18,20 @@ def get_classroom_evaluations(classroom_id):
         if not user_can_access_classroom(current_user.id, classroom_id):
             return jsonify({'success': False, 'message': 'Classe introuvable ou accès non autorisé'}), 404
         
-        # Récupérer toutes les évaluations avec leurs notes
-        evaluations = Evaluation.query.filter_by(classroom_id=classroom_id).order_by(Evaluation.date.desc()).all()
-        print(f"DEBUG: Found {len(evaluations)} evaluations for classroom {classroom_id}")
+        # Évaluations et notes depuis la matrice de la classe (en cache tant
+        # que rien n'a changé ; sinon 2 requêtes au lieu d'une par évaluation)
+        from services.grade_matrix import get_class_matrix
+        matrix = get_class_matrix(classroom_id)
+        print(f"DEBUG: Found {len(matrix.evaluations)} evaluations for classroom {classroom_id}")
         
         evaluations_data = []
         ta_groups = set()
         
-        for evaluation in evaluations:
-            # Récupérer les notes de cette évaluation
-            grades = EvaluationGrade.query.filter_by(evaluation_id=evaluation.id).all()
-            grades_data = []
-            
-            for grade in grades:
-                grades_data.append({
-                    'student_id': grade.student_id,
-                    'points': grade.points
-                })
+        for evaluation in reversed(matrix.evaluations):
+            grades_data = [
+                {'student_id': student_id, 'points': points}
+                for _, student_id, points in matrix.evaluation_grades(evaluation.id)
+            ]
             
             evaluation_data = {
                 'id': evaluation.id,
@@ -127,7 +42,7 @@ def get_classroom_evaluations(classroom_id):
                 'max_points': evaluation.max_points,
                 'min_points': evaluation.min_points,
                 'grades': grades_data,
-                'average': evaluation.get_average()
+                'average': matrix.evaluation_average(evaluation.id)
             }
             
             evaluations_data.append(evaluation_data)
@@ -447,52 +362,26 @@ def delete_evaluation(evaluation_id):
 # ---------------------------------------------------------------------------
 
 def _grades_matrix(classroom_id):
-    """Construit la matrice élèves × évaluations + moyennes, en répliquant la
-    logique d'affichage de l'app : les items d'un groupe TA comptent comme UNE
-    évaluation (moyenne du groupe) dans la moyenne de l'élève."""
-    students = Student.query.filter_by(classroom_id=classroom_id).all()
-    sort_pref = getattr(current_user, 'student_sort_pref', 'last_name') or 'last_name'
-    if sort_pref == 'first_name':
-        students.sort(key=lambda s: ((s.first_name or '').lower(), (s.last_name or '').lower()))
-    else:
-        students.sort(key=lambda s: ((s.last_name or '').lower(), (s.first_name or '').lower()))
+    """Élèves triés selon la préférence de l'enseignant + GradeMatrix de la
+    classe (services/grade_matrix.py : colonnes, moyennes élève et classe
+    précalculées, en cache tant que les notes ne changent pas)."""
+    from services.grade_matrix import get_class_matrix
+    from services.grade_exports import sorted_students
 
-    evaluations = (Evaluation.query.filter_by(classroom_id=classroom_id)
-                   .order_by(Evaluation.date, Evaluation.id).all())
-    grades = {}
-    if evaluations:
-        ev_ids = [e.id for e in evaluations]
-        for g in EvaluationGrade.query.filter(EvaluationGrade.evaluation_id.in_(ev_ids)).all():
-            grades[(g.evaluation_id, g.student_id)] = g.points
-
-    def student_average(sid):
-        vals = []
-        # évaluations significatives : comptées telles quelles
-        for ev in evaluations:
-            if ev.type != 'ta':
-                v = grades.get((ev.id, sid))
-                if v is not None:
-                    vals.append(v)
-        # groupes TA : moyenne du groupe comptée une seule fois
-        ta_groups = {}
-        for ev in evaluations:
-            if ev.type == 'ta':
-                ta_groups.setdefault(ev.ta_group_name or 'TA', []).append(ev)
-        for evs in ta_groups.values():
-            g_vals = [grades[(e.id, sid)] for e in evs if grades.get((e.id, sid)) is not None]
-            if g_vals:
-                vals.append(sum(g_vals) / len(g_vals))
-        return (sum(vals) / len(vals)) if vals else None
-
-    return students, evaluations, grades, student_average
+    sort_pref = getattr(current_user, 'student_sort_pref', 'last_name') or 'last_name'
+    return sorted_students(classroom_id, sort_pref), get_class_matrix(classroom_id)
 
 
 @evaluations_bp.route('/classroom/<int:classroom_id>/export.<fmt>')
 @login_required
 def export_grades(classroom_id, fmt):
     """Exporte les notes d'une classe en PDF ou CSV (pour entretiens de parents,
-    conseils de classe, archivage)."""
-    from flask import Response, abort
+    conseils de classe, archivage). Le CSV est streamé ligne par ligne, le PDF
+    écrit dans un fichier temporaire puis envoyé par morceaux
+    (services/grade_exports.py)."""
+    import tempfile
+    from flask import Response, abort, send_file, stream_with_context
+    from services.grade_exports import grades_csv_lines, write_grades_pdf, safe_export_name
 
     if fmt not in ('pdf', 'csv'):
         abort(404)
@@ -500,83 +389,78 @@ def export_grades(classroom_id, fmt):
         abort(403)
     classroom = Classroom.query.get_or_404(classroom_id)
 
-    students, evaluations, grades, student_average = _grades_matrix(classroom_id)
-
-    def fmt_val(v, dec=1):
-        return ('%.*f' % (dec, v)) if v is not None else ''
-
-    safe_name = ''.join(c if c.isalnum() or c in '-_' else '_'
-                        for c in f"notes_{classroom.name}_{classroom.subject}")
+    students, matrix = _grades_matrix(classroom_id)
+    safe_name = safe_export_name(classroom)
 
     if fmt == 'csv':
-        import csv as _csv
-        import io as _io
-        buf = _io.StringIO()
-        w = _csv.writer(buf, delimiter=';')
-        w.writerow(['Élève'] + [f"{e.title} ({e.date.strftime('%d.%m.%Y')})" for e in evaluations]
-                   + ['Moyenne'])
-        w.writerow([''] + [f"sur {fmt_val(e.max_points, 0)}" for e in evaluations] + [''])
-        for s in students:
-            w.writerow([s.full_name]
-                       + [fmt_val(grades.get((e.id, s.id))) for e in evaluations]
-                       + [fmt_val(student_average(s.id), 2)])
-        w.writerow(['Moyenne de classe']
-                   + [fmt_val(e.get_average(), 2) for e in evaluations] + [''])
-        # BOM pour qu'Excel ouvre l'UTF-8 correctement
-        data = '\ufeff' + buf.getvalue()
-        return Response(data, mimetype='text/csv; charset=utf-8',
+        return Response(stream_with_context(grades_csv_lines(students, matrix)),
+                        mimetype='text/csv; charset=utf-8',
                         headers={'Content-Disposition': f'attachment; filename="{safe_name}.csv"'})
 
-    # ---- PDF (reportlab, paysage) ----
-    import io as _io
-    from reportlab.lib.pagesizes import A4, landscape
-    from reportlab.lib.units import cm
-    from reportlab.lib import colors
-    from reportlab.lib.styles import getSampleStyleSheet
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+    # ---- PDF (reportlab, paysage) : en mémoire jusqu'à 1 Mo, puis sur disque ----
+    spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    write_grades_pdf(spool, classroom, students, matrix, current_user.username)
+    spool.seek(0)
+    return send_file(spool, mimetype='application/pdf', as_attachment=True,
+                     download_name=f"{safe_name}.pdf")
+
+
+# ---------------------------------------------------------------------------
+# Export de toutes les classes (ZIP, en arrière-plan)
+# ---------------------------------------------------------------------------
+
+def _export_job_payload(job):
+    from flask import url_for
+    payload = job.to_dict()
+    if job.status == 'done':
+        payload['download_url'] = url_for('evaluations.download_export', job_id=job.id)
+    return payload
+
 
-    buf = _io.BytesIO()
-    doc = SimpleDocTemplate(buf, pagesize=landscape(A4),
-                            rightMargin=1.2 * cm, leftMargin=1.2 * cm,
-                            topMargin=1.2 * cm, bottomMargin=1.2 * cm)
-    styles = getSampleStyleSheet()
-    elements = [
-        Paragraph(f"<b>Notes — {classroom.name} · {classroom.subject}</b>", styles['Title']),
-        Paragraph(f"Enseignant : {current_user.username} — généré le "
-                  f"{datetime.now().strftime('%d.%m.%Y à %H:%M')}", styles['Normal']),
-        Spacer(1, 0.5 * cm),
-    ]
+@evaluations_bp.route('/export-all', methods=['POST'])
+@login_required
+def export_all_classes():
+    """Lance l'export ZIP (notes CSV + PDF, présences CSV) de toutes les classes."""
+    from services.export_jobs import submit_export_all, ExportInProgress
+
+    try:
+        job = submit_export_all(current_user)
+    except ExportInProgress as e:
+        return jsonify({'success': True, 'job': _export_job_payload(e.job),
+                        'message': 'Un export est déjà en cours'})
+    return jsonify({'success': True, 'job': _export_job_payload(job),
+                    'message': 'Export en préparation'})
 
-    header = ['Élève'] + [f"{e.title}\n{e.date.strftime('%d.%m.%y')} · /{fmt_val(e.max_points, 0)}"
-                          for e in evaluations] + ['Moyenne']
-    rows = [header]
-    for s in students:
-        rows.append([s.full_name]
-                    + [fmt_val(grades.get((e.id, s.id))) for e in evaluations]
-                    + [fmt_val(student_average(s.id), 2)])
-    rows.append(['Moyenne de classe']
-                + [fmt_val(e.get_average(), 2) for e in evaluations] + [''])
 
-    first_col = 4.2 * cm
-    avail = landscape(A4)[0] - 2.4 * cm - first_col - 2 * cm
-    ev_w = max(1.5 * cm, min(3 * cm, avail / max(1, len(evaluations))))
-    table = Table(rows, colWidths=[first_col] + [ev_w] * len(evaluations) + [2 * cm],
-                  repeatRows=1)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4F46E5')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('FONTSIZE', (0, 0), (-1, 0), 7),
-        ('FONTSIZE', (0, 1), (-1, -1), 8),
-        ('ALIGN', (1, 0), (-1, -1), 'CENTER'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('GRID', (0, 0), (-1, -1), 0.4, colors.HexColor('#D1D5DB')),
-        ('ROWBACKGROUNDS', (0, 1), (-1, -2), [colors.white, colors.HexColor('#F9FAFB')]),
-        ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#EEF2FF')),
-        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-        ('FONTNAME', (-1, 1), (-1, -1), 'Helvetica-Bold'),
-    ]))
-    elements.append(table)
-    doc.build(elements)
-    buf.seek(0)
-    return Response(buf.read(), mimetype='application/pdf',
-                    headers={'Content-Disposition': f'attachment; filename="{safe_name}.pdf"'})
+@evaluations_bp.route('/export-jobs/<int:job_id>')
+@login_required
+def export_job_status(job_id):
+    """Statut d'un export (interrogé par la page jusqu'à « done » / « failed »)."""
+    from models.export_job import ExportJob
+
+    job = ExportJob.query.filter_by(id=job_id, user_id=current_user.id).first()
+    if not job:
+        return jsonify({'success': False, 'message': 'Export introuvable'}), 404
+    return jsonify({'success': True, 'job': _export_job_payload(job)})
+
+
+@evaluations_bp.route('/export-jobs/<int:job_id>/download')
+@login_required
+def download_export(job_id):
+    """Télécharge l'archive d'un export terminé (streamée depuis R2 ou le disque)."""
+    from flask import Response, abort, stream_with_context
+    from models.export_job import ExportJob
+    from services.r2_storage import stream_stored_object
+
+    job = ExportJob.query.filter_by(id=job_id, user_id=current_user.id, status='done').first()
+    if not job or not job.storage_key or (job.expires_at and job.expires_at < datetime.utcnow()):
+        abort(404)
+    streamed = stream_stored_object(job.storage_key)
+    if streamed is None:
+        abort(404)
+    chunks, length = streamed
+    headers = {'Content-Disposition':
+               f'attachment; filename="exports_{job.created_at.strftime("%Y-%m-%d")}.zip"'}
+    if length:
+        headers['Content-Length'] = str(length)
+    return Response(stream_with_context(chunks), mimetype='application/zip', headers=headers)
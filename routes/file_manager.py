@@ -9,12 +9,16 @@ import uuid
 import shutil
 import unicodedata
 from datetime import datetime
-from PIL import Image
+from utils.startup import lazy_module
 from models.file_manager import FileFolder, UserFile
 from models.class_file import ClassFile
-from services.document_conversion import convert_if_needed, is_convertible_filename, ConversionError
+from services.document_conversion import is_convertible_filename, ConversionError
+from services.job_runner import task
+from services.pdf_previews import request_previews
 import io
 
+Image = lazy_module('PIL.Image')  # chargé à la première miniature
+
 # Importer les modèles après leur création
 # from models.file_manager import FileFolder, UserFile
 
@@ -590,67 +594,24 @@ def api_migrate_to_r2():
 @file_manager_bp.route('/api/admin/backfill-r2', methods=['POST'])
 @admin_required
 def api_admin_backfill_r2():
-    """One-shot admin : migre TOUS les user_files encore stockés en BLOB DB vers
-    Cloudflare R2, à la clé canonique files/{user_id}/{filename} — cohérente avec
-    le chemin de lecture (serve_user_file_content), contrairement à l'ancienne
-    route par-utilisateur. Le BLOB n'est libéré qu'APRÈS vérification de la
-    présence de l'objet sur R2 (aucun risque de perte). Idempotent.
+    """One-shot admin : lance la migration de TOUS les user_files encore
+    stockés en BLOB DB vers Cloudflare R2 (tâche de fond
+    services/r2_storage.backfill_blobs_to_r2 ; suivi : GET /api/jobs/<id>,
+    rapport dans ``result``).
 
     Body JSON optionnel : {"dry_run": true} pour un aperçu sans écrire.
     """
-    from models.file_manager import UserFile
-    from services.r2_storage import (upload_file_to_r2, upload_thumbnail_to_r2,
-                                      file_exists_on_r2, is_r2_enabled)
+    from services.job_runner import enqueue
+    from services.r2_storage import is_r2_enabled
 
     if not is_r2_enabled():
         return jsonify({'success': False, 'message': 'R2 non configuré'}), 400
 
-    try:
-        return _backfill_r2_impl(UserFile, upload_file_to_r2, upload_thumbnail_to_r2, file_exists_on_r2)
-    except Exception as e:
-        db.session.rollback()
-        current_app.logger.error(f'[BACKFILL-R2] Erreur globale: {e}')
-        return jsonify({'success': False, 'message': f'Erreur serveur : {e}'}), 500
-
-
-def _backfill_r2_impl(UserFile, upload_file_to_r2, upload_thumbnail_to_r2, file_exists_on_r2):
     dry_run = bool((request.get_json(silent=True) or {}).get('dry_run', False))
-
-    files = UserFile.query.filter(UserFile.file_content.isnot(None)).all()
-    report = {'candidates': len(files), 'migrated': 0, 'thumbs_migrated': 0,
-              'freed_bytes': 0, 'errors': []}
-
-    for f in files:
-        blob = f.file_content
-        if not blob:
-            continue
-        if dry_run:
-            report['migrated'] += 1
-            report['freed_bytes'] += len(blob)
-            continue
-        try:
-            key = upload_file_to_r2(blob, f.user_id, f.filename, f.mime_type)
-            # Sécurité : ne jamais vider le BLOB sans confirmer l'objet sur R2.
-            if not key or not file_exists_on_r2(f.user_id, f.filename):
-                report['errors'].append({'id': f.id, 'name': f.original_filename,
-                                         'error': 'r2_upload_non_verifie'})
-                continue
-            f.r2_key = key
-            if f.thumbnail_content:
-                tkey = upload_thumbnail_to_r2(f.thumbnail_content, f.user_id, f.filename)
-                if tkey and file_exists_on_r2(f.user_id, f.filename, file_type='thumbnail'):
-                    f.r2_thumbnail_key = tkey
-                    f.thumbnail_content = None
-                    report['thumbs_migrated'] += 1
-            report['freed_bytes'] += len(blob)
-            f.file_content = None
-            db.session.commit()
-            report['migrated'] += 1
-        except Exception as e:
-            db.session.rollback()
-            report['errors'].append({'id': f.id, 'name': f.original_filename, 'error': str(e)})
-
-    return jsonify({'success': True, 'dry_run': dry_run, 'report': report})
+    job = enqueue('files.backfill_r2', {'dry_run': dry_run},
+                  unique_key=f'files.backfill_r2:{int(dry_run)}', user_id=current_user.id)
+    db.session.commit()
+    return jsonify({'success': True, 'dry_run': dry_run, 'job': job.to_dict()}), 202
 
 
 @file_manager_bp.route('/api/folder-contents/<int:folder_id>')
@@ -774,20 +735,10 @@ def _fileless_subtree_roots(folder_obj, base_path=''):
     fichiers : une branche entièrement vide ne peut donc PAS être recréée
     côté classe. On la signale à l'utilisateur au lieu de la taire (sinon
     « seulement une partie des dossiers s'est dupliquée » sans explication).
+    Deux requêtes quelle que soit la profondeur (services/folder_tree.py).
     """
-    def subtree_count(f):
-        n = f.files.count()
-        for sub in f.subfolders:
-            n += subtree_count(sub)
-        return n
-
-    current = f"{base_path}/{folder_obj.name}" if base_path else folder_obj.name
-    if subtree_count(folder_obj) == 0:
-        return [current]
-    roots = []
-    for sub in folder_obj.subfolders:
-        roots.extend(_fileless_subtree_roots(sub, current))
-    return roots
+    from services.folder_tree import fileless_subtree_roots
+    return fileless_subtree_roots(folder_obj.id, base_path)
 
 
 def _fileless_warnings(fileless):
@@ -804,7 +755,7 @@ def copy_folder_to_class():
     try:
         print(f"🔍 copy_folder_to_class appelée par user_id: {current_user.id}")
         
-        from models.file_manager import FileFolder, UserFile
+        from models.file_manager import FileFolder
         from models.classroom import Classroom
 
         data = request.get_json()
@@ -843,68 +794,20 @@ def copy_folder_to_class():
         if not classroom:
             return jsonify({'success': False, 'message': 'Classe introuvable'}), 404
 
-        # Fonction récursive pour copier un dossier et son contenu
-        # Retourne (copied_count, already_exists_count, failed_count)
-        def copy_folder_recursive(source_folder, class_id, parent_folder_path=None):
-            copied_count = 0
-            already_exists_count = 0
-            failed_count = 0
-            current_folder_path = parent_folder_path + "/" + source_folder.name if parent_folder_path else source_folder.name
-
-            # Copier tous les fichiers du dossier — SANS hydrater les blobs.
-            # list(source_folder.files) chargeait chaque UserFile avec ses
-            # colonnes BYTEA (file_content/thumbnail_content) : un dossier de
-            # vrais PDF explosait la RAM du worker → 502. En plus, le commit
-            # par fichier expire les instances : tout accès suivant rechargeait
-            # la ligne ENTIÈRE (blob compris). On itère donc sur les ids et on
-            # charge chaque fichier à la demande, blobs différés, puis on
-            # l'expulse de la session pour libérer la mémoire.
-            from sqlalchemy.orm import defer
-            file_ids = [row.id for row in source_folder.files.with_entities(UserFile.id).all()]
-            for fid in file_ids:
-                user_file = db.session.query(UserFile).options(
-                    defer(UserFile.file_content), defer(UserFile.thumbnail_content)
-                ).get(fid)
-                if not user_file:
-                    failed_count += 1
-                    continue
-                result = copy_single_file_to_class(user_file, class_id, current_folder_path)
-                db.session.expunge(user_file)
-                if result is True:
-                    copied_count += 1
-                elif result == 'exists':
-                    already_exists_count += 1
-                else:
-                    failed_count += 1
-
-            # Copier récursivement les sous-dossiers
-            for subfolder in source_folder.subfolders:
-                sub_copied, sub_exists, sub_failed = copy_folder_recursive(subfolder, class_id, current_folder_path)
-                copied_count += sub_copied
-                already_exists_count += sub_exists
-                failed_count += sub_failed
-
-            return copied_count, already_exists_count, failed_count
-
-        # Compter d'abord les fichiers réels disponibles
-        total_files_in_folder = 0
-        def count_files_recursive(folder_obj):
-            count = folder_obj.files.count()  # Utiliser .count() au lieu de len()
-            for subfolder in folder_obj.subfolders:
-                count += count_files_recursive(subfolder)
-            return count
-        
-        total_files_in_folder = count_files_recursive(folder)
+        # Copier le dossier (copie groupée, voir copy_folder_tree_to_class).
+        # Une copie trop longue s'arrête en cours de route (partial) ; le
+        # client la relance avec le « resume » reçu pour continuer.
+        progress = _resume_folder_copy(data, folder, class_id)
+        if progress['remaining']:
+            return _partial_copy_response(folder, progress)
+
+        copied_count, already_exists_count, failed_count, total_files_in_folder = (
+            progress['copied'], progress['exists'], progress['failed'], progress['total']
+        )
         print(f"🔍 Nombre total de fichiers dans le dossier '{folder.name}': {total_files_in_folder}")
-        
-        # Copier le dossier
-        copied_count, already_exists_count, failed_count = copy_folder_recursive(folder, class_id)
 
         print(f"✅ Copie terminée: {copied_count} copiés, {already_exists_count} déjà existants, {failed_count} échoués pour '{folder.name}' vers classe {class_id}")
 
-        # COMMIT IMMÉDIAT avant la vérification
-        db.session.commit()
-
         # Branches vides de la source : impossibles à recréer côté classe,
         # on les liste pour que la copie « partielle » soit explicable.
         fileless = _fileless_subtree_roots(folder)
@@ -1040,35 +943,11 @@ def copy_folder_to_class_folder():
         if not classroom:
             return jsonify({'success': False, 'message': 'Classe introuvable'}), 404
 
-        # Fonction récursive pour copier dans un dossier spécifique
-        def copy_folder_to_target(source_folder, class_id, target_folder_base):
-            copied_count = 0
-            current_target_path = target_folder_base + "/" + source_folder.name
-
-            # Copier tous les fichiers du dossier (ids seulement, blobs différés
-            # — voir copy_folder_to_class pour l'explication mémoire)
-            from sqlalchemy.orm import defer
-            from models.file_manager import UserFile
-            file_ids = [row.id for row in source_folder.files.with_entities(UserFile.id).all()]
-            for fid in file_ids:
-                user_file = db.session.query(UserFile).options(
-                    defer(UserFile.file_content), defer(UserFile.thumbnail_content)
-                ).get(fid)
-                if not user_file:
-                    continue
-                if copy_single_file_to_class(user_file, class_id, current_target_path) is True:
-                    copied_count += 1
-                db.session.expunge(user_file)
-
-            # Copier récursivement les sous-dossiers
-            for subfolder in source_folder.subfolders:
-                copied_count += copy_folder_to_target(subfolder, class_id, current_target_path)
-
-            return copied_count
-
         # Copier le dossier
-        copied_count = copy_folder_to_target(folder, class_id, target_folder_path)
-        db.session.commit()
+        progress = _resume_folder_copy(data, folder, class_id, target_folder_path)
+        if progress['remaining']:
+            return _partial_copy_response(folder, progress)
+        copied_count = progress['copied']
 
         return jsonify({
             'success': True,
@@ -1082,11 +961,225 @@ def copy_folder_to_class_folder():
         db.session.rollback()
         return jsonify({'success': False, 'message': f'Erreur lors de la copie du dossier: {str(e)}'}), 500
 
+# Copie de dossiers vers une classe : duplications R2 en parallèle (pool
+# borné), insertion groupée des ClassFile, budget de temps par requête.
+CLASS_COPY_CONCURRENCY = 8
+CLASS_COPY_BATCH_SIZE = 50
+CLASS_COPY_TIME_BUDGET = 75  # secondes, sous le timeout gunicorn (120 s)
+
+
+def copy_folder_tree_to_class(folder, class_id, base_path=None, time_budget=None, resume_after=None):
+    """Copie un dossier et toute sa sous-arborescence vers une classe.
+
+    Les fichiers gardent leur chemin relatif : ``base_path/Dossier/Sous-dossier``
+    (``Dossier/…`` sans base). Avant, chaque fichier passait par
+    copy_single_file_to_class : requête de doublon, copy_r2_object séquentiel
+    et commit — un dossier de 300 fichiers dépassait le timeout gunicorn et
+    laissait une copie partielle. Désormais :
+
+      1. arborescence et fichiers (métadonnées, jamais les blobs) en deux
+         requêtes, copies déjà présentes en une seule requête ;
+      2. duplications R2 réparties sur un pool de CLASS_COPY_CONCURRENCY
+         threads, par lots de CLASS_COPY_BATCH_SIZE ;
+      3. un INSERT groupé des ClassFile et un commit par lot.
+
+    Reprise : au-delà de ``time_budget`` secondes (CLASS_COPY_TIME_BUDGET par
+    défaut) on s'arrête après le lot en cours et ``cursor`` désigne le
+    dernier fichier traité. Relancer avec ``resume_after=cursor`` reprend
+    juste après (les échecs déjà comptés ne sont pas retentés en boucle).
+
+    Retourne un dict ``copied``, ``exists``, ``failed``, ``total``,
+    ``remaining`` et ``cursor`` (id du dernier fichier traité, ou None).
+    """
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from sqlalchemy import insert
+    from sqlalchemy.orm import load_only
+    from services.folder_tree import subtree_paths
+
+    if time_budget is None:
+        time_budget = current_app.config.get('CLASS_COPY_TIME_BUDGET', CLASS_COPY_TIME_BUDGET)
+    deadline = time.monotonic() + time_budget
+
+    paths = subtree_paths(folder.id, base_path)
+    files = UserFile.query.options(load_only(
+        UserFile.id, UserFile.user_id, UserFile.folder_id, UserFile.filename,
+        UserFile.original_filename, UserFile.file_type, UserFile.file_size,
+        UserFile.mime_type, UserFile.r2_key,
+    )).filter(UserFile.folder_id.in_(list(paths))).order_by(
+        UserFile.folder_id, UserFile.original_filename, UserFile.id
+    ).all()
+    progress = {'copied': 0, 'exists': 0, 'failed': 0, 'total': len(files),
+                'remaining': 0, 'cursor': None}
+    if not files:
+        return progress
+
+    existing = set(ClassFile.query.with_entities(
+        ClassFile.user_file_id, ClassFile.folder_path
+    ).filter(
+        ClassFile.classroom_id == class_id,
+        ClassFile.user_file_id.in_([f.id for f in files]),
+    ))
+    start_at = 0
+    if resume_after is not None:
+        start_at = next((i + 1 for i, f in enumerate(files) if f.id == resume_after), 0)
+    progress['exists'] = sum(
+        1 for f in files[:start_at] if (f.id, paths[f.folder_id]) in existing
+    )
+    todo = []
+    for f in files[start_at:]:
+        if (f.id, paths[f.folder_id]) in existing:
+            progress['exists'] += 1
+        else:
+            todo.append(f)
+
+    app = current_app._get_current_object()
+
+    def duplicate(source):
+        # Thread du pool : contexte applicatif (config R2) et session propres
+        with app.app_context():
+            return _duplicate_to_class_storage(
+                source, class_id,
+                load_content=lambda: db.session.query(UserFile.file_content)
+                .filter_by(id=source['id']).scalar(),
+            )
+
+    processed = 0
+    workers = current_app.config.get('CLASS_COPY_CONCURRENCY', CLASS_COPY_CONCURRENCY)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='class-copy') as pool:
+        for start in range(0, len(todo), CLASS_COPY_BATCH_SIZE):
+            if processed and time.monotonic() > deadline:
+                break
+            batch = todo[start:start + CLASS_COPY_BATCH_SIZE]
+            keys = list(pool.map(duplicate, [_class_copy_source(f) for f in batch]))
+
+            rows = [{
+                'classroom_id': class_id,
+                'user_file_id': f.id,
+                'folder_path': paths[f.folder_id],
+                'r2_key': key,
+                'own_original_filename': f.original_filename,
+                'own_filename': f.filename,
+                'own_file_type': f.file_type,
+                'own_file_size': f.file_size,
+                'own_mime_type': f.mime_type,
+            } for f, key in zip(batch, keys) if key]
+            if rows:
+                db.session.execute(insert(ClassFile), rows)
+            db.session.commit()
+
+            progress['copied'] += len(rows)
+            progress['failed'] += len(batch) - len(rows)
+            progress['cursor'] = batch[-1].id
+            processed += len(batch)
+
+    progress['remaining'] = len(todo) - processed
+    return progress
+
+
+def _resume_folder_copy(data, folder, class_id, base_path=None):
+    """Lance ou reprend une copie de dossier depuis une requête JSON.
+
+    Le client renvoie tel quel le ``resume`` de la réponse précédente
+    (``{'after', 'copied', 'failed'}``) ; les compteurs sont cumulés pour que
+    le message final porte sur toute la copie (les fichiers copiés lors des
+    appels précédents sont comptés comme copiés, pas « déjà présents »).
+    """
+    resume = data.get('resume') or {}
+    try:
+        after = int(resume['after']) if resume.get('after') is not None else None
+        copied_before = max(int(resume.get('copied') or 0), 0)
+        failed_before = max(int(resume.get('failed') or 0), 0)
+    except (TypeError, ValueError):
+        after, copied_before, failed_before = None, 0, 0
+
+    progress = copy_folder_tree_to_class(folder, class_id, base_path, resume_after=after)
+    resumed = min(copied_before, progress['exists'])
+    progress['copied'] += resumed
+    progress['exists'] -= resumed
+    progress['failed'] += failed_before
+    return progress
+
+
+def _partial_copy_response(folder, progress):
+    """Réponse d'une copie interrompue par le budget de temps : le client
+    relance la même requête avec ``resume``."""
+    done = progress['total'] - progress['remaining']
+    return jsonify({
+        'success': True,
+        'partial': True,
+        'progress': {'done': done, 'total': progress['total']},
+        'resume': {'after': progress['cursor'], 'copied': progress['copied'],
+                   'failed': progress['failed']},
+        'message': f'Copie de « {folder.name} » en cours : {done}/{progress["total"]} fichier(s)'
+    })
+
+
+def _class_copy_source(user_file):
+    """Métadonnées d'un UserFile nécessaires à sa duplication (dict simple,
+    utilisable hors de la session, ex. dans un thread du pool de copie)."""
+    return {
+        'id': user_file.id,
+        'name': user_file.original_filename,
+        'r2_key': user_file.r2_key,
+        'file_type': user_file.file_type,
+        'mime_type': user_file.mime_type,
+        'local_path': get_absolute_file_path(user_file),
+    }
+
+
+def _duplicate_to_class_storage(source, class_id, load_content):
+    """Duplique un fichier vers ``class_files/<classe>/<uuid>.<ext>`` sur R2.
+
+    Ordre : copie R2 server-side, sinon BLOB (chargé via ``load_content``
+    seulement si nécessaire) puis fichier physique local, uploadés vers R2.
+    Retourne la clé R2 de la copie, ou None.
+    """
+    dest_key = f"class_files/{class_id}/{uuid.uuid4()}.{source['file_type'] or 'bin'}"
+
+    # 1. R2 → copie server-side (rapide, sans download)
+    if source['r2_key']:
+        try:
+            from services.r2_storage import copy_r2_object
+            if copy_r2_object(source['r2_key'], dest_key):
+                print(f"✅ Fichier dupliqué R2 (server-side): {source['name']} -> {dest_key}")
+                return dest_key
+        except Exception as e:
+            print(f"⚠️  Erreur copie R2 server-side: {e}")
+
+    from services.r2_storage import upload_to_r2_key
+
+    # 2. BLOB → upload vers R2
+    content = load_content()
+    if content:
+        try:
+            if upload_to_r2_key(content, dest_key, source['mime_type']):
+                print(f"✅ Fichier BLOB dupliqué vers R2: {source['name']} -> {dest_key}")
+                return dest_key
+        except Exception as e:
+            print(f"⚠️  Erreur upload BLOB vers R2: {e}")
+    del content
+
+    # 3. Fichier physique local → upload vers R2
+    if not os.path.exists(source['local_path']):
+        print(f"❌ Fichier introuvable: R2, BLOB et physique manquants pour {source['name']}")
+        return None
+    try:
+        with open(source['local_path'], 'rb') as f:
+            file_data = f.read()
+        if upload_to_r2_key(file_data, dest_key, source['mime_type']):
+            print(f"✅ Fichier local dupliqué vers R2: {source['name']} -> {dest_key}")
+            return dest_key
+    except Exception as e:
+        print(f"⚠️  Erreur upload local vers R2: {e}")
+
+    print(f"❌ Impossible de dupliquer le fichier: {source['name']}")
+    return None
+
+
 def copy_single_file_to_class(user_file, class_id, folder_path=None):
     """Fonction utilitaire pour copier un fichier vers une classe (duplication réelle dans R2)"""
     try:
-        import uuid as uuid_module
-
         # Vérifier si le fichier n'existe pas déjà dans ce chemin spécifique
         folder_path_clean = folder_path or ''
         existing_file = ClassFile.query.filter_by(
@@ -1100,50 +1193,10 @@ def copy_single_file_to_class(user_file, class_id, folder_path=None):
             return 'exists'  # Fichier déjà existant
 
         # Dupliquer le fichier dans R2 (copie réelle, pas une simple référence)
-        class_r2_key = None
-        file_ext = user_file.file_type or 'bin'
-        dest_filename = f"{uuid_module.uuid4()}.{file_ext}"
-        dest_key = f"class_files/{class_id}/{dest_filename}"
-
-        # 1. R2 → copie server-side (rapide, sans download)
-        if user_file.r2_key:
-            try:
-                from services.r2_storage import copy_r2_object
-                if copy_r2_object(user_file.r2_key, dest_key):
-                    class_r2_key = dest_key
-                    print(f"✅ Fichier dupliqué R2 (server-side): {user_file.original_filename} -> {dest_key}")
-            except Exception as e:
-                print(f"⚠️  Erreur copie R2 server-side: {e}")
-
-        # 2. BLOB → upload vers R2
-        if not class_r2_key and user_file.file_content:
-            try:
-                from services.r2_storage import upload_to_r2_key
-                if upload_to_r2_key(user_file.file_content, dest_key, user_file.mime_type):
-                    class_r2_key = dest_key
-                    print(f"✅ Fichier BLOB dupliqué vers R2: {user_file.original_filename} -> {dest_key}")
-            except Exception as e:
-                print(f"⚠️  Erreur upload BLOB vers R2: {e}")
-
-        # 3. Fichier physique local → upload vers R2
-        if not class_r2_key:
-            file_path = get_absolute_file_path(user_file)
-            if os.path.exists(file_path):
-                try:
-                    from services.r2_storage import upload_to_r2_key
-                    with open(file_path, 'rb') as f:
-                        file_data = f.read()
-                    if upload_to_r2_key(file_data, dest_key, user_file.mime_type):
-                        class_r2_key = dest_key
-                        print(f"✅ Fichier local dupliqué vers R2: {user_file.original_filename} -> {dest_key}")
-                except Exception as e:
-                    print(f"⚠️  Erreur upload local vers R2: {e}")
-            else:
-                print(f"❌ Fichier introuvable: R2, BLOB et physique manquants pour {user_file.original_filename}")
-                return False
-
+        class_r2_key = _duplicate_to_class_storage(
+            _class_copy_source(user_file), class_id, load_content=lambda: user_file.file_content
+        )
         if not class_r2_key:
-            print(f"❌ Impossible de dupliquer le fichier: {user_file.original_filename}")
             return False
 
         # Créer l'entrée en base de données avec la clé R2 de la copie
@@ -1309,31 +1362,8 @@ def delete_multiple():
                 ).first()
 
                 if folder:
-                    # Fonction récursive pour supprimer les fichiers et dossiers
-                    def delete_folder_recursive(folder):
-                        # D'abord, supprimer récursivement tous les sous-dossiers
-                        for subfolder in list(folder.subfolders):
-                            delete_folder_recursive(subfolder)
-                        
-                        # Supprimer les fichiers physiques du dossier
-                        for file in folder.files:
-                            file_path = get_absolute_file_path(file)
-                            if os.path.exists(file_path):
-                                os.remove(file_path)
-
-                            if file.thumbnail_path:
-                                thumbnail_path = os.path.join(current_app.root_path, file.get_thumbnail_path())
-                                if os.path.exists(thumbnail_path):
-                                    os.remove(thumbnail_path)
-                            
-                            # Supprimer le fichier de la base de données
-                            db.session.delete(file)
-                        
-                        # Supprimer le dossier de la base de données
-                        db.session.delete(folder)
-
-                    # Supprimer récursivement le dossier et tout son contenu
-                    delete_folder_recursive(folder)
+                    # Supprimer le dossier et tout son contenu (R2, disque, copies legacy)
+                    _purge_folder_tree(folder)
                     deleted_count += 1
 
         db.session.commit()
@@ -1429,6 +1459,35 @@ def create_folder_structure():
         db.session.rollback()
         return jsonify({'success': False, 'message': str(e)}), 500
 
+def _submit_conversion(file_data, original_filename, folder_id):
+    """Conversion Word/Pages → PDF des uploads du gestionnaire de fichiers.
+
+    Retourne ``(converted, response)`` :
+      - ``(None, None)``              : pas un format à convertir ;
+      - ``((pdf_bytes, nom), None)``  : PDF déjà en cache, l'upload continue ;
+      - ``(None, réponse)``           : job mis en file d'attente (le
+        navigateur suit /api/conversion-jobs/<id>) ou erreur à renvoyer.
+    """
+    from services.conversion_queue import submit_conversion, QueueFullError
+
+    if not is_convertible_filename(original_filename):
+        return None, None
+    try:
+        state, result = submit_conversion(current_user.id, file_data, original_filename, folder_id)
+    except ConversionError as conv_err:
+        return None, (jsonify({'success': False, 'message': str(conv_err)}), 400)
+    except QueueFullError as full:
+        return None, (jsonify({'success': False, 'message': str(full)}), 429)
+    if state == 'cached':
+        return result, None
+    return None, jsonify({
+        'success': True,
+        'pending': True,
+        'conversion_job': result.to_dict(),
+        'message': f'Conversion de « {original_filename} » en PDF en cours'
+    })
+
+
 @file_manager_bp.route('/upload-with-structure', methods=['POST'])
 @login_required
 def upload_with_structure():
@@ -1546,11 +1605,10 @@ def upload_with_structure():
         file.seek(0)
         mime_type = file.content_type
 
-        # === Conversion automatique Word/Pages -> PDF (CloudConvert) ===
-        try:
-            converted = convert_if_needed(file_data, original_filename)
-        except ConversionError as conv_err:
-            return jsonify({'success': False, 'message': str(conv_err)}), 400
+        # === Conversion automatique Word/Pages -> PDF (file d'attente) ===
+        converted, pending_response = _submit_conversion(file_data, original_filename, target_folder_id)
+        if pending_response is not None:
+            return pending_response
         if converted:
             file_data, original_filename = converted
             file_ext = 'pdf'
@@ -1616,6 +1674,10 @@ def upload_with_structure():
                 current_app.logger.warning(f"Erreur création miniature: {thumb_err}")
 
         db.session.add(user_file)
+        if file_ext == 'pdf':
+            # Aperçus des pages générés en tâche de fond, prêts à l'ouverture
+            db.session.flush()
+            request_previews('userfile', user_file)
         db.session.commit()
 
         current_app.logger.info(f'[UPLOAD-DEBUG] SUCCESS: "{original_filename}" -> folder_id={target_folder_id}, r2_key={r2_key}')
@@ -1646,6 +1708,27 @@ def upload_with_structure():
                 pass
         return jsonify({'success': False, 'message': str(e)}), 500
 
+@file_manager_bp.route('/api/conversion-jobs/<int:job_id>', methods=['GET'])
+@login_required
+def conversion_job_status(job_id):
+    """Statut d'une conversion en arrière-plan (polling du navigateur)."""
+    from models.conversion_job import ConversionJob
+
+    job = ConversionJob.query.filter_by(id=job_id, user_id=current_user.id).first()
+    if not job:
+        return jsonify({'success': False, 'message': 'Conversion introuvable'}), 404
+    payload = {'success': True, 'job': job.to_dict()}
+    if job.status == 'done' and job.result_user_file_id:
+        user_file = db.session.get(UserFile, job.result_user_file_id)
+        if user_file:
+            payload['file'] = {
+                'id': user_file.id,
+                'name': user_file.original_filename,
+                'type': user_file.file_type,
+                'size': user_file.format_size()
+            }
+    return jsonify(payload)
+
 @file_manager_bp.route('/create-folder', methods=['POST'])
 @login_required
 def create_folder():
@@ -1735,11 +1818,10 @@ def upload_file():
         file.seek(0)
         mime_type = file.content_type
 
-        # === Conversion automatique Word/Pages -> PDF (CloudConvert) ===
-        try:
-            converted = convert_if_needed(file_data, original_filename)
-        except ConversionError as conv_err:
-            return jsonify({'success': False, 'message': str(conv_err)}), 400
+        # === Conversion automatique Word/Pages -> PDF (file d'attente) ===
+        converted, pending_response = _submit_conversion(file_data, original_filename, folder_id)
+        if pending_response is not None:
+            return pending_response
         if converted:
             file_data, original_filename = converted
             file_ext = 'pdf'
@@ -1809,6 +1891,10 @@ def upload_file():
                 current_app.logger.warning(f"Erreur création miniature: {thumb_err}")
 
         db.session.add(user_file)
+        if file_ext == 'pdf':
+            # Aperçus des pages générés en tâche de fond, prêts à l'ouverture
+            db.session.flush()
+            request_previews('userfile', user_file)
         db.session.commit()
 
         return jsonify({
@@ -2097,11 +2183,68 @@ def delete_file(file_id):
         db.session.rollback()
         return jsonify({'success': False, 'message': str(e)}), 500
 
+def _purge_folder_tree(folder):
+    """Supprime un dossier, ses sous-dossiers et leurs fichiers (R2, disque,
+    copies legacy des classes, puis lignes en base).
+
+    Nombre constant de requêtes quelle que soit la profondeur : sous-arbre et
+    fichiers résolus par CTE récursive, copies legacy et lignes supprimées en
+    masse (services/folder_tree.py). Les blobs ne sont jamais chargés.
+    Le commit reste à la charge de l'appelant.
+    """
+    from sqlalchemy.orm import defer
+    from models.student import LegacyClassFile
+    from services.folder_tree import subtree_ids, delete_subtree
+    from services.r2_storage import delete_file_from_r2
+
+    files = UserFile.query.options(
+        defer(UserFile.file_content), defer(UserFile.thumbnail_content)
+    ).filter(UserFile.folder_id.in_(subtree_ids(folder.id))).all()
+
+    for file in files:
+        # Supprimer de R2 si stocké là
+        if file.r2_key:
+            try:
+                delete_file_from_r2(file.user_id, file.filename)
+            except Exception:
+                pass
+        if file.r2_thumbnail_key:
+            try:
+                delete_file_from_r2(file.user_id, file.thumbnail_path, file_type='thumbnail')
+            except Exception:
+                pass
+
+        # Supprimer fichier physique
+        file_path = get_absolute_file_path(file)
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+        if file.thumbnail_path:
+            thumbnail_path = os.path.join(current_app.root_path, file.get_thumbnail_path())
+            if os.path.exists(thumbnail_path):
+                os.remove(thumbnail_path)
+
+    # Copies dans les classes (système legacy, identifiées par 'filename')
+    filenames = [file.filename for file in files]
+    if filenames:
+        legacy_copies = LegacyClassFile.query.filter(LegacyClassFile.filename.in_(filenames))
+        for (copy_filename,) in legacy_copies.with_entities(LegacyClassFile.filename):
+            file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'class_files', copy_filename)
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        legacy_copies.delete(synchronize_session=False)
+
+    for file in files:
+        db.session.expunge(file)
+    db.session.expunge(folder)
+    return delete_subtree(folder.id)
+
+
 @file_manager_bp.route('/delete-folder/<int:folder_id>', methods=['DELETE'])
 @login_required
 def delete_folder(folder_id):
     """Supprimer un dossier et son contenu"""
-    from models.file_manager import FileFolder, UserFile
+    from models.file_manager import FileFolder
 
     # Convertir folder_id en entier pour éviter les erreurs PostgreSQL
     try:
@@ -2115,58 +2258,9 @@ def delete_folder(folder_id):
     ).first_or_404()
 
     try:
-        # Fonction récursive pour supprimer les fichiers et dossiers
-        def delete_folder_recursive(folder):
-            # D'abord, supprimer récursivement tous les sous-dossiers
-            for subfolder in list(folder.subfolders):
-                delete_folder_recursive(subfolder)
-            
-            # Supprimer les fichiers (R2 + physiques) du dossier
-            for file in folder.files:
-                # Supprimer de R2 si stocké là
-                if file.r2_key:
-                    try:
-                        from services.r2_storage import delete_file_from_r2
-                        delete_file_from_r2(file.user_id, file.filename)
-                    except Exception:
-                        pass
-                if file.r2_thumbnail_key:
-                    try:
-                        from services.r2_storage import delete_file_from_r2 as del_r2
-                        del_r2(file.user_id, file.thumbnail_path, file_type='thumbnail')
-                    except Exception:
-                        pass
-
-                # Supprimer fichier physique
-                file_path = get_absolute_file_path(file)
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-
-                if file.thumbnail_path:
-                    thumbnail_path = os.path.join(current_app.root_path, file.get_thumbnail_path())
-                    if os.path.exists(thumbnail_path):
-                        os.remove(thumbnail_path)
-                
-                # D'abord supprimer toutes les copies dans les classes (système legacy)
-                from models.student import LegacyClassFile
-                # Les fichiers legacy utilisent 'filename' pour identifier les copies
-                legacy_copies = LegacyClassFile.query.filter_by(filename=file.filename).all()
-                for copy in legacy_copies:
-                    # Supprimer le fichier physique s'il existe
-                    file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'class_files', copy.filename)
-                    if os.path.exists(file_path):
-                        os.remove(file_path)
-                    db.session.delete(copy)
-                
-                # Ensuite supprimer le fichier original de la base de données
-                db.session.delete(file)
-            
-            # Supprimer le dossier de la base de données
-            db.session.delete(folder)
+        # Supprimer le dossier et tout son contenu (R2, disque, copies legacy)
+        _purge_folder_tree(folder)
 
-        # Supprimer récursivement le dossier et tout son contenu
-        delete_folder_recursive(folder)
-        
         # Commit final
         db.session.commit()
 
@@ -2470,144 +2564,342 @@ def update_folder_color():
         db.session.rollback()
         return jsonify({'success': False, 'message': str(e)}), 500
 
+def _annotation_target_from_ref(file_ref):
+    """Résout l'identifiant de fichier reçu par les routes d'annotations.
+
+    Retourne ``((file_id, file_type), None)`` ou ``(None, (réponse, code))``.
+    Fichiers éphémères : id de la forme « eph<id> », namespace dédié
+    (file_type='ephemeral_file') pour ne pas entrer en collision avec les ids
+    des fichiers de classe / personnels.
+    """
+    raw_str = str(file_ref or '')
+    if raw_str.startswith('eph') and raw_str[3:].isdigit():
+        from models.planning import EphemeralFile
+        eph = EphemeralFile.query.filter_by(
+            id=int(raw_str[3:]), user_id=current_user.id
+        ).first()
+        if not eph:
+            return None, (jsonify({'success': False, 'message': 'Fichier introuvable'}), 404)
+        return (eph.id, 'ephemeral_file'), None
+
+    file_id = int(raw_str) if raw_str.isdigit() else None
+    if not file_id:
+        return None, (jsonify({'success': False, 'message': 'ID de fichier invalide'}), 400)
+
+    # Accepter les 3 systèmes de fichiers (v2 / legacy / userfile), comme
+    # serve_file. Avant, on ne regardait que la table v2 → un fichier legacy
+    # ou un UserFile (ex. .docx converti en PDF) s'affichait mais renvoyait
+    # 404 ici → annotations jamais sauvegardées.
+    target = _resolve_annotation_target(file_id, current_user)
+    if not target:
+        return None, (jsonify({'success': False, 'message': 'Fichier introuvable'}), 404)
+    return target, None
+
+
+def _annotations_payload(file_ref):
+    """Réponse complète de load-annotations (toutes les pages)."""
+    from services.annotation_store import get_annotation, load_pages
+
+    target, error = _annotation_target_from_ref(file_ref)
+    if error:
+        return error
+    file_id, file_type = target
+
+    annotation = get_annotation(file_id, file_type, current_user.id)
+    if not annotation:
+        # Pas d'annotations trouvées, retourner structure vide
+        return jsonify({'success': True, 'annotations': {}})
+
+    annotations, versions = load_pages(annotation)
+    # Un en-tête legacy vient peut-être d'être éclaté en pages
+    db.session.commit()
+    return jsonify({
+        'success': True,
+        'annotations': annotations,
+        'versions': versions,
+        'custom_pages': annotation.custom_pages_data or []
+    })
+
+
 @file_manager_bp.route('/api/save-annotations', methods=['POST'])
 @login_required
 def save_annotations():
-    """Sauvegarder les annotations d'un fichier"""
+    """Sauvegarder les annotations d'un fichier (document complet).
+
+    Conservé pour les lecteurs qui envoient encore tout le document : il est
+    ramené à un diff par page, les pages inchangées ne sont pas réécrites.
+    """
     try:
-        from models.file_manager import FileAnnotation
-        
+        from services.annotation_store import get_annotation, replace_all_pages
+
         data = request.get_json()
         annotations_data = data.get('annotations', {})
         custom_pages_data = data.get('custom_pages', [])
-        file_id_raw = data.get('file_id')
-
-        # Fichiers éphémères : id de la forme « eph<id> », namespace dédié
-        # (file_type='ephemeral_file') pour ne pas entrer en collision avec
-        # les ids des fichiers de classe / personnels.
-        raw_str = str(file_id_raw or '')
-        if raw_str.startswith('eph') and raw_str[3:].isdigit():
-            from models.planning import EphemeralFile
-            eph = EphemeralFile.query.filter_by(
-                id=int(raw_str[3:]), user_id=current_user.id
-            ).first()
-            if not eph:
-                return jsonify({'success': False, 'message': 'Fichier introuvable'}), 404
-            file_id, file_type = eph.id, 'ephemeral_file'
-        else:
-            # Extraire l'ID du fichier depuis les données
-            file_id = int(file_id_raw) if str(file_id_raw).isdigit() else None
-            if not file_id:
-                return jsonify({'success': False, 'message': 'ID de fichier invalide'}), 400
-
-            # Accepter les 3 systèmes de fichiers (v2 / legacy / userfile), comme
-            # serve_file. Avant, on ne regardait que la table v2 → un fichier legacy
-            # ou un UserFile (ex. .docx converti en PDF) s'affichait mais renvoyait
-            # 404 ici → annotations jamais sauvegardées.
-            target = _resolve_annotation_target(file_id, current_user)
-            if not target:
-                return jsonify({'success': False, 'message': 'Fichier introuvable'}), 404
-            file_id, file_type = target
 
-        # Chercher une annotation existante
-        annotation = FileAnnotation.query.filter_by(
-            file_id=file_id,
-            file_type=file_type,
-            user_id=current_user.id
-        ).first()
+        target, error = _annotation_target_from_ref(data.get('file_id'))
+        if error:
+            return error
+        file_id, file_type = target
 
-        if annotation:
-            # Mettre à jour l'annotation existante
-            annotation.annotations_data = annotations_data
-            annotation.custom_pages_data = custom_pages_data
-            annotation.updated_at = datetime.utcnow()
-        else:
-            # Créer une nouvelle annotation
-            annotation = FileAnnotation(
-                file_id=file_id,
-                file_type=file_type,
-                user_id=current_user.id,
-                annotations_data=annotations_data,
-                custom_pages_data=custom_pages_data
-            )
-            db.session.add(annotation)
-            
+        annotation = get_annotation(file_id, file_type, current_user.id, create=True)
+        versions = replace_all_pages(annotation, annotations_data, custom_pages=custom_pages_data)
         db.session.commit()
-        
+
         return jsonify({
             'success': True,
-            'message': 'Annotations sauvegardées'
+            'message': 'Annotations sauvegardées',
+            'versions': {k: v for k, v in versions.items() if v}
         })
-        
+
     except Exception as e:
         db.session.rollback()
         print(f"Erreur lors de la sauvegarde des annotations: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
 
-@file_manager_bp.route('/api/load-annotations/eph<int:eph_id>', methods=['GET'])
+
+@file_manager_bp.route('/api/annotations/<file_ref>/pages', methods=['PATCH'])
 @login_required
-def load_annotations_ephemeral(eph_id):
-    """Annotations d'un fichier éphémère (namespace 'ephemeral_file')."""
+def patch_annotation_pages(file_ref):
+    """Sauvegarde incrémentale : n'écrit que les pages modifiées.
+
+    Corps JSON :
+        pages          : {pageId: [annotations] | null}  (null / [] = page effacée)
+        base_versions  : {pageId: version} optionnel → 409 si la page a changé
+        custom_pages   : liste optionnelle, remplace les pages custom
+    """
     try:
-        from models.file_manager import FileAnnotation
-        from models.planning import EphemeralFile
+        from services.annotation_store import (
+            get_annotation, apply_page_changes, AnnotationConflict
+        )
 
-        eph = EphemeralFile.query.filter_by(id=eph_id, user_id=current_user.id).first()
-        if not eph:
-            return jsonify({'success': False, 'message': 'Fichier introuvable'}), 404
+        data = request.get_json() or {}
+        pages = data.get('pages') or {}
+        if not isinstance(pages, dict):
+            return jsonify({'success': False, 'message': 'Format de pages invalide'}), 400
+        base_versions = data.get('base_versions') or {}
+        try:
+            if not isinstance(base_versions, dict):
+                raise TypeError
+            base_versions = {key: int(known or 0) for key, known in base_versions.items()}
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'message': 'Format de base_versions invalide'}), 400
 
-        annotation = FileAnnotation.query.filter_by(
-            file_id=eph_id, file_type='ephemeral_file', user_id=current_user.id
-        ).first()
-        if annotation:
+        target, error = _annotation_target_from_ref(file_ref)
+        if error:
+            return error
+        file_id, file_type = target
+
+        annotation = get_annotation(file_id, file_type, current_user.id, create=True)
+        try:
+            versions = apply_page_changes(
+                annotation, pages,
+                base_versions=base_versions,
+                custom_pages=data.get('custom_pages'),
+            )
+        except AnnotationConflict as conflict:
+            db.session.rollback()
             return jsonify({
-                'success': True,
-                'annotations': annotation.annotations_data,
-                'custom_pages': annotation.custom_pages_data or []
-            })
-        return jsonify({'success': True, 'annotations': {}})
+                'success': False,
+                'message': 'Pages modifiées depuis un autre appareil',
+                'conflicts': conflict.conflicts
+            }), 409
+        db.session.commit()
+
+        return jsonify({'success': True, 'versions': versions})
+
     except Exception as e:
+        db.session.rollback()
+        print(f"Erreur lors de la sauvegarde incrémentale des annotations: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
-@file_manager_bp.route('/api/load-annotations/<int:file_id>', methods=['GET'])
+@file_manager_bp.route('/api/annotations/<file_ref>/pages', methods=['GET'])
 @login_required
-def load_annotations(file_id):
-    """Charger les annotations d'un fichier"""
+def load_annotation_pages(file_ref):
+    """Chargement paresseux des annotations au fil du scroll.
+
+    Paramètres : ``from`` / ``to`` (plage inclusive de pages PDF) et/ou
+    ``pages`` (liste de pageId séparés par des virgules, pages custom
+    comprises). Sans paramètre, renvoie toutes les pages. ``index`` liste
+    toujours toutes les pages annotées avec leur version.
+    """
     try:
-        from models.file_manager import FileAnnotation
+        from services.annotation_store import get_annotation, load_pages, page_index
 
-        # Accepter les 3 systèmes de fichiers (v2 / legacy / userfile), comme
-        # serve_file et save-annotations.
-        target = _resolve_annotation_target(file_id, current_user)
-        if not target:
-            return jsonify({'success': False, 'message': 'Fichier introuvable'}), 404
+        target, error = _annotation_target_from_ref(file_ref)
+        if error:
+            return error
         file_id, file_type = target
 
-        # Chercher l'annotation
-        annotation = FileAnnotation.query.filter_by(
-            file_id=file_id,
-            file_type=file_type,
-            user_id=current_user.id
-        ).first()
-        
-        if annotation:
-            return jsonify({
-                'success': True,
-                'annotations': annotation.annotations_data,
-                'custom_pages': annotation.custom_pages_data or []
-            })
-        else:
-            # Pas d'annotations trouvées, retourner structure vide
-            return jsonify({
-                'success': True,
-                'annotations': {}
-            })
-            
+        annotation = get_annotation(file_id, file_type, current_user.id)
+        if not annotation:
+            return jsonify({'success': True, 'annotations': {}, 'versions': {},
+                            'index': {}, 'custom_pages': []})
+
+        page_keys = [k for k in (request.args.get('pages') or '').split(',') if k]
+        annotations, versions = load_pages(
+            annotation,
+            page_keys=page_keys or None,
+            first=request.args.get('from', type=int),
+            last=request.args.get('to', type=int),
+        )
+        index = page_index(annotation)
+        db.session.commit()
+
+        return jsonify({
+            'success': True,
+            'annotations': annotations,
+            'versions': versions,
+            'index': index,
+            'custom_pages': annotation.custom_pages_data or []
+        })
     except Exception as e:
+        db.session.rollback()
+        print(f"Erreur lors du chargement des pages d'annotations: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+@file_manager_bp.route('/api/load-annotations/eph<int:eph_id>', methods=['GET'])
+@login_required
+def load_annotations_ephemeral(eph_id):
+    """Annotations d'un fichier éphémère (namespace 'ephemeral_file')."""
+    try:
+        return _annotations_payload(f'eph{eph_id}')
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+@file_manager_bp.route('/api/load-annotations/<int:file_id>', methods=['GET'])
+@login_required
+def load_annotations(file_id):
+    """Charger les annotations d'un fichier"""
+    try:
+        return _annotations_payload(file_id)
+    except Exception as e:
+        db.session.rollback()
         print(f"Erreur lors du chargement des annotations: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
 
+def _preview_source(kind, obj):
+    """Source dont le contenu est réellement servi pour un candidat : une
+    copie de classe v2 liée à son UserFile partage les aperçus de celui-ci."""
+    if kind == 'v2' and obj.user_file_id:
+        from sqlalchemy.orm import defer as _defer
+        source_uf = db.session.query(UserFile).options(
+            _defer(UserFile.file_content), _defer(UserFile.thumbnail_content)
+        ).get(obj.user_file_id)
+        if source_uf:
+            return 'userfile', source_uf
+    return kind, obj
+
+
+def _pdf_preview_for(file_id):
+    """PdfPreview prêt du 1er candidat PDF accessible, ou None. Dépose la
+    génération (tâche de fond) si les aperçus manquent ou sont périmés."""
+    from services.pdf_previews import current_preview
+
+    for kind, obj in _find_class_file_candidates(file_id, current_user):
+        if not (obj.original_filename or '').lower().endswith('.pdf'):
+            continue
+        preview = current_preview(*_preview_source(kind, obj))
+        db.session.commit()
+        return preview
+    return None
+
+
+def _ready_preview(file_id, content_hash):
+    """PdfPreview prêt d'un candidat accessible dont le contenu a ce hash
+    (URL d'image / de texte), sans relire la version de la source."""
+    from models.pdf_preview import PdfPreview
+    from services.pdf_previews import source_key
+
+    keys = [source_key(*_preview_source(kind, obj))
+            for kind, obj in _find_class_file_candidates(file_id, current_user)]
+    if not keys:
+        return None
+    return PdfPreview.query.filter(
+        PdfPreview.source_key.in_(keys),
+        PdfPreview.content_hash == content_hash,
+        PdfPreview.status == 'ready',
+    ).first()
+
+
+def _immutable_response(data, mimetype, etag):
+    """Réponse d'un objet adressé par hash : ne change jamais pour une URL."""
+    from flask import Response
+
+    response = Response(data, mimetype=mimetype)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return response.make_conditional(request)
+
+
+@file_manager_bp.route('/api/previews/<int:file_id>/manifest', methods=['GET'])
+@login_required
+def pdf_preview_manifest(file_id):
+    """Nombre de pages, tailles et niveaux de zoom des aperçus serveur.
+    404 tant qu'ils ne sont pas générés : le lecteur rend alors le PDF."""
+    from services.pdf_previews import is_preview_enabled, manifest
+
+    if not is_preview_enabled():
+        return jsonify({'success': False, 'message': 'Aperçus serveur désactivés'}), 404
+    preview = _pdf_preview_for(file_id)
+    if not preview:
+        return jsonify({'success': False, 'message': 'Aperçus en préparation'}), 404
+    return jsonify({'success': True, **manifest(preview)})
+
+
+@file_manager_bp.route('/api/previews/<int:file_id>/<content_hash>/<level>/<int:page>', methods=['GET'])
+@login_required
+def pdf_preview_page(file_id, content_hash, level, page):
+    """Image JPEG d'une page, générée à l'avance par la tâche de fond."""
+    from services.pdf_previews import page_image
+
+    preview = _ready_preview(file_id, content_hash)
+    data = page_image(preview, level, page) if preview else None
+    if data is None:
+        abort(404)
+    return _immutable_response(data, 'image/jpeg', f"{content_hash}-{level}-{page}")
+
+
+@file_manager_bp.route('/api/previews/<int:file_id>/<content_hash>/text/<int:page>', methods=['GET'])
+@login_required
+def pdf_preview_text(file_id, content_hash, page):
+    """Couche texte d'une page : mots et rectangles en points PDF."""
+    from services.pdf_previews import page_text
+
+    preview = _ready_preview(file_id, content_hash)
+    data = page_text(preview, page) if preview else None
+    if data is None:
+        abort(404)
+    return _immutable_response(data, 'application/json', f"{content_hash}-text-{page}")
+
+
+@task('pdf_previews.generate', queue='previews')
+def generate_pdf_previews_job(kind, obj_id, version):
+    """Tâche de fond (services/job_runner.py) : aperçus d'une source, lue
+    comme serve_file la sert (R2 streamé / BLOB / disque)."""
+    from models.student import LegacyClassFile
+    from services.pdf_previews import generate_previews, source_key
+
+    model = {'userfile': UserFile, 'v2': ClassFile, 'legacy': LegacyClassFile}[kind]
+    obj = db.session.get(model, obj_id)
+    if obj is None:
+        return {'skipped': True}
+
+    def open_chunks():
+        # send_file (fichiers sur disque) exige un contexte de requête
+        with current_app.test_request_context():
+            response = _serve_class_file_candidate(kind, obj)
+        if response is None:
+            return None
+        response.direct_passthrough = False
+        return response.iter_encoded()
+
+    return generate_previews(source_key(kind, obj), version, open_chunks)
+
+
 @file_manager_bp.route('/cleanup-all-files', methods=['POST'])
 @login_required
 def cleanup_all_files():
@@ -2755,11 +3047,11 @@ def api_move_item():
         if target_id == folder.id:
             return jsonify({'success': False, 'error': 'Impossible de déplacer un dossier dans lui-même'}), 400
         # Empêcher un cycle : interdire le déplacement dans un de ses descendants
-        cursor = target
-        while cursor is not None:
-            if cursor.id == folder.id:
+        # (ancêtres de la cible en une requête, CTE récursive)
+        if target is not None:
+            from services.folder_tree import is_descendant
+            if is_descendant(target.id, folder.id):
                 return jsonify({'success': False, 'error': 'Impossible de déplacer un dossier dans un de ses sous-dossiers'}), 400
-            cursor = FileFolder.query.filter_by(id=cursor.parent_id, user_id=current_user.id).first() if cursor.parent_id else None
         folder.parent_id = target_id
     else:
         return jsonify({'success': False, 'error': 'Type invalide'}), 400
@@ -29,6 +29,7 @@ from flask import Blueprint, request, jsonify, current_app
 from flask_login import login_required, current_user
 
 from extensions import db
+from services.premium_status import invalidate_premium
 from utils.apple_iap import (
     verify_signed_jws,
     process_transaction_for_user,
@@ -255,6 +256,7 @@ def app_store_notifications():
                 user.premium_until = None
 
         db.session.commit()
+        invalidate_premium(user.id)
     except Exception as e:
         db.session.rollback()
         logger.exception("[IAP notif] erreur traitement")
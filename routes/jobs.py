@@ -0,0 +1,41 @@
+"""API de suivi des tâches de fond (services/job_runner.py)."""
+from flask import Blueprint, jsonify
+from flask_login import login_required, current_user
+
+from extensions import db
+from models.background_job import BackgroundJob
+from models.user import User
+from routes import admin_required
+
+jobs_bp = Blueprint('jobs', __name__, url_prefix='/api/jobs')
+
+
+@jobs_bp.route('/<int:job_id>', methods=['GET'])
+@login_required
+def job_status(job_id):
+    """Statut d'une tâche de l'enseignant (ou de n'importe qui pour un admin).
+    Parents et élèves sont aussi connectés par Flask-Login : leurs ids
+    recouvrent ceux des enseignants, d'où le contrôle du type."""
+    if not isinstance(current_user, User):
+        return jsonify({'success': False, 'message': 'Tâche introuvable'}), 404
+    job = db.session.get(BackgroundJob, job_id)
+    if job is None or (job.user_id != current_user.id and not current_user.is_admin):
+        return jsonify({'success': False, 'message': 'Tâche introuvable'}), 404
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+
+@jobs_bp.route('/stats', methods=['GET'])
+@admin_required
+def job_stats():
+    """Tâches par file et par statut, tâches périodiques (admin)."""
+    from services.job_runner import queue_stats
+    return jsonify({'success': True, **queue_stats()})
+
+
+@jobs_bp.route('/failed', methods=['GET'])
+@admin_required
+def failed_jobs():
+    """50 dernières tâches en échec (admin)."""
+    jobs = BackgroundJob.query.filter_by(status='failed').order_by(
+        BackgroundJob.finished_at.desc()).limit(50).all()
+    return jsonify({'success': True, 'jobs': [job.to_dict() for job in jobs]})
@@ -1,16 +1,12 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session, abort
 from flask_login import login_user, logout_user, login_required, current_user
 from extensions import db
 from models.parent import Parent, ParentChild, ClassCode
 from models.user import User
-from models.classroom import Classroom
 from models.student import Student
-from models.attendance import Attendance
-from models.student_sanctions import StudentSanctionCount
-from models.sanctions import StudentSanctionRecord, SanctionTemplate
-from models.evaluation import Evaluation, EvaluationGrade
 from models.email_verification import EmailVerification
 from services.email_service import send_verification_code
+from services.student_report import get_linked_reports, get_student_reports
 from datetime import datetime, date, timedelta
 import re
 import os
@@ -48,35 +44,6 @@ def check_parent_email_verified():
             return redirect(url_for('parent_auth.verify_email'))
     return None
 
-def get_all_linked_students(original_student_id):
-    """Récupérer tous les élèves liés (original + copies dans les classes dérivées)"""
-    from models.class_collaboration import SharedClassroom, StudentClassroomLink
-    
-    # Récupérer l'élève original
-    original_student = Student.query.get(original_student_id)
-    if not original_student:
-        return []
-    
-    linked_students = [original_student]
-    
-    # Chercher les classes dérivées qui ont été créées à partir de la classe de cet élève
-    shared_classrooms = SharedClassroom.query.filter_by(
-        original_classroom_id=original_student.classroom_id
-    ).all()
-    
-    for shared_classroom in shared_classrooms:
-        # Chercher l'élève correspondant dans la classe dérivée
-        derived_student = Student.query.filter_by(
-            classroom_id=shared_classroom.derived_classroom_id,
-            first_name=original_student.first_name,
-            last_name=original_student.last_name
-        ).first()
-        
-        if derived_student:
-            linked_students.append(derived_student)
-    
-    return linked_students
-
 # Décorateur pour vérifier que c'est bien un parent qui est connecté
 def parent_required(f):
     @wraps(f)
@@ -532,20 +499,16 @@ def dashboard():
         parent_id=current_user.id
     ).order_by(AbsenceJustification.created_at.desc()).limit(10).all()
 
-    # Récupérer les remarques envoyées aux parents
-    from models.lesson_memo import StudentRemark
-    student_ids = [child.id for child, _ in children]
-    remarks = StudentRemark.query.filter(
-        StudentRemark.student_id.in_(student_ids),
-        StudentRemark.send_to_parent_and_student == True
-    ).order_by(StudentRemark.created_at.desc()).limit(20).all()
+    # Remarques envoyées aux parents (rapports des enfants)
+    reports = get_student_reports([child.id for child, _ in children])
+    all_remarks = sorted(
+        (remark for report in reports.values() for remark in report.remarks),
+        key=lambda r: r.created_at or datetime.min, reverse=True
+    )
+    remarks = all_remarks[:20]
 
     # Compter les remarques non lues
-    unread_remarks_count = StudentRemark.query.filter(
-        StudentRemark.student_id.in_(student_ids),
-        StudentRemark.send_to_parent_and_student == True,
-        StudentRemark.is_viewed_by_parent == False
-    ).count()
+    unread_remarks_count = sum(1 for remark in all_remarks if not remark.is_viewed_by_parent)
 
     # Annonces de classe (diffusées par les enseignants aux parents)
     from models.announcement import Announcement
@@ -585,17 +548,17 @@ def get_student_attendance(student_id):
     if not parent_child:
         return jsonify({'error': 'Accès non autorisé'}), 403
     
-    student = Student.query.get_or_404(student_id)
+    # Rapports de l'élève et de ses copies dans les classes dérivées
+    reports = get_linked_reports(student_id)
+    if not reports:
+        abort(404)
+    student = reports[0]
     
-    # Récupérer tous les élèves liés (original + copies dans les classes dérivées)
-    linked_students = get_all_linked_students(student_id)
-    linked_student_ids = [s.id for s in linked_students]
-    
-    # Récupérer uniquement les absences et retards de TOUS les élèves liés
-    attendances = Attendance.query.filter(Attendance.student_id.in_(linked_student_ids))\
-        .filter(Attendance.status.in_(['absent', 'late']))\
-        .order_by(Attendance.date.desc(), Attendance.period_number)\
-        .limit(100).all()  # Augmenter la limite car on a plus de données
+    # Absences et retards de TOUS les élèves liés, les 100 plus récents
+    attendances = sorted(
+        (attendance for report in reports for attendance in report.attendance),
+        key=lambda a: (-a.date.toordinal(), a.period_number)
+    )[:100]
     
     # Grouper par date
     attendance_by_date = {}
@@ -608,10 +571,6 @@ def get_student_attendance(student_id):
                 'general_note': ''
             }
         
-        # Récupérer le nom de la classe/matière
-        classroom_name = attendance.classroom.name if attendance.classroom else 'Classe inconnue'
-        subject = attendance.classroom.subject if attendance.classroom else ''
-        
         # Ajouter la période avec info de la classe
         attendance_by_date[date_key]['periods'].append({
             'period': str(attendance.period_number),
@@ -619,18 +578,16 @@ def get_student_attendance(student_id):
             'arrival_time': None,  # Le modèle n'a pas ce champ spécifique
             'note': attendance.comment or '',
             'late_minutes': attendance.late_minutes if attendance.status == 'late' else None,
-            'classroom': classroom_name,
-            'subject': subject
+            'classroom': attendance.classroom_name or 'Classe inconnue',
+            'subject': attendance.subject or ''
         })
         
         # Ajouter le commentaire général si il y en a un et qu'il n'est pas déjà ajouté
         if attendance.comment and not attendance_by_date[date_key]['general_note']:
             attendance_by_date[date_key]['general_note'] = attendance.comment
     
-    # Convertir en liste et trier par date (plus récent en premier)
-    from datetime import datetime as dt
+    # Dates déjà dans l'ordre (plus récent en premier)
     attendance_data = list(attendance_by_date.values())
-    attendance_data.sort(key=lambda x: dt.strptime(x['date'], '%d/%m/%Y'), reverse=True)
     
     return jsonify({
         'student_name': f"{student.first_name} {student.last_name}",
@@ -650,33 +607,29 @@ def get_student_grades(student_id):
     if not parent_child:
         return jsonify({'error': 'Accès non autorisé'}), 403
     
-    student = Student.query.get_or_404(student_id)
+    # Rapports de l'élève et de ses copies dans les classes dérivées
+    reports = get_linked_reports(student_id)
+    if not reports:
+        abort(404)
+    student = reports[0]
     
-    # Récupérer tous les élèves liés (original + copies dans les classes dérivées)
-    linked_students = get_all_linked_students(student_id)
-    linked_student_ids = [s.id for s in linked_students]
-    
-    # Récupérer toutes les notes de TOUS les élèves liés avec les évaluations et classes
-    grades_query = db.session.query(EvaluationGrade, Evaluation, Classroom).join(
-        Evaluation, EvaluationGrade.evaluation_id == Evaluation.id
-    ).join(
-        Classroom, Evaluation.classroom_id == Classroom.id
-    ).filter(
-        EvaluationGrade.student_id.in_(linked_student_ids),
-        EvaluationGrade.points.isnot(None)  # Seulement les notes attribuées
-    ).order_by(Classroom.subject, Evaluation.date).all()
+    # Notes attribuées de TOUS les élèves liés, par discipline puis par date
+    grades = sorted(
+        (grade for report in reports for grade in report.grades if grade.points is not None),
+        key=lambda g: (g.subject, g.date)
+    )
     
     # Organiser les données pour un tableau unique avec toutes les disciplines
     subjects_data = {}
-    all_evaluations = []  # Pour tracker toutes les évaluations uniques
+    all_evaluations = {}  # Évaluations uniques, par id
     
-    for grade, evaluation, classroom in grades_query:
-        subject = classroom.subject
+    for grade in grades:
+        subject = grade.subject
         
         if subject not in subjects_data:
             subjects_data[subject] = {
                 'subject_name': subject,
-                'classroom_name': classroom.name,
+                'classroom_name': grade.classroom_name,
                 'grades': {},  # grades par evaluation_id
                 'total_significatif': 0,
                 'count_significatif': 0,
@@ -684,32 +637,31 @@ def get_student_grades(student_id):
                 'count_ta': 0
             }
         
-        # Ajouter l'évaluation à la liste globale si elle n'existe pas
-        if not any(e['id'] == evaluation.id for e in all_evaluations):
-            all_evaluations.append({
-                'id': evaluation.id,
-                'title': evaluation.title,
-                'type': evaluation.type,
-                'ta_group_name': evaluation.ta_group_name,
-                'date': evaluation.date,
+        if grade.evaluation_id not in all_evaluations:
+            all_evaluations[grade.evaluation_id] = {
+                'id': grade.evaluation_id,
+                'title': grade.title,
+                'type': grade.type,
+                'ta_group_name': grade.ta_group_name,
+                'date': grade.date,
                 'subject': subject,
-                'classroom_name': classroom.name
-            })
+                'classroom_name': grade.classroom_name
+            }
         
         # Ajouter la note de l'élève pour cette évaluation
-        subjects_data[subject]['grades'][evaluation.id] = round(grade.get_note_swiss(), 2) if grade.get_note_swiss() else None
+        subjects_data[subject]['grades'][grade.evaluation_id] = round(grade.points, 2) if grade.points else None
         
         # Calculer pour les moyennes
-        if grade.get_note_swiss():
-            if evaluation.type == 'significatif':
-                subjects_data[subject]['total_significatif'] += grade.get_note_swiss()
+        if grade.points:
+            if grade.type == 'significatif':
+                subjects_data[subject]['total_significatif'] += grade.points
                 subjects_data[subject]['count_significatif'] += 1
-            elif evaluation.type == 'ta':
-                subjects_data[subject]['total_ta'] += grade.get_note_swiss()
+            elif grade.type == 'ta':
+                subjects_data[subject]['total_ta'] += grade.points
                 subjects_data[subject]['count_ta'] += 1
     
     # Trier les évaluations par date
-    all_evaluations.sort(key=lambda x: x['date'])
+    all_evaluations = sorted(all_evaluations.values(), key=lambda x: x['date'])
     
     # Calculer les moyennes pour chaque discipline
     for subject, data in subjects_data.items():
@@ -755,61 +707,44 @@ def get_student_sanctions(student_id):
         if not parent_child:
             return jsonify({'error': 'Accès non autorisé'}), 403
         
-        student = Student.query.get_or_404(student_id)
+        # Rapports de l'élève et de ses copies dans les classes dérivées
+        reports = get_linked_reports(student_id)
+        if not reports:
+            return jsonify({'error': 'Élève introuvable'}), 404
+        student = reports[0]
         
-        # Récupérer tous les élèves liés (original + copies dans les classes dérivées)
-        linked_students = get_all_linked_students(student_id)
-        linked_student_ids = [s.id for s in linked_students]
+        # Compteurs de coches de l'élève, par modèle
+        check_counts = {sanction.template_id: sanction.count for sanction in student.sanctions}
         
-        # Récupérer les compteurs de coches pour TOUS les élèves liés
-        sanction_counts = StudentSanctionCount.query.filter(
-            StudentSanctionCount.student_id.in_(linked_student_ids)
-        ).filter(
-            StudentSanctionCount.check_count > 0
-        ).all()
-        
-        # Organiser par discipline - Obtenir toutes les classes de TOUS les élèves liés
-        student_classrooms = Classroom.query.join(Student).filter(Student.id.in_(linked_student_ids)).all()
+        # Organiser par discipline : les classes de TOUS les élèves liés
+        classrooms = {}
+        for report in reports:
+            if report.classroom_id is not None:
+                classrooms.setdefault(report.classroom_id, report)
         
         sanctions_by_subject = {}
         total_checks = 0
         
-        for classroom in student_classrooms:
-            subject = classroom.subject
-            
-            # Récupérer les templates de sanctions actifs pour cette classe
-            from models.sanctions import ClassroomSanctionImport
-            classroom_imports = ClassroomSanctionImport.query.filter_by(
-                classroom_id=classroom.id,
-                is_active=True
-            ).all()
+        for classroom_id in sorted(classrooms):
+            report = classrooms[classroom_id]
+            subject = report.subject
             
             if subject not in sanctions_by_subject:
                 sanctions_by_subject[subject] = {
                     'subject_name': subject,
-                    'classroom_name': classroom.name,
+                    'classroom_name': report.classroom_name,
                     'total_checks': 0,
                     'templates': []
                 }
             
-            # Pour chaque template de cette classe, vérifier s'il y a des coches pour cet élève
-            for import_link in classroom_imports:
-                template = SanctionTemplate.query.get(import_link.template_id)
-                if not template:
-                    continue
-                
-                # Chercher le compteur de coches pour cet élève et ce template
-                student_count = StudentSanctionCount.query.filter_by(
-                    student_id=student_id,
-                    template_id=template.id
-                ).first()
-                
-                check_count = student_count.check_count if student_count else 0
+            # Pour chaque modèle importé dans cette classe, les coches de l'élève
+            for template in report.sanction_imports:
+                check_count = check_counts.get(template.template_id, 0)
                 
                 sanctions_by_subject[subject]['templates'].append({
                     'template_name': template.name,
                     'check_count': check_count,
-                    'template_id': template.id
+                    'template_id': template.template_id
                 })
                 
                 if check_count > 0:
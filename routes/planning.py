@@ -14,6 +14,7 @@ from routes import teacher_required
 import secrets
 import string
 from models.classroom_access_code import ClassroomAccessCode
+from services.access_control import user_can_access_student
 import re
 
 planning_bp = Blueprint('planning', __name__, url_prefix='/planning')
@@ -139,128 +140,6 @@ def can_add_student_to_class(classroom_id, current_user):
     print("DEBUG can_add_student_to_class - Access denied")
     return False, "Accès non autorisé", None
 
-def user_can_access_classroom(user_id, classroom_id):
-    """Vérifie si un utilisateur peut accéder à une classe (directement ou via collaboration)"""
-    try:
-        classroom_id = int(classroom_id)
-    except (TypeError, ValueError):
-        return False
-
-    classroom = Classroom.query.filter_by(id=classroom_id).first()
-    if not classroom:
-        print(f"DEBUG user_can_access_classroom: classroom {classroom_id} not found")
-        return False
-    
-    print(f"DEBUG user_can_access_classroom: classroom owner is user {classroom.user_id}")
-    
-    # 1. Vérifier si c'est sa propre classe
-    if classroom.user_id == user_id:
-        print(f"DEBUG user_can_access_classroom: user {user_id} owns classroom {classroom_id}")
-        return True
-    
-    # 2. Vérifier si c'est une classe dérivée et l'utilisateur est maître de classe
-    from models.class_collaboration import SharedClassroom, ClassMaster, TeacherCollaboration
-    shared_classroom = SharedClassroom.query.filter_by(derived_classroom_id=classroom_id).first()
-    
-    print(f"DEBUG user_can_access_classroom: shared_classroom found: {shared_classroom is not None}")
-    
-    if shared_classroom:
-        # Vérifier si l'utilisateur actuel est maître de la classe originale
-        class_master = ClassMaster.query.filter_by(
-            classroom_id=shared_classroom.original_classroom_id,
-            master_teacher_id=user_id
-        ).first()
-        
-        print(f"DEBUG user_can_access_classroom: class_master found: {class_master is not None}")
-        
-        if class_master:
-            print(f"DEBUG user_can_access_classroom: user {user_id} is master of original classroom")
-            return True
-    
-    # 3. Vérifier si l'utilisateur est enseignant spécialisé avec accès à cette classe originale
-    # Chercher si l'utilisateur a une collaboration active donnant accès à la classe originale de classroom_id
-    collaborations = TeacherCollaboration.query.filter_by(
-        specialized_teacher_id=user_id,
-        is_active=True
-    ).all()
-    
-    print(f"DEBUG user_can_access_classroom: found {len(collaborations)} active collaborations for specialized teacher {user_id}")
-    
-    for collaboration in collaborations:
-        shared_classrooms = SharedClassroom.query.filter_by(
-            collaboration_id=collaboration.id
-        ).all()
-        
-        for shared_classroom in shared_classrooms:
-            print(f"DEBUG user_can_access_classroom: checking shared classroom - original: {shared_classroom.original_classroom_id}, derived: {shared_classroom.derived_classroom_id}")
-            if shared_classroom.original_classroom_id == classroom_id:
-                print(f"DEBUG user_can_access_classroom: specialized teacher {user_id} has access to original classroom {classroom_id}")
-                return True
-    
-    # 4. Vérifier si l'utilisateur est maître et cette classe appartient à un enseignant spécialisé dans son groupe
-    master_classes = ClassMaster.query.filter_by(master_teacher_id=user_id).all()
-    
-    print(f"DEBUG user_can_access_classroom: user {user_id} is master of {len(master_classes)} classes")
-    
-    for master_class in master_classes:
-        # Vérifier s'il y a des classes dérivées pour ce maître
-        collaborations = TeacherCollaboration.query.filter_by(
-            master_teacher_id=user_id,
-            is_active=True
-        ).all()
-        
-        for collaboration in collaborations:
-            shared_classrooms = SharedClassroom.query.filter_by(
-                collaboration_id=collaboration.id,
-                derived_classroom_id=classroom_id
-            ).all()
-            
-            if shared_classrooms:
-                print(f"DEBUG user_can_access_classroom: master {user_id} has access to derived classroom {classroom_id}")
-                return True
-    
-    print(f"DEBUG user_can_access_classroom: user {user_id} has NO access to classroom {classroom_id}")
-    return False
-
-def user_can_access_student(user_id, student_id):
-    """Vérifie si un utilisateur peut accéder à un élève (directement ou via collaboration)"""
-    from models.student import Student
-    
-    print(f"DEBUG: user_can_access_student called with user_id={user_id}, student_id={student_id}")
-    
-    # 1. Vérifier si l'élève appartient directement à une classe de l'utilisateur
-    student = Student.query.filter_by(id=student_id, user_id=user_id).first()
-    if student:
-        print(f"DEBUG: Student {student_id} found directly owned by user {user_id}")
-        return student
-    
-    # 2. Vérifier si l'utilisateur peut accéder à l'élève via une collaboration
-    from models.class_collaboration import SharedClassroom, TeacherCollaboration, ClassMaster
-    
-    # Trouver l'élève (peu importe le propriétaire)
-    student = Student.query.filter_by(id=student_id).first()
-    if not student:
-        print(f"DEBUG: Student {student_id} not found at all")
-        return None
-    
-    print(f"DEBUG: Student {student_id} found, belongs to classroom {student.classroom_id}, owned by user {student.user_id}")
-    
-    # Vérifier si l'utilisateur actuel a accès à la classe de cet élève via collaboration
-    print(f"DEBUG: About to check user_can_access_classroom({user_id}, {student.classroom_id})")
-    try:
-        has_access = user_can_access_classroom(user_id, student.classroom_id)
-        print(f"DEBUG: user_can_access_classroom returned: {has_access}")
-        if has_access:
-            print(f"DEBUG: User {user_id} has access to classroom {student.classroom_id} via collaboration")
-            return student
-    except Exception as e:
-        print(f"DEBUG: ERROR in user_can_access_classroom: {e}")
-        import traceback
-        traceback.print_exc()
-    
-    print(f"DEBUG: User {user_id} does NOT have access to student {student_id}")
-    return None
-
 @planning_bp.route('/api/day/<date_str>')
 @login_required
 def get_day_plannings(date_str):
@@ -380,9 +259,12 @@ def get_week_dates(week_date):
 
     return week_dates
 
-def is_holiday(date_to_check, user):
-    """Vérifie si une date est pendant les vacances et retourne le nom si c'est le cas"""
-    for holiday in user.holidays.all():
+def is_holiday(date_to_check, user, holidays=None):
+    """Vérifie si une date est pendant les vacances et retourne le nom si c'est le cas.
+    holidays : vacances déjà chargées (évite une requête par date dans les boucles)"""
+    if holidays is None:
+        holidays = user.holidays.all()
+    for holiday in holidays:
         if holiday.start_date <= date_to_check <= holiday.end_date:
             return holiday.name
     return None
@@ -1035,9 +917,10 @@ def calendar_view():
 
     # Vérifier si les dates sont en vacances et récupérer les noms
     holidays_info = {}
+    user_holidays = current_user.holidays.all()
     for date in week_dates:
         date_str = date.strftime('%Y-%m-%d')
-        holiday_name = is_holiday(date, current_user)
+        holiday_name = is_holiday(date, current_user, user_holidays)
         holidays_info[date_str] = {
             'is_holiday': holiday_name is not None,
             'name': holiday_name
@@ -1497,19 +1380,33 @@ def check_day_planning(date, classroom_id):
             'message': str(e)
         })
 
-def get_decoupage_for_week(classroom_id, week_number):
+def load_class_decoupage(classroom_id):
+    """Charge l'assignation de découpage d'une classe et ses périodes.
+    Returns: (assignment, periods), ou (None, []) sans découpage"""
+    from models.decoupage import DecoupageAssignment, DecoupagePeriod
+
+    # Trouver l'assignation de découpage pour cette classe
+    assignment = DecoupageAssignment.query.filter_by(classroom_id=classroom_id).first()
+    if not assignment:
+        return None, []
+
+    periods = DecoupagePeriod.query.filter_by(
+        decoupage_id=assignment.decoupage.id
+    ).order_by(DecoupagePeriod.order).all()
+    return assignment, periods
+
+def get_decoupage_for_week(classroom_id, week_number, class_decoupage=None):
     """
     Récupère les informations de découpage pour une semaine donnée d'une classe.
     Gère les demi-semaines: retourne un dict avec first_half et second_half.
     Chaque moitié peut avoir un thème différent ou être None.
+    class_decoupage : résultat de load_class_decoupage, pour ne pas le
+    recharger à chaque semaine (calendrier annuel).
     """
-    from models.decoupage import DecoupageAssignment, DecoupagePeriod
-
     if not classroom_id or not week_number:
         return None
 
-    # Trouver l'assignation de découpage pour cette classe
-    assignment = DecoupageAssignment.query.filter_by(classroom_id=classroom_id).first()
+    assignment, periods = class_decoupage or load_class_decoupage(classroom_id)
 
     if not assignment:
         return None
@@ -1518,10 +1415,6 @@ def get_decoupage_for_week(classroom_id, week_number):
     start_week = assignment.start_week
 
     # Calculer quelle période correspond à cette semaine
-    periods = DecoupagePeriod.query.filter_by(
-        decoupage_id=decoupage.id
-    ).order_by(DecoupagePeriod.order).all()
-
     if not periods:
         return None
 
@@ -1614,19 +1507,33 @@ def generate_annual_calendar(item, item_type='classroom'):
     # Récupérer toutes les vacances
     holidays = current_user.holidays.all()
 
-    # Récupérer tous les plannings pour cette classe ou ce groupe mixte
+    # Récupérer tous les plannings et l'horaire type pour cette classe ou ce groupe mixte
     if item_type == 'mixed_group':
         all_plannings = Planning.query.filter_by(
             user_id=current_user.id,
             mixed_group_id=item.id
         ).all()
+        schedules = Schedule.query.filter_by(
+            user_id=current_user.id,
+            mixed_group_id=item.id
+        )
         print(f"👥 Found {len(all_plannings)} plannings for mixed group {item.id}")
     else:
         all_plannings = Planning.query.filter_by(
             user_id=current_user.id,
             classroom_id=item.id
         ).all()
+        schedules = Schedule.query.filter_by(
+            user_id=current_user.id,
+            classroom_id=item.id
+        )
         print(f"📚 Found {len(all_plannings)} plannings for classroom {item.id}")
+
+    # Jours de la semaine où l'horaire type prévoit un cours
+    scheduled_weekdays = {weekday for (weekday,) in schedules.with_entities(Schedule.weekday).distinct()}
+
+    # Découpage de la classe, chargé une fois pour toutes les semaines
+    class_decoupage = load_class_decoupage(item.id) if item_type == 'classroom' else None
     
     # Debug: afficher les plannings trouvés
     for planning in all_plannings:
@@ -1679,7 +1586,7 @@ def generate_annual_calendar(item, item_type='classroom'):
         # Récupérer le ruban de découpage pour cette semaine (uniquement pour les classrooms)
         decoupage_ribbon = None
         if item_type == 'classroom' and week_number and not week_holiday:
-            decoupage_ribbon = get_decoupage_for_week(item.id, week_number)
+            decoupage_ribbon = get_decoupage_for_week(item.id, week_number, class_decoupage)
 
         week_info = {
             'start_date': week_dates[0],
@@ -1701,7 +1608,7 @@ def generate_annual_calendar(item, item_type='classroom'):
             date_str = date_to_check.strftime('%Y-%m-%d')
 
             # Vérifier si c'est un jour de vacances
-            holiday_name = is_holiday(date_to_check, current_user)
+            holiday_name = is_holiday(date_to_check, current_user, holidays)
             if holiday_name:
                 week_info['holidays_by_day'][i] = holiday_name
 
@@ -1709,19 +1616,7 @@ def generate_annual_calendar(item, item_type='classroom'):
                 continue
 
             # Vérifier dans l'horaire type si cette classe/groupe mixte a cours ce jour
-            weekday = i
-            if item_type == 'mixed_group':
-                has_schedule = Schedule.query.filter_by(
-                    user_id=current_user.id,
-                    mixed_group_id=item.id,
-                    weekday=weekday
-                ).first() is not None
-            else:
-                has_schedule = Schedule.query.filter_by(
-                    user_id=current_user.id,
-                    classroom_id=item.id,
-                    weekday=weekday
-                ).first() is not None
+            has_schedule = i in scheduled_weekdays
 
             # Vérifier s'il y a des planifications spécifiques pour ce jour
             has_planning = date_str in plannings_by_date
@@ -4073,9 +3968,12 @@ def import_students():
 
     JSON attendu : {classroom_id, csv_text, dry_run}
     - dry_run=true  : parse + contrôle les doublons, ne crée rien (aperçu).
-    - dry_run=false : crée les élèves (ORM -> chiffrement + email_hash automatiques).
+    - dry_run=false : crée les élèves en lot (services/student_import : un
+      INSERT multi-lignes par paquet, chiffrement et email_hash compris).
     """
-    from models.student import Student
+    from services.student_import import (
+        MAX_IMPORT_ROWS, bulk_insert_students, existing_name_keys, plan_import,
+    )
 
     data = request.get_json()
     if not data:
@@ -4102,29 +4000,14 @@ def import_students():
     rows, errors, meta = _parse_students_csv(data.get('csv_text', ''),
                                              col_map=data.get('col_map'))
 
-    if len(rows) > 200:
+    if len(rows) > MAX_IMPORT_ROWS:
         return jsonify({'success': False,
-                        'message': f'Trop de lignes ({len(rows)}). Maximum 200 élèves par import.'}), 400
+                        'message': f'Trop de lignes ({len(rows)}). Maximum {MAX_IMPORT_ROWS} élèves par import.'}), 400
 
     # Doublons : dans la classe existante et à l'intérieur du fichier lui-même.
-    # Les noms sont chiffrés en base (non requêtables) -> comparaison en Python.
-    existing = {(s.first_name.strip().lower(), (s.last_name or '').strip().lower())
-                for s in Student.query.filter_by(classroom_id=classroom_id).all()}
-    seen = set()
-    to_create, skipped = [], []
-    for r in rows:
-        key = (r['first_name'].lower(), (r['last_name'] or '').lower())
-        if key in existing:
-            skipped.append({'line': r['line'],
-                            'name': f"{r['first_name']} {r['last_name']}".strip(),
-                            'reason': 'Existe déjà dans la classe'})
-        elif key in seen:
-            skipped.append({'line': r['line'],
-                            'name': f"{r['first_name']} {r['last_name']}".strip(),
-                            'reason': 'Doublon dans le fichier'})
-        else:
-            seen.add(key)
-            to_create.append(r)
+    # Les noms sont chiffrés en base (non requêtables) -> comparaison en Python,
+    # sur le prénom et le nom seulement.
+    to_create, skipped = plan_import(rows, existing_name_keys(classroom_id))
 
     preview = [{'line': r['line'], 'first_name': r['first_name'], 'last_name': r['last_name'],
                 'email': r['email'], 'parent_email_mother': r['parent_email_mother'],
@@ -4136,18 +4019,9 @@ def import_students():
                         'skipped': skipped, 'errors': errors, 'meta': meta})
 
     try:
-        for r in to_create:
-            db.session.add(Student(
-                classroom_id=classroom_id,
-                user_id=current_user.id,
-                first_name=r['first_name'],
-                last_name=r['last_name'],
-                email=r['email'],
-                parent_email_mother=r['parent_email_mother'],
-                parent_email_father=r['parent_email_father'],
-            ))
+        created = bulk_insert_students(to_create, classroom_id, current_user.id)
         db.session.commit()
-        return jsonify({'success': True, 'dry_run': False, 'created': len(to_create),
+        return jsonify({'success': True, 'dry_run': False, 'created': created,
                         'skipped': skipped, 'errors': errors})
     except Exception as e:
         db.session.rollback()
@@ -4681,29 +4555,13 @@ def update_attendance():
 @login_required
 def get_attendance_stats(date, period):
     """Obtenir les statistiques de présence pour un cours"""
-    from models.attendance import Attendance
-
     try:
         # Convertir la date
         course_date = datetime.strptime(date, '%Y-%m-%d').date()
 
-        # Récupérer toutes les présences pour ce cours
-        attendances = Attendance.query.filter_by(
-            user_id=current_user.id,
-            date=course_date,
-            period_number=period
-        ).all()
-
-        stats = {
-            'present': 0,
-            'absent': 0,
-            'late': 0,
-            'total': 0
-        }
-
-        for attendance in attendances:
-            stats['total'] += 1
-            stats[attendance.status] += 1
+        # Comptage des présences de ce cours (GROUP BY status)
+        from services.attendance_stats import lesson_status_counts
+        stats = lesson_status_counts(current_user.id, course_date, period)
 
         return jsonify({
             'success': True,
@@ -4912,7 +4770,7 @@ def save_file_annotations():
         file_id = int(file_id)
 
         # Vérifier que le fichier appartient à l'utilisateur (fichier de classe)
-        from models.file_manager import UserFile, FileAnnotation
+        from models.file_manager import UserFile
         from models.student import LegacyClassFile as ClassFile
 
         # D'abord chercher dans user_files
@@ -4932,26 +4790,12 @@ def save_file_annotations():
         if not file_found:
             return jsonify({'success': False, 'message': 'Fichier non trouvé'}), 404
         
-        print(f"[DEBUG] Fichier validé, suppression des anciennes annotations...")
-        
-        # Supprimer les anciennes annotations
-        deleted_count = FileAnnotation.query.filter_by(
-            file_id=file_id,
-            user_id=current_user.id
-        ).delete()
-        
-        print(f"[DEBUG] {deleted_count} anciennes annotations supprimées")
-        
-        # Sauvegarder les nouvelles annotations
-        if annotations:
-            print(f"[DEBUG] Création de nouvelles annotations...")
-            new_annotation = FileAnnotation(
-                file_id=file_id,
-                user_id=current_user.id,
-                annotations_data=annotations
-            )
-            db.session.add(new_annotation)
-            print(f"[DEBUG] Nouvelles annotations ajoutées à la session")
+        # Stockage par page (services/annotation_store.py) : seules les pages
+        # modifiées sont réécrites, l'en-tête (pages custom) est conservé
+        from services.annotation_store import get_annotation, save_document
+        annotation = get_annotation(file_id, None, current_user.id, create=bool(annotations))
+        if annotation is not None:
+            save_document(annotation, annotations)
         
         db.session.commit()
         print(f"[DEBUG] === FIN save_file_annotations - SUCCESS ===")
@@ -4969,10 +4813,9 @@ def save_file_annotations():
 @login_required
 def check_sanction_thresholds():
     """Vérifier les seuils de sanctions franchis pendant la période"""
-    from models.sanctions import SanctionTemplate, SanctionThreshold, SanctionOption, ClassroomSanctionImport
-    from models.student_sanctions import StudentSanctionCount
+    from models.sanctions import SanctionTemplate, ClassroomSanctionImport
     from models.student import Student
-    import random
+    from services.sanction_thresholds import class_threshold_breaches
     
     data = request.get_json()
     if not data:
@@ -5025,39 +4868,8 @@ def check_sanction_thresholds():
         # Récupérer les élèves de la classe
         students = Student.query.filter_by(classroom_id=classroom_id).all()
         
-        threshold_breaches = []
-        
-        for student in students:
-            for sanction_template in imported_sanctions:
-                # Récupérer le compteur actuel
-                current_count = StudentSanctionCount.query.filter_by(
-                    student_id=student.id,
-                    template_id=sanction_template.id
-                ).first()
-                
-                current_value = current_count.check_count if current_count else 0
-                initial_value = int(initial_counts.get(f"{student.id}_{sanction_template.id}", 0))
-                
-                # Vérifier quels seuils ont été franchis pendant cette période
-                thresholds = sanction_template.thresholds.order_by(SanctionThreshold.check_count).all()
-                
-                for threshold in thresholds:
-                    # Seuil franchi si: initial < seuil <= current
-                    if initial_value < threshold.check_count <= current_value:
-                        # Tirer au sort une sanction pour ce seuil
-                        available_options = threshold.sanctions.filter_by(is_active=True).all()
-                        if available_options:
-                            selected_option = random.choice(available_options)
-                            
-                            threshold_breaches.append({
-                                'student_id': student.id,
-                                'student_name': student.full_name,
-                                'sanction_template': sanction_template.name,
-                                'threshold': threshold.check_count,
-                                'sanction_text': selected_option.description,
-                                'min_days_deadline': selected_option.min_days_deadline,
-                                'option_id': selected_option.id
-                            })
+        # Compteurs, seuils et options chargés en bloc, tirage au sort en mémoire
+        threshold_breaches = class_threshold_breaches(students, imported_sanctions, initial_counts)
         
         return jsonify({
             'success': True,
@@ -5208,7 +5020,7 @@ def get_file_annotations(file_id):
         print(f"[DEBUG] === DEBUT get_file_annotations file_id={file_id} ===")
         
         # Vérifier que le fichier appartient à l'utilisateur
-        from models.file_manager import UserFile, FileAnnotation
+        from models.file_manager import UserFile
         from models.student import LegacyClassFile as ClassFile
         
         # D'abord chercher dans user_files
@@ -5230,13 +5042,11 @@ def get_file_annotations(file_id):
         
         print(f"[DEBUG] Recherche des annotations...")
         
-        # Récupérer les annotations
-        annotation = FileAnnotation.query.filter_by(
-            file_id=file_id,
-            user_id=current_user.id
-        ).first()
-        
-        annotations = annotation.annotations_data if annotation else []
+        # Récupérer les annotations : document {pageId: [...]} reconstruit
+        # depuis les lignes par page (services/annotation_store.py)
+        from services.annotation_store import get_annotation, load_document
+        annotations = load_document(get_annotation(file_id, None, current_user.id))
+        db.session.commit()  # éclatement éventuel d'un ancien blob
         
         print(f"[DEBUG] {len(annotations)} annotations trouvées")
         print(f"[DEBUG] === FIN get_file_annotations - SUCCESS ===")
@@ -6633,84 +6443,72 @@ def get_student_report_info(student_id):
         traceback.print_exc()
         return jsonify({'success': False, 'message': str(e)}), 500
 
+def _is_class_master_of(student):
+    """L'utilisateur courant est-il maître de la classe de l'élève ?"""
+    from models.class_collaboration import ClassMaster
+    return ClassMaster.query.filter_by(
+        classroom_id=student.classroom_id,
+        master_teacher_id=current_user.id
+    ).first() is not None
+
+def _is_centralized_sanction_mode(student):
+    """Le maître de la classe de l'élève gère-t-il les coches en mode centralisé ?"""
+    from models.class_collaboration import ClassMaster
+    from models.user_preferences import UserSanctionPreferences
+    class_master = ClassMaster.query.filter_by(classroom_id=student.classroom_id).first()
+    if not class_master:
+        return False
+    master_prefs = UserSanctionPreferences.get_or_create_for_user_classroom(
+        class_master.master_teacher_id, student.classroom_id
+    )
+    return master_prefs.display_mode == 'centralized'
+
 @planning_bp.route('/student/<int:student_id>/accommodations')
 @login_required
 def get_student_report_accommodations(student_id):
     """Récupérer les aménagements d'un élève selon le rôle"""
     try:
-        from models.accommodation import StudentAccommodation, AccommodationTemplate
-        from models.class_collaboration import ClassMaster
-        from models.user import User
-        
+        from services.student_report import get_student_report
+
         # Vérifier l'accès à l'élève
         student = user_can_access_student(current_user.id, student_id)
         if not student:
             return jsonify({'success': False, 'message': 'Élève introuvable'}), 404
-        
-        # Vérifier si l'utilisateur actuel est maître de classe pour cette classe
-        is_class_master = ClassMaster.query.filter_by(
-            classroom_id=student.classroom_id,
-            master_teacher_id=current_user.id
-        ).first() is not None
-        
-        # Récupérer tous les aménagements de l'élève (prédéfinis et personnalisés)
-        accommodations = StudentAccommodation.query.filter(
-            StudentAccommodation.student_id == student_id,
-            StudentAccommodation.is_active == True
-        ).all()
-        
+
+        is_class_master = _is_class_master_of(student)
+        report = get_student_report(student_id)
+
         valid_accommodations = []
-        
-        if is_class_master:
-            # Maître de classe : voir tous les aménagements avec attribution
-            for acc in accommodations:
-                teacher_name = "Inconnu"
-                is_own = False
-                
-                if acc.template_id and acc.template:
-                    # Aménagement prédéfini
-                    template_user = User.query.filter_by(id=acc.template.user_id).first()
-                    teacher_name = template_user.username if template_user else "Inconnu"
-                    is_own = acc.template.user_id == current_user.id
+        for acc in report.accommodations:
+            if is_class_master:
+                # Maître de classe : voir tous les aménagements avec attribution
+                if acc.template_owner_id is not None:
+                    teacher_name = acc.template_owner_name or "Inconnu"
+                    is_own = acc.template_owner_id == current_user.id
                 else:
-                    # Aménagement personnalisé - pour l'instant, on ne peut pas identifier l'auteur
+                    # Aménagement personnalisé : le modèle n'a pas d'auteur
                     teacher_name = "Aménagement personnalisé"
-                    is_own = False  # On ne peut pas déterminer l'auteur pour les aménagements personnalisés
-                
-                valid_accommodations.append({
-                    'name': acc.name,
-                    'emoji': acc.emoji,
-                    'time_multiplier': acc.time_multiplier,
-                    'teacher_name': teacher_name,
-                    'is_own': is_own
-                })
-        else:
-            # Enseignant spécialisé : voir seulement ses propres aménagements prédéfinis
-            # Note: Les aménagements personnalisés ne peuvent pas être filtrés par auteur car le modèle n'a pas de user_id
-            print(f"DEBUG: Enseignant spécialisé {current_user.id} vérifie {len(accommodations)} aménagements")
-            for acc in accommodations:
-                print(f"DEBUG: Aménagement {acc.id} - template_id: {acc.template_id}, template exists: {acc.template is not None}")
-                if acc.template:
-                    print(f"DEBUG: Template user_id: {acc.template.user_id}, current_user.id: {current_user.id}")
-                
-                # Vérifier si c'est son aménagement prédéfini
-                if acc.template_id and acc.template and acc.template.user_id == current_user.id:
-                    print(f"DEBUG: Aménagement {acc.id} appartient à l'enseignant spécialisé")
-                    valid_accommodations.append({
-                        'name': acc.name,
-                        'emoji': acc.emoji,
-                        'time_multiplier': acc.time_multiplier,
-                        'teacher_name': current_user.username,
-                        'is_own': True
-                    })
-                else:
-                    print(f"DEBUG: Aménagement {acc.id} N'appartient PAS à l'enseignant spécialisé")
-        
+                    is_own = False
+            elif acc.template_owner_id == current_user.id:
+                # Enseignant spécialisé : seulement ses propres aménagements prédéfinis
+                teacher_name = current_user.username
+                is_own = True
+            else:
+                continue
+
+            valid_accommodations.append({
+                'name': acc.name,
+                'emoji': acc.emoji,
+                'time_multiplier': acc.time_multiplier,
+                'teacher_name': teacher_name,
+                'is_own': is_own
+            })
+
         return jsonify({
             'success': True,
             'accommodations': valid_accommodations
         })
-        
+
     except Exception as e:
         print(f"ERROR in get_student_report_accommodations: {str(e)}")
         import traceback
@@ -6722,99 +6520,45 @@ def get_student_report_accommodations(student_id):
 def get_student_report_grades(student_id):
     """Récupérer les notes d'un élève selon le rôle"""
     try:
+        from services.student_report import get_student_report
+
         # Vérifier d'abord l'accès à l'élève
         student = user_can_access_student(current_user.id, student_id)
         if not student:
             return jsonify({'success': False, 'message': 'Élève introuvable'}), 404
-        
-        from models.evaluation import EvaluationGrade, Evaluation
-        from models.classroom import Classroom
-        from models.class_collaboration import ClassMaster, TeacherCollaboration, SharedClassroom
-        from models.user import User
-        
-        # Déterminer le rôle de l'utilisateur actuel
-        is_master = ClassMaster.query.filter_by(
-            classroom_id=student.classroom_id,
-            master_teacher_id=current_user.id
-        ).first() is not None
-        
-        if is_master:
-            # Maître de classe : voir toutes les évaluations avec attribution des enseignants
-            # Récupérer toutes les notes de cet élève avec les informations des évaluations et enseignants
-            grades_query = db.session.query(
-                EvaluationGrade, 
-                Evaluation, 
-                Classroom,
-                User
-            ).join(
-                Evaluation,
-                EvaluationGrade.evaluation_id == Evaluation.id
-            ).join(
-                Classroom,
-                Evaluation.classroom_id == Classroom.id
-            ).join(
-                User,
-                Classroom.user_id == User.id
-            ).filter(
-                EvaluationGrade.student_id == student_id
-            ).order_by(Evaluation.date.desc()).all()
-            
-            grades = [
-                {
-                    'evaluation_name': evaluation.title,
-                    'score': grade.points,
-                    'max_score': evaluation.max_points,
-                    'date': evaluation.date.strftime('%d/%m/%Y') if evaluation.date else '',
-                    'teacher_name': user.username,
-                    'is_own': user.id == current_user.id,
-                    'subject': classroom.subject
-                }
-                for grade, evaluation, classroom, user in grades_query
-            ]
-            
-        else:
-            # Enseignant spécialisé : voir seulement ses propres évaluations
-            grades_query = db.session.query(
-                EvaluationGrade, 
-                Evaluation, 
-                Classroom
-            ).join(
-                Evaluation,
-                EvaluationGrade.evaluation_id == Evaluation.id
-            ).join(
-                Classroom,
-                Evaluation.classroom_id == Classroom.id
-            ).filter(
-                EvaluationGrade.student_id == student_id,
-                Classroom.user_id == current_user.id
-            ).order_by(Evaluation.date.desc()).all()
-            
-            grades = [
-                {
-                    'evaluation_name': evaluation.title,
-                    'score': grade.points,
-                    'max_score': evaluation.max_points,
-                    'date': evaluation.date.strftime('%d/%m/%Y') if evaluation.date else '',
-                    'teacher_name': current_user.username,
-                    'is_own': True,
-                    'subject': classroom.subject
-                }
-                for grade, evaluation, classroom in grades_query
-            ]
-        
+
+        # Maître de classe : toutes les évaluations avec attribution des
+        # enseignants ; enseignant spécialisé : seulement les siennes
+        is_master = _is_class_master_of(student)
+        report = get_student_report(student_id)
+
+        grades = [
+            {
+                'evaluation_name': grade.title,
+                'score': grade.points,
+                'max_score': grade.max_points,
+                'date': grade.date.strftime('%d/%m/%Y') if grade.date else '',
+                'teacher_name': grade.teacher_name,
+                'is_own': grade.teacher_id == current_user.id,
+                'subject': grade.subject
+            }
+            for grade in reversed(report.grades)
+            if grade.teacher_name is not None and (is_master or grade.teacher_id == current_user.id)
+        ]
+
         # Organiser les notes par discipline pour l'affichage en tableau
         subjects_data = {}
         for grade in grades:
             subject = grade['subject']
             teacher = grade['teacher_name']
-            
+
             if subject not in subjects_data:
                 subjects_data[subject] = {
                     'subject': subject,
                     'teacher_name': teacher,
                     'evaluations': []
                 }
-            
+
             subjects_data[subject]['evaluations'].append({
                 'evaluation_name': grade['evaluation_name'],
                 'score': grade['score'],
@@ -6822,20 +6566,19 @@ def get_student_report_grades(student_id):
                 'date': grade['date'],
                 'is_own': grade['is_own']
             })
-        
+
         # Trier les évaluations par date dans chaque matière
         for subject_data in subjects_data.values():
             subject_data['evaluations'].sort(key=lambda x: x['date'], reverse=True)
-        
+
         return jsonify({
             'success': True,
             'grades': grades,  # Format original pour compatibilité
             'subjects_table': list(subjects_data.values())  # Format tableau
         })
-        
+
     except Exception as e:
         print(f"ERROR in get_student_report_grades: {str(e)}")
-        print(f"ERROR traceback: {e.__class__.__name__}: {e}")
         import traceback
         traceback.print_exc()
         return jsonify({'success': False, 'message': str(e)}), 500
@@ -6845,125 +6588,39 @@ def get_student_report_grades(student_id):
 def get_student_report_sanctions(student_id):
     """Récupérer les sanctions/coches d'un élève selon le rôle"""
     try:
-        from models.sanctions import SanctionTemplate
-        from models.student_sanctions import StudentSanctionCount
-        from models.student import Student
-        from models.user_preferences import UserSanctionPreferences
-        from models.class_collaboration import ClassMaster
-        from models.user import User
-        
+        from services.student_report import get_student_report
+
         # Vérifier d'abord l'accès à l'élève
         student = user_can_access_student(current_user.id, student_id)
         if not student:
             return jsonify({'success': False, 'message': 'Élève introuvable'}), 404
-        
-        # Vérifier si l'utilisateur actuel est maître de classe pour cette classe
-        is_class_master = ClassMaster.query.filter_by(
-            classroom_id=student.classroom_id,
-            master_teacher_id=current_user.id
-        ).first() is not None
-        
-        print(f"DEBUG sanctions - User {current_user.id} accessing student {student_id}")
-        print(f"DEBUG sanctions - Student classroom: {student.classroom_id}")
-        print(f"DEBUG sanctions - Is class master: {is_class_master}")
-        
-        # Vérifier le mode de sanction pour cette classe (du maître de classe)
-        class_master = ClassMaster.query.filter_by(classroom_id=student.classroom_id).first()
-        if class_master:
-            master_prefs = UserSanctionPreferences.get_or_create_for_user_classroom(
-                class_master.master_teacher_id, student.classroom_id
-            )
-            is_centralized_mode = master_prefs.display_mode == 'centralized'
-        else:
-            is_centralized_mode = False
-        
-        sanctions = []
-        
-        if is_class_master:
-            if is_centralized_mode:
-                # Maître de classe en mode centralisé : voir seulement ses propres sanctions
-                sanctions = db.session.query(StudentSanctionCount, SanctionTemplate).join(
-                    SanctionTemplate,
-                    StudentSanctionCount.template_id == SanctionTemplate.id
-                ).filter(
-                    StudentSanctionCount.student_id == student_id,
-                    SanctionTemplate.user_id == current_user.id,
-                    SanctionTemplate.is_active == True,
-                    StudentSanctionCount.check_count > 0
-                ).all()
-                
-                sanctions_data = [
-                    {
-                        'name': sanction_template.name,
-                        'description': sanction_template.description,
-                        'count': student_sanction.check_count,
-                        'teacher_name': current_user.username,
-                        'is_own': True
-                    }
-                    for student_sanction, sanction_template in sanctions
-                ]
-            else:
-                # Maître de classe en mode normal : voir toutes les sanctions avec attribution
-                all_sanctions = db.session.query(StudentSanctionCount, SanctionTemplate, User).join(
-                    SanctionTemplate,
-                    StudentSanctionCount.template_id == SanctionTemplate.id
-                ).join(
-                    User,
-                    SanctionTemplate.user_id == User.id
-                ).filter(
-                    StudentSanctionCount.student_id == student_id,
-                    SanctionTemplate.is_active == True,
-                    StudentSanctionCount.check_count > 0
-                ).all()
-                
-                print(f"DEBUG sanctions - Maître de classe (mode normal): {len(all_sanctions)} sanctions trouvées")
-                for sanction, template, user in all_sanctions:
-                    print(f"  - Template: {template.name} (User: {user.username}), Count: {sanction.check_count}")
-                
-                sanctions_data = [
-                    {
-                        'name': sanction_template.name,
-                        'description': sanction_template.description,
-                        'count': student_sanction.check_count,
-                        'teacher_name': user.username,
-                        'is_own': user.id == current_user.id
-                    }
-                    for student_sanction, sanction_template, user in all_sanctions
-                ]
-        else:
-            # Enseignant spécialisé : voir seulement ses propres sanctions
-            # Il faut chercher dans toutes les tables de sanctions car l'élève peut avoir
-            # des entrées liées aux templates de l'enseignant spécialisé
-            sanctions = db.session.query(StudentSanctionCount, SanctionTemplate).join(
-                SanctionTemplate,
-                StudentSanctionCount.template_id == SanctionTemplate.id
-            ).filter(
-                StudentSanctionCount.student_id == student_id,
-                SanctionTemplate.user_id == current_user.id,
-                SanctionTemplate.is_active == True,
-                StudentSanctionCount.check_count > 0
-            ).all()
-            
-            print(f"DEBUG sanctions - Enseignant spécialisé: {len(sanctions)} sanctions trouvées")
-            for sanction, template in sanctions:
-                print(f"  - Template: {template.name} (User: {template.user_id}), Count: {sanction.check_count}")
-            
-            sanctions_data = [
-                {
-                    'name': sanction_template.name,
-                    'description': sanction_template.description,
-                    'count': student_sanction.check_count,
-                    'teacher_name': current_user.username,
-                    'is_own': True
-                }
-                for student_sanction, sanction_template in sanctions
-            ]
-        
+
+        is_class_master = _is_class_master_of(student)
+        is_centralized_mode = _is_centralized_sanction_mode(student)
+        report = get_student_report(student_id)
+
+        # Maître de classe en mode normal : toutes les coches avec
+        # attribution ; en mode centralisé ou enseignant spécialisé :
+        # seulement les siennes
+        see_all = is_class_master and not is_centralized_mode
+        sanctions_data = [
+            {
+                'name': sanction.name,
+                'description': sanction.description,
+                'count': sanction.count,
+                'teacher_name': sanction.teacher_name,
+                'is_own': sanction.teacher_id == current_user.id
+            }
+            for sanction in report.sanctions
+            if sanction.is_active and sanction.teacher_name is not None
+            and (see_all or sanction.teacher_id == current_user.id)
+        ]
+
         return jsonify({
             'success': True,
             'sanctions': sanctions_data
         })
-        
+
     except Exception as e:
         print(f"ERROR in get_student_report_sanctions: {str(e)}")
         import traceback
@@ -6975,88 +6632,38 @@ def get_student_report_sanctions(student_id):
 def get_student_report_attendance(student_id):
     """Récupérer les absences d'un élève selon le rôle"""
     try:
-        from models.attendance import Attendance
-        from models.classroom import Classroom
-        from models.class_collaboration import ClassMaster
-        from models.user import User
-        
+        from services.student_report import get_student_report
+
         # Vérifier d'abord l'accès à l'élève
         student = user_can_access_student(current_user.id, student_id)
         if not student:
             return jsonify({'success': False, 'message': 'Élève introuvable'}), 404
-        
-        # Vérifier si l'utilisateur actuel est maître de classe pour cette classe
-        is_class_master = ClassMaster.query.filter_by(
-            classroom_id=student.classroom_id,
-            master_teacher_id=current_user.id
-        ).first() is not None
-        
-        print(f"DEBUG attendance - User {current_user.id} accessing student {student_id}")
-        print(f"DEBUG attendance - Student classroom: {student.classroom_id}")
-        print(f"DEBUG attendance - Is class master: {is_class_master}")
-        
-        if is_class_master:
-            # Maître de classe : voir toutes les absences avec attribution des enseignants
-            attendances = db.session.query(Attendance, Classroom, User).join(
-                Classroom,
-                Attendance.classroom_id == Classroom.id
-            ).join(
-                User,
-                Classroom.user_id == User.id
-            ).filter(
-                Attendance.student_id == student_id,
-                Attendance.status.in_(['absent', 'late'])
-            ).order_by(Attendance.date.desc()).all()
-            
-            print(f"DEBUG attendance - Maître de classe: {len(attendances)} absences trouvées")
-            for attendance, classroom, user in attendances:
-                print(f"  - Date: {attendance.date}, Status: {attendance.status}, Classroom: {classroom.name} (User: {user.username})")
-            
-            attendance_data = [
-                {
-                    'date': attendance.date.strftime('%d/%m/%Y'),
-                    'period_number': attendance.period_number,
-                    'status': attendance.status,
-                    'late_minutes': attendance.late_minutes,
-                    'classroom_name': classroom.name,
-                    'teacher_name': user.username,
-                    'is_own': user.id == current_user.id
-                }
-                for attendance, classroom, user in attendances
-            ]
-        else:
-            # Enseignant spécialisé : voir seulement les absences qu'il a saisies dans ses classes
-            attendances = db.session.query(Attendance, Classroom).join(
-                Classroom,
-                Attendance.classroom_id == Classroom.id
-            ).filter(
-                Attendance.student_id == student_id,
-                Classroom.user_id == current_user.id,
-                Attendance.status.in_(['absent', 'late'])
-            ).order_by(Attendance.date.desc()).all()
-            
-            print(f"DEBUG attendance - Enseignant spécialisé: {len(attendances)} absences trouvées")
-            for attendance, classroom in attendances:
-                print(f"  - Date: {attendance.date}, Status: {attendance.status}, Classroom: {classroom.name} (ID: {classroom.id})")
-            
-            attendance_data = [
-                {
-                    'date': attendance.date.strftime('%d/%m/%Y'),
-                    'period_number': attendance.period_number,
-                    'status': attendance.status,
-                    'late_minutes': attendance.late_minutes,
-                    'classroom_name': classroom.name,
-                    'teacher_name': current_user.username,
-                    'is_own': True
-                }
-                for attendance, classroom in attendances
-            ]
-        
+
+        # Maître de classe : toutes les absences avec attribution des
+        # enseignants ; enseignant spécialisé : celles de ses classes
+        is_class_master = _is_class_master_of(student)
+        report = get_student_report(student_id)
+
+        attendance_data = [
+            {
+                'date': attendance.date.strftime('%d/%m/%Y'),
+                'period_number': attendance.period_number,
+                'status': attendance.status,
+                'late_minutes': attendance.late_minutes,
+                'classroom_name': attendance.classroom_name,
+                'teacher_name': attendance.teacher_name,
+                'is_own': attendance.teacher_id == current_user.id
+            }
+            for attendance in report.attendance
+            if attendance.teacher_name is not None
+            and (is_class_master or attendance.teacher_id == current_user.id)
+        ]
+
         return jsonify({
             'success': True,
             'attendance': attendance_data
         })
-        
+
     except Exception as e:
         print(f"ERROR in get_student_report_attendance: {str(e)}")
         import traceback
@@ -7205,238 +6812,99 @@ def get_student_info_history(student_id):
 def get_student_behavior_summary(student_id):
     """Récupérer un résumé compact des sanctions et absences d'un élève"""
     try:
-        from models.sanctions import SanctionTemplate
-        from models.student_sanctions import StudentSanctionCount
-        from models.attendance import Attendance
-        from models.classroom import Classroom
-        from models.class_collaboration import ClassMaster
-        from models.user_preferences import UserSanctionPreferences
-        from models.user import User
-        from datetime import datetime, timedelta
-        
+        from services.student_report import get_student_report
+
         # Vérifier d'abord l'accès à l'élève
         student = user_can_access_student(current_user.id, student_id)
         if not student:
             return jsonify({'success': False, 'message': 'Élève introuvable'}), 404
-        
-        # Vérifier si l'utilisateur actuel est maître de classe pour cette classe
-        is_class_master = ClassMaster.query.filter_by(
-            classroom_id=student.classroom_id,
-            master_teacher_id=current_user.id
-        ).first() is not None
-        
-        # Vérifier le mode de sanction pour cette classe (du maître de classe)
-        class_master = ClassMaster.query.filter_by(classroom_id=student.classroom_id).first()
-        if class_master:
-            master_prefs = UserSanctionPreferences.get_or_create_for_user_classroom(
-                class_master.master_teacher_id, student.classroom_id
-            )
-            is_centralized_mode = master_prefs.display_mode == 'centralized'
-        else:
-            is_centralized_mode = False
-        
-        # Récupérer les sanctions
-        if is_class_master:
-            if is_centralized_mode:
-                # Mode centralisé: voir seulement ses propres sanctions
-                sanctions_query = db.session.query(StudentSanctionCount, SanctionTemplate, User).join(
-                    SanctionTemplate,
-                    StudentSanctionCount.template_id == SanctionTemplate.id
-                ).join(
-                    User,
-                    SanctionTemplate.user_id == User.id
-                ).filter(
-                    StudentSanctionCount.student_id == student_id,
-                    SanctionTemplate.user_id == current_user.id,
-                    StudentSanctionCount.check_count > 0
-                )
-            else:
-                # Mode normal: voir toutes les sanctions
-                sanctions_query = db.session.query(StudentSanctionCount, SanctionTemplate, User).join(
-                    SanctionTemplate,
-                    StudentSanctionCount.template_id == SanctionTemplate.id
-                ).join(
-                    User,
-                    SanctionTemplate.user_id == User.id
-                ).filter(
-                    StudentSanctionCount.student_id == student_id,
-                    StudentSanctionCount.check_count > 0
-                )
-        else:
-            # Enseignant spécialisé: voir seulement ses propres sanctions
-            sanctions_query = db.session.query(StudentSanctionCount, SanctionTemplate, User).join(
-                SanctionTemplate,
-                StudentSanctionCount.template_id == SanctionTemplate.id
-            ).join(
-                User,
-                SanctionTemplate.user_id == User.id
-            ).filter(
-                StudentSanctionCount.student_id == student_id,
-                SanctionTemplate.user_id == current_user.id,
-                StudentSanctionCount.check_count > 0
-            )
-        
-        sanctions_data = sanctions_query.all()
-        
-        # Récupérer les absences
-        if is_class_master:
-            if is_centralized_mode:
-                # Mode centralisé: voir seulement ses propres absences
-                attendance_query = db.session.query(Attendance, User).join(
-                    User,
-                    Attendance.user_id == User.id
-                ).filter(
-                    Attendance.student_id == student_id,
-                    Attendance.user_id == current_user.id,
-                    Attendance.status.in_(['absent', 'late'])
-                )
-            else:
-                # Mode normal: voir toutes les absences
-                attendance_query = db.session.query(Attendance, User).join(
-                    User,
-                    Attendance.user_id == User.id
-                ).filter(
-                    Attendance.student_id == student_id,
-                    Attendance.status.in_(['absent', 'late'])
-                )
-        else:
-            # Enseignant spécialisé: voir seulement ses propres absences
-            attendance_query = db.session.query(Attendance, User).join(
-                User,
-                Attendance.user_id == User.id
-            ).filter(
-                Attendance.student_id == student_id,
-                Attendance.user_id == current_user.id,
-                Attendance.status.in_(['absent', 'late'])
-            )
-        
-        attendance_data = attendance_query.order_by(Attendance.date.desc()).all()
-        
+
+        is_class_master = _is_class_master_of(student)
+        is_centralized_mode = _is_centralized_sanction_mode(student)
+        report = get_student_report(student_id)
+
+        # Maître de classe en mode normal : toutes les sanctions et absences ;
+        # en mode centralisé ou enseignant spécialisé : seulement les siennes
+        see_all = is_class_master and not is_centralized_mode
+
         # Organiser les données par enseignant pour les sanctions
         sanctions_summary = {}
-        
-        # Traiter les sanctions
-        for sanction_count, template, user in sanctions_data:
-            teacher_id = user.id
-            teacher_name = user.username
-            
+        for sanction in report.sanctions:
+            if sanction.teacher_name is None or not (see_all or sanction.teacher_id == current_user.id):
+                continue
+            teacher_id = sanction.teacher_id
+
             if teacher_id not in sanctions_summary:
                 sanctions_summary[teacher_id] = {
-                    'teacher_name': teacher_name,
+                    'teacher_name': sanction.teacher_name,
                     'is_own': teacher_id == current_user.id,
                     'sanctions_count': 0,
                     'sanctions_details': []
                 }
-            
-            sanctions_summary[teacher_id]['sanctions_count'] += sanction_count.check_count
+
+            sanctions_summary[teacher_id]['sanctions_count'] += sanction.count
             sanctions_summary[teacher_id]['sanctions_details'].append({
-                'name': template.name,
-                'count': sanction_count.check_count,
-                'emoji': template.emoji if hasattr(template, 'emoji') else '⚠️'
+                'name': sanction.name,
+                'count': sanction.count,
+                'emoji': '⚠️'
             })
-        
-        # Grouper les absences par date et statut pour détecter les plages consécutives
+
+        # Grouper les absences par date (enseignant : celui qui a saisi)
         attendance_by_date = {}
-        
-        # D'abord organiser toutes les absences par date
-        for attendance, user in attendance_data:
-            date_key = attendance.date.strftime('%Y-%m-%d')
-            if date_key not in attendance_by_date:
-                attendance_by_date[date_key] = []
-            
-            attendance_by_date[date_key].append({
-                'date': attendance.date,
-                'period': attendance.period_number,
-                'status': attendance.status,
-                'teacher_id': user.id,
-                'teacher_name': user.username
-            })
-        
-        # Organiser les données par date plutôt que par enseignant
+        for attendance in report.attendance:
+            if attendance.recorded_by_name is None \
+                    or not (see_all or attendance.recorded_by_id == current_user.id):
+                continue
+            attendance_by_date.setdefault(attendance.date, []).append(attendance)
+
+        # Les 10 jours les plus récents, plus récents en premier
         attendance_by_day = []
-        
-        # Traiter les absences groupées par date
-        for date_key, absences_of_day in attendance_by_date.items():
-            # Trier par période pour détecter les plages consécutives
-            absences_of_day.sort(key=lambda x: x['period'])
-            
-            # Pour cette date, créer une entrée avec tous les détails
+        for day in sorted(attendance_by_date, reverse=True)[:10]:
+            absences_of_day = sorted(attendance_by_date[day], key=lambda a: a.period_number)
             date_entry = {
-                'date': absences_of_day[0]['date'].strftime('%d/%m'),
-                'date_obj': absences_of_day[0]['date'],  # Pour le tri
+                'date': day.strftime('%d/%m'),
+                'date_obj': day,
                 'periods_details': [],
                 'total_absences': len(absences_of_day)
             }
-            
-            # Grouper par statut (absent/late) pour traiter séparément
+
+            # Par statut (absent/late), regrouper les périodes consécutives
             by_status = {}
             for absence in absences_of_day:
-                status = absence['status']
-                if status not in by_status:
-                    by_status[status] = []
-                by_status[status].append(absence)
-            
-            # Pour chaque statut, détecter les plages consécutives
+                by_status.setdefault(absence.status, []).append(absence)
+
             for status, status_absences in by_status.items():
-                if not status_absences:
-                    continue
-                    
-                # Grouper les périodes consécutives
-                groups = []
-                current_group = [status_absences[0]]
-                
-                for i in range(1, len(status_absences)):
-                    prev_period = current_group[-1]['period']
-                    curr_period = status_absences[i]['period']
-                    
-                    # Si la période est consécutive, ajouter au groupe
-                    if curr_period == prev_period + 1:
-                        current_group.append(status_absences[i])
+                groups = [[status_absences[0]]]
+                for absence in status_absences[1:]:
+                    if absence.period_number == groups[-1][-1].period_number + 1:
+                        groups[-1].append(absence)
                     else:
-                        # Sinon, finaliser le groupe et en commencer un nouveau
-                        groups.append(current_group)
-                        current_group = [status_absences[i]]
-                
-                # Ajouter le dernier groupe
-                groups.append(current_group)
-                
-                # Pour chaque groupe, créer un détail de période
+                        groups.append([absence])
+
                 for group in groups:
-                    # Utiliser le dernier enseignant du groupe comme demandé
+                    # Le dernier enseignant de la plage
                     last_teacher = group[-1]
-                    
-                    # Créer le texte de la plage
                     if len(group) == 1:
-                        period_text = f"P{group[0]['period']}"
+                        period_text = f"P{group[0].period_number}"
                     else:
-                        period_text = f"P{group[0]['period']}-P{group[-1]['period']}"
-                    
+                        period_text = f"P{group[0].period_number}-P{group[-1].period_number}"
+
                     date_entry['periods_details'].append({
                         'period_range': period_text,
                         'status': status,
                         'status_text': 'Absent' if status == 'absent' else 'Retard',
-                        'teacher_name': last_teacher['teacher_name'],
-                        'teacher_id': last_teacher['teacher_id'],
-                        'is_own': last_teacher['teacher_id'] == current_user.id,
+                        'teacher_name': last_teacher.recorded_by_name,
+                        'teacher_id': last_teacher.recorded_by_id,
+                        'is_own': last_teacher.recorded_by_id == current_user.id,
                         'count': len(group)
                     })
-            
+
             attendance_by_day.append(date_entry)
-        
-        # Trier par date décroissante (plus récentes en premier)
-        attendance_by_day.sort(key=lambda x: x['date_obj'], reverse=True)
-        
-        # Limiter aux 10 jours les plus récents pour l'affichage
-        attendance_by_day = attendance_by_day[:10]
-        
-        # Convertir en listes triées
-        sanctions_list = []
-        for teacher_id, data in sanctions_summary.items():
-            sanctions_list.append(data)
-        
-        # Trier par: ses propres données en premier, puis par nom
-        sanctions_list.sort(key=lambda x: (not x['is_own'], x['teacher_name']))
-        
+
+        # Ses propres données en premier, puis par nom
+        sanctions_list = sorted(sanctions_summary.values(),
+                                key=lambda x: (not x['is_own'], x['teacher_name']))
+
         return jsonify({
             'success': True,
             'sanctions': sanctions_list,
@@ -7444,7 +6912,7 @@ def get_student_behavior_summary(student_id):
             'is_class_master': is_class_master,
             'is_centralized_mode': is_centralized_mode
         })
-        
+
     except Exception as e:
         print(f"ERROR in get_student_behavior_summary: {str(e)}")
         import traceback
@@ -7961,42 +7429,31 @@ def add_mixed_group_students():
         if not mixed_group:
             return jsonify({'success': False, 'message': 'Groupe mixte non trouvé'})
         
-        added_count = 0
+        from services.student_import import copy_students
         
-        for student_id in student_ids:
-            student = Student.query.get(student_id)
-            if not student:
-                continue
-            
-            # Vérifier si l'élève n'est pas déjà dans le groupe
-            existing_link = MixedGroupStudent.query.filter_by(
+        # Élèves existants et déjà membres du groupe : une requête chacun
+        try:
+            requested_ids = list(dict.fromkeys(int(sid) for sid in student_ids))
+        except (ValueError, TypeError):
+            return jsonify({'success': False, 'message': 'IDs d\'élèves invalides'})
+        found_ids = {sid for (sid,) in db.session.query(Student.id).filter(Student.id.in_(requested_ids))}
+        already_linked = {sid for (sid,) in db.session.query(MixedGroupStudent.student_id).filter(
+            MixedGroupStudent.mixed_group_id == mixed_group.id,
+            MixedGroupStudent.student_id.in_(requested_ids)
+        )}
+        new_ids = [sid for sid in requested_ids if sid in found_ids and sid not in already_linked]
+        
+        # Ajouter les élèves au groupe mixte
+        for student_id in new_ids:
+            db.session.add(MixedGroupStudent(
                 mixed_group_id=mixed_group.id,
                 student_id=student_id
-            ).first()
-            
-            if not existing_link:
-                # Ajouter l'élève au groupe mixte
-                mixed_student = MixedGroupStudent(
-                    mixed_group_id=mixed_group.id,
-                    student_id=student_id
-                )
-                db.session.add(mixed_student)
-                added_count += 1
-                
-                # Copier l'élève dans la classe auto-créée
-                if mixed_group.auto_classroom:
-                    auto_student = Student(
-                        classroom_id=mixed_group.auto_classroom.id,
-                        user_id=current_user.id,
-                        first_name=student.first_name,
-                        last_name=student.last_name,
-                        email=student.email,
-                        date_of_birth=student.date_of_birth,
-                        parent_email_mother=student.parent_email_mother,
-                        parent_email_father=student.parent_email_father,
-                        additional_info=student.additional_info
-                    )
-                    db.session.add(auto_student)
+            ))
+        added_count = len(new_ids)
+        
+        # Copier les élèves dans la classe auto-créée (insertion en lot)
+        if new_ids and mixed_group.auto_classroom_id:
+            copy_students(new_ids, mixed_group.auto_classroom_id, current_user.id, skip_existing=False)
         
         db.session.commit()
         
@@ -9463,9 +8920,12 @@ def delete_resource():
                     except Exception:
                         pass
                 from models.file_manager import FileAnnotation
-                FileAnnotation.query.filter_by(
+                from services.annotation_store import delete_pages_for
+                eph_annotations = FileAnnotation.query.filter_by(
                     file_type='ephemeral_file', file_id=eph.id
-                ).delete()
+                )
+                delete_pages_for(eph_annotations)
+                eph_annotations.delete(synchronize_session=False)
                 db.session.delete(eph)
         db.session.delete(resource)
         db.session.commit()
@@ -535,6 +535,8 @@ def _delete_all_user_data(user_id):
 
     # 9. Fichiers
     StudentFile.query.filter_by(user_id=user_id).delete(synchronize_session='fetch')
+    from services.annotation_store import delete_pages_for
+    delete_pages_for(FileAnnotation.query.filter_by(user_id=user_id))
     FileAnnotation.query.filter_by(user_id=user_id).delete(synchronize_session='fetch')
     UserFile.query.filter_by(user_id=user_id).delete(synchronize_session='fetch')
     FileFolder.query.filter_by(user_id=user_id).delete(synchronize_session='fetch')
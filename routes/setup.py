@@ -1637,94 +1637,42 @@ def manage_classrooms():
                         added_student_ids = set()  # Pour éviter les doublons
                         print(f"DEBUG: Processing {len(selected_students)} student entries")
                         
-                        for i, student_data in enumerate(selected_students):
-                            print(f"DEBUG: Student {i}: {student_data}, type: {type(student_data)}")
+                        # Ids sélectionnés (hors invitations : ajoutés après acceptation)
+                        # et élèves existants, en une requête
+                        candidate_ids = []
+                        for student_data in selected_students:
                             if isinstance(student_data, dict) and student_data.get('selected', False):
-                                student_id = student_data['student_id']
-                                source_type = student_data.get('source_type', 'unknown')
-                                source_class_name = student_data.get('source_class_name', 'unknown')
-                                
-                                print(f"DEBUG: Processing student {student_id} from source_type='{source_type}' class='{source_class_name}'")
-                                
-                                # IMPORTANT: Ne pas ajouter les élèves des classes ajoutées par invitation
-                                # Ces élèves seront ajoutés seulement après acceptation de l'invitation
-                                if source_type == 'invitation':
-                                    print(f"DEBUG: Student {student_id} from invitation source - will be added after acceptance")
-                                    continue
-                                elif source_type == 'code_access':
-                                    print(f"DEBUG: Student {student_id} from code_access source - will be added immediately")
-                                else:
-                                    print(f"DEBUG: Student {student_id} from unknown source_type='{source_type}' - will be added")
-                                
-                                # Vérifier que l'étudiant n'est pas déjà ajouté
-                                if student_id in added_student_ids:
-                                    print(f"DEBUG: Student {student_id} already added, skipping")
-                                    continue
-                                
-                                # Vérifier que l'étudiant n'est pas déjà dans ce groupe mixte
-                                existing_link = MixedGroupStudent.query.filter_by(
-                                    mixed_group_id=mixed_group.id,
-                                    student_id=student_id
-                                ).first()
-                                
-                                if existing_link:
-                                    print(f"DEBUG: Student {student_id} already in mixed group, skipping")
+                                if student_data.get('source_type', 'unknown') == 'invitation':
                                     continue
-                                
-                                print(f"DEBUG: Adding student {student_id} to mixed group {mixed_group.id} (source: {source_type})")
-                                
-                                # Vérifier que l'étudiant existe
-                                from models.student import Student
-                                student = Student.query.get(student_id)
-                                if not student:
-                                    print(f"ERROR: Student with ID {student_id} not found!")
+                                try:
+                                    candidate_ids.append(int(student_data['student_id']))
+                                except (KeyError, ValueError, TypeError):
                                     continue
-                                
-                                print(f"DEBUG: Student found: {student.full_name}")
-                                mixed_student = MixedGroupStudent(
-                                    mixed_group_id=mixed_group.id,
-                                    student_id=student_id
-                                )
-                                db.session.add(mixed_student)
-                                added_student_ids.add(student_id)
-                                student_count += 1
-                                print(f"DEBUG: Successfully added student {student_id} to mixed group")
+                        from models.student import Student
+                        from services.student_import import copy_students
+                        found_ids = {sid for (sid,) in db.session.query(Student.id).filter(
+                            Student.id.in_(candidate_ids))} if candidate_ids else set()
                         
-                        # Copier les étudiants sélectionnés dans la classe auto-créée pour qu'ils apparaissent dans la gestion de classe
-                        # SEULEMENT ceux qui ont été ajoutés (pas ceux en attente d'invitation)
+                        ordered_ids = []
+                        for student_id in candidate_ids:
+                            # Vérifier que l'étudiant n'est pas déjà ajouté et qu'il existe
+                            if student_id in added_student_ids:
+                                continue
+                            if student_id not in found_ids:
+                                print(f"ERROR: Student with ID {student_id} not found!")
+                                continue
+                            db.session.add(MixedGroupStudent(
+                                mixed_group_id=mixed_group.id,
+                                student_id=student_id
+                            ))
+                            added_student_ids.add(student_id)
+                            ordered_ids.append(student_id)
+                            student_count += 1
+                        
+                        # Copier les étudiants ajoutés dans la classe auto-créée pour qu'ils
+                        # apparaissent dans la gestion de classe (insertion en lot)
                         print(f"DEBUG: Copying {student_count} confirmed students to auto_classroom {auto_classroom.id}")
-                        for student_data in selected_students:
-                            if isinstance(student_data, dict) and student_data.get('selected', False):
-                                student_id = student_data['student_id']
-                                source_type = student_data.get('source_type', 'unknown')
-                                
-                                # Ne pas copier les élèves des classes ajoutées par invitation
-                                if source_type == 'invitation':
-                                    print(f"DEBUG: Student {student_id} from invitation source - not copying until acceptance")
-                                    continue
-                                
-                                # Vérifier que l'étudiant a été ajouté au groupe mixte
-                                if student_id not in added_student_ids:
-                                    print(f"DEBUG: Student {student_id} was not added to mixed group, skipping copy")
-                                    continue
-                                
-                                original_student = Student.query.get(student_id)
-                                
-                                if original_student:
-                                    # Créer une copie de l'élève pour la classe auto-créée
-                                    auto_student = Student(
-                                        classroom_id=auto_classroom.id,
-                                        user_id=current_user.id,
-                                        first_name=original_student.first_name,
-                                        last_name=original_student.last_name,
-                                        email=original_student.email,
-                                        date_of_birth=original_student.date_of_birth,
-                                        parent_email_mother=original_student.parent_email_mother,
-                                        parent_email_father=original_student.parent_email_father,
-                                        additional_info=original_student.additional_info
-                                    )
-                                    db.session.add(auto_student)
-                                    print(f"DEBUG: Copied student {original_student.full_name} to auto_classroom")
+                        copy_students(ordered_ids, auto_classroom.id, current_user.id, skip_existing=False)
                         
                         # Envoyer les invitations aux maîtres des classes ajoutées via invitation
                         print(f"DEBUG: Processing invitations for {len(processed_sources)} source classes")
@@ -2642,7 +2590,7 @@ def corbeille():
     """Page Corbeille : classes supprimées récupérables (30 jours)."""
     from datetime import timedelta
     from models.deleted_classroom import DeletedClassroom
-    from services.classroom_trash import purge_expired_trash, TRASH_RETENTION_DAYS
+    from services.classroom_trash import purge_expired_trash, trash_preview, TRASH_RETENTION_DAYS
 
     purge_expired_trash()  # nettoie opportunément les entrées expirées
 
@@ -2655,14 +2603,15 @@ def corbeille():
     entries = []
     for it in items:
         expires = it.deleted_at + timedelta(days=TRASH_RETENTION_DAYS)
-        entries.append({'row': it, 'days_left': max(0, (expires - datetime.utcnow()).days)})
+        entries.append({'row': it, 'days_left': max(0, (expires - datetime.utcnow()).days),
+                        'preview': trash_preview(it)})
     return render_template('setup/corbeille.html', entries=entries, retention=TRASH_RETENTION_DAYS)
 
 
 @setup_bp.route('/corbeille/<int:entry_id>/restore', methods=['POST'])
 @login_required
 def restore_from_corbeille(entry_id):
-    """Restaure une classe supprimée (élèves + évaluations + notes)."""
+    """Restaure une classe supprimée (élèves + évaluations + notes + présences)."""
     from models.deleted_classroom import DeletedClassroom
     from services.classroom_trash import restore_classroom
 
@@ -2681,10 +2630,10 @@ def restore_from_corbeille(entry_id):
 def delete_from_corbeille(entry_id):
     """Supprime définitivement une entrée de la corbeille."""
     from models.deleted_classroom import DeletedClassroom
+    from services.classroom_trash import delete_trash_entry
 
     entry = DeletedClassroom.query.filter_by(id=entry_id, user_id=current_user.id).first_or_404()
-    db.session.delete(entry)
-    db.session.commit()
+    delete_trash_entry(entry)
     flash('Classe supprimée définitivement de la corbeille.', 'info')
     return redirect(url_for('setup.corbeille'))
 
@@ -2700,7 +2649,7 @@ def delete_classroom(id):
     from models.user_preferences import UserSanctionPreferences
 
     def _archive_before_purge():
-        # Corbeille : archiver la classe (élèves + évaluations + notes) AVANT la
+        # Corbeille : archiver la classe (élèves + évaluations + notes + présences) AVANT la
         # purge, pour une restauration 30 jours. Best-effort — ne lève jamais et
         # ignore les classes sans contenu (0 élève et 0 évaluation).
         try:
@@ -5,8 +5,11 @@ from extensions import db
 from models.user import User
 from models.subscription import Subscription
 from models.voucher import Voucher
+from services.premium_status import invalidate_premium
 from datetime import datetime
-import stripe
+from utils.startup import lazy_module
+
+stripe = lazy_module('stripe')  # chargé au premier appel Stripe
 from utils.platform_detection import is_ios_native_app
 
 subscription_bp = Blueprint('subscription', __name__, url_prefix='/subscription')
@@ -375,6 +378,9 @@ def webhook():
     elif event_type == 'invoice.payment_failed':
         _handle_payment_failed(data_object)
 
+    # Statut Premium en cache : l'abonnement vient peut-être de changer
+    invalidate_premium()
+
     return jsonify({'success': True})
 
 
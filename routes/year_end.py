@@ -31,105 +31,11 @@ def _get_user_mixed_groups():
 
 def _get_students_data_for_class(classroom_id):
     """
-    Collecte toutes les données d'un élève pour le rapport PDF.
-    Réutilise les mêmes données que la page manage-classes.
+    Collecte toutes les données des élèves d'une classe pour le rapport PDF
+    (requêtes groupées pour toute la classe : services/class_report).
     """
-    from models.student import Student, Grade
-    from models.attendance import Attendance
-    from models.evaluation import Evaluation, EvaluationGrade
-    from models.student_sanctions import StudentSanctionCount
-    from models.lesson_memo import StudentRemark
-
-    students = Student.query.filter_by(
-        classroom_id=classroom_id, user_id=current_user.id
-    ).order_by(Student.last_name, Student.first_name).all()
-
-    students_data = []
-    for student in students:
-        # Absences et retards
-        attendances = Attendance.query.filter_by(
-            student_id=student.id, user_id=current_user.id
-        ).all()
-        absences_count = sum(1 for a in attendances if a.status == 'absent')
-        late_count = sum(1 for a in attendances if a.status == 'late')
-        late_minutes_total = sum(a.late_minutes or 0 for a in attendances if a.status == 'late')
-
-        # Notes (évaluations modernes)
-        grades_list = []
-        evals = Evaluation.query.filter_by(classroom_id=classroom_id).all()
-        total_points = 0
-        total_max = 0
-        grade_count = 0
-        for ev in evals:
-            eg = EvaluationGrade.query.filter_by(
-                evaluation_id=ev.id, student_id=student.id
-            ).first()
-            if eg and eg.points is not None:
-                grades_list.append({
-                    'title': ev.title,
-                    'points': eg.points,
-                    'max': ev.max_points,
-                    'date': ev.date,
-                })
-                total_points += eg.points
-                total_max += (ev.max_points or 0)
-                grade_count += 1
-
-        # Notes legacy
-        legacy_grades = Grade.query.filter_by(
-            student_id=student.id, classroom_id=classroom_id
-        ).all()
-        for lg in legacy_grades:
-            grades_list.append({
-                'title': lg.title,
-                'points': lg.grade,
-                'max': lg.max_grade,
-                'date': lg.date,
-            })
-            if lg.grade is not None and lg.max_grade:
-                total_points += lg.grade
-                total_max += lg.max_grade
-                grade_count += 1
-
-        average = None
-        if grade_count > 0 and total_max > 0:
-            average = (total_points / total_max) * 6  # Note suisse sur 6
-
-        # Sanctions
-        sanction_counts = StudentSanctionCount.query.filter_by(
-            student_id=student.id
-        ).all()
-        sanctions = []
-        for sc in sanction_counts:
-            if sc.check_count > 0:
-                sanctions.append({
-                    'name': sc.template.name if sc.template else 'Inconnu',
-                    'count': sc.check_count,
-                })
-
-        # Remarques
-        remarks_list = StudentRemark.query.filter_by(
-            student_id=student.id, user_id=current_user.id
-        ).order_by(StudentRemark.source_date.desc()).all()
-        remarks = []
-        for r in remarks_list:
-            remarks.append({
-                'content': r.content,
-                'date': r.source_date if hasattr(r, 'source_date') else None,
-            })
-
-        students_data.append({
-            'student': student,
-            'absences_count': absences_count,
-            'late_count': late_count,
-            'late_minutes_total': late_minutes_total,
-            'grades': grades_list,
-            'average': average,
-            'sanctions': sanctions,
-            'remarks': remarks,
-        })
-
-    return students_data
+    from services.class_report import load_class_report_data
+    return load_class_report_data(classroom_id, current_user.id)
 
 
 def _school_year_label(start, end):
@@ -170,7 +76,7 @@ def step1():
 def export_class_pdf(classroom_id):
     """Télécharge le rapport PDF d'une classe."""
     from models.classroom import Classroom
-    from services.year_end_pdf import generate_class_report_pdf
+    from services.class_report import render_class_report
 
     classroom = Classroom.query.filter_by(id=classroom_id, user_id=current_user.id).first_or_404()
     students_data = _get_students_data_for_class(classroom_id)
@@ -178,7 +84,7 @@ def export_class_pdf(classroom_id):
     year_label = _school_year_label(current_user.school_year_start, current_user.school_year_end)
     teacher_name = current_user.username or 'Enseignant'
 
-    pdf_bytes = generate_class_report_pdf(classroom, students_data, year_label, teacher_name)
+    pdf_bytes = render_class_report(classroom, students_data, year_label, teacher_name)
 
     response = make_response(pdf_bytes)
     safe_name = classroom.name.replace(' ', '_').replace('/', '-')
@@ -192,7 +98,6 @@ def export_class_pdf(classroom_id):
 def export_all_pdf(classroom_id=None):
     """Télécharge un PDF consolidé avec tous les rapports de toutes les classes."""
     from models.classroom import Classroom
-    from services.year_end_pdf import generate_class_report_pdf
     import io
 
     classrooms = _get_user_classrooms()
@@ -489,7 +394,7 @@ def confirm():
 @year_end_bp.route('/execute', methods=['POST'])
 @login_required
 def execute():
-    """Exécute le nettoyage de fin d'année."""
+    """Lance le nettoyage de fin d'année (en arrière-plan)."""
     class_actions = session.get('year_end_class_actions', {})
     dates_info = session.get('year_end_dates', {})
 
@@ -502,38 +407,94 @@ def execute():
         flash('Veuillez cocher la case de confirmation.', 'error')
         return redirect(url_for('year_end.confirm'))
 
+    new_start = date.fromisoformat(dates_info['start'])
+    new_end = date.fromisoformat(dates_info['end'])
+    # Les vacances de l'année écoulée sont toujours supprimées à la clôture
+    # (l'enseignant reconfigure ses nouvelles vacances sur /setup/holidays juste après).
+    holiday_action = 'clear'
+
+    # Le nettoyage tourne en arrière-plan, classe par classe ; la page de
+    # progression interroge le job puis redirige vers les vacances.
+    from services.year_end_jobs import submit_year_end, YearEndInProgress
     try:
-        new_start = date.fromisoformat(dates_info['start'])
-        new_end = date.fromisoformat(dates_info['end'])
-        # Les vacances de l'année écoulée sont toujours supprimées à la clôture
-        # (l'enseignant reconfigure ses nouvelles vacances sur /setup/holidays juste après).
-        holiday_action = 'clear'
-
-        from services.year_end_cleanup import execute_year_end_cleanup
-        summary = execute_year_end_cleanup(
+        job = submit_year_end(
             user=current_user,
             class_actions=class_actions,
             new_year_start=new_start,
             new_year_end=new_end,
             holiday_action=holiday_action,
         )
-
-        # Nettoyer la session
-        session.pop('year_end_class_actions', None)
-        session.pop('year_end_dates', None)
-
-        flash(
-            f'Nouvelle année scolaire configurée avec succès ! '
-            f'{summary["plannings_deleted"]} plannings supprimés, '
-            f'{summary["attendance_deleted"]} présences supprimées, '
-            f'{summary["classes_deleted"]} classes supprimées, '
-            f'{summary["classes_renamed"]} classes renommées. '
-            f'Configurez maintenant vos nouvelles vacances scolaires.',
-            'success'
-        )
-        return redirect(url_for('setup.manage_holidays'))
-
+    except YearEndInProgress as e:
+        job = e.job
     except Exception as e:
         db.session.rollback()
         flash(f'Erreur lors du nettoyage : {str(e)}', 'error')
         return redirect(url_for('year_end.confirm'))
+
+    # Nettoyer la session
+    session.pop('year_end_class_actions', None)
+    session.pop('year_end_dates', None)
+    return redirect(url_for('year_end.progress', job_id=job.id))
+
+
+@year_end_bp.route('/progress/<int:job_id>')
+@login_required
+def progress(job_id):
+    """Progression du passage à la nouvelle année."""
+    from services.year_end_jobs import get_job
+
+    job = get_job(job_id, current_user.id)
+    if not job:
+        flash('Nettoyage introuvable.', 'error')
+        return redirect(url_for('year_end.step1'))
+    if job.status == 'done':
+        return redirect(url_for('year_end.finish', job_id=job.id))
+    return render_template('year_end/wizard.html', step=5, job=job.to_dict())
+
+
+@year_end_bp.route('/jobs/<int:job_id>')
+@login_required
+def job_status(job_id):
+    """Statut du job (interrogé par la page de progression)."""
+    from services.year_end_jobs import get_job
+
+    job = get_job(job_id, current_user.id)
+    if not job:
+        return jsonify({'success': False, 'message': 'Nettoyage introuvable'}), 404
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+
+@year_end_bp.route('/jobs/<int:job_id>/retry', methods=['POST'])
+@login_required
+def retry(job_id):
+    """Reprend un nettoyage en échec à l'étape où il s'est arrêté."""
+    from services.year_end_jobs import get_job, retry_job
+
+    job = get_job(job_id, current_user.id)
+    if not job:
+        return jsonify({'success': False, 'message': 'Nettoyage introuvable'}), 404
+    job = retry_job(job)
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+
+@year_end_bp.route('/jobs/<int:job_id>/finish')
+@login_required
+def finish(job_id):
+    """Fin du passage à la nouvelle année : résumé puis configuration des vacances."""
+    from services.year_end_jobs import get_job
+
+    job = get_job(job_id, current_user.id)
+    if not job or job.status != 'done':
+        return redirect(url_for('year_end.progress', job_id=job_id))
+
+    summary = job.summary_dict
+    flash(
+        f'Nouvelle année scolaire configurée avec succès ! '
+        f'{summary.get("plannings_deleted", 0)} plannings supprimés, '
+        f'{summary.get("attendance_deleted", 0)} présences supprimées, '
+        f'{summary.get("classes_deleted", 0)} classes supprimées, '
+        f'{summary.get("classes_renamed", 0)} classes renommées. '
+        f'Configurez maintenant vos nouvelles vacances scolaires.',
+        'success'
+    )
+    return redirect(url_for('setup.manage_holidays'))
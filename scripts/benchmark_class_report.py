@@ -0,0 +1,101 @@
+"""Mesure le rendu du rapport PDF de classe (services/year_end_pdf).
+
+Compare le rendu séquentiel (tel qu'exécuté avant dans le worker) au rendu
+par morceaux dans le pool de processus, sur une classe fictive : aucune base
+de données n'est nécessaire.
+
+    python scripts/benchmark_class_report.py
+    python scripts/benchmark_class_report.py --students 25 --processes 4 --repeat 5
+
+Le premier rendu parallèle démarre les processus du pool (« froid ») ; les
+suivants le réutilisent, comme en production.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FIRST_NAMES = ['Emma', 'Noah', 'Léa', 'Lucas', 'Chloé', 'Liam', 'Mia', 'Gabriel', 'Zoé', 'Nathan']
+LAST_NAMES = ['Rossi', 'Meier', 'Favre', 'Bianchi', 'Müller', 'Dubois', 'Keller', 'Moreau']
+
+
+def fake_class(students, seed=1):
+    """Classe fictive : notes, sanctions et remarques d'une année ordinaire."""
+    from types import SimpleNamespace
+    from services.year_end_pdf import ReportStudent
+
+    rng = random.Random(seed)
+    start = date(2025, 8, 25)
+    students_data = []
+    for i in range(students):
+        grades = [{
+            'title': f'Évaluation {k + 1}',
+            'points': round(rng.uniform(8, 24), 1),
+            'max': 24.0,
+            'date': start + timedelta(days=14 * k),
+        } for k in range(12)]
+        students_data.append({
+            'student': ReportStudent(i + 1, rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)),
+            'absences_count': rng.randint(0, 12),
+            'late_count': rng.randint(0, 6),
+            'late_minutes_total': rng.randint(0, 60),
+            'grades': grades,
+            'average': sum(g['points'] for g in grades) / (24.0 * len(grades)) * 6,
+            'sanctions': [{'name': 'Oubli de matériel', 'count': rng.randint(1, 4)}],
+            'remarks': [{
+                'content': 'Participe activement, travail régulier. ' * rng.randint(1, 4),
+                'date': start + timedelta(days=rng.randint(0, 280)),
+            } for _ in range(rng.randint(2, 8))],
+        })
+    return SimpleNamespace(name='9VP2', subject='Mathématiques'), students_data
+
+
+def timed(fn, repeat):
+    durations = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        durations.append(time.perf_counter() - t0)
+    return durations, result
+
+
+def main():
+    from services.year_end_pdf import DEFAULT_PROCESSES, _fitz, generate_class_report_pdf
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=25)
+    parser.add_argument('--processes', type=int, default=DEFAULT_PROCESSES)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    classroom, students_data = fake_class(args.students)
+
+    def render(processes):
+        return lambda: generate_class_report_pdf(classroom, students_data, '2025-2026', 'Enseignant',
+                                                 processes=processes)
+
+    sequential, pdf = timed(render(1), args.repeat)
+    print(f"{args.students} élèves, {len(pdf) // 1024} Ko")
+    print(f"séquentiel          : médiane {statistics.median(sequential) * 1000:7.0f} ms")
+
+    if _fitz() is None:
+        print("PyMuPDF absent : pas de rendu parallèle (fusion impossible)")
+        return
+    if args.processes < 2:
+        print("--processes < 2 : pas de rendu parallèle")
+        return
+
+    cold, _ = timed(render(args.processes), 1)
+    warm, pdf = timed(render(args.processes), args.repeat)
+    print(f"{args.processes} processus (froid) : {cold[0] * 1000:7.0f} ms")
+    print(f"{args.processes} processus        : médiane {statistics.median(warm) * 1000:7.0f} ms "
+          f"(x{statistics.median(sequential) / statistics.median(warm):.1f})")
+
+
+if __name__ == '__main__':
+    main()
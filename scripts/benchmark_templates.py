@@ -0,0 +1,125 @@
+"""Mesure le rendu de calendar_view en mode développement et en mode production.
+
+Démarre l'application sur une base SQLite temporaire avec le jeu de
+scripts/check_query_budgets.py, puis appelle la page dans deux modes
+(utils/template_cache.py) :
+
+    - avant / développement : rechargement automatique (chaque rendu relit
+      la date des templates), filtres non mémoïsés, pas de cache de bytecode ;
+    - production : templates compilés une fois, filtres mémoïsés, cache de
+      bytecode rempli à l'avance comme par `flask compile-templates`.
+
+« froid » : premier rendu d'un processus (compilation, ou chargement du
+bytecode en production) ; « chaud » : médiane des rendus suivants. Le temps
+de rendu est mesuré entre les signaux before_render_template et
+template_rendered, sans les requêtes SQL de la vue.
+
+    python scripts/benchmark_templates.py
+    python scripts/benchmark_templates.py --page planning.lesson_view --repeat 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils.jinja_filters as jinja_filters
+from scripts.check_query_budgets import PAGES, create_test_app, seed
+
+BENCHMARKED_PAGES = ['planning.calendar_view', 'planning.lesson_view']
+
+# Filtres mémoïsés (utils/jinja_filters.py), remplacés par leur version
+# d'origine (__wrapped__) en mode développement
+MEMOIZED = {name: getattr(jinja_filters, name)
+            for name in ('format_date', 'format_date_full', '_render_checklist')}
+
+
+class RenderTimer:
+    """Durée de chaque rendu de template de l'application (signaux Flask)."""
+
+    def __init__(self, app):
+        from flask import before_render_template, template_rendered
+        self.durations = []
+        self._started = []
+        before_render_template.connect(self._before, app)
+        template_rendered.connect(self._after, app)
+
+    def _before(self, sender, **extra):
+        self._started.append(time.perf_counter())
+
+    def _after(self, sender, **extra):
+        self.durations.append(time.perf_counter() - self._started.pop())
+
+    def total_since(self, index):
+        return sum(self.durations[index:])
+
+
+def set_mode(app, production, cache_dir):
+    """Applique un mode de rendu et vide le cache mémoire de Jinja."""
+    from jinja2 import FileSystemBytecodeCache
+
+    env = app.jinja_env
+    env.auto_reload = not production
+    env.bytecode_cache = FileSystemBytecodeCache(cache_dir) if production else None
+    for name, memoized in MEMOIZED.items():
+        memoized.cache_clear()
+        fn = memoized if production else memoized.__wrapped__
+        setattr(jinja_filters, name, fn)
+        if name in env.filters:
+            env.filters[name] = fn
+    env.cache.clear()
+
+
+def run(app, ids, page, repeat, timer):
+    """Returns: (rendu froid, médiane des rendus chauds, médiane des requêtes) en s."""
+    client = app.test_client()
+    with app.app_context():
+        mark = len(timer.durations)
+        page(app, client, ids)
+        cold = timer.total_since(mark)
+        renders, requests = [], []
+        for _ in range(repeat):
+            mark = len(timer.durations)
+            t0 = time.perf_counter()
+            page(app, client, ids)
+            requests.append(time.perf_counter() - t0)
+            renders.append(timer.total_since(mark))
+    return cold, statistics.median(renders), statistics.median(requests)
+
+
+def main():
+    from utils.template_cache import compile_templates
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--page', choices=BENCHMARKED_PAGES, default='planning.calendar_view')
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_test_app('sqlite:///' + os.path.join(tmp, 'templates.db'))
+        ids = seed(app)
+        timer = RenderTimer(app)
+        page = PAGES[args.page]
+        cache_dir = os.path.join(tmp, 'jinja-cache')
+        os.makedirs(cache_dir)
+
+        set_mode(app, production=False, cache_dir=cache_dir)
+        before = run(app, ids, page, args.repeat, timer)
+
+        set_mode(app, production=True, cache_dir=cache_dir)
+        compile_templates(app)          # `flask compile-templates`
+        app.jinja_env.cache.clear()     # nouveau processus : cache mémoire vide
+        after = run(app, ids, page, args.repeat, timer)
+
+    print(f"{args.page} — {args.repeat} rendus")
+    print(f"{'':14} {'froid':>9} {'chaud':>9} {'requête':>9}")
+    for label, (cold, warm, request) in (('développement', before), ('production', after)):
+        print(f"{label:14} {cold * 1000:7.1f}ms {warm * 1000:7.1f}ms {request * 1000:7.1f}ms")
+    print(f"rendu chaud x{before[1] / after[1]:.2f}, premier rendu x{before[0] / after[0]:.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,328 @@
+"""Budgets de requêtes SQL et de temps des pages les plus fréquentées.
+
+Démarre l'application sur une base jetable (SQLite temporaire par défaut,
+ou --database-url vers un Postgres local VIDE : les tables sont créées puis
+supprimées), y sème le jeu de test (scripts/seed_test_data.py) complété d'un
+horaire, de plannings, de présences, d'une mission avec tentatives et d'un
+parent, puis appelle chaque page et vérifie :
+
+    - une réponse 2xx (les mesures directes de fonction n'ont pas de statut) ;
+    - le nombre de requêtes SQL (max sur les appels mesurés) ;
+    - la durée médiane (bornée, multipliée par --time-factor sur une machine lente).
+
+Un dépassement affiche les formes de requêtes les plus répétées
+(utils/query_stats.py) pour retrouver le changement responsable. Code de
+sortie 1 si un budget est dépassé.
+
+    python scripts/check_query_budgets.py
+    python scripts/check_query_budgets.py --only calendar_view --repeat 5
+    python scripts/check_query_budgets.py --database-url postgresql://localhost/profcalendar_budget
+
+Chaque page est appelée une première fois sans mesure (compilation des
+templates, caches), comme en production après le démarrage.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, time as time_type, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# (nom, requêtes SQL max, médiane max en ms) — jeu de test : 10 élèves par
+# classe, 4 classes par enseignant. Étalonnés sur SQLite (--repeat 5, 3
+# exécutions) : requêtes mesurées + ~20 % (au moins 2), temps ~5 × la
+# médiane mesurée (Postgres, machine plus lente : --time-factor). Relever un
+# budget seulement avec le changement qui le justifie.
+BUDGETS = [
+    ('planning.calendar_view', 22, 150),              # mesuré : 18 requêtes, 32 ms
+    ('planning.lesson_view', 24, 100),                # 20 requêtes, 14 ms
+    ('planning.get_current_or_next_lesson', 7, 25),   # 5 requêtes, 2 ms
+    ('exercises.live_tracking', 36, 75),              # 30 requêtes, 12 ms
+    ('evaluations.export_grades', 4, 25),             # 2 requêtes, 2 ms
+    ('api.student_dashboard', 17, 50),                # 14 requêtes, 6 ms
+    ('parent_auth.dashboard', 7, 50),                 # 5 requêtes, 6 ms
+]
+
+PERIODS = [(time_type(8, 0), time_type(8, 45)), (time_type(8, 50), time_type(9, 35)),
+           (time_type(9, 55), time_type(10, 40)), (time_type(10, 45), time_type(11, 30)),
+           (time_type(13, 30), time_type(14, 15)), (time_type(14, 20), time_type(15, 5))]
+PLANNING_WEEKS = 8
+PARENT_PASSWORD = 'Test1234!'
+
+
+def create_test_app(database_url):
+    """Application branchée sur ``database_url``. Les variables d'environnement
+    sont posées avant l'import de config.py (lues à l'import) ; le schéma
+    vient de db.create_all(), pas des migrations : pas de vérification de
+    révision au démarrage."""
+    os.environ['DATABASE_URL'] = database_url
+    os.environ.setdefault('SECRET_KEY', 'query-budgets')
+    os.environ.setdefault('SCHEMA_CHECK_AT_BOOT', '0')
+    from app import create_app
+
+    app = create_app()
+    app.config.update(
+        TESTING=True,
+        WTF_CSRF_ENABLED=False,
+        JOB_RUNNER='worker',          # pas d'exécuteur de fond pendant les mesures
+        N_PLUS_ONE_THRESHOLD=10 ** 6,  # les formes répétées sont rapportées ici
+    )
+    return app
+
+
+def seed(app):
+    """Jeu de test + données des pages mesurées. Returns: dict des ids utiles."""
+    from extensions import db
+    from scripts.seed_test_data import seed_test_data
+
+    with app.app_context():
+        db.create_all()
+        seed_test_data()
+        return _seed_budget_data()
+
+
+def _seed_budget_data():
+    from extensions import db
+    from models.attendance import Attendance
+    from models.classroom import Classroom
+    from models.evaluation import Evaluation
+    from models.exercise import Exercise, ExerciseBlock
+    from models.exercise_progress import ExercisePublication, StudentBlockAnswer, StudentExerciseAttempt
+    from models.parent import Parent, ParentChild
+    from models.planning import Planning
+    from models.schedule import Schedule
+    from models.student import Student
+    from models.user import User
+
+    teacher = User.query.filter(User.email.like('%@profcalendar.dev')).order_by(User.id).first()
+    today = date.today()
+    # Année scolaire autour d'aujourd'hui : il y a toujours un cours à afficher
+    teacher.school_year_start = today - timedelta(days=60)
+    teacher.school_year_end = today + timedelta(days=240)
+    teacher.subscription_tier = 'premium'
+    teacher.premium_until = None
+
+    classrooms = Classroom.query.filter_by(user_id=teacher.id).order_by(Classroom.id).all()
+    classroom = classrooms[0]
+    students = Student.query.filter_by(classroom_id=classroom.id).order_by(Student.id).all()
+
+    # Horaire : 6 périodes par jour, classes en rotation
+    for weekday in range(5):
+        for period, (start, end) in enumerate(PERIODS, start=1):
+            db.session.add(Schedule(
+                user_id=teacher.id, classroom_id=classrooms[(weekday + period) % len(classrooms)].id,
+                weekday=weekday, period_number=period, start_time=start, end_time=end,
+            ))
+
+    # Plannings des semaines autour d'aujourd'hui, présences des cours passés
+    monday = today - timedelta(days=today.weekday())
+    for week in range(-PLANNING_WEEKS // 2, PLANNING_WEEKS // 2):
+        for weekday in range(5):
+            day = monday + timedelta(weeks=week, days=weekday)
+            for period in range(1, len(PERIODS) + 1):
+                planned = classrooms[(weekday + period) % len(classrooms)]
+                db.session.add(Planning(
+                    user_id=teacher.id, classroom_id=planned.id, date=day, period_number=period,
+                    title=f'Séquence {week + PLANNING_WEEKS} — leçon {period}',
+                    description='Objectifs :\n[ ] Correction des devoirs\n[ ] Théorie\n[ ] Exercices 1 à 6',
+                ))
+                if planned.id == classroom.id and day < today:
+                    for i, student in enumerate(students):
+                        db.session.add(Attendance(
+                            student_id=student.id, classroom_id=classroom.id, user_id=teacher.id,
+                            date=day, period_number=period,
+                            status='absent' if (i + period) % 9 == 0 else 'present',
+                        ))
+
+    # Mission en cours : tentatives terminées, en cours et pas commencées
+    exercise = Exercise(user_id=teacher.id, title='Fractions', subject=classroom.subject,
+                        is_published=True, is_draft=False, total_points=50, classroom_id=classroom.id)
+    db.session.add(exercise)
+    db.session.flush()
+    blocks = [ExerciseBlock(exercise_id=exercise.id, block_type='qcm', position=k,
+                            title=f'Question {k + 1}', points=10, config_json={})
+              for k in range(5)]
+    db.session.add_all(blocks)
+    publication = ExercisePublication(exercise_id=exercise.id, classroom_id=classroom.id,
+                                      published_by=teacher.id, is_active=True)
+    db.session.add(publication)
+    db.session.flush()
+    for i, student in enumerate(students[:-2]):
+        attempt = StudentExerciseAttempt(
+            student_id=student.id, exercise_id=exercise.id, publication_id=publication.id,
+            started_at=datetime.utcnow() - timedelta(minutes=20),
+            completed_at=datetime.utcnow() if i % 2 == 0 else None,
+            score=30 + i, max_score=50,
+        )
+        db.session.add(attempt)
+        db.session.flush()
+        answered = blocks if attempt.completed_at else blocks[:3]
+        db.session.add_all([StudentBlockAnswer(attempt_id=attempt.id, block_id=block.id,
+                                               answer_json={'choice': k}, is_correct=k % 2 == 0)
+                            for k, block in enumerate(answered)])
+
+    parent = Parent(email='parent.budget@parent.profcalendar.dev', first_name='Parent',
+                    last_name='Budget', email_verified=True, is_verified=True, teacher_id=teacher.id)
+    parent.set_password(PARENT_PASSWORD)
+    db.session.add(parent)
+    db.session.flush()
+    db.session.add(ParentChild(parent_id=parent.id, student_id=students[0].id))
+    db.session.commit()
+
+    assert Evaluation.query.filter_by(classroom_id=classroom.id).count(), "classe sans évaluation"
+    return {
+        'teacher_id': teacher.id,
+        'classroom_id': classroom.id,
+        'publication_id': publication.id,
+        'student_id': students[0].id,
+        'parent_id': parent.id,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Pages mesurées : fonction(app, client, ids) -> statut HTTP (ou None)
+# ---------------------------------------------------------------------------
+
+def _login(client, user_type, user_id):
+    with client.session_transaction() as session:
+        session['_user_id'] = f'{user_type}:{user_id}'
+        session['_fresh'] = True
+        session['user_type'] = user_type
+
+
+def _get(client, url, **kwargs):
+    response = client.get(url, **kwargs)
+    response.get_data()  # consomme les réponses streamées dans la mesure
+    return response.status_code
+
+
+def _calendar_view(app, client, ids):
+    _login(client, 'teacher', ids['teacher_id'])
+    return _get(client, '/planning/calendar')
+
+
+def _lesson_view(app, client, ids):
+    _login(client, 'teacher', ids['teacher_id'])
+    return _get(client, '/planning/lesson')
+
+
+def _current_or_next_lesson(app, client, ids):
+    from models.user import User
+    from routes.planning import get_current_or_next_lesson
+
+    with app.test_request_context('/planning/lesson'):
+        get_current_or_next_lesson(User.query.get(ids['teacher_id']))
+
+
+def _live_tracking(app, client, ids):
+    _login(client, 'teacher', ids['teacher_id'])
+    return _get(client, f"/exercises/publication/{ids['publication_id']}/live-tracking")
+
+
+def _export_grades(app, client, ids):
+    _login(client, 'teacher', ids['teacher_id'])
+    return _get(client, f"/api/evaluations/classroom/{ids['classroom_id']}/export.csv")
+
+
+def _student_dashboard(app, client, ids):
+    from routes.api import generate_token
+
+    with app.app_context():
+        token = generate_token('student', ids['student_id'])
+    return _get(client, '/api/v1/student/dashboard', headers={'Authorization': f'Bearer {token}'})
+
+
+def _parent_dashboard(app, client, ids):
+    _login(client, 'parent', ids['parent_id'])
+    return _get(client, '/parent/dashboard')
+
+
+PAGES = {
+    'planning.calendar_view': _calendar_view,
+    'planning.lesson_view': _lesson_view,
+    'planning.get_current_or_next_lesson': _current_or_next_lesson,
+    'exercises.live_tracking': _live_tracking,
+    'evaluations.export_grades': _export_grades,
+    'api.student_dashboard': _student_dashboard,
+    'parent_auth.dashboard': _parent_dashboard,
+}
+
+
+def measure(app, ids, name, repeat):
+    """Appelle la page ``repeat`` fois après un appel de chauffe.
+    Returns: (statut, QueryStats de l'appel le plus coûteux, médiane en s)."""
+    from utils.query_stats import capture_queries
+
+    page = PAGES[name]
+    client = app.test_client()
+    with app.app_context():
+        page(app, client, ids)
+        worst, durations, status = None, [], None
+        for _ in range(repeat):
+            with capture_queries(name) as stats:
+                t0 = time.perf_counter()
+                status = page(app, client, ids)
+                durations.append(time.perf_counter() - t0)
+            if worst is None or stats.count > worst.count:
+                worst = stats
+    return status, worst, statistics.median(durations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', help="base Postgres locale vide (défaut : SQLite temporaire)")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--time-factor', type=float, default=1.0,
+                        help="multiplie les bornes de temps (machine lente, CI)")
+    parser.add_argument('--only', action='append', choices=sorted(PAGES), help="page à mesurer (répétable)")
+    args = parser.parse_args()
+
+    tmpdir = None
+    database_url = args.database_url
+    if not database_url:
+        tmpdir = tempfile.TemporaryDirectory()
+        database_url = 'sqlite:///' + os.path.join(tmpdir.name, 'budgets.db')
+
+    app = create_test_app(database_url)
+    ids = seed(app)
+
+    failures = 0
+    try:
+        for name, max_queries, max_ms in BUDGETS:
+            if args.only and name not in args.only:
+                continue
+            status, stats, median = measure(app, ids, name, args.repeat)
+            max_ms *= args.time_factor
+            problems = []
+            # Une redirection (connexion, page vide) mesurerait une autre page
+            if status is not None and not 200 <= status < 300:
+                problems.append(f"HTTP {status}")
+            if stats.count > max_queries:
+                problems.append(f"{stats.count} requêtes > {max_queries}")
+            if median * 1000 > max_ms:
+                problems.append(f"{median * 1000:.0f} ms > {max_ms:.0f} ms")
+            mark = '❌' if problems else '✅'
+            print(f"{mark} {name:<38} {stats.count:>4} requêtes (max {max_queries:>3})  "
+                  f"{median * 1000:7.1f} ms (max {max_ms:.0f})")
+            if problems:
+                failures += 1
+                print(f"   {', '.join(problems)}")
+                print('   ' + stats.report().replace('\n', '\n   '))
+    finally:
+        from extensions import db
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+        if tmpdir is not None:
+            tmpdir.cleanup()
+
+    if failures:
+        print(f"\n{failures} budget(s) dépassé(s)")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -9,8 +9,8 @@ discipline a ses propres lignes élèves (notes/coches indépendantes).
 Champs copiés : identité + contacts (first/last name, email, date de naissance,
 emails parents, infos complémentaires). PAS copiés : mot de passe/authentification
 élève, jeton push — la nouvelle ligne repart neutre. Les élèves déjà présents
-dans la destination (même nom normalisé) sont ignorés. Chiffrement et
-email_hash gérés automatiquement par les modèles de l'app.
+dans la destination (même nom normalisé) sont ignorés. Insertion en lot via
+services/student_import.py (chiffrement des colonnes et email_hash compris).
 """
 import os
 import sys
@@ -75,6 +75,7 @@ def run():
     from extensions import db
     from models.student import Student
     from models.classroom import Classroom
+    from services.student_import import copy_students
 
     app = create_app('production')
 
@@ -84,25 +85,14 @@ def run():
         if not src or not dst:
             raise RuntimeError(f"classe introuvable pour user {user_id}: src={bool(src)} dst={bool(dst)}")
 
-        existants = {
-            (norm(st.last_name), norm(st.first_name))
-            for st in Student.query.filter_by(classroom_id=dst_id, user_id=user_id).all()
-        }
-
-        copies = ignores = 0
-        for st in Student.query.filter_by(classroom_id=src_id, user_id=user_id).all():
-            if (norm(st.last_name), norm(st.first_name)) in existants:
-                ignores += 1
-                continue
-            db.session.add(Student(
-                classroom_id=dst_id, user_id=user_id,
-                first_name=st.first_name, last_name=st.last_name,
-                email=st.email, date_of_birth=st.date_of_birth,
-                parent_email_mother=st.parent_email_mother,
-                parent_email_father=st.parent_email_father,
-                additional_info=st.additional_info,
-            ))
-            copies += 1
+        # Copie en lot : 1 lecture des sources, 1 lecture des noms existants,
+        # INSERT multi-lignes (services/student_import.py)
+        source_ids = [sid for (sid,) in db.session.query(Student.id).filter_by(
+            classroom_id=src_id, user_id=user_id).order_by(Student.id)]
+        copies, ignores = copy_students(
+            source_ids, dst_id, user_id,
+            key=lambda first, last: (norm(last), norm(first)),
+        )
         db.session.commit()
 
         total = Student.query.filter_by(classroom_id=dst_id, user_id=user_id).count()
@@ -0,0 +1,86 @@
+"""Mesure le démarrage à froid de l'application et vérifie son budget.
+
+Chaque mesure importe app.py dans un nouveau processus Python (rien en
+cache, comme un déploiement) sur une base SQLite temporaire, puis affiche
+le profil de create_app (utils/startup.py) : durée par blueprint et par
+phase. Échoue (code de sortie 1) si :
+
+    - la médiane dépasse --budget-ms ;
+    - un module lourd et optionnel (HEAVY_MODULES) a été exécuté pendant le
+      démarrage au lieu d'être chargé au premier usage.
+
+    python scripts/profile_startup.py
+    python scripts/profile_startup.py --repeat 5 --budget-ms 4000
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_BUDGET_MS = 3000
+
+# Modules qui ne doivent pas être exécutés par create_app
+HEAVY_MODULES = ['stripe', 'PIL.Image', 'resend', 'reportlab', 'boto3', 'fitz']
+
+_CHILD = """
+import json, sys, time
+t0 = time.perf_counter()
+import app
+elapsed = time.perf_counter() - t0
+from utils.startup import module_loaded
+print(json.dumps({
+    'import_ms': round(elapsed * 1000, 1),
+    'profile': app.app.extensions['startup_profile'].to_dict(),
+    'loaded': [name for name in sys.argv[1:] if module_loaded(name)],
+}))
+"""
+
+
+def cold_start(database_url):
+    """Démarrage dans un nouveau processus. Returns: dict (voir _CHILD)."""
+    env = dict(os.environ, DATABASE_URL=database_url, STARTUP_PROFILE='0',
+               SCHEMA_CHECK_AT_BOOT='0')
+    env.pop('FLASK_ENV', None)
+    result = subprocess.run([sys.executable, '-c', _CHILD, *HEAVY_MODULES], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    # create_app affiche encore des messages : le JSON est la dernière ligne
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument('--top', type=int, default=10, help="phases affichées")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        runs = [cold_start('sqlite:///' + os.path.join(tmp, 'startup.db')) for _ in range(args.repeat)]
+
+    median = statistics.median(run['import_ms'] for run in runs)
+    last = runs[-1]
+    print(f"Démarrage à froid : médiane {median:.0f} ms sur {args.repeat} "
+          f"(create_app {last['profile']['total_ms']:.0f} ms, budget {args.budget_ms:.0f} ms)")
+    for phase in sorted(last['profile']['phases'], key=lambda p: -p['ms'])[:args.top]:
+        suffix = f"  (échec : {phase['error']})" if phase['error'] else ''
+        print(f"  {phase['ms']:7.1f} ms  {phase['name']}{suffix}")
+
+    failures = []
+    if median > args.budget_ms:
+        failures.append(f"médiane {median:.0f} ms > budget {args.budget_ms:.0f} ms")
+    if last['loaded']:
+        failures.append(f"modules lourds chargés au démarrage : {', '.join(last['loaded'])}")
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        sys.exit(1)
+    print("✅ Budget de démarrage respecté")
+
+
+if __name__ == '__main__':
+    main()
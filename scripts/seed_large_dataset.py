@@ -0,0 +1,532 @@
+"""Jeu de données synthétique à grande échelle (tests de charge, budgets).
+
+seed_test_data.py et seed_demo_class.py créent quelques enseignants : trop
+peu pour reproduire les lenteurs des enseignants à 10 classes, avec classes
+partagées et dérivées, deux ans de plannings, des milliers de présences,
+des centaines de fichiers et des annotations de plusieurs Mo.
+
+Ici, pour chaque enseignant (--teachers, 100 par défaut) :
+    - CLASSES classes de STUDENTS élèves (profil RPG, parent pour une partie) ;
+    - une maîtrise de classe et un code d'accès ; un enseignant sur
+      COLLABORATION_EVERY collabore avec le suivant (classe dérivée + liens) ;
+    - un horaire de LESSONS_PER_CLASS périodes par classe et par semaine,
+      et un planning par période sur deux années scolaires ;
+    - des évaluations notées, des présences (ATTENDANCE_RATIO des cours
+      passés), des modèles de sanctions avec compteurs ;
+    - FILES fichiers dans une arborescence de dossiers, dont quelques PDF
+      annotés (ANNOTATION_KB par annotation, une ligne par page) ;
+    - des exercices publiés avec tentatives et réponses.
+
+Déterministe : même --seed et même --today → mêmes données. Tout passe par
+des INSERT multi-lignes (services/student_import.py fait de même) : les hooks
+ORM ne s'appliquent pas, email_hash est calculé ici et le cumul des présences
+est reconstruit à la fin de chaque lot d'enseignants.
+
+Fichiers : écrits sous UPLOAD_FOLDER/files/<user_id>/ (repli disque du
+gestionnaire de fichiers) si UPLOAD_FOLDER est configuré, sinon en BLOB.
+
+À lancer sur une base vide ou dédiée :
+    flask seed-large-data
+    flask seed-large-data --teachers 10 --seed 7 --today 2026-03-02
+"""
+import json
+import os
+import random
+from datetime import date, datetime, time, timedelta
+
+DOMAIN = 'scale.profcalendar.dev'
+PASSWORD = 'Test1234!'
+
+CLASSES = 10
+STUDENTS = 22
+LESSONS_PER_CLASS = 3
+EVALUATIONS_PER_YEAR = 6
+ATTENDANCE_RATIO = 0.15
+COLLABORATION_EVERY = 3
+PARENT_RATIO = 0.5
+FOLDERS = 20
+FILES = 300
+FILE_KB = 8
+ANNOTATED_FILES = 5
+ANNOTATION_PAGES = 30
+ANNOTATION_KB = 2048
+EXERCISES = 15
+BLOCKS_PER_EXERCISE = 8
+SANCTION_TEMPLATES = 3
+
+# Enseignants par transaction (et par reconstruction du cumul des présences)
+COMMIT_EVERY = 10
+INSERT_BATCH_SIZE = 1000
+
+PERIODS = [(time(8, 0), time(8, 45)), (time(8, 50), time(9, 35)), (time(9, 55), time(10, 40)),
+           (time(10, 45), time(11, 30)), (time(11, 35), time(12, 20)), (time(13, 30), time(14, 15)),
+           (time(14, 20), time(15, 5)), (time(15, 10), time(15, 55))]
+SUBJECTS = ['Français', 'Mathématiques', 'Allemand', 'Anglais', 'Histoire', 'Géographie',
+            'Sciences', 'Physique', 'Arts visuels', 'Musique', 'Éducation physique']
+COLORS = ['#4F46E5', '#10B981', '#F59E0B', '#EF4444', '#8B5CF6', '#06B6D4']
+FIRST_NAMES = ['Emma', 'Léa', 'Chloé', 'Lina', 'Alice', 'Mia', 'Zoé', 'Louise', 'Camille', 'Jade',
+               'Noah', 'Liam', 'Lucas', 'Ethan', 'Nathan', 'Louis', 'Hugo', 'Gabriel', 'Arthur', 'Jules']
+LAST_NAMES = ['Müller', 'Meier', 'Schmid', 'Keller', 'Weber', 'Huber', 'Rossi', 'Bianchi', 'Favre',
+              'Bonvin', 'Carron', 'Fellay', 'Luyet', 'Blanc', 'Dufour', 'Monnet', 'Rochat', 'Vuille']
+AVATAR_CLASSES = ['guerrier', 'mage', 'archer', 'guerisseur']
+MINIMAL_PDF = (b'%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n'
+               b'2 0 obj<</Type/Pages/Kids[3 0 R]/Count 1>>endobj\n'
+               b'3 0 obj<</Type/Page/Parent 2 0 R/MediaBox[0 0 595 842]>>endobj\n'
+               b'trailer<</Root 1 0 R>>\n%%EOF\n')
+
+
+def school_years(today):
+    """(début, fin) des deux dernières années scolaires, la courante en dernier."""
+    first_year = today.year if today.month >= 8 else today.year - 1
+    return [(date(year, 8, 20), date(year + 1, 6, 26)) for year in (first_year - 1, first_year)]
+
+
+def school_year_label(start):
+    return f'{start.year}-{start.year + 1}'
+
+
+def _insert(model, rows, returning=True):
+    """INSERT multi-lignes par paquets. Returns: ids dans l'ordre de ``rows``
+    (ou [] si ``returning`` est faux)."""
+    from sqlalchemy import insert
+    from extensions import db
+
+    ids = []
+    for start in range(0, len(rows), INSERT_BATCH_SIZE):
+        batch = rows[start:start + INSERT_BATCH_SIZE]
+        if returning:
+            statement = insert(model).returning(model.id, sort_by_parameter_order=True)
+            ids.extend(db.session.scalars(statement, batch))
+        else:
+            db.session.execute(insert(model), batch)
+    return ids
+
+
+class _Generator:
+    """État d'une génération : tirages aléatoires et ids créés."""
+
+    def __init__(self, seed, today, upload_folder):
+        self.rng = random.Random(seed)
+        self.today = today
+        self.years = school_years(today)
+        self.upload_folder = upload_folder
+        self.now = datetime.combine(today, time(12, 0))
+
+    # ------------------------------------------------------------------
+    # Enseignants, classes, élèves
+    # ------------------------------------------------------------------
+
+    def teachers(self, count, password_hash):
+        from models.user import User
+
+        start, end = self.years[-1]
+        rows = [{
+            'username': f'Enseignant {i:04d}',
+            'email': f'prof{i:04d}@{DOMAIN}',
+            'password_hash': password_hash,
+            'email_verified': True,
+            'subscription_tier': 'premium' if i % 2 == 0 else 'freemium',
+            'setup_completed': True,
+            'schedule_completed': True,
+            'school_year_start': start,
+            'school_year_end': end,
+            'day_start_time': PERIODS[0][0],
+            'day_end_time': PERIODS[-1][1],
+            'period_duration': 45,
+            'break_duration': 5,
+            'created_at': self.now,
+        } for i in range(count)]
+        return _insert(User, rows)
+
+    def classrooms(self, teacher_id):
+        from models.classroom import Classroom
+
+        rows = []
+        for c in range(CLASSES):
+            group = f'{9 + c % 3}VG{c // 3 + 1}'
+            rows.append({
+                'user_id': teacher_id, 'name': group, 'class_group': group,
+                'subject': SUBJECTS[(teacher_id + c) % len(SUBJECTS)],
+                'color': COLORS[c % len(COLORS)], 'is_class_master': c == 0,
+            })
+        return _insert(Classroom, rows)
+
+    def students(self, teacher_id, classroom_ids):
+        """Returns: {classroom_id: [student_id, ...]}."""
+        from models.student import Student
+        from utils.encryption import encryption_engine
+
+        rows, owners = [], []
+        for classroom_id in classroom_ids:
+            for s in range(STUDENTS):
+                first, last = self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES)
+                email = f'eleve{classroom_id}.{s}@{DOMAIN}'
+                rows.append({
+                    'classroom_id': classroom_id, 'user_id': teacher_id,
+                    'first_name': first, 'last_name': last,
+                    'email': email, 'email_hash': encryption_engine.hash_email(email),
+                    'parent_email_mother': f'parent{classroom_id}.{s}@{DOMAIN}',
+                    'created_at': self.now,
+                })
+                owners.append(classroom_id)
+        by_classroom = {classroom_id: [] for classroom_id in classroom_ids}
+        for classroom_id, student_id in zip(owners, _insert(Student, rows)):
+            by_classroom[classroom_id].append(student_id)
+        return by_classroom
+
+    def parents(self, teacher_id, student_ids, password_hash):
+        from models.parent import Parent, ParentChild
+        from utils.encryption import encryption_engine
+
+        chosen = [s for s in student_ids if self.rng.random() < PARENT_RATIO]
+        rows = [{
+            'email': f'parent.{s}@{DOMAIN}', 'email_hash': encryption_engine.hash_email(f'parent.{s}@{DOMAIN}'),
+            'password_hash': password_hash, 'first_name': 'Parent', 'last_name': str(s),
+            'teacher_id': teacher_id, 'is_verified': True, 'email_verified': True, 'created_at': self.now,
+        } for s in chosen]
+        parent_ids = _insert(Parent, rows)
+        _insert(ParentChild, [{'parent_id': p, 'student_id': s, 'relationship': 'mother', 'created_at': self.now}
+                              for p, s in zip(parent_ids, chosen)], returning=False)
+
+    def rpg_profiles(self, student_ids):
+        from models.rpg import StudentRPGProfile
+
+        rows = []
+        for student_id in student_ids:
+            xp = self.rng.randint(0, 5000)
+            rows.append({
+                'student_id': student_id, 'avatar_class': self.rng.choice(AVATAR_CLASSES),
+                'xp_total': xp, 'level': 1 + xp // 500, 'gold': self.rng.randint(0, 300),
+                'avatar_accessories_json': {}, 'evolutions_json': [], 'active_skills_json': [],
+                'equipment_json': {}, 'created_at': self.now,
+            })
+        _insert(StudentRPGProfile, rows, returning=False)
+
+    # ------------------------------------------------------------------
+    # Collaborations
+    # ------------------------------------------------------------------
+
+    def access_codes(self, teacher_ids):
+        from models.class_collaboration import TeacherAccessCode
+
+        rows = [{'master_teacher_id': t, 'code': f'SC{t:08d}', 'is_active': True, 'current_uses': 0,
+                 'created_at': self.now} for t in teacher_ids]
+        return dict(zip(teacher_ids, _insert(TeacherAccessCode, rows)))
+
+    def class_master(self, teacher_id, classroom_id):
+        from models.class_collaboration import ClassMaster
+
+        _insert(ClassMaster, [{'classroom_id': classroom_id, 'master_teacher_id': teacher_id,
+                               'school_year': school_year_label(self.years[-1][0]),
+                               'created_at': self.now}], returning=False)
+
+    def collaboration(self, specialist_id, master_id, code_id, master_classroom_id, master_students):
+        """Classe dérivée de la maîtrise de ``master_id`` pour ``specialist_id``.
+        Returns: id de la classe dérivée."""
+        from models.class_collaboration import SharedClassroom, StudentClassroomLink, TeacherCollaboration
+        from models.classroom import Classroom
+
+        subject = SUBJECTS[specialist_id % len(SUBJECTS)]
+        collaboration_id, = _insert(TeacherCollaboration, [{
+            'specialized_teacher_id': specialist_id, 'master_teacher_id': master_id,
+            'access_code_id': code_id, 'is_active': True, 'joined_at': self.now}])
+        derived_id, = _insert(Classroom, [{
+            'user_id': specialist_id, 'name': 'Dérivée', 'class_group': 'Dérivée',
+            'subject': subject, 'color': '#8B5CF6'}])
+        _insert(SharedClassroom, [{'collaboration_id': collaboration_id, 'original_classroom_id': master_classroom_id,
+                                   'derived_classroom_id': derived_id, 'subject': subject,
+                                   'created_at': self.now}], returning=False)
+        _insert(StudentClassroomLink, [{'student_id': s, 'classroom_id': derived_id, 'subject': subject,
+                                        'is_primary': False, 'added_by_teacher_id': specialist_id,
+                                        'added_at': self.now} for s in master_students], returning=False)
+        return derived_id
+
+    # ------------------------------------------------------------------
+    # Horaire, plannings, présences
+    # ------------------------------------------------------------------
+
+    def schedule(self, teacher_id, classroom_ids):
+        """Returns: {(jour, période): classroom_id}."""
+        from models.schedule import Schedule
+
+        slots = [(weekday, period) for weekday in range(5) for period in range(1, len(PERIODS) + 1)]
+        self.rng.shuffle(slots)
+        wanted = [c for c in classroom_ids for _ in range(LESSONS_PER_CLASS)]
+        assigned = dict(zip(slots, wanted))
+        _insert(Schedule, [{
+            'user_id': teacher_id, 'classroom_id': classroom_id, 'weekday': weekday,
+            'period_number': period, 'start_time': PERIODS[period - 1][0], 'end_time': PERIODS[period - 1][1],
+        } for (weekday, period), classroom_id in sorted(assigned.items())], returning=False)
+        return assigned
+
+    def lesson_days(self):
+        """Jours de classe des deux années scolaires (lundi→vendredi)."""
+        for start, end in self.years:
+            day = start
+            while day <= end:
+                if day.weekday() < 5:
+                    yield day
+                day += timedelta(days=1)
+
+    def plannings(self, teacher_id, slots):
+        from models.planning import Planning
+
+        rows, taught = [], []
+        for day in self.lesson_days():
+            for period in range(1, len(PERIODS) + 1):
+                classroom_id = slots.get((day.weekday(), period))
+                if classroom_id is None:
+                    continue
+                rows.append({
+                    'user_id': teacher_id, 'classroom_id': classroom_id, 'date': day, 'period_number': period,
+                    'title': f'Leçon du {day:%d.%m}',
+                    'description': 'Objectifs :\n[x] Correction\n[ ] Théorie\n[ ] Exercices 1 à 8',
+                    'created_at': self.now, 'updated_at': self.now,
+                })
+                if day < self.today:
+                    taught.append((classroom_id, day, period))
+        _insert(Planning, rows, returning=False)
+        return taught
+
+    def attendance(self, teacher_id, taught, students):
+        from models.attendance import Attendance
+
+        rows = []
+        for classroom_id, day, period in taught:
+            if classroom_id not in students or self.rng.random() >= ATTENDANCE_RATIO:
+                continue
+            for student_id in students[classroom_id]:
+                roll = self.rng.random()
+                status = 'absent' if roll < 0.04 else 'late' if roll < 0.07 else 'present'
+                rows.append({
+                    'student_id': student_id, 'classroom_id': classroom_id, 'user_id': teacher_id,
+                    'date': day, 'period_number': period, 'status': status,
+                    'late_minutes': self.rng.randint(2, 15) if status == 'late' else None,
+                    'created_at': self.now,
+                })
+        _insert(Attendance, rows, returning=False)
+
+    # ------------------------------------------------------------------
+    # Évaluations, sanctions
+    # ------------------------------------------------------------------
+
+    def evaluations(self, students):
+        from models.evaluation import Evaluation, EvaluationGrade
+
+        rows, owners = [], []
+        for classroom_id in students:
+            for start, end in self.years:
+                span = (min(end, self.today) - start).days
+                for k in range(EVALUATIONS_PER_YEAR if span > 0 else 0):
+                    rows.append({
+                        'classroom_id': classroom_id, 'title': f'Évaluation {k + 1}',
+                        'type': 'significatif' if k % 2 == 0 else 'ta',
+                        'date': start + timedelta(days=span * (k + 1) // (EVALUATIONS_PER_YEAR + 1)),
+                        'max_points': 40, 'min_points': 0,
+                    })
+                    owners.append(classroom_id)
+        grades = []
+        for classroom_id, evaluation_id in zip(owners, _insert(Evaluation, rows)):
+            for student_id in students[classroom_id]:
+                points = None if self.rng.random() < 0.03 else round(self.rng.uniform(12, 40) * 2) / 2
+                grades.append({'evaluation_id': evaluation_id, 'student_id': student_id,
+                               'points': points, 'date': self.now})
+        _insert(EvaluationGrade, grades, returning=False)
+
+    def sanctions(self, teacher_id, students):
+        from models.sanctions import ClassroomSanctionImport, SanctionOption, SanctionTemplate, SanctionThreshold
+        from models.student_sanctions import StudentSanctionCount
+
+        template_ids = _insert(SanctionTemplate, [{
+            'user_id': teacher_id, 'name': f'Sanction {k + 1}', 'description': 'Oubli, bavardage, devoirs',
+            'is_active': True, 'created_at': self.now} for k in range(SANCTION_TEMPLATES)])
+        thresholds = [(t, count) for t in template_ids for count in (3, 6, 9)]
+        threshold_ids = _insert(SanctionThreshold, [{'template_id': t, 'check_count': count, 'created_at': self.now}
+                                                    for t, count in thresholds])
+        _insert(SanctionOption, [{'threshold_id': th, 'description': f'Option {k + 1}', 'order_index': k,
+                                  'is_active': True, 'created_at': self.now}
+                                 for th in threshold_ids for k in range(2)], returning=False)
+        _insert(ClassroomSanctionImport, [{'classroom_id': c, 'template_id': t, 'is_active': True,
+                                           'imported_at': self.now}
+                                          for c in students for t in template_ids], returning=False)
+        _insert(StudentSanctionCount, [{'student_id': s, 'template_id': t, 'check_count': self.rng.choice((0, 0, 1, 2, 4, 7)),
+                                        'created_at': self.now}
+                                       for ids in students.values() for s in ids for t in template_ids],
+                returning=False)
+
+    # ------------------------------------------------------------------
+    # Fichiers et annotations
+    # ------------------------------------------------------------------
+
+    def files(self, teacher_id):
+        from models.file_manager import FileAnnotation, FileAnnotationPage, FileFolder, UserFile
+
+        folder_ids = []
+        for k in range(FOLDERS):
+            parent_id = self.rng.choice(folder_ids) if folder_ids and k % 3 else None
+            folder_ids.extend(_insert(FileFolder, [{'user_id': teacher_id, 'parent_id': parent_id,
+                                                    'name': f'Dossier {k + 1}', 'color': COLORS[k % len(COLORS)],
+                                                    'created_at': self.now, 'updated_at': self.now}]))
+
+        content = MINIMAL_PDF + b'%' + b'x' * max(FILE_KB * 1024 - len(MINIMAL_PDF) - 2, 0) + b'\n'
+        rows = []
+        for k in range(FILES):
+            filename = f'scale_{teacher_id}_{k}.pdf'
+            rows.append({
+                'user_id': teacher_id, 'folder_id': self.rng.choice(folder_ids + [None]),
+                'filename': filename, 'original_filename': f'Fiche {k + 1}.pdf', 'file_type': 'pdf',
+                'file_size': len(content), 'mime_type': 'application/pdf', 'uploaded_at': self.now,
+                'file_content': None if self.upload_folder else content,
+            })
+            if self.upload_folder:
+                path = os.path.join(self.upload_folder, 'files', str(teacher_id), filename)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'wb') as f:
+                    f.write(content)
+        file_ids = _insert(UserFile, rows)
+
+        annotated = file_ids[:ANNOTATED_FILES]
+        annotation_ids = _insert(FileAnnotation, [{
+            'file_id': file_id, 'file_type': 'user_file', 'user_id': teacher_id,
+            'annotations_data': {}, 'created_at': self.now, 'updated_at': self.now} for file_id in annotated])
+        pages = []
+        for annotation_id in annotation_ids:
+            for page in range(1, ANNOTATION_PAGES + 1):
+                pages.append({'annotation_id': annotation_id, 'page_key': str(page), 'page_number': page,
+                              'data': self._strokes(ANNOTATION_KB * 1024 // ANNOTATION_PAGES),
+                              'version': 1, 'updated_at': self.now})
+        _insert(FileAnnotationPage, pages, returning=False)
+
+    def _strokes(self, size):
+        """Traits de stylet d'environ ``size`` octets une fois en JSON."""
+        strokes, total = [], 0
+        while total < size:
+            x, y = self.rng.uniform(0, 595), self.rng.uniform(0, 842)
+            points = []
+            for _ in range(40):
+                x += self.rng.uniform(-3, 3)
+                y += self.rng.uniform(-3, 3)
+                points.append([round(x, 1), round(y, 1)])
+            stroke = {'type': 'pen', 'color': '#1F2937', 'width': 2, 'points': points}
+            strokes.append(stroke)
+            total += len(json.dumps(stroke))
+        return strokes
+
+    # ------------------------------------------------------------------
+    # Exercices
+    # ------------------------------------------------------------------
+
+    def exercises(self, teacher_id, students):
+        from models.exercise import Exercise, ExerciseBlock
+        from models.exercise_progress import ExercisePublication, StudentBlockAnswer, StudentExerciseAttempt
+
+        classroom_ids = list(students)
+        targets = [classroom_ids[k % len(classroom_ids)] for k in range(EXERCISES)]
+        exercise_ids = _insert(Exercise, [{
+            'user_id': teacher_id, 'title': f'Mission {k + 1}', 'subject': SUBJECTS[k % len(SUBJECTS)],
+            'is_published': True, 'is_draft': False, 'total_points': 10 * BLOCKS_PER_EXERCISE,
+            'classroom_id': classroom_id, 'created_at': self.now, 'updated_at': self.now,
+        } for k, classroom_id in enumerate(targets)])
+        block_ids = _insert(ExerciseBlock, [{
+            'exercise_id': e, 'block_type': 'qcm', 'position': b, 'title': f'Question {b + 1}',
+            'config_json': {'choices': ['A', 'B', 'C', 'D'], 'answer': b % 4}, 'points': 10, 'created_at': self.now,
+        } for e in exercise_ids for b in range(BLOCKS_PER_EXERCISE)])
+        publication_ids = _insert(ExercisePublication, [{
+            'exercise_id': e, 'classroom_id': c, 'published_by': teacher_id, 'published_at': self.now,
+            'mode': 'classique', 'is_active': False} for e, c in zip(exercise_ids, targets)])
+
+        attempts, answered = [], []
+        for k, (e, c, p) in enumerate(zip(exercise_ids, targets, publication_ids)):
+            blocks = block_ids[k * BLOCKS_PER_EXERCISE:(k + 1) * BLOCKS_PER_EXERCISE]
+            for student_id in students[c]:
+                if self.rng.random() >= 0.8:
+                    continue
+                correct = [self.rng.random() < 0.7 for _ in blocks]
+                completed = self.rng.random() < 0.9
+                attempts.append({
+                    'student_id': student_id, 'exercise_id': e, 'publication_id': p,
+                    'started_at': self.now - timedelta(days=k), 'completed_at': self.now - timedelta(days=k) if completed else None,
+                    'score': 10 * sum(correct), 'max_score': 10 * len(blocks),
+                    'xp_earned': 10 * sum(correct) if completed else 0, 'gold_earned': 0,
+                })
+                answered.append(list(zip(blocks, correct)))
+        answers = []
+        for attempt_id, block_answers in zip(_insert(StudentExerciseAttempt, attempts), answered):
+            answers.extend({'attempt_id': attempt_id, 'block_id': b, 'answer_json': {'choice': int(ok)},
+                            'is_correct': ok, 'points_earned': 10 if ok else 0, 'answered_at': self.now}
+                           for b, ok in block_answers)
+        _insert(StudentBlockAnswer, answers, returning=False)
+
+
+def seed_large_dataset(teachers=100, seed=42, today=None):
+    """Génère le jeu de données (voir le docstring du module)."""
+    import time as time_module
+    from flask import current_app
+    from werkzeug.security import generate_password_hash
+    from extensions import db
+    from models.user import User
+    from services.access_control import invalidate_access
+    from services.attendance_stats import rebuild_rollup
+
+    if User.query.filter(User.email.like(f'%@{DOMAIN}')).first():
+        print(f'⚠️  Des données @{DOMAIN} existent déjà : utilisez une base vide.')
+        return
+
+    started = time_module.perf_counter()
+    gen = _Generator(seed, today or date.today(), current_app.config.get('UPLOAD_FOLDER'))
+    password_hash = generate_password_hash(PASSWORD)
+
+    teacher_ids = gen.teachers(teachers, password_hash)
+    codes = gen.access_codes(teacher_ids)
+    classrooms, students = {}, {}
+    for teacher_id in teacher_ids:
+        classrooms[teacher_id] = gen.classrooms(teacher_id)
+        students[teacher_id] = gen.students(teacher_id, classrooms[teacher_id])
+        all_students = [s for ids in students[teacher_id].values() for s in ids]
+        gen.parents(teacher_id, all_students, password_hash)
+        gen.rpg_profiles(all_students)
+        gen.class_master(teacher_id, classrooms[teacher_id][0])
+    db.session.commit()
+    print(f'👤 {teachers} enseignants, {teachers * CLASSES} classes, '
+          f'{teachers * CLASSES * STUDENTS} élèves ({time_module.perf_counter() - started:.0f} s)')
+
+    for i, teacher_id in enumerate(teacher_ids):
+        taught_students = dict(students[teacher_id])
+        if i % COLLABORATION_EVERY == 0 and len(teacher_ids) > 1:
+            master_id = teacher_ids[(i + 1) % len(teacher_ids)]
+            master_classroom = classrooms[master_id][0]
+            master_students = students[master_id][master_classroom]
+            derived_id = gen.collaboration(teacher_id, master_id, codes[master_id], master_classroom, master_students)
+            taught_students[derived_id] = master_students
+
+        slots = gen.schedule(teacher_id, classrooms[teacher_id])
+        taught = gen.plannings(teacher_id, slots)
+        gen.attendance(teacher_id, taught, students[teacher_id])
+        gen.evaluations(taught_students)
+        gen.sanctions(teacher_id, students[teacher_id])
+        gen.files(teacher_id)
+        gen.exercises(teacher_id, students[teacher_id])
+
+        if (i + 1) % COMMIT_EVERY == 0 or i + 1 == len(teacher_ids):
+            batch = teacher_ids[i - i % COMMIT_EVERY:i + 1]
+            rebuild_rollup([c for t in batch for c in classrooms[t]])
+            db.session.commit()
+            print(f'   {i + 1}/{teachers} enseignants ({time_module.perf_counter() - started:.0f} s)')
+
+    invalidate_access()
+    print(f'✅ Jeu de données généré en {time_module.perf_counter() - started:.0f} s '
+          f'(mot de passe : {PASSWORD}, emails prof0000@{DOMAIN}…)')
+
+
+def register_large_dataset_command(app):
+    """Enregistre la commande `flask seed-large-data`."""
+    import click
+
+    @app.cli.command('seed-large-data')
+    @click.option('--teachers', default=100, show_default=True, help="Nombre d'enseignants")
+    @click.option('--seed', default=42, show_default=True, help='Graine aléatoire')
+    @click.option('--today', default=None, help='Date de référence AAAA-MM-JJ (défaut : aujourd\'hui)')
+    def _seed_large_data_cmd(teachers, seed, today):
+        """Génère un jeu de données synthétique à grande échelle."""
+        reference = datetime.strptime(today, '%Y-%m-%d').date() if today else None
+        seed_large_dataset(teachers=teachers, seed=seed, today=reference)
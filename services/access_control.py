@@ -0,0 +1,207 @@
+"""Droits d'accès d'un enseignant aux classes et aux élèves.
+
+user_can_access_classroom (dupliquée dans routes/planning.py et
+routes/evaluations.py) et user_can_access_student parcouraient
+TeacherCollaboration / SharedClassroom / ClassMaster en boucles Python
+imbriquées, avec des print de debug, en tête de presque chaque endpoint et
+parfois plusieurs fois par requête.
+
+Ici, les ensembles d'ids accessibles sont calculés une fois par enseignant
+(2 requêtes) puis chaque contrôle est une recherche dans un set. Une classe
+est accessible si :
+
+    1. l'enseignant en est propriétaire ;
+    2. c'est une classe dérivée dont la classe originale a pour maître de
+       classe l'enseignant ;
+    3. c'est la classe originale d'une collaboration active où l'enseignant
+       est enseignant spécialisé ;
+    4. l'enseignant est maître de classe et c'est une classe dérivée d'une de
+       ses collaborations actives.
+
+Un élève est accessible s'il appartient à l'enseignant ou à une classe
+accessible.
+
+Cache : un AccessSet par enseignant, en mémoire du processus (un seul
+worker eventlet en production), vidé quand une classe, un élève, un maître
+de classe, une collaboration ou une classe partagée est créé, modifié ou
+supprimé (événements ORM, INSERT/DELETE/UPDATE en masse compris). ACCESS_CACHE_TTL
+borne la durée de vie d'une entrée pour les écritures hors ORM.
+"""
+import threading
+import time
+from collections import namedtuple
+
+from sqlalchemy import event, or_, select, union
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models.class_collaboration import ClassMaster, SharedClassroom, TeacherCollaboration
+from models.classroom import Classroom
+from models.student import Student
+
+# Durée de vie maximale d'un jeu de droits en cache (secondes).
+ACCESS_CACHE_TTL = 300
+
+AccessSet = namedtuple('AccessSet', 'classroom_ids student_ids')
+
+_cache = {}                      # user_id -> (expires_at, AccessSet)
+_lock = threading.Lock()
+# Incrémentée par invalidate_access() : un jeu calculé pendant une
+# invalidation (lectures antérieures à l'écriture) n'est pas mis en cache.
+_generation = 0
+
+# Modèles dont la modification change des droits d'accès, et colonnes
+# concernées (modifier le nom d'un élève ne vide pas le cache)
+_WATCHED_ATTRS = {
+    Classroom: ('user_id',),
+    Student: ('user_id', 'classroom_id'),
+    ClassMaster: ('classroom_id', 'master_teacher_id'),
+    TeacherCollaboration: ('specialized_teacher_id', 'master_teacher_id', 'is_active'),
+    SharedClassroom: ('collaboration_id', 'original_classroom_id', 'derived_classroom_id'),
+}
+_WATCHED = tuple(_WATCHED_ATTRS)
+
+
+def _accessible_classroom_ids(user_id):
+    own = select(Classroom.id).where(Classroom.user_id == user_id)
+
+    # 2. Classes dérivées d'une classe dont l'enseignant est maître
+    derived_of_mastered = select(SharedClassroom.derived_classroom_id).join(
+        ClassMaster, ClassMaster.classroom_id == SharedClassroom.original_classroom_id
+    ).where(ClassMaster.master_teacher_id == user_id)
+
+    # 3. Classes originales des collaborations (enseignant spécialisé)
+    originals = select(SharedClassroom.original_classroom_id).join(
+        TeacherCollaboration, TeacherCollaboration.id == SharedClassroom.collaboration_id
+    ).where(
+        TeacherCollaboration.specialized_teacher_id == user_id,
+        TeacherCollaboration.is_active == True,
+    )
+
+    # 4. Classes dérivées des collaborations d'un maître de classe
+    derived_of_collaborations = select(SharedClassroom.derived_classroom_id).join(
+        TeacherCollaboration, TeacherCollaboration.id == SharedClassroom.collaboration_id
+    ).where(
+        TeacherCollaboration.master_teacher_id == user_id,
+        TeacherCollaboration.is_active == True,
+        select(ClassMaster.id).where(ClassMaster.master_teacher_id == user_id).exists(),
+    )
+
+    candidates = union(own, derived_of_mastered, originals, derived_of_collaborations).subquery()
+    # Seules les classes qui existent encore
+    return frozenset(db.session.execute(
+        select(Classroom.id).where(Classroom.id.in_(select(candidates.c[0])))
+    ).scalars())
+
+
+def _compute(user_id):
+    classroom_ids = _accessible_classroom_ids(user_id)
+    student_filter = Student.user_id == user_id
+    if classroom_ids:
+        student_filter = or_(student_filter, Student.classroom_id.in_(classroom_ids))
+    student_ids = frozenset(db.session.execute(
+        select(Student.id).where(student_filter)
+    ).scalars())
+    return AccessSet(classroom_ids, student_ids)
+
+
+def get_access_set(user_id):
+    """AccessSet (classes et élèves accessibles) de ``user_id``, depuis le
+    cache si les droits n'ont pas changé (2 requêtes sinon)."""
+    now = time.monotonic()
+    with _lock:
+        entry = _cache.get(user_id)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        generation = _generation
+
+    access = _compute(user_id)
+    with _lock:
+        if _generation == generation:
+            _cache[user_id] = (now + ACCESS_CACHE_TTL, access)
+    return access
+
+
+def invalidate_access(user_id=None):
+    """Oublie les droits de ``user_id`` (de tout le monde par défaut)."""
+    global _generation
+    with _lock:
+        _generation += 1
+        if user_id is None:
+            _cache.clear()
+        else:
+            _cache.pop(user_id, None)
+
+
+def _as_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def user_can_access_classroom(user_id, classroom_id):
+    """Vérifie si un utilisateur peut accéder à une classe (directement ou via collaboration)"""
+    classroom_id = _as_int(classroom_id)
+    if classroom_id is None or user_id is None:
+        return False
+    return classroom_id in get_access_set(user_id).classroom_ids
+
+
+def user_can_access_student(user_id, student_id):
+    """Élève si l'utilisateur peut y accéder (directement ou via
+    collaboration), None sinon."""
+    student_id = _as_int(student_id)
+    if student_id is None or user_id is None:
+        return None
+    if student_id not in get_access_set(user_id).student_ids:
+        return None
+    return db.session.get(Student, student_id)
+
+
+# ---------------------------------------------------------------------------
+# Invalidation (événements ORM)
+# ---------------------------------------------------------------------------
+# Le cache est vidé au flush (les requêtes suivantes de la même session
+# voient les nouveaux droits) et au commit (un jeu recalculé entre-temps par
+# une autre session serait périmé).
+
+def _changes_access(obj, session):
+    if obj in session.new or obj in session.deleted:
+        return True
+    attrs = db.inspect(obj).attrs
+    return any(attrs[name].history.has_changes() for name in _WATCHED_ATTRS[type(obj)])
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_access_changes(session, flush_context, instances):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if type(obj) in _WATCHED_ATTRS and _changes_access(obj, session):
+            invalidate_access()
+            session.info['access_dirty'] = True
+            return
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session):
+    if session.info.pop('access_dirty', False):
+        invalidate_access()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_rolled_back(session):
+    if session.info.pop('access_dirty', False):
+        # Les droits calculés avec les écritures annulées sont faux
+        invalidate_access()
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _bulk_changes(orm_execute_state):
+    # INSERT en masse compris (import d'élèves : services/student_import.py)
+    if not (orm_execute_state.is_insert or orm_execute_state.is_delete
+            or orm_execute_state.is_update):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ in _WATCHED:
+        invalidate_access()
+        orm_execute_state.session.info['access_dirty'] = True
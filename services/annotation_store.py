@@ -0,0 +1,262 @@
+"""Stockage incrémental des annotations PDF, page par page.
+
+Historiquement, chaque autosave du lecteur PDF remplaçait le document JSON
+complet ``FileAnnotation.annotations_data`` : pour un PDF de 60 pages annoté,
+un seul trait de stylo réécrivait plusieurs Mo (et leur stockage TOAST), puis
+``load_annotations`` renvoyait tout au prochain affichage.
+
+Désormais ``FileAnnotation`` ne sert plus que d'en-tête (fichier, utilisateur,
+pages custom) et les annotations vivent dans ``FileAnnotationPage`` : une
+ligne par page, avec un compteur ``version``.
+
+    - apply_page_changes()  : PATCH — n'écrit que les pages reçues (une page
+                              vide ou ``None`` supprime la ligne) ;
+    - replace_all_pages()   : sauvegarde complète historique, ramenée à un
+                              diff (les pages inchangées ne sont pas réécrites) ;
+    - load_pages()          : lecture d'un sous-ensemble (clés ou plage de
+                              numéros) pour un chargement paresseux au scroll ;
+    - load_document()       : document complet ``{pageId: [...]}``, pour les
+                              routes qui lisent et écrivent tout d'un bloc
+                              (planning.get/save_file_annotations, lesson_view).
+
+Les anciens en-têtes dont ``annotations_data`` contient encore le document
+complet sont éclatés en lignes par page au premier accès (migration paresseuse,
+voir _explode_legacy_blob), sans script de reprise à lancer.
+"""
+from datetime import datetime
+
+from extensions import db
+from models.file_manager import FileAnnotation, FileAnnotationPage
+
+
+class AnnotationConflict(Exception):
+    """Une page a été modifiée ailleurs depuis la version connue du client."""
+
+    def __init__(self, conflicts):
+        super().__init__(f"{len(conflicts)} page(s) en conflit")
+        self.conflicts = conflicts
+
+
+def page_number_for(page_key):
+    """Numéro de page PDF si la clé est numérique (« 3 »), sinon None
+    (pages custom du lecteur : « blank_… », « graph_… »)."""
+    key = str(page_key)
+    return int(key) if key.isdigit() else None
+
+
+def get_annotation(file_id, file_type, user_id, create=False):
+    """En-tête FileAnnotation d'un fichier pour un utilisateur (créé si demandé).
+    ``file_type=None`` : n'importe quel type (routes planning, qui ne le
+    précisent pas ; un en-tête créé prend alors le type par défaut)."""
+    query = FileAnnotation.query.filter_by(file_id=file_id, user_id=user_id)
+    if file_type is not None:
+        query = query.filter_by(file_type=file_type)
+    annotation = query.first()
+    if annotation is None and create:
+        annotation = FileAnnotation(
+            file_id=file_id,
+            user_id=user_id,
+            annotations_data={},
+            custom_pages_data=[],
+        )
+        if file_type is not None:
+            annotation.file_type = file_type
+        db.session.add(annotation)
+        db.session.flush()
+    if annotation is not None:
+        _explode_legacy_blob(annotation)
+    return annotation
+
+
+def _explode_legacy_blob(annotation):
+    """Migre le document JSON complet d'un ancien en-tête vers des lignes
+    par page, puis vide ``annotations_data``. Idempotent : ne fait rien si le
+    blob est déjà vide ou n'est pas un dict {pageId: [...]} (très anciens
+    enregistrements en liste, rendus tels quels par load_document). Le
+    lecteur propre et lesson_view (planning.save_file_annotations) utilisent
+    tous deux le format dict : les deux relisent ensuite les lignes par page."""
+    blob = annotation.annotations_data
+    if not isinstance(blob, dict) or not blob:
+        return
+    existing = {p.page_key for p in annotation.pages.with_entities(FileAnnotationPage.page_key)}
+    for key, items in blob.items():
+        key = str(key)
+        if key in existing or not items:
+            continue
+        db.session.add(FileAnnotationPage(
+            annotation_id=annotation.id,
+            page_key=key,
+            page_number=page_number_for(key),
+            data=items,
+            version=1,
+        ))
+    annotation.annotations_data = {}
+    db.session.flush()
+
+
+def apply_page_changes(annotation, pages, base_versions=None, custom_pages=None):
+    """Applique un delta de pages sur un en-tête.
+
+    Args:
+        annotation: en-tête FileAnnotation (voir get_annotation).
+        pages: ``{page_key: [annotations] | None}``. Une liste vide ou ``None``
+            supprime la page.
+        base_versions: optionnel, ``{page_key: version}`` connue du client.
+            Une page dont la version serveur diffère est refusée (conflit) ;
+            0 signifie « la page n'existait pas encore ».
+        custom_pages: si fourni (non ``None``), remplace la liste des pages
+            custom.
+
+    Returns:
+        ``{page_key: version}`` des pages après écriture (0 = supprimée).
+
+    Raises:
+        AnnotationConflict: si au moins une page est en conflit. Rien n'est
+            écrit dans ce cas (l'appelant fait le rollback).
+    """
+    pages = {str(k): v for k, v in pages.items()}
+    keys = list(pages)
+    rows = {}
+    if keys:
+        rows = {
+            row.page_key: row
+            for row in FileAnnotationPage.query.filter(
+                FileAnnotationPage.annotation_id == annotation.id,
+                FileAnnotationPage.page_key.in_(keys),
+            )
+        }
+
+    if base_versions:
+        conflicts = []
+        for key, known in base_versions.items():
+            key = str(key)
+            if key not in keys:
+                continue
+            current = rows[key].version if key in rows else 0
+            if int(known or 0) != current:
+                conflicts.append({'page': key, 'version': current})
+        if conflicts:
+            raise AnnotationConflict(conflicts)
+
+    versions = {}
+    now = datetime.utcnow()
+    for raw_key, items in pages.items():
+        key = str(raw_key)
+        row = rows.get(key)
+        if not items:
+            if row is not None:
+                db.session.delete(row)
+            versions[key] = 0
+            continue
+        if row is None:
+            row = FileAnnotationPage(
+                annotation_id=annotation.id,
+                page_key=key,
+                page_number=page_number_for(key),
+                data=items,
+                version=1,
+            )
+            db.session.add(row)
+        elif row.data != items:
+            row.data = items
+            row.version = (row.version or 0) + 1
+            row.updated_at = now
+        versions[key] = row.version
+
+    if custom_pages is not None:
+        annotation.custom_pages_data = custom_pages
+    annotation.updated_at = now
+    return versions
+
+
+def replace_all_pages(annotation, pages, custom_pages=None):
+    """Sauvegarde complète (ancien contrat de /api/save-annotations) exprimée
+    comme un delta : les pages absentes sont supprimées, les pages identiques
+    ne sont pas réécrites."""
+    pages = {str(k): v for k, v in (pages or {}).items()}
+    for (key,) in annotation.pages.with_entities(FileAnnotationPage.page_key):
+        pages.setdefault(key, None)
+    return apply_page_changes(annotation, pages, custom_pages=custom_pages)
+
+
+def load_pages(annotation, page_keys=None, first=None, last=None):
+    """Annotations d'un en-tête, éventuellement restreintes.
+
+    Args:
+        page_keys: liste de clés à charger (pages custom comprises).
+        first, last: plage inclusive de numéros de pages PDF. Les pages
+            custom ne sont renvoyées que si aucun filtre n'est donné ou si
+            elles figurent dans ``page_keys``.
+
+    Returns:
+        ``(annotations, versions)`` : ``{page_key: [...]}`` et
+        ``{page_key: version}``.
+    """
+    query = FileAnnotationPage.query.filter_by(annotation_id=annotation.id)
+    filters = []
+    if page_keys:
+        filters.append(FileAnnotationPage.page_key.in_([str(k) for k in page_keys]))
+    if first is not None or last is not None:
+        numbered = FileAnnotationPage.page_number.isnot(None)
+        if first is not None:
+            numbered = db.and_(numbered, FileAnnotationPage.page_number >= first)
+        if last is not None:
+            numbered = db.and_(numbered, FileAnnotationPage.page_number <= last)
+        filters.append(numbered)
+    if filters:
+        query = query.filter(db.or_(*filters))
+
+    annotations, versions = {}, {}
+    for row in query:
+        annotations[row.page_key] = row.data
+        versions[row.page_key] = row.version
+    return annotations, versions
+
+
+def load_document(annotation):
+    """Document complet d'un en-tête au format ``{pageId: [...]}`` reconstruit
+    depuis les lignes par page. Un ancien en-tête dont le blob est une liste
+    (non éclatable) est renvoyé tel quel."""
+    if annotation is None:
+        return {}
+    blob = annotation.annotations_data
+    if isinstance(blob, list) and blob:
+        return blob
+    annotations, _ = load_pages(annotation)
+    return annotations
+
+
+def save_document(annotation, document):
+    """Sauvegarde complète d'un document lu par load_document : un dict passe
+    par replace_all_pages (diff page par page), une liste (ancien format) reste
+    dans l'en-tête. Returns: ``{page_key: version}`` (vide pour une liste)."""
+    if isinstance(document, dict):
+        if isinstance(annotation.annotations_data, list):
+            annotation.annotations_data = {}
+        return replace_all_pages(annotation, document)
+    replace_all_pages(annotation, {})
+    annotation.annotations_data = document or {}
+    annotation.updated_at = datetime.utcnow()
+    return {}
+
+
+def page_index(annotation):
+    """``{page_key: version}`` de toutes les pages annotées, sans les données
+    (permet au lecteur de savoir quelles pages charger au scroll)."""
+    return {
+        key: version
+        for key, version in annotation.pages.with_entities(
+            FileAnnotationPage.page_key, FileAnnotationPage.version
+        )
+    }
+
+
+def delete_pages_for(annotation_query):
+    """Supprime les pages des en-têtes sélectionnés par ``annotation_query``
+    (requête FileAnnotation filtrée), avant une suppression en masse des
+    en-têtes : ``Query.delete()`` ne déclenche pas les cascades ORM et SQLite
+    n'applique pas ``ON DELETE CASCADE`` sans PRAGMA."""
+    ids = annotation_query.with_entities(FileAnnotation.id).scalar_subquery()
+    FileAnnotationPage.query.filter(
+        FileAnnotationPage.annotation_id.in_(ids)
+    ).delete(synchronize_session=False)
@@ -0,0 +1,329 @@
+"""Statistiques et listes de présences calculées côté base.
+
+/attendance/api/stats chargeait toutes les lignes ``attendance`` de la période
+(des dizaines de milliers sur une année) pour les compter avec trois
+compréhensions de liste ; /api/absences et /api/late-arrivals renvoyaient
+toute l'année d'un coup en déchiffrant chaque commentaire. Ici :
+
+    - status_counts / lesson_status_counts : un GROUP BY status ;
+    - student_totals : absences, retards et minutes de retard par élève en
+      une requête (rapports de fin d'année) ;
+    - grouped_listing : absences ou retards regroupés par (date, élève,
+      classe), paginés en SQL ; seuls les enregistrements de la page sont
+      chargés, donc seuls leurs commentaires sont déchiffrés ;
+    - daily_summary : lit la table attendance_daily_rollup (une ligne par
+      classe, date, période et statut) pour les tableaux de bord.
+
+La table de cumul est maintenue par des événements ORM : chaque flush qui
+touche des présences recalcule les cumuls des (classe, date) concernées,
+dans la même transaction. Les DELETE/UPDATE en masse (Query.delete()) sont
+interceptés de la même façon. Les écritures en SQL brut doivent appeler
+rebuild_rollup().
+"""
+from datetime import date
+
+from sqlalchemy import delete, event, func, insert, select, tuple_
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models.attendance import Attendance, AttendanceDailyRollup
+from models.classroom import Classroom
+
+# Groupes (date, élève, classe) par page dans les listes d'absences/retards.
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+STATUSES = ('present', 'absent', 'late')
+
+
+def school_year_window(today=None):
+    """``(1er septembre, 31 juillet)`` de l'année scolaire en cours (même
+    règle que la page des présences)."""
+    today = today or date.today()
+    start_year = today.year - 1 if today.month < 8 else today.year
+    return date(start_year, 9, 1), date(start_year + 1, 7, 31)
+
+
+def _teacher_attendance(query, user_id, start=None, end=None, classroom_id=None):
+    query = query.join(Classroom, Attendance.classroom_id == Classroom.id).filter(
+        Classroom.user_id == user_id
+    )
+    if start:
+        query = query.filter(Attendance.date >= start)
+    if end:
+        query = query.filter(Attendance.date <= end)
+    if classroom_id:
+        query = query.filter(Attendance.classroom_id == classroom_id)
+    return query
+
+
+# ---------------------------------------------------------------------------
+# Comptages
+# ---------------------------------------------------------------------------
+
+def status_counts(user_id, start=None, end=None, classroom_id=None):
+    """``{'present', 'absent', 'late', 'total'}`` des classes de l'enseignant.
+    1 requête."""
+    rows = _teacher_attendance(
+        db.session.query(Attendance.status, func.count(Attendance.id)),
+        user_id, start, end, classroom_id,
+    ).group_by(Attendance.status).all()
+    counts = dict.fromkeys(STATUSES, 0)
+    for status, count in rows:
+        counts[status] = counts.get(status, 0) + count
+    counts['total'] = sum(count for _, count in rows)
+    return counts
+
+
+def lesson_status_counts(user_id, day, period_number):
+    """Comptage des présences saisies par ``user_id`` pour un cours. 1 requête."""
+    rows = db.session.query(Attendance.status, func.count(Attendance.id)).filter(
+        Attendance.user_id == user_id,
+        Attendance.date == day,
+        Attendance.period_number == period_number,
+    ).group_by(Attendance.status).all()
+    counts = dict.fromkeys(STATUSES, 0)
+    for status, count in rows:
+        counts[status] = counts.get(status, 0) + count
+    counts['total'] = sum(count for _, count in rows)
+    return counts
+
+
+def student_totals(student_ids, user_id=None):
+    """``{student_id: {'absent', 'late', 'late_minutes'}}`` (zéros pour les
+    élèves sans absence). ``user_id`` restreint aux saisies d'un enseignant.
+    1 requête."""
+    student_ids = list(student_ids)
+    totals = {sid: {'absent': 0, 'late': 0, 'late_minutes': 0} for sid in student_ids}
+    if not student_ids:
+        return totals
+    query = db.session.query(
+        Attendance.student_id, Attendance.status,
+        func.count(Attendance.id), func.coalesce(func.sum(Attendance.late_minutes), 0),
+    ).filter(
+        Attendance.student_id.in_(student_ids),
+        Attendance.status.in_(('absent', 'late')),
+    )
+    if user_id is not None:
+        query = query.filter(Attendance.user_id == user_id)
+    for student_id, status, count, minutes in query.group_by(
+            Attendance.student_id, Attendance.status):
+        totals[student_id][status] = count
+        if status == 'late':
+            totals[student_id]['late_minutes'] = int(minutes or 0)
+    return totals
+
+
+def daily_summary(classroom_ids, start=None, end=None):
+    """Cumul par jour depuis attendance_daily_rollup :
+    ``[{'date', 'present', 'absent', 'late', 'late_minutes'}]`` trié par date.
+    1 requête."""
+    classroom_ids = list(classroom_ids)
+    if not classroom_ids:
+        return []
+    query = db.session.query(
+        AttendanceDailyRollup.date, AttendanceDailyRollup.status,
+        func.sum(AttendanceDailyRollup.record_count),
+        func.sum(AttendanceDailyRollup.late_minutes),
+    ).filter(AttendanceDailyRollup.classroom_id.in_(classroom_ids))
+    if start:
+        query = query.filter(AttendanceDailyRollup.date >= start)
+    if end:
+        query = query.filter(AttendanceDailyRollup.date <= end)
+
+    days = {}
+    for day, status, count, minutes in query.group_by(
+            AttendanceDailyRollup.date, AttendanceDailyRollup.status):
+        entry = days.setdefault(day, {'date': day, 'present': 0, 'absent': 0,
+                                      'late': 0, 'late_minutes': 0})
+        entry[status] = int(count or 0)
+        if status == 'late':
+            entry['late_minutes'] = int(minutes or 0)
+    return [days[day] for day in sorted(days)]
+
+
+# ---------------------------------------------------------------------------
+# Listes paginées
+# ---------------------------------------------------------------------------
+
+def matching_student_ids(user_id, name):
+    """Ids des élèves de l'enseignant dont le prénom ou le nom contient
+    ``name``. Les noms sont chiffrés en base : le filtre se fait après
+    déchiffrement, pas en ILIKE."""
+    from models.student import Student
+
+    needle = name.strip().lower()
+    rows = db.session.query(Student.id, Student.first_name, Student.last_name).join(
+        Classroom, Student.classroom_id == Classroom.id
+    ).filter(Classroom.user_id == user_id)
+    return [sid for sid, first, last in rows
+            if needle in (first or '').lower() or needle in (last or '').lower()]
+
+
+def grouped_listing(user_id, status, start, end, classroom_id=None,
+                    student_ids=None, page=1, per_page=DEFAULT_PAGE_SIZE):
+    """Une page d'absences (ou de retards) regroupées par (date, élève, classe),
+    les plus récentes d'abord.
+
+    Returns:
+        ``(groupes, total)`` où chaque groupe est un dict ``date``,
+        ``student``, ``classroom``, ``periods``, ``late_minutes``,
+        ``comments`` et ``total`` le nombre de groupes sur toute la fenêtre.
+        4 requêtes quelle que soit la taille de la fenêtre.
+    """
+    from models.student import Student
+
+    key_cols = (Attendance.date, Attendance.student_id, Attendance.classroom_id)
+    groups_query = _teacher_attendance(
+        db.session.query(*key_cols), user_id, start, end, classroom_id
+    ).filter(Attendance.status == status)
+    if student_ids is not None:
+        if not student_ids:
+            return [], 0
+        groups_query = groups_query.filter(Attendance.student_id.in_(student_ids))
+    groups_query = groups_query.group_by(*key_cols)
+
+    total = db.session.query(func.count()).select_from(groups_query.subquery()).scalar() or 0
+    keys = groups_query.order_by(
+        Attendance.date.desc(), Attendance.student_id, Attendance.classroom_id
+    ).limit(per_page).offset((page - 1) * per_page).all()
+    if not keys:
+        return [], total
+
+    # Enregistrements de la page seulement (commentaires déchiffrés ici)
+    groups = {tuple(k): {'date': k[0], 'periods': [], 'late_minutes': 0, 'comments': []}
+              for k in keys}
+    records = Attendance.query.filter(
+        Attendance.status == status,
+        tuple_(*key_cols).in_([tuple(k) for k in keys]),
+    ).order_by(Attendance.period_number)
+    for record in records:
+        group = groups.get((record.date, record.student_id, record.classroom_id))
+        if group is None:
+            continue
+        group['periods'].append(record.period_number)
+        group['late_minutes'] += record.late_minutes or 0
+        if record.comment:
+            group['comments'].append(record.comment)
+
+    students = {s.id: s for s in Student.query.filter(
+        Student.id.in_({k[1] for k in keys}))}
+    classrooms = {c.id: c for c in Classroom.query.filter(
+        Classroom.id.in_({k[2] for k in keys}))}
+    for (day, student_id, classroom_id_), group in groups.items():
+        group['student'] = students.get(student_id)
+        group['classroom'] = classrooms.get(classroom_id_)
+
+    # Ordre d'affichage : date décroissante puis nom (déchiffré) de l'élève
+    page_groups = list(groups.values())
+    page_groups.sort(key=lambda g: (
+        -g['date'].toordinal(),
+        (g['student'].last_name or '').lower() if g['student'] else '',
+        (g['student'].first_name or '').lower() if g['student'] else '',
+    ))
+    return page_groups, total
+
+
+# ---------------------------------------------------------------------------
+# Table de cumul
+# ---------------------------------------------------------------------------
+
+def _refresh_rollup(connection, keys):
+    """Recalcule les cumuls des couples (classe, date) ``keys`` depuis
+    ``attendance``. 2 requêtes par classe touchée."""
+    by_classroom = {}
+    for classroom_id, day in keys:
+        if classroom_id is not None and day is not None:
+            by_classroom.setdefault(classroom_id, set()).add(day)
+
+    rollup = AttendanceDailyRollup.__table__
+    attendance = Attendance.__table__
+    for classroom_id, days in by_classroom.items():
+        days = sorted(days)
+        connection.execute(delete(rollup).where(
+            rollup.c.classroom_id == classroom_id, rollup.c.date.in_(days)))
+        connection.execute(insert(rollup).from_select(
+            ['classroom_id', 'date', 'period_number', 'status', 'record_count', 'late_minutes'],
+            select(
+                attendance.c.classroom_id, attendance.c.date, attendance.c.period_number,
+                attendance.c.status, func.count(),
+                func.coalesce(func.sum(attendance.c.late_minutes), 0),
+            ).where(
+                attendance.c.classroom_id == classroom_id, attendance.c.date.in_(days)
+            ).group_by(
+                attendance.c.classroom_id, attendance.c.date,
+                attendance.c.period_number, attendance.c.status,
+            )
+        ))
+
+
+def rebuild_rollup(classroom_ids=None):
+    """Reconstruit la table de cumul (toutes les classes, ou ``classroom_ids``)
+    après des écritures qui ne passent pas par l'ORM. Ne commite pas."""
+    query = db.session.query(Attendance.classroom_id, Attendance.date).distinct()
+    rollup_query = db.session.query(
+        AttendanceDailyRollup.classroom_id, AttendanceDailyRollup.date).distinct()
+    if classroom_ids is not None:
+        query = query.filter(Attendance.classroom_id.in_(classroom_ids))
+        rollup_query = rollup_query.filter(AttendanceDailyRollup.classroom_id.in_(classroom_ids))
+    # Couples encore présents dans le cumul mais plus dans attendance : vidés aussi
+    keys = set(map(tuple, query)) | set(map(tuple, rollup_query))
+    _refresh_rollup(db.session.connection(), keys)
+    return len(keys)
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_attendance_changes(session, flush_context, instances):
+    keys = None
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, Attendance):
+            continue
+        if keys is None:
+            keys = session.info.setdefault('attendance_rollup_keys', set())
+        keys.add((obj.classroom_id, obj.date))
+        if obj in session.dirty:
+            # Présence déplacée (autre classe ou autre date) : l'ancien couple aussi
+            state = db.inspect(obj)
+            old_classrooms = state.attrs.classroom_id.history.deleted or [obj.classroom_id]
+            old_dates = state.attrs.date.history.deleted or [obj.date]
+            for classroom_id in old_classrooms:
+                for day in old_dates:
+                    keys.add((classroom_id, day))
+
+
+@event.listens_for(Session, 'after_flush')
+def _refresh_after_flush(session, flush_context):
+    keys = session.info.pop('attendance_rollup_keys', None)
+    if keys:
+        _refresh_rollup(session.connection(), keys)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_attendance_changes(session):
+    session.info.pop('attendance_rollup_keys', None)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _bulk_attendance_changes(orm_execute_state):
+    """``Query.delete()`` / ``update()`` sur Attendance ne passent pas par le
+    flush : les couples (classe, date) visés sont lus avant l'instruction,
+    puis recalculés après."""
+    if not (orm_execute_state.is_delete or orm_execute_state.is_update):
+        return None
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or mapper.class_ is not Attendance:
+        return None
+
+    session = orm_execute_state.session
+    target = select(Attendance.classroom_id, Attendance.date).distinct()
+    whereclause = orm_execute_state.statement.whereclause
+    if whereclause is not None:
+        target = target.where(whereclause)
+    keys = set(map(tuple, session.execute(target)))
+
+    result = orm_execute_state.invoke_statement()
+    if orm_execute_state.is_update:
+        # Les lignes ont pu changer de classe ou de date
+        keys |= set(map(tuple, session.execute(target)))
+    _refresh_rollup(session.connection(), keys)
+    return result
@@ -0,0 +1,155 @@
+"""Données et rendu des rapports PDF de classe (fin d'année, sauvegardes des
+collaborations).
+
+_get_students_data_for_class (routes/year_end.py) et
+_get_students_data_for_archive (services/year_end_archive.py) chargeaient les
+élèves entiers (tous les champs chiffrés déchiffrés) puis, pour chaque
+élève, les évaluations de la classe, une requête par note, les notes legacy,
+les compteurs de sanctions (+ le modèle de chaque compteur) et les remarques.
+
+load_class_report_data() charge toute la classe en 7 requêtes, en ne
+sélectionnant que les colonnes affichées (seuls les champs chiffrés utiles
+sont déchiffrés), et renvoie des structures simples (ReportStudent, dicts)
+que services/year_end_pdf peut envoyer à ses processus de rendu.
+"""
+from collections import defaultdict
+
+from flask import current_app
+
+from extensions import db
+from services.year_end_pdf import ReportStudent, generate_class_report_pdf
+
+
+def load_class_report_data(classroom_id, student_owner_id, data_classroom_id=None,
+                           data_teacher_id=None, remark_date='source_date'):
+    """
+    Données du rapport de chaque élève d'une classe, au format attendu par
+    generate_class_report_pdf.
+
+    Args:
+        classroom_id: classe où sont les élèves
+        student_owner_id: propriétaire des élèves
+        data_classroom_id: classe des évaluations et notes (``classroom_id``
+            par défaut ; classe dérivée pour un enseignant spécialisé)
+        data_teacher_id: enseignant des présences et remarques
+            (``student_owner_id`` par défaut)
+        remark_date: colonne datant les remarques (``'source_date'`` ou
+            ``'created_at'``), aussi utilisée pour les trier (récentes d'abord)
+    """
+    from models.student import Student, Grade
+    from models.evaluation import Evaluation, EvaluationGrade
+    from models.sanctions import SanctionTemplate
+    from models.student_sanctions import StudentSanctionCount
+    from models.lesson_memo import StudentRemark
+    from services.attendance_stats import student_totals
+
+    data_classroom_id = data_classroom_id or classroom_id
+    data_teacher_id = data_teacher_id or student_owner_id
+
+    students = [
+        ReportStudent(*row) for row in db.session.query(
+            Student.id, Student.first_name, Student.last_name
+        ).filter(
+            Student.classroom_id == classroom_id, Student.user_id == student_owner_id
+        ).order_by(Student.last_name, Student.first_name)
+    ]
+    if not students:
+        return []
+    student_ids = [s.id for s in students]
+
+    # Absences et retards de toute la classe en une requête (GROUP BY)
+    attendance_totals = student_totals(student_ids, user_id=data_teacher_id)
+
+    # Notes (évaluations modernes), dans l'ordre des évaluations
+    evaluations = db.session.query(
+        Evaluation.id, Evaluation.title, Evaluation.max_points, Evaluation.date
+    ).filter(Evaluation.classroom_id == data_classroom_id).order_by(Evaluation.id).all()
+    points = {
+        (evaluation_id, student_id): value
+        for evaluation_id, student_id, value in db.session.query(
+            EvaluationGrade.evaluation_id, EvaluationGrade.student_id, EvaluationGrade.points
+        ).join(Evaluation, Evaluation.id == EvaluationGrade.evaluation_id).filter(
+            Evaluation.classroom_id == data_classroom_id,
+            EvaluationGrade.student_id.in_(student_ids),
+            EvaluationGrade.points.isnot(None),
+        )
+    }
+
+    # Notes legacy
+    legacy = defaultdict(list)
+    for student_id, title, grade, max_grade, grade_date in db.session.query(
+        Grade.student_id, Grade.title, Grade.grade, Grade.max_grade, Grade.date
+    ).filter(
+        Grade.classroom_id == data_classroom_id, Grade.student_id.in_(student_ids)
+    ).order_by(Grade.id):
+        legacy[student_id].append((title, grade, max_grade, grade_date))
+
+    # Sanctions
+    sanctions = defaultdict(list)
+    for student_id, name, count in db.session.query(
+        StudentSanctionCount.student_id, SanctionTemplate.name, StudentSanctionCount.check_count
+    ).outerjoin(
+        SanctionTemplate, SanctionTemplate.id == StudentSanctionCount.template_id
+    ).filter(
+        StudentSanctionCount.student_id.in_(student_ids), StudentSanctionCount.check_count > 0
+    ).order_by(StudentSanctionCount.id):
+        sanctions[student_id].append({'name': name or 'Inconnu', 'count': count})
+
+    # Remarques (de l'enseignant concerné)
+    date_column = getattr(StudentRemark, remark_date)
+    remarks = defaultdict(list)
+    for student_id, content, remark_at in db.session.query(
+        StudentRemark.student_id, StudentRemark.content, date_column
+    ).filter(
+        StudentRemark.student_id.in_(student_ids), StudentRemark.user_id == data_teacher_id
+    ).order_by(date_column.desc(), StudentRemark.id):
+        remarks[student_id].append({'content': content, 'date': remark_at})
+
+    students_data = []
+    for student in students:
+        grades_list = []
+        total_points = 0
+        total_max = 0
+        grade_count = 0
+        for evaluation_id, title, max_points, evaluation_date in evaluations:
+            value = points.get((evaluation_id, student.id))
+            if value is None:
+                continue
+            grades_list.append({'title': title, 'points': value, 'max': max_points, 'date': evaluation_date})
+            total_points += value
+            total_max += (max_points or 0)
+            grade_count += 1
+
+        for title, grade, max_grade, grade_date in legacy[student.id]:
+            grades_list.append({'title': title, 'points': grade, 'max': max_grade, 'date': grade_date})
+            if grade is not None and max_grade:
+                total_points += grade
+                total_max += max_grade
+                grade_count += 1
+
+        average = None
+        if grade_count > 0 and total_max > 0:
+            average = (total_points / total_max) * 6  # Note suisse sur 6
+
+        totals = attendance_totals[student.id]
+        students_data.append({
+            'student': student,
+            'absences_count': totals['absent'],
+            'late_count': totals['late'],
+            'late_minutes_total': totals['late_minutes'],
+            'grades': grades_list,
+            'average': average,
+            'sanctions': sanctions[student.id],
+            'remarks': remarks[student.id],
+        })
+
+    return students_data
+
+
+def render_class_report(classroom, students_data, school_year_label, teacher_name):
+    """PDF du rapport de classe, rendu par le pool de processus
+    (``YEAR_END_PDF_PROCESSES`` ; 1 = rendu dans le processus courant)."""
+    return generate_class_report_pdf(
+        classroom, students_data, school_year_label, teacher_name,
+        processes=current_app.config.get('YEAR_END_PDF_PROCESSES'),
+    )
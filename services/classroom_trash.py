@@ -1,35 +1,149 @@
 """Corbeille des classes supprimées : archivage (avant purge) + restauration.
 
 Approche « archive » (et non soft-delete) : à la suppression d'une classe, on
-sérialise la classe + ses élèves + évaluations + notes dans la table
-deleted_classrooms (payload chiffré), PUIS la purge normale s'exécute. Aucune
-des ~200 requêtes Classroom existantes n'est touchée. La restauration recrée la
-classe via l'ORM. Rétention : 30 jours.
+sérialise la classe + ses élèves + évaluations + notes + présences dans la
+corbeille, PUIS la purge normale s'exécute. Aucune des ~200 requêtes Classroom
+existantes n'est touchée. Rétention : 30 jours.
+
+Format d'archive 2 : l'archive d'une classe avec une année de présences
+(des dizaines de milliers de lignes) était un seul JSON chiffré, construit
+puis déchiffré et parsé entièrement en mémoire, et la restauration insérait
+les lignes une à une (un flush par élève et par évaluation). Désormais :
+
+    - les lignes sont lues en flux (yield_per) et écrites par morceaux de
+      CHUNK_ROWS lignes d'un même type dans deleted_classroom_chunks : JSON
+      lines compressé (zlib) puis chiffré (un jeton Fernet par morceau) ;
+    - deleted_classrooms.payload ne garde que l'en-tête : la classe, le
+      nombre de lignes de chaque type et un aperçu borné (PREVIEW_STUDENTS
+      noms) affiché par la corbeille sans lire les morceaux ;
+    - la restauration relit les morceaux un par un, dans l'ordre (élèves et
+      évaluations avant les notes et présences), et les insère en INSERT
+      multi-lignes.
+
+La mémoire utilisée ne dépend que de CHUNK_ROWS (plus la correspondance des
+ids d'élèves et d'évaluations), et le nombre d'allers-retours du nombre de
+morceaux. Les entrées au format 1 (payload complet) restent restaurables.
 """
 import json
+import zlib
 from datetime import datetime, timedelta, date as _date
 
+from sqlalchemy import delete, insert, select
+
 from extensions import db
+from services.job_runner import periodic
+from utils.encryption import encryption_engine
 
 TRASH_RETENTION_DAYS = 30
 
+ARCHIVE_VERSION = 2
+
+# Lignes par morceau d'archive.
+CHUNK_ROWS = 1000
+
+# Noms d'élèves gardés dans l'en-tête pour l'aperçu de la corbeille.
+PREVIEW_STUDENTS = 5
+
+# Colonnes archivées, par type de ligne, dans l'ordre de l'archive. Les
+# références entre lignes utilisent les ids d'origine (``id``,
+# ``student_id``, ``evaluation_id``), remplacés à la restauration.
+ARCHIVE_FIELDS = {
+    'students': ('id', 'first_name', 'last_name', 'email', 'date_of_birth',
+                 'parent_email_mother', 'parent_email_father', 'additional_info'),
+    'evaluations': ('id', 'title', 'type', 'ta_group_name', 'date', 'max_points', 'min_points'),
+    'grades': ('evaluation_id', 'student_id', 'points'),
+    'attendance': ('student_id', 'date', 'period_number', 'status', 'late_minutes', 'comment'),
+}
+
+# Colonnes de date, sérialisées en ISO
+_DATE_FIELDS = {'date_of_birth', 'date'}
+
+
+# ---------------------------------------------------------------------------
+# Morceaux d'archive
+# ---------------------------------------------------------------------------
+
+def _json_default(value):
+    if isinstance(value, (_date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Valeur non sérialisable : {value!r}")
+
+
+def encode_chunk(rows):
+    """Jeton chiffré d'un morceau : lignes (listes) en JSON lines, compressées."""
+    lines = '\n'.join(json.dumps(row, separators=(',', ':'), default=_json_default) for row in rows)
+    return encryption_engine.encrypt_bytes(zlib.compress(lines.encode('utf-8')))
+
+
+def decode_chunk(token):
+    """Lignes (listes) d'un morceau encodé par encode_chunk."""
+    lines = zlib.decompress(encryption_engine.decrypt_bytes(token)).decode('utf-8')
+    return [json.loads(line) for line in lines.splitlines() if line]
+
+
+def _parse_date(value):
+    if not value:
+        return None
+    try:
+        return _date.fromisoformat(value[:10])
+    except (TypeError, ValueError):
+        return None
+
+
+def _archive_queries(classroom_id):
+    """(type, requête) des lignes à archiver, dans l'ordre de l'archive."""
+    from models.student import Student
+    from models.evaluation import Evaluation, EvaluationGrade
+    from models.attendance import Attendance
+
+    def columns(model, kind):
+        return [getattr(model, field) for field in ARCHIVE_FIELDS[kind]]
+
+    class_students = select(Student.id).where(Student.classroom_id == classroom_id)
+    return [
+        ('students', db.session.query(*columns(Student, 'students')).filter(
+            Student.classroom_id == classroom_id).order_by(Student.id)),
+        ('evaluations', db.session.query(*columns(Evaluation, 'evaluations')).filter(
+            Evaluation.classroom_id == classroom_id).order_by(Evaluation.id)),
+        ('grades', db.session.query(*columns(EvaluationGrade, 'grades')).join(
+            Evaluation, Evaluation.id == EvaluationGrade.evaluation_id
+        ).filter(
+            Evaluation.classroom_id == classroom_id,
+            EvaluationGrade.student_id.in_(class_students),
+        ).order_by(EvaluationGrade.id)),
+        ('attendance', db.session.query(*columns(Attendance, 'attendance')).filter(
+            Attendance.classroom_id == classroom_id,
+            Attendance.student_id.in_(class_students),
+        ).order_by(Attendance.id)),
+    ]
+
+
+def _archive_chunks(classroom_id):
+    """(type, lignes) par morceaux d'au plus CHUNK_ROWS lignes, lus en flux."""
+    for kind, query in _archive_queries(classroom_id):
+        rows = []
+        for row in query.yield_per(CHUNK_ROWS):
+            rows.append(list(row))
+            if len(rows) == CHUNK_ROWS:
+                yield kind, rows
+                rows = []
+        if rows:
+            yield kind, rows
+
+
+# ---------------------------------------------------------------------------
+# Archivage
+# ---------------------------------------------------------------------------
 
 def archive_classroom(classroom, actor_user_id):
-    """Sérialise une classe + élèves + évaluations + notes dans la corbeille.
+    """Archive une classe + élèves + évaluations + notes + présences dans la corbeille.
 
     Best-effort : à appeler AVANT la purge. Commit immédiat pour survivre à un
     éventuel expunge_all() de la routine de suppression. L'appelant DOIT envelopper
     cet appel dans un try/except : l'archivage ne doit jamais empêcher la suppression.
-
-    Retourne l'entrée DeletedClassroom créée.
     """
-    from models.student import Student
-    from models.evaluation import Evaluation, EvaluationGrade
-    from models.deleted_classroom import DeletedClassroom
-
     try:
-        return _archive_classroom_impl(classroom, actor_user_id,
-                                       Student, Evaluation, EvaluationGrade, DeletedClassroom)
+        return _archive_classroom_impl(classroom, actor_user_id)
     except Exception:
         # Best-effort : l'archivage ne lit que la session principale (les écritures
         # passent par une session séparée), donc on ne touche JAMAIS à la session
@@ -38,57 +152,11 @@ def archive_classroom(classroom, actor_user_id):
         return None
 
 
-def _archive_classroom_impl(classroom, actor_user_id, Student, Evaluation, EvaluationGrade, DeletedClassroom):
-    students = Student.query.filter_by(classroom_id=classroom.id).all()
-    sid_to_idx = {}
-    students_payload = []
-    for i, s in enumerate(students):
-        sid_to_idx[s.id] = i
-        students_payload.append({
-            'idx': i,
-            'first_name': s.first_name,
-            'last_name': s.last_name,
-            'email': s.email,
-            'parent_email_mother': s.parent_email_mother,
-            'parent_email_father': s.parent_email_father,
-            'additional_info': s.additional_info,
-        })
-
-    evals = Evaluation.query.filter_by(classroom_id=classroom.id).all()
-    eid_to_idx = {}
-    evals_payload = []
-    for j, e in enumerate(evals):
-        eid_to_idx[e.id] = j
-        evals_payload.append({
-            'idx': j,
-            'title': e.title,
-            'type': e.type,
-            'ta_group_name': e.ta_group_name,
-            'date': e.date.isoformat() if e.date else None,
-            'max_points': e.max_points,
-            'min_points': e.min_points,
-        })
-
-    grades_payload = []
-    if eid_to_idx and sid_to_idx:
-        grades = EvaluationGrade.query.filter(
-            EvaluationGrade.evaluation_id.in_(list(eid_to_idx.keys()))
-        ).all()
-        for g in grades:
-            if g.evaluation_id in eid_to_idx and g.student_id in sid_to_idx:
-                grades_payload.append({
-                    'student_idx': sid_to_idx[g.student_id],
-                    'eval_idx': eid_to_idx[g.evaluation_id],
-                    'points': g.points,
-                })
-
-    # Rien à archiver : classe vide (ou déliaison d'une classe dérivée sans élèves
-    # propres). On évite de créer une entrée corbeille inutile.
-    if not students_payload and not evals_payload:
-        return None
+def _archive_classroom_impl(classroom, actor_user_id):
+    from models.deleted_classroom import DeletedClassroom, DeletedClassroomChunk
 
-    payload = {
-        'version': 1,
+    header = {
+        'version': ARCHIVE_VERSION,
         'classroom': {
             'name': classroom.name,
             'subject': classroom.subject,
@@ -97,44 +165,193 @@ def _archive_classroom_impl(classroom, actor_user_id, Student, Evaluation, Evalu
             'is_class_master': bool(getattr(classroom, 'is_class_master', False)),
             'is_temporary': bool(getattr(classroom, 'is_temporary', False)),
         },
-        'students': students_payload,
-        'evaluations': evals_payload,
-        'grades': grades_payload,
+        'counts': dict.fromkeys(ARCHIVE_FIELDS, 0),
+        'preview': [],
     }
 
-    entry = DeletedClassroom(
-        user_id=actor_user_id,
-        original_classroom_id=classroom.id,
-        name=classroom.name,
-        subject=classroom.subject,
-        color=classroom.color,
-        class_group=classroom.class_group,
-        student_count=len(students_payload),
-        payload=json.dumps(payload),
-        deleted_at=datetime.utcnow(),
-    )
     # IMPORTANT : écrire via une session SÉPARÉE. Un db.session.commit() ici
     # expirerait l'objet `classroom` de la session principale ; l'expunge_all()
     # de la routine de suppression le détacherait alors, et le premier accès
     # suivant à classroom.id lèverait DetachedInstanceError -> la purge échoue
     # (classe non supprimée) alors que l'archive est déjà écrite. La session
-    # séparée persiste l'entrée sans jamais toucher la session principale.
+    # séparée persiste l'entrée sans jamais toucher la session principale ; elle
+    # n'est commitée qu'une fois tous les morceaux écrits (archive complète ou
+    # rien).
     from sqlalchemy.orm import Session as _SASession
     with _SASession(bind=db.session.get_bind()) as _s2:
-        _s2.add(entry)
+        entry = None
+        for seq, (kind, rows) in enumerate(_archive_chunks(classroom.id)):
+            if entry is None:
+                entry = DeletedClassroom(
+                    user_id=actor_user_id,
+                    original_classroom_id=classroom.id,
+                    name=classroom.name,
+                    subject=classroom.subject,
+                    color=classroom.color,
+                    class_group=classroom.class_group,
+                    deleted_at=datetime.utcnow(),
+                )
+                _s2.add(entry)
+                _s2.flush()
+            _s2.execute(insert(DeletedClassroomChunk), [{
+                'entry_id': entry.id, 'seq': seq, 'kind': kind,
+                'row_count': len(rows), 'data': encode_chunk(rows),
+            }])
+            header['counts'][kind] += len(rows)
+            if kind == 'students':
+                header['preview'].extend(
+                    f"{row[1]} {row[2] or ''}".strip()
+                    for row in rows[:PREVIEW_STUDENTS - len(header['preview'])]
+                )
+
+        # Rien à archiver : classe vide (ou déliaison d'une classe dérivée sans élèves
+        # propres). On évite de créer une entrée corbeille inutile.
+        if entry is None or not (header['counts']['students'] or header['counts']['evaluations']):
+            _s2.rollback()
+            return None
+
+        entry.student_count = header['counts']['students']
+        entry.payload = json.dumps(header)
         _s2.commit()
     return None
 
 
+# ---------------------------------------------------------------------------
+# Aperçu
+# ---------------------------------------------------------------------------
+
+def trash_preview(entry):
+    """Aperçu d'une entrée corbeille : nombres de lignes et quelques noms
+    d'élèves (au plus PREVIEW_STUDENTS). Ne lit que l'en-tête (format 2).
+
+    Returns:
+        dict ``counts``, ``students`` (noms), ``more`` (élèves non nommés).
+    """
+    data = json.loads(entry.payload) if entry.payload else {}
+    if data.get('version', 1) >= 2:
+        counts, names = data.get('counts', {}), data.get('preview', [])
+    else:
+        students = data.get('students', [])
+        counts = {'students': len(students), 'evaluations': len(data.get('evaluations', [])),
+                  'grades': len(data.get('grades', [])), 'attendance': 0}
+        names = [f"{s.get('first_name') or ''} {s.get('last_name') or ''}".strip()
+                 for s in students[:PREVIEW_STUDENTS]]
+    return {
+        'counts': counts,
+        'students': names,
+        'more': max(0, counts.get('students', 0) - len(names)),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Restauration
+# ---------------------------------------------------------------------------
+
+def _stored_chunks(entry_id):
+    """(type, lignes) des morceaux d'une entrée, lus un par un dans l'ordre."""
+    from models.deleted_classroom import DeletedClassroomChunk
+
+    result = db.session.execute(
+        select(DeletedClassroomChunk.kind, DeletedClassroomChunk.data).where(
+            DeletedClassroomChunk.entry_id == entry_id
+        ).order_by(DeletedClassroomChunk.seq).execution_options(yield_per=1)
+    )
+    for kind, token in result:
+        yield kind, decode_chunk(token)
+
+
+def _legacy_chunks(data):
+    """Payload au format 1 (un seul JSON) converti en lignes du format 2 :
+    les index ``idx`` tiennent lieu d'ids d'origine."""
+    students = [[s.get('idx'), s.get('first_name'), s.get('last_name'), s.get('email'), None,
+                 s.get('parent_email_mother'), s.get('parent_email_father'), s.get('additional_info')]
+                for s in data.get('students', [])]
+    evaluations = [[e.get('idx'), e.get('title'), e.get('type'), e.get('ta_group_name'),
+                    e.get('date'), e.get('max_points'), e.get('min_points')]
+                   for e in data.get('evaluations', [])]
+    grades = [[g.get('eval_idx'), g.get('student_idx'), g.get('points')]
+              for g in data.get('grades', [])]
+    for kind, rows in (('students', students), ('evaluations', evaluations), ('grades', grades)):
+        for start in range(0, len(rows), CHUNK_ROWS):
+            yield kind, rows[start:start + CHUNK_ROWS]
+
+
+def _restore_rows(chunks, classroom_id, user_id):
+    """Insère les lignes ``chunks`` (type, lignes) dans la classe restaurée,
+    un INSERT multi-lignes par morceau. Ne commite pas."""
+    from models.student import Student
+    from models.evaluation import Evaluation, EvaluationGrade
+    from models.attendance import Attendance
+
+    student_ids, evaluation_ids = {}, {}
+    today = datetime.utcnow().date()
+    for kind, rows in chunks:
+        records = [dict(zip(ARCHIVE_FIELDS[kind], row)) for row in rows]
+        if kind == 'students':
+            values = [{
+                'classroom_id': classroom_id,
+                'user_id': user_id,
+                'first_name': r['first_name'] or '',
+                'last_name': r['last_name'] or '',
+                'email': r['email'],
+                'email_hash': encryption_engine.hash_email(r['email']) if r['email'] else None,
+                'date_of_birth': _parse_date(r['date_of_birth']),
+                'parent_email_mother': r['parent_email_mother'],
+                'parent_email_father': r['parent_email_father'],
+                'additional_info': r['additional_info'],
+            } for r in records]
+            new_ids = db.session.scalars(
+                insert(Student).returning(Student.id, sort_by_parameter_order=True),
+                values, execution_options={'render_nulls': True}
+            ).all()
+            student_ids.update(zip((r['id'] for r in records), new_ids))
+        elif kind == 'evaluations':
+            values = [{
+                'classroom_id': classroom_id,
+                'title': r['title'] or 'Évaluation',
+                'type': r['type'] or 'significatif',
+                'ta_group_name': r['ta_group_name'],
+                'date': _parse_date(r['date']) or today,
+                'max_points': r['max_points'] if r['max_points'] is not None else 6.0,
+                'min_points': r['min_points'] if r['min_points'] is not None else 0,
+            } for r in records]
+            new_ids = db.session.scalars(
+                insert(Evaluation).returning(Evaluation.id, sort_by_parameter_order=True),
+                values, execution_options={'render_nulls': True}
+            ).all()
+            evaluation_ids.update(zip((r['id'] for r in records), new_ids))
+        elif kind == 'grades':
+            values = [{
+                'evaluation_id': evaluation_ids[r['evaluation_id']],
+                'student_id': student_ids[r['student_id']],
+                'points': r['points'],
+            } for r in records
+                if r['evaluation_id'] in evaluation_ids and r['student_id'] in student_ids]
+            if values:
+                db.session.execute(insert(EvaluationGrade).execution_options(render_nulls=True), values)
+        elif kind == 'attendance':
+            values = [{
+                'student_id': student_ids[r['student_id']],
+                'classroom_id': classroom_id,
+                'user_id': user_id,
+                'date': _parse_date(r['date']),
+                'period_number': r['period_number'],
+                'status': r['status'],
+                'late_minutes': r['late_minutes'],
+                'comment': r['comment'],
+            } for r in records if r['student_id'] in student_ids and r['date']]
+            if values:
+                db.session.execute(insert(Attendance).execution_options(render_nulls=True), values)
+
+
 def restore_classroom(entry, user_id):
-    """Recrée une classe (+ élèves + évaluations + notes) depuis une entrée corbeille.
+    """Recrée une classe (+ élèves + évaluations + notes + présences) depuis une entrée corbeille.
 
     Retourne le nouvel objet Classroom et supprime l'entrée corbeille.
     La maîtrise de classe (collaboration) n'est pas restaurée.
     """
     from models.classroom import Classroom
-    from models.student import Student
-    from models.evaluation import Evaluation, EvaluationGrade
+    from services.attendance_stats import rebuild_rollup
 
     data = json.loads(entry.payload) if entry.payload else {}
     c = data.get('classroom', {})
@@ -151,64 +368,48 @@ def restore_classroom(entry, user_id):
     db.session.add(classroom)
     db.session.flush()  # -> classroom.id
 
-    idx_to_sid = {}
-    for s in data.get('students', []):
-        st = Student(
-            classroom_id=classroom.id,
-            user_id=user_id,
-            first_name=s.get('first_name') or '',
-            last_name=s.get('last_name') or '',
-            email=s.get('email'),
-            parent_email_mother=s.get('parent_email_mother'),
-            parent_email_father=s.get('parent_email_father'),
-            additional_info=s.get('additional_info'),
-        )
-        db.session.add(st)
-        db.session.flush()
-        idx_to_sid[s.get('idx')] = st.id
-
-    idx_to_eid = {}
-    for e in data.get('evaluations', []):
-        ev_date = None
-        if e.get('date'):
-            try:
-                ev_date = _date.fromisoformat(e['date'])
-            except Exception:
-                ev_date = None
-        ev = Evaluation(
-            classroom_id=classroom.id,
-            title=e.get('title') or 'Évaluation',
-            type=e.get('type') or 'significatif',
-            ta_group_name=e.get('ta_group_name'),
-            date=ev_date or datetime.utcnow().date(),
-            max_points=e.get('max_points') if e.get('max_points') is not None else 6.0,
-            min_points=e.get('min_points') if e.get('min_points') is not None else 0,
-        )
-        db.session.add(ev)
-        db.session.flush()
-        idx_to_eid[e.get('idx')] = ev.id
-
-    for g in data.get('grades', []):
-        sid = idx_to_sid.get(g.get('student_idx'))
-        eid = idx_to_eid.get(g.get('eval_idx'))
-        if sid and eid:
-            db.session.add(EvaluationGrade(
-                evaluation_id=eid, student_id=sid, points=g.get('points'),
-            ))
+    if data.get('version', 1) >= 2:
+        chunks = _stored_chunks(entry.id)
+    else:
+        chunks = _legacy_chunks(data)
+    _restore_rows(chunks, classroom.id, user_id)
+    # Présences insérées hors flush : cumuls journaliers à recalculer
+    rebuild_rollup([classroom.id])
 
-    db.session.delete(entry)
+    delete_trash_entry(entry, commit=False)
     db.session.commit()
     return classroom
 
 
+# ---------------------------------------------------------------------------
+# Suppression
+# ---------------------------------------------------------------------------
+
+def delete_trash_entry(entry, commit=True):
+    """Supprime définitivement une entrée corbeille et ses morceaux."""
+    from models.deleted_classroom import DeletedClassroomChunk
+
+    db.session.execute(delete(DeletedClassroomChunk).where(
+        DeletedClassroomChunk.entry_id == entry.id
+    ).execution_options(synchronize_session=False))
+    db.session.delete(entry)
+    if commit:
+        db.session.commit()
+
+
+@periodic('trash.purge', every=timedelta(days=1))
 def purge_expired_trash():
     """Supprime définitivement les entrées corbeille de plus de 30 jours.
 
     Retourne le nombre d'entrées purgées.
     """
-    from models.deleted_classroom import DeletedClassroom
+    from models.deleted_classroom import DeletedClassroom, DeletedClassroomChunk
     cutoff = datetime.utcnow() - timedelta(days=TRASH_RETENTION_DAYS)
     try:
+        expired = select(DeletedClassroom.id).where(DeletedClassroom.deleted_at < cutoff)
+        db.session.execute(delete(DeletedClassroomChunk).where(
+            DeletedClassroomChunk.entry_id.in_(expired)
+        ).execution_options(synchronize_session=False))
         n = DeletedClassroom.query.filter(
             DeletedClassroom.deleted_at < cutoff
         ).delete(synchronize_session=False)
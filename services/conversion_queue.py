@@ -0,0 +1,165 @@
+"""File d'attente des conversions Word/Pages → PDF du gestionnaire de fichiers.
+
+Avant, upload_file / upload_with_structure appelaient convert_if_needed dans
+la requête : soumission CloudConvert, interrogation du job toutes les 2 s
+jusqu'à 100 s, téléchargement du résultat — la requête restait bloquée tout
+ce temps et un même .docx importé deux fois était converti deux fois.
+
+Désormais :
+    1. submit_conversion() calcule l'empreinte du fichier. Si le PDF est déjà
+       dans le cache de conversions (document_conversion.cached_conversion),
+       l'appelant le reçoit tout de suite et crée le UserFile comme avant.
+    2. Sinon la source est déposée (R2 ou disque), un ConversionJob est créé
+       et une tâche « conversions.run » est déposée dans l'exécuteur de
+       tâches (services/job_runner.py, file ``conversions``, 2 à la fois) ;
+       la requête répond immédiatement avec l'id du job.
+    3. Le navigateur interroge GET /file_manager/api/conversion-jobs/<id>.
+
+Un job interrompu par un redémarrage est repris par l'exécuteur de tâches
+(tâche « running » sans signal de vie remise en file).
+"""
+import logging
+import uuid
+from datetime import datetime
+
+from extensions import db
+from models.conversion_job import ConversionJob
+from services.document_conversion import (
+    ConversionError, cached_conversion, convert_if_needed, is_conversion_enabled, source_hash,
+    _extension, _pdf_filename,
+)
+from services.job_runner import enqueue, task
+from services.pdf_previews import request_previews
+
+logger = logging.getLogger(__name__)
+
+# Conversions simultanées (en attente + en cours) autorisées par enseignant.
+MAX_ACTIVE_JOBS_PER_USER = 20
+
+
+class QueueFullError(Exception):
+    """Trop de conversions en cours pour cet utilisateur."""
+
+
+def submit_conversion(user_id, file_bytes, original_filename, folder_id=None):
+    """Prend en charge un fichier à convertir.
+
+    Returns:
+        ``('cached', (pdf_bytes, pdf_filename))`` si le PDF est déjà en cache,
+        sinon ``('queued', ConversionJob)``.
+
+    Raises:
+        ConversionError: aucun convertisseur configuré (et pas de cache).
+        QueueFullError: trop de conversions actives pour cet utilisateur.
+    """
+    digest = source_hash(file_bytes)
+
+    pdf_bytes = cached_conversion(digest)
+    if pdf_bytes is not None:
+        return 'cached', (pdf_bytes, _pdf_filename(original_filename))
+
+    if not is_conversion_enabled():
+        raise ConversionError(
+            "La conversion automatique en PDF n'est pas configurée sur le serveur. "
+            "Convertis le document en PDF avant de l'importer."
+        )
+
+    # Même fichier déjà en cours de conversion vers le même dossier (re-drop)
+    existing = ConversionJob.query.filter(
+        ConversionJob.user_id == user_id,
+        ConversionJob.source_hash == digest,
+        ConversionJob.folder_id == folder_id,
+        ConversionJob.status.in_(('queued', 'running')),
+    ).first()
+    if existing:
+        return 'queued', existing
+
+    active = ConversionJob.query.filter(
+        ConversionJob.user_id == user_id,
+        ConversionJob.status.in_(('queued', 'running')),
+    ).count()
+    if active >= MAX_ACTIVE_JOBS_PER_USER:
+        raise QueueFullError(
+            "Trop de conversions en cours. Patiente quelques instants avant d'en ajouter d'autres."
+        )
+
+    from services.r2_storage import write_stored_object
+    source_key = f"conversions/src/{uuid.uuid4()}.{_extension(original_filename) or 'bin'}"
+    write_stored_object(source_key, file_bytes)
+
+    job = ConversionJob(
+        user_id=user_id,
+        folder_id=folder_id,
+        original_filename=original_filename,
+        source_hash=digest,
+        source_key=source_key,
+        status='queued',
+    )
+    db.session.add(job)
+    db.session.flush()
+    enqueue('conversions.run', {'job_id': job.id}, unique_key=f'conversion:{job.id}', user_id=user_id)
+    db.session.commit()
+    return 'queued', job
+
+
+@task('conversions.run', queue='conversions')
+def run_conversion_job(job_id):
+    """Exécute un job (tâche de l'exécuteur). Un job terminé n'est pas
+    rejoué ; un job « running » est repris (exécution interrompue)."""
+    from services.r2_storage import read_stored_object, delete_stored_object
+
+    claimed = ConversionJob.query.filter(
+        ConversionJob.id == job_id, ConversionJob.status.in_(('queued', 'running')),
+    ).update({'status': 'running', 'started_at': datetime.utcnow()}, synchronize_session=False)
+    db.session.commit()
+    if not claimed:
+        return
+    job = db.session.get(ConversionJob, job_id)
+
+    try:
+        source = read_stored_object(job.source_key)
+        if source is None:
+            raise ConversionError("Fichier source introuvable, réimporte le document.")
+        pdf_bytes, pdf_name = convert_if_needed(source, job.original_filename)
+        user_file = _store_result(job, pdf_bytes, pdf_name)
+        job.result_user_file_id = user_file.id
+        job.status = 'done'
+    except ConversionError as e:
+        db.session.rollback()
+        job.status, job.error = 'failed', str(e)
+    except Exception as e:
+        db.session.rollback()
+        logger.exception("Conversion %s échouée", job_id)
+        job.status, job.error = 'failed', f"Erreur inattendue : {e}"
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+    delete_stored_object(job.source_key)
+
+
+def _store_result(job, pdf_bytes, pdf_name):
+    """Crée le UserFile du PDF converti (R2 prioritaire, BLOB en repli),
+    comme upload_file."""
+    from models.file_manager import UserFile
+    from services.r2_storage import is_r2_enabled, upload_file_to_r2
+
+    unique_filename = f"{uuid.uuid4()}.pdf"
+    r2_key = None
+    if is_r2_enabled():
+        r2_key = upload_file_to_r2(pdf_bytes, job.user_id, unique_filename, mime_type='application/pdf')
+
+    user_file = UserFile(
+        user_id=job.user_id,
+        folder_id=job.folder_id,
+        filename=unique_filename,
+        original_filename=pdf_name,
+        file_type='pdf',
+        file_size=len(pdf_bytes),
+        mime_type='application/pdf',
+        r2_key=r2_key,
+    )
+    if not r2_key:
+        user_file.file_content = pdf_bytes
+    db.session.add(user_file)
+    db.session.flush()
+    request_previews('userfile', user_file)
+    return user_file
@@ -1,15 +1,15 @@
 """Conversion automatique de documents bureautiques en PDF via CloudConvert.
 
 Le lecteur du site ne sait afficher que des PDF (et des images). Les fichiers
-Word (.doc/.docx) et Pages (.pages) uploadés sont donc convertis en PDF à la
-volée, au moment de l'upload, avant d'être stockés.
+Word (.doc/.docx) et Pages (.pages) uploadés sont donc convertis en PDF avant
+d'être stockés.
 
-Pourquoi une conversion *inline* (dans la requête) est acceptable ici :
-    En production l'app tourne sous gunicorn avec un worker eventlet
-    (sockets monkey-patchés). Un appel réseau bloquant cède donc la main aux
-    autres requêtes : attendre CloudConvert ne gèle pas le site. On borne
-    quand même chaque appel par un timeout et la durée totale par un deadline,
-    pour rester sous le `--timeout 120` de gunicorn.
+Conversion inline ou en file d'attente :
+    convert_if_needed() convertit dans l'appelant (upload vers une classe).
+    Les uploads du gestionnaire de fichiers passent par
+    services/conversion_queue.py : la requête répond tout de suite et le
+    navigateur interroge le statut du job. Chaque appel réseau reste borné
+    par un timeout et la durée totale par un deadline.
 
 Configuration :
     Variable d'environnement ``CLOUDCONVERT_API_KEY`` (scopes ``task.read`` et
@@ -22,9 +22,24 @@ Flux CloudConvert (API v2) :
     2. POST form.url  → envoi du fichier (multipart) sur le formulaire fourni
     3. GET  /v2/jobs/{id} en boucle → attendre status 'finished' (ou 'error')
     4. GET  result.files[0].url → télécharger le PDF
+
+Convertisseurs (``DOCUMENT_CONVERTER``, config Flask ou variable d'env) :
+    ``cloudconvert`` (défaut), ``libreoffice`` (``soffice --headless`` local)
+    ou ``stub`` (PDF d'une page généré avec reportlab, sans réseau — pour les
+    tests et le développement hors ligne). register_backend() permet d'en
+    brancher un autre.
+
+Cache :
+    Le PDF produit est conservé sous ``conversions/<sha256 de la source>.pdf``
+    (R2 ou disque local) : un même .docx importé deux fois n'est converti
+    qu'une seule fois. Les uploads du gestionnaire de fichiers passent par la
+    file d'attente asynchrone de services/conversion_queue.py.
 """
 
+import hashlib
 import os
+import subprocess
+import tempfile
 import time
 
 import requests
@@ -46,9 +61,116 @@ def _extension(filename):
     return ""
 
 
+class CloudConvertBackend:
+    """Conversion via l'API CloudConvert (production)."""
+    name = "cloudconvert"
+
+    def is_available(self):
+        return bool(os.environ.get("CLOUDCONVERT_API_KEY"))
+
+    def convert(self, file_bytes, filename):
+        return _cloudconvert_to_pdf(file_bytes, filename)
+
+
+class LibreOfficeBackend:
+    """Conversion locale via LibreOffice en mode headless (``soffice``)."""
+    name = "libreoffice"
+    binary = "soffice"
+
+    def is_available(self):
+        from shutil import which
+        return which(self.binary) is not None
+
+    def convert(self, file_bytes, filename):
+        with tempfile.TemporaryDirectory() as workdir:
+            src = os.path.join(workdir, f"source.{_extension(filename) or 'docx'}")
+            with open(src, "wb") as f:
+                f.write(file_bytes)
+            try:
+                subprocess.run(
+                    [self.binary, "--headless", "--convert-to", "pdf", "--outdir", workdir, src],
+                    check=True, capture_output=True, timeout=100,
+                )
+            except (subprocess.SubprocessError, OSError) as exc:
+                raise ConversionError(f"Conversion LibreOffice échouée : {exc}")
+            out = os.path.join(workdir, "source.pdf")
+            if not os.path.exists(out):
+                raise ConversionError("LibreOffice n'a produit aucun PDF.")
+            with open(out, "rb") as f:
+                return f.read()
+
+
+class StubBackend:
+    """Convertisseur factice hors ligne : PDF d'une page portant le nom du
+    fichier source. Pour les tests et le développement local."""
+    name = "stub"
+
+    def is_available(self):
+        return True
+
+    def convert(self, file_bytes, filename):
+        from io import BytesIO
+        from reportlab.pdfgen import canvas
+
+        buf = BytesIO()
+        pdf = canvas.Canvas(buf)
+        pdf.drawString(72, 760, f"Document converti : {filename}")
+        pdf.drawString(72, 740, f"{len(file_bytes)} octets")
+        pdf.showPage()
+        pdf.save()
+        return buf.getvalue()
+
+
+_BACKENDS = {
+    backend.name: backend
+    for backend in (CloudConvertBackend(), LibreOfficeBackend(), StubBackend())
+}
+
+
+def register_backend(backend):
+    """Ajoute (ou remplace) un convertisseur, sélectionnable par son ``name``."""
+    _BACKENDS[backend.name] = backend
+
+
+def get_backend():
+    """Convertisseur configuré (``DOCUMENT_CONVERTER``, défaut cloudconvert)."""
+    name = None
+    try:
+        name = current_app.config.get("DOCUMENT_CONVERTER")
+    except RuntimeError:
+        pass  # hors contexte d'application
+    name = name or os.environ.get("DOCUMENT_CONVERTER") or "cloudconvert"
+    return _BACKENDS.get(name) or _BACKENDS["cloudconvert"]
+
+
 def is_conversion_enabled():
-    """True si une clé API CloudConvert est configurée."""
-    return bool(os.environ.get("CLOUDCONVERT_API_KEY"))
+    """True si le convertisseur configuré est utilisable (clé API CloudConvert,
+    binaire LibreOffice présent…)."""
+    return get_backend().is_available()
+
+
+def source_hash(file_bytes):
+    """Empreinte sha256 du fichier source (clé du cache de conversions)."""
+    return hashlib.sha256(file_bytes).hexdigest()
+
+
+def _cache_key(digest):
+    return f"conversions/{digest}.pdf"
+
+
+def cached_conversion(digest):
+    """PDF déjà produit pour cette source, ou None."""
+    from services.r2_storage import read_stored_object
+    try:
+        return read_stored_object(_cache_key(digest))
+    except Exception as exc:
+        current_app.logger.warning(f"Cache de conversion illisible ({digest[:12]}) : {exc}")
+        return None
+
+
+def _pdf_filename(original_filename):
+    base = original_filename.rsplit(".", 1)[0] if "." in original_filename else original_filename
+    return f"{base}.pdf"
 
 
 def is_convertible_filename(filename):
@@ -74,15 +196,21 @@ def convert_if_needed(file_bytes, original_filename):
     if not is_convertible_filename(original_filename):
         return None
 
-    if not is_conversion_enabled():
-        raise ConversionError(
-            "La conversion automatique en PDF n'est pas configurée sur le serveur. "
-            "Convertis le document en PDF avant de l'importer."
-        )
-
-    pdf_bytes = _cloudconvert_to_pdf(file_bytes, original_filename)
-    base = original_filename.rsplit(".", 1)[0] if "." in original_filename else original_filename
-    return pdf_bytes, f"{base}.pdf"
+    digest = source_hash(file_bytes)
+    pdf_bytes = cached_conversion(digest)
+    if pdf_bytes is None:
+        if not is_conversion_enabled():
+            raise ConversionError(
+                "La conversion automatique en PDF n'est pas configurée sur le serveur. "
+                "Convertis le document en PDF avant de l'importer."
+            )
+        pdf_bytes = get_backend().convert(file_bytes, original_filename)
+        try:
+            from services.r2_storage import write_stored_object
+            write_stored_object(_cache_key(digest), pdf_bytes, "application/pdf")
+        except Exception as exc:
+            current_app.logger.warning(f"Cache de conversion non écrit ({digest[:12]}) : {exc}")
+    return pdf_bytes, _pdf_filename(original_filename)
 
 
 def _find_task(job, name):
@@ -1,6 +1,8 @@
 import os
 import sys
-import resend
+from utils.startup import lazy_module
+
+resend = lazy_module('resend')  # chargé au premier envoi
 
 
 def _log(msg):
@@ -124,3 +126,44 @@ def send_email(to_email, subject, html_content):
     except Exception as e:
         _log(f"[EMAIL] ÉCHEC - '{subject}' → {to_email}: {type(e).__name__}: {e}")
         return False
+
+
+def send_email_batch(emails):
+    """Envoi groupé via l'API batch de Resend (100 emails max par appel).
+
+    Utilisé par l'outbox de notifications (services/notification_outbox.py).
+
+    Args:
+        emails: liste de dicts ``to``, ``subject``, ``html``
+
+    Returns:
+        Liste de DeliveryResult, dans l'ordre de ``emails``.
+
+    Raises:
+        Exception: échec de l'appel (tout le lot est à réessayer).
+    """
+    from services.notification_outbox import DeliveryResult
+
+    api_key = os.environ.get('RESEND_API_KEY')
+    from_email = os.environ.get('RESEND_FROM_EMAIL', 'onboarding@resend.dev')
+
+    if not from_email or '@' not in from_email or '.' not in from_email.split('@')[-1]:
+        from_email = 'onboarding@resend.dev'
+
+    if not api_key:
+        raise RuntimeError("RESEND_API_KEY non configurée")
+
+    resend.api_key = api_key
+    result = resend.Batch.send([{
+        "from": from_email,
+        "to": [email['to']],
+        "subject": email['subject'],
+        "html": email['html'],
+    } for email in emails])
+    ids = [item.get('id') for item in (result or {}).get('data') or []]
+    _log(f"[EMAIL] LOT - {len(ids)}/{len(emails)} email(s) accepté(s) par Resend")
+    return [
+        DeliveryResult(True, ids[i], None, False) if i < len(ids) and ids[i]
+        else DeliveryResult(False, None, "Réponse Resend sans identifiant", False)
+        for i in range(len(emails))
+    ]
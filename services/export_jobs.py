@@ -0,0 +1,133 @@
+"""Exports « toutes les classes » en arrière-plan.
+
+Avant un conseil de classe, exporter chaque classe l'une après l'autre
+depuis la requête HTTP dépassait le timeout gunicorn. submit_export_all()
+crée un ExportJob et dépose une tâche « exports.run » dans l'exécuteur de
+tâches (services/job_runner.py, file ``exports``, 1 à la fois : l'export
+est lourd en CPU), qui écrit le ZIP dans un fichier temporaire via
+services/grade_exports.write_export_zip, le dépose sur R2 (ou le disque)
+puis marque le job « done ». Le navigateur interroge le statut et
+télécharge l'archive par un lien valable EXPORT_RETENTION_DAYS jours ; les
+archives expirées sont purgées chaque jour (tâche « exports.purge »).
+"""
+import logging
+import os
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+
+from extensions import db
+from models.export_job import ExportJob
+from services.job_runner import enqueue, periodic, task
+
+logger = logging.getLogger(__name__)
+
+EXPORT_RETENTION_DAYS = 7
+
+
+class ExportInProgress(Exception):
+    """Un export est déjà en cours pour cet utilisateur."""
+
+    def __init__(self, job):
+        super().__init__("Un export est déjà en cours")
+        self.job = job
+
+
+def submit_export_all(user):
+    """Crée le job d'export de toutes les classes de ``user``.
+
+    Raises:
+        ExportInProgress: un export de cet utilisateur n'est pas terminé.
+    """
+    from models.classroom import Classroom
+
+    active = ExportJob.query.filter(
+        ExportJob.user_id == user.id,
+        ExportJob.status.in_(('queued', 'running')),
+    ).first()
+    if active:
+        raise ExportInProgress(active)
+
+    purge_expired_exports(user.id)
+
+    job = ExportJob(
+        user_id=user.id,
+        status='queued',
+        classes_total=Classroom.query.filter_by(user_id=user.id).count(),
+    )
+    db.session.add(job)
+    db.session.flush()
+    enqueue('exports.run', {'job_id': job.id}, unique_key=f'export:{job.id}', user_id=user.id)
+    db.session.commit()
+    return job
+
+
+@task('exports.run', queue='exports')
+def run_export_job(job_id):
+    """Exécute un job (tâche de l'exécuteur). Un job terminé n'est pas
+    rejoué ; un job « running » est repris (exécution interrompue)."""
+    from models.classroom import Classroom
+    from models.user import User
+    from services.grade_exports import write_export_zip
+    from services.r2_storage import write_stored_file
+
+    claimed = ExportJob.query.filter(
+        ExportJob.id == job_id, ExportJob.status.in_(('queued', 'running')),
+    ).update({'status': 'running'}, synchronize_session=False)
+    db.session.commit()
+    if not claimed:
+        return
+    job = db.session.get(ExportJob, job_id)
+    user = db.session.get(User, job.user_id)
+
+    fd, path = tempfile.mkstemp(suffix='.zip')
+    os.close(fd)
+    try:
+        classrooms = Classroom.query.filter_by(user_id=user.id).order_by(Classroom.name).all()
+        job.classes_total = len(classrooms)
+        db.session.commit()
+
+        def progress(done, total):
+            job.classes_done = done
+            db.session.commit()
+
+        write_export_zip(
+            path, classrooms, user.username or 'Enseignant',
+            sort_pref=getattr(user, 'student_sort_pref', None) or 'last_name',
+            progress=progress,
+        )
+        key = f"exports/{user.id}/{uuid.uuid4()}.zip"
+        write_stored_file(key, path, 'application/zip')
+
+        job.storage_key = key
+        job.file_size = os.path.getsize(path)
+        job.status = 'done'
+        job.expires_at = datetime.utcnow() + timedelta(days=EXPORT_RETENTION_DAYS)
+    except Exception as e:
+        db.session.rollback()
+        logger.exception("Export %s échoué", job_id)
+        job.status, job.error = 'failed', f"Erreur lors de l'export : {e}"
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+
+
+@periodic('exports.purge', every=timedelta(days=1))
+def purge_expired_exports(user_id=None):
+    """Supprime les archives expirées (et leurs jobs). Retourne le nombre
+    de jobs supprimés."""
+    from services.r2_storage import delete_stored_object
+
+    query = ExportJob.query.filter(ExportJob.expires_at < datetime.utcnow())
+    if user_id is not None:
+        query = query.filter(ExportJob.user_id == user_id)
+    expired = query.all()
+    for job in expired:
+        if job.storage_key:
+            delete_stored_object(job.storage_key)
+        db.session.delete(job)
+    if expired:
+        db.session.commit()
+    return len(expired)
@@ -0,0 +1,219 @@
+"""Opérations sur l'arborescence des dossiers du gestionnaire de fichiers.
+
+Les dossiers (FileFolder) forment un arbre parent_id → id. Les anciennes
+méthodes parcouraient cet arbre via les relations ``parent`` / ``subfolders``
+/ ``files`` : une requête par dossier (et par niveau pour les ancêtres). Un
+cours importé avec quelques centaines de sous-dossiers coûtait autant de
+requêtes pour afficher une taille, copier vers une classe ou supprimer.
+
+Chaque fonction ci-dessous s'exécute en un nombre CONSTANT de requêtes quelle
+que soit la profondeur, grâce à des CTE récursives (``WITH RECURSIVE``,
+supportées par PostgreSQL et SQLite) :
+
+    - subtree_folders() / subtree_paths()  : dossiers d'une sous-arborescence
+    - subtree_files()                      : fichiers d'une sous-arborescence
+    - subtree_stats()                      : taille et nombre de fichiers
+    - ancestor_ids() / folder_path()       : remontée vers la racine
+    - is_descendant()                      : détection de cycle (déplacement)
+    - fileless_subtree_roots()             : branches sans aucun fichier
+    - delete_subtree()                     : suppression en masse
+
+Les chemins sont reconstruits en Python à partir des lignes (id, parent_id,
+name) — aucune concaténation SQL dépendante du dialecte.
+"""
+from sqlalchemy import func, literal, select
+
+from extensions import db
+from models.file_manager import FileFolder, UserFile
+
+
+def _descendants_cte(root_id, user_id=None):
+    """CTE récursive (id, parent_id, name, depth) : ``root_id`` et tous ses
+    descendants. ``user_id`` restreint la racine au propriétaire."""
+    anchor = select(
+        FileFolder.id, FileFolder.parent_id, FileFolder.name,
+        literal(0).label('depth'),
+    ).where(FileFolder.id == root_id)
+    if user_id is not None:
+        anchor = anchor.where(FileFolder.user_id == user_id)
+    tree = anchor.cte('folder_subtree', recursive=True)
+    child = db.aliased(FileFolder)
+    return tree.union_all(
+        select(child.id, child.parent_id, child.name, tree.c.depth + 1)
+        .where(child.parent_id == tree.c.id)
+    )
+
+
+def _ancestors_cte(folder_id):
+    """CTE récursive (id, parent_id, name, depth) : ``folder_id`` puis ses
+    parents jusqu'à la racine (depth croissante vers le haut)."""
+    anchor = select(
+        FileFolder.id, FileFolder.parent_id, FileFolder.name,
+        literal(0).label('depth'),
+    ).where(FileFolder.id == folder_id)
+    chain = anchor.cte('folder_ancestors', recursive=True)
+    parent = db.aliased(FileFolder)
+    return chain.union_all(
+        select(parent.id, parent.parent_id, parent.name, chain.c.depth + 1)
+        .where(parent.id == chain.c.parent_id)
+    )
+
+
+# ---------------------------------------------------------------------------
+# Sous-arborescence
+# ---------------------------------------------------------------------------
+
+def subtree_folders(root_id, user_id=None):
+    """Lignes ``(id, parent_id, name, depth)`` de la sous-arborescence, racine
+    comprise, parents avant enfants. Liste vide si la racine n'existe pas
+    (ou n'appartient pas à ``user_id``). 1 requête."""
+    tree = _descendants_cte(root_id, user_id)
+    return db.session.execute(
+        select(tree.c.id, tree.c.parent_id, tree.c.name, tree.c.depth)
+        .order_by(tree.c.depth, tree.c.name, tree.c.id)
+    ).all()
+
+
+def subtree_ids(root_id, user_id=None):
+    """Ids des dossiers de la sous-arborescence (racine comprise). 1 requête."""
+    return [row.id for row in subtree_folders(root_id, user_id)]
+
+
+def subtree_paths(root_id, base_path=None, user_id=None, rows=None):
+    """``{folder_id: chemin}`` pour chaque dossier de la sous-arborescence.
+
+    Le chemin de la racine est ``base_path/nom`` (ou ``nom`` sans base) :
+    c'est le ``folder_path`` utilisé côté classe par les copies.
+    ``rows`` permet de réutiliser un résultat de subtree_folders(). 1 requête.
+    """
+    if rows is None:
+        rows = subtree_folders(root_id, user_id)
+    paths = {}
+    for row in rows:  # parents avant enfants (tri par profondeur)
+        prefix = paths.get(row.parent_id) if row.depth else base_path
+        paths[row.id] = f"{prefix}/{row.name}" if prefix else row.name
+    return paths
+
+
+def subtree_files(root_id, *columns, user_id=None):
+    """Fichiers de la sous-arborescence, sans jamais charger les blobs.
+
+    Returns:
+        Lignes ``(id, folder_id, *columns)`` triées par dossier puis nom. 1 requête.
+    """
+    tree = _descendants_cte(root_id, user_id)
+    return db.session.execute(
+        select(UserFile.id, UserFile.folder_id, *columns)
+        .where(UserFile.folder_id.in_(select(tree.c.id)))
+        .order_by(UserFile.folder_id, UserFile.original_filename, UserFile.id)
+    ).all()
+
+
+def subtree_stats(root_id):
+    """``(taille totale en octets, nombre de fichiers)`` de la
+    sous-arborescence. 1 requête."""
+    tree = _descendants_cte(root_id)
+    size, count = db.session.execute(
+        select(func.coalesce(func.sum(UserFile.file_size), 0), func.count(UserFile.id))
+        .where(UserFile.folder_id.in_(select(tree.c.id)))
+    ).one()
+    return int(size or 0), int(count or 0)
+
+
+def file_counts_by_folder(root_id):
+    """``{folder_id: nombre de fichiers directs}`` pour chaque dossier non vide
+    de la sous-arborescence. 1 requête."""
+    tree = _descendants_cte(root_id)
+    return dict(db.session.execute(
+        select(UserFile.folder_id, func.count(UserFile.id))
+        .where(UserFile.folder_id.in_(select(tree.c.id)))
+        .group_by(UserFile.folder_id)
+    ).all())
+
+
+def fileless_subtree_roots(root_id, base_path=''):
+    """Chemins des racines des branches SANS AUCUN fichier (la racine elle-même
+    si toute l'arborescence est vide). 2 requêtes."""
+    rows = subtree_folders(root_id)
+    if not rows:
+        return []
+    paths = subtree_paths(root_id, base_path or None, rows=rows)
+    direct = file_counts_by_folder(root_id)
+
+    # Cumul des fichiers par sous-arborescence : enfants avant parents.
+    total = {row.id: direct.get(row.id, 0) for row in rows}
+    for row in reversed(rows):
+        if row.depth:
+            total[row.parent_id] += total[row.id]
+
+    roots = []
+    for row in rows:
+        # Première branche vide rencontrée en descendant : parent non vide
+        # (ou racine). Ses descendants, vides aussi, ne sont pas répétés.
+        if total[row.id] == 0 and (row.depth == 0 or total[row.parent_id] > 0):
+            roots.append(paths[row.id])
+    return roots
+
+
+# ---------------------------------------------------------------------------
+# Ancêtres
+# ---------------------------------------------------------------------------
+
+def ancestor_ids(folder_id):
+    """Ids de ``folder_id`` et de ses ancêtres, du dossier vers la racine.
+    1 requête."""
+    chain = _ancestors_cte(folder_id)
+    return [row.id for row in db.session.execute(
+        select(chain.c.id).order_by(chain.c.depth)
+    )]
+
+
+def folder_path(folder_id):
+    """Chemin complet ``Racine/…/Dossier``. 1 requête."""
+    chain = _ancestors_cte(folder_id)
+    names = db.session.execute(
+        select(chain.c.name).order_by(chain.c.depth.desc())
+    ).scalars().all()
+    return '/'.join(names)
+
+
+def is_descendant(folder_id, ancestor_id):
+    """True si ``folder_id`` est ``ancestor_id`` ou se trouve sous lui
+    (déplacer ``ancestor_id`` dans ``folder_id`` créerait un cycle). 1 requête."""
+    return ancestor_id in ancestor_ids(folder_id)
+
+
+# ---------------------------------------------------------------------------
+# Suppression
+# ---------------------------------------------------------------------------
+
+def delete_subtree(root_id):
+    """Supprime en base un dossier, ses sous-dossiers et leurs fichiers.
+
+    Le nettoyage du stockage (R2, disque, copies legacy) reste à la charge de
+    l'appelant, qui récupère d'abord les fichiers via subtree_files().
+    Nombre constant de requêtes (pas de chargement des objets ORM).
+
+    Returns:
+        ``(nombre de dossiers, nombre de fichiers)`` supprimés.
+    """
+    from models.file_manager import FileShare
+    from models.conversion_job import ConversionJob
+
+    folder_ids = subtree_ids(root_id)
+    if not folder_ids:
+        return 0, 0
+    file_ids = select(UserFile.id).where(UserFile.folder_id.in_(folder_ids))
+
+    FileShare.query.filter(FileShare.file_id.in_(file_ids)).delete(synchronize_session=False)
+    ConversionJob.query.filter(ConversionJob.result_user_file_id.in_(file_ids)).update(
+        {'result_user_file_id': None}, synchronize_session=False)
+    ConversionJob.query.filter(ConversionJob.folder_id.in_(folder_ids)).update(
+        {'folder_id': None}, synchronize_session=False)
+    file_count = UserFile.query.filter(UserFile.folder_id.in_(folder_ids)).delete(
+        synchronize_session=False)
+    # Une seule instruction : les contraintes parent_id sont vérifiées à la
+    # fin de l'instruction, quand tout le sous-arbre a disparu.
+    folder_count = FileFolder.query.filter(FileFolder.id.in_(folder_ids)).delete(
+        synchronize_session=False)
+    return folder_count, file_count
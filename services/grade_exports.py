@@ -0,0 +1,199 @@
+"""Exports des notes et des présences (CSV, PDF, ZIP toutes classes).
+
+export_grades construisait le CSV complet ou le PDF reportlab en mémoire
+avant de répondre ; exporter toutes ses classes avant un conseil de classe
+dépassait le timeout gunicorn. Ici :
+
+    - grades_csv_lines / attendance_csv_lines : générateurs qui produisent le
+      CSV ligne par ligne (réponse HTTP streamée, ou écriture dans un ZIP) ;
+      les présences sont lues par paquets (yield_per), jamais en bloc ;
+    - write_grades_pdf : PDF écrit dans un fichier (SpooledTemporaryFile côté
+      route : en mémoire jusqu'à 1 Mo puis sur disque), le tableau découpé
+      par pages au lieu d'un seul Table géant ;
+    - write_export_zip : archive de toutes les classes (notes CSV + PDF,
+      présences CSV), utilisée par le job d'arrière-plan (services/export_jobs.py).
+
+Format CSV : séparateur « ; » et BOM UTF-8 pour Excel, comme avant.
+"""
+import csv
+import io
+import zipfile
+from datetime import datetime
+
+from models.attendance import Attendance
+from models.student import Student
+from services.grade_matrix import get_class_matrix
+
+# Élèves par page dans le PDF des notes (le tableau est découpé par page).
+PDF_ROWS_PER_PAGE = 28
+
+ATTENDANCE_STATUS_LABELS = {'present': 'Présent', 'absent': 'Absent', 'late': 'Retard'}
+
+
+def fmt_val(v, dec=1):
+    return ('%.*f' % (dec, v)) if v is not None else ''
+
+
+def safe_export_name(classroom, prefix='notes'):
+    return ''.join(c if c.isalnum() or c in '-_' else '_'
+                   for c in f"{prefix}_{classroom.name}_{classroom.subject}")
+
+
+def sorted_students(classroom_id, sort_pref='last_name'):
+    """Élèves de la classe, triés comme la page des notes."""
+    students = Student.query.filter_by(classroom_id=classroom_id).all()
+    if sort_pref == 'first_name':
+        students.sort(key=lambda s: ((s.first_name or '').lower(), (s.last_name or '').lower()))
+    else:
+        students.sort(key=lambda s: ((s.last_name or '').lower(), (s.first_name or '').lower()))
+    return students
+
+
+def _csv_line(row):
+    buf = io.StringIO()
+    csv.writer(buf, delimiter=';').writerow(row)
+    return buf.getvalue()
+
+
+# ---------------------------------------------------------------------------
+# CSV
+# ---------------------------------------------------------------------------
+
+def grades_csv_lines(students, matrix):
+    """Lignes (str) du CSV des notes d'une classe, BOM compris."""
+    evaluations = matrix.evaluations
+    yield '\ufeff' + _csv_line(
+        ['Élève'] + [f"{e.title} ({e.date.strftime('%d.%m.%Y')})" for e in evaluations]
+        + ['Moyenne'])
+    yield _csv_line([''] + [f"sur {fmt_val(e.max_points, 0)}" for e in evaluations] + [''])
+    for s in students:
+        yield _csv_line([s.full_name]
+                        + [fmt_val(v) for v in matrix.row(s.id)]
+                        + [fmt_val(matrix.student_average(s.id), 2)])
+    yield _csv_line(['Moyenne de classe']
+                    + [fmt_val(v, 2) for v in matrix.evaluation_averages] + [''])
+
+
+def attendance_csv_lines(classroom_id, students):
+    """Lignes (str) du CSV des présences enregistrées d'une classe (absences
+    et retards ; les présences simples ne sont pas listées)."""
+    names = {s.id: s.full_name for s in students}
+    yield '\ufeff' + _csv_line(['Date', 'Période', 'Élève', 'Statut', 'Retard (min)', 'Commentaire'])
+    records = Attendance.query.filter(
+        Attendance.classroom_id == classroom_id,
+        Attendance.status.in_(('absent', 'late')),
+    ).order_by(Attendance.date, Attendance.period_number, Attendance.student_id).yield_per(500)
+    for a in records:
+        yield _csv_line([
+            a.date.strftime('%d.%m.%Y'),
+            a.period_number,
+            names.get(a.student_id, ''),
+            ATTENDANCE_STATUS_LABELS.get(a.status, a.status),
+            a.late_minutes if a.late_minutes is not None else '',
+            a.comment or '',
+        ])
+
+
+# ---------------------------------------------------------------------------
+# PDF
+# ---------------------------------------------------------------------------
+
+def write_grades_pdf(fileobj, classroom, students, matrix, teacher_name):
+    """Écrit le PDF des notes (paysage A4) dans ``fileobj``."""
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.lib.units import cm
+    from reportlab.lib import colors
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
+
+    evaluations = matrix.evaluations
+    doc = SimpleDocTemplate(fileobj, pagesize=landscape(A4),
+                            rightMargin=1.2 * cm, leftMargin=1.2 * cm,
+                            topMargin=1.2 * cm, bottomMargin=1.2 * cm)
+    styles = getSampleStyleSheet()
+    elements = [
+        Paragraph(f"<b>Notes — {classroom.name} · {classroom.subject}</b>", styles['Title']),
+        Paragraph(f"Enseignant : {teacher_name} — généré le "
+                  f"{datetime.now().strftime('%d.%m.%Y à %H:%M')}", styles['Normal']),
+        Spacer(1, 0.5 * cm),
+    ]
+
+    header = ['Élève'] + [f"{e.title}\n{e.date.strftime('%d.%m.%y')} · /{fmt_val(e.max_points, 0)}"
+                          for e in evaluations] + ['Moyenne']
+    footer = ['Moyenne de classe'] + [fmt_val(v, 2) for v in matrix.evaluation_averages] + ['']
+
+    first_col = 4.2 * cm
+    avail = landscape(A4)[0] - 2.4 * cm - first_col - 2 * cm
+    ev_w = max(1.5 * cm, min(3 * cm, avail / max(1, len(evaluations))))
+    col_widths = [first_col] + [ev_w] * len(evaluations) + [2 * cm]
+
+    # Un tableau par page : reportlab n'a jamais à découper (et garder en
+    # mémoire) un Table de toute la classe.
+    chunks = [students[i:i + PDF_ROWS_PER_PAGE]
+              for i in range(0, len(students), PDF_ROWS_PER_PAGE)] or [[]]
+    for index, chunk in enumerate(chunks):
+        last = index == len(chunks) - 1
+        rows = [header] + [
+            [s.full_name] + [fmt_val(v) for v in matrix.row(s.id)]
+            + [fmt_val(matrix.student_average(s.id), 2)]
+            for s in chunk
+        ]
+        if last:
+            rows.append(footer)
+        table = Table(rows, colWidths=col_widths, repeatRows=1)
+        style = [
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4F46E5')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('FONTSIZE', (0, 0), (-1, 0), 7),
+            ('FONTSIZE', (0, 1), (-1, -1), 8),
+            ('ALIGN', (1, 0), (-1, -1), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('GRID', (0, 0), (-1, -1), 0.4, colors.HexColor('#D1D5DB')),
+            ('FONTNAME', (-1, 1), (-1, -1), 'Helvetica-Bold'),
+        ]
+        if last:
+            style += [
+                ('ROWBACKGROUNDS', (0, 1), (-1, -2), [colors.white, colors.HexColor('#F9FAFB')]),
+                ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#EEF2FF')),
+                ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+            ]
+        else:
+            style.append(('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F9FAFB')]))
+        table.setStyle(TableStyle(style))
+        elements.append(table)
+        if not last:
+            elements.append(PageBreak())
+    doc.build(elements)
+
+
+# ---------------------------------------------------------------------------
+# ZIP toutes classes
+# ---------------------------------------------------------------------------
+
+def write_export_zip(path, classrooms, teacher_name, sort_pref='last_name', progress=None):
+    """Écrit dans ``path`` un ZIP avec, par classe, ``<classe>/notes.csv``,
+    ``<classe>/notes.pdf`` et ``<classe>/presences.csv``. Chaque fichier est
+    écrit en flux dans l'archive. ``progress(done, total)`` est appelé après
+    chaque classe."""
+    used = set()
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        for done, classroom in enumerate(classrooms, start=1):
+            folder = safe_export_name(classroom, prefix='classe')
+            while folder in used:
+                folder += '_'
+            used.add(folder)
+
+            students = sorted_students(classroom.id, sort_pref)
+            matrix = get_class_matrix(classroom.id)
+
+            with zf.open(f"{folder}/notes.csv", 'w') as f:
+                for line in grades_csv_lines(students, matrix):
+                    f.write(line.encode('utf-8'))
+            with zf.open(f"{folder}/notes.pdf", 'w') as f:
+                write_grades_pdf(f, classroom, students, matrix, teacher_name)
+            with zf.open(f"{folder}/presences.csv", 'w') as f:
+                for line in attendance_csv_lines(classroom.id, students):
+                    f.write(line.encode('utf-8'))
+
+            if progress:
+                progress(done, len(classrooms))
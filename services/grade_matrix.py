@@ -0,0 +1,280 @@
+"""Matrice des notes d'une classe (élèves × évaluations) et moyennes en cache.
+
+La page des notes, export_grades et l'endpoint mobile student_grades
+recalculaient chacun les moyennes dans leurs propres boucles ; la fermeture
+student_average de _grades_matrix reparcourait toutes les évaluations et
+reconstruisait les groupes TA pour CHAQUE élève.
+
+Ici, une seule construction par classe :
+    - les évaluations deviennent des colonnes (ordre date, id) ;
+    - les notes remplissent une ligne dense par élève (None = pas de note) ;
+    - les colonnes significatives et les groupes TA sont indexés une fois,
+      puis toutes les moyennes (par évaluation, par élève, sommes par type)
+      sont calculées en un passage.
+
+Règle de moyenne de l'app : les items d'un groupe TA comptent comme UNE
+évaluation (moyenne du groupe) dans la moyenne de l'élève.
+
+Cache : une GradeMatrix par classe, en mémoire du processus (un seul worker
+eventlet en production). Elle est invalidée quand une Evaluation ou une
+EvaluationGrade de la classe est insérée, modifiée ou supprimée (événements
+ORM, y compris les INSERT/DELETE/UPDATE en masse, et annulation d'une
+transaction qui les avait modifiées). GRADE_MATRIX_CACHE_TTL borne la durée de
+vie d'une matrice pour les écritures hors ORM. Les élèves ne font pas partie
+du cache : l'appelant lit la liste à jour et demande les lignes par id.
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models.evaluation import Evaluation, EvaluationGrade
+
+# Nombre de classes gardées en mémoire (LRU).
+MAX_CACHED_CLASSES = 256
+
+# Durée de vie maximale d'une matrice en cache (secondes).
+GRADE_MATRIX_CACHE_TTL = 300
+
+EvaluationColumn = namedtuple(
+    'EvaluationColumn',
+    'id title type ta_group_name date max_points min_points',
+)
+
+
+def _mean(values):
+    return (sum(values) / len(values)) if values else None
+
+
+class GradeMatrix:
+    """Notes d'une classe sous forme de matrice dense, moyennes précalculées.
+
+    Attributs :
+        evaluations : liste d'EvaluationColumn (ordre date, id).
+        evaluation_averages : moyenne de chaque colonne (None si aucune note).
+    """
+
+    def __init__(self, evaluations, grade_rows):
+        self.evaluations = evaluations
+        self._column = {ev.id: i for i, ev in enumerate(evaluations)}
+        width = len(evaluations)
+
+        # Lignes denses : student_id -> [points | None] et ids des notes
+        self._rows = {}
+        self._grade_ids = {}
+        for grade_id, evaluation_id, student_id, points in grade_rows:
+            col = self._column.get(evaluation_id)
+            if col is None:
+                continue
+            if student_id not in self._rows:
+                self._rows[student_id] = [None] * width
+                self._grade_ids[student_id] = [None] * width
+            self._rows[student_id][col] = points
+            self._grade_ids[student_id][col] = grade_id
+
+        # Index des colonnes, construit une seule fois pour toute la classe
+        self._significant_cols = [i for i, ev in enumerate(evaluations) if ev.type != 'ta']
+        ta_groups = OrderedDict()
+        for i, ev in enumerate(evaluations):
+            if ev.type == 'ta':
+                ta_groups.setdefault(ev.ta_group_name or 'TA', []).append(i)
+        self._ta_groups = list(ta_groups.values())
+        self._ta_cols = [i for cols in self._ta_groups for i in cols]
+
+        # Moyennes par colonne : transposition des lignes
+        columns = list(zip(*self._rows.values())) if self._rows else [()] * width
+        self.evaluation_averages = [
+            _mean([v for v in column if v is not None]) for column in columns
+        ]
+
+        # Moyennes par élève (significatives + groupes TA) et sommes par type
+        self._student_averages = {}
+        self._type_totals = {}
+        for student_id, row in self._rows.items():
+            significant = [row[i] for i in self._significant_cols if row[i] is not None]
+            ta_flat = [row[i] for i in self._ta_cols if row[i] is not None]
+            group_means = [_mean(vals) for vals in (
+                [row[i] for i in cols if row[i] is not None] for cols in self._ta_groups
+            ) if vals]
+            self._student_averages[student_id] = _mean(significant + group_means)
+            self._type_totals[student_id] = (
+                sum(significant), len(significant), sum(ta_flat), len(ta_flat)
+            )
+
+    def points(self, evaluation_id, student_id):
+        """Points d'un élève à une évaluation (None si pas de note)."""
+        row = self._rows.get(student_id)
+        col = self._column.get(evaluation_id)
+        if row is None or col is None:
+            return None
+        return row[col]
+
+    def row(self, student_id):
+        """Ligne de l'élève : points par évaluation, dans l'ordre des colonnes."""
+        return list(self._rows.get(student_id) or [None] * len(self.evaluations))
+
+    def student_average(self, student_id):
+        """Moyenne de l'élève (groupes TA comptés une fois), None sans note."""
+        return self._student_averages.get(student_id)
+
+    def type_totals(self, student_id):
+        """``(somme, nombre)`` des notes significatives puis TA (items à plat)
+        d'un élève — pour les moyennes pondérées de l'app mobile."""
+        return self._type_totals.get(student_id, (0, 0, 0, 0))
+
+    def evaluation_average(self, evaluation_id):
+        col = self._column.get(evaluation_id)
+        return self.evaluation_averages[col] if col is not None else None
+
+    def evaluation_grades(self, evaluation_id):
+        """Notes saisies pour une évaluation : ``[(grade_id, student_id, points)]``."""
+        col = self._column.get(evaluation_id)
+        if col is None:
+            return []
+        return [
+            (ids[col], student_id, self._rows[student_id][col])
+            for student_id, ids in self._grade_ids.items() if ids[col] is not None
+        ]
+
+    def student_grades(self, student_id):
+        """Notes d'un élève : ``[(grade_id, EvaluationColumn, points)]``."""
+        ids = self._grade_ids.get(student_id)
+        if ids is None:
+            return []
+        row = self._rows[student_id]
+        return [(ids[i], ev, row[i]) for i, ev in enumerate(self.evaluations) if ids[i] is not None]
+
+
+# ---------------------------------------------------------------------------
+# Cache par classe
+# ---------------------------------------------------------------------------
+
+_cache = OrderedDict()           # classroom_id -> (expires_at, GradeMatrix)
+_evaluation_class = {}           # evaluation_id -> classroom_id (classes en cache)
+_lock = threading.Lock()
+
+
+def _build(classroom_id):
+    evaluations = [
+        EvaluationColumn(*row) for row in db.session.query(
+            Evaluation.id, Evaluation.title, Evaluation.type, Evaluation.ta_group_name,
+            Evaluation.date, Evaluation.max_points, Evaluation.min_points,
+        ).filter(Evaluation.classroom_id == classroom_id)
+        .order_by(Evaluation.date, Evaluation.id)
+    ]
+    grade_rows = []
+    if evaluations:
+        grade_rows = db.session.query(
+            EvaluationGrade.id, EvaluationGrade.evaluation_id,
+            EvaluationGrade.student_id, EvaluationGrade.points,
+        ).join(Evaluation, EvaluationGrade.evaluation_id == Evaluation.id).filter(
+            Evaluation.classroom_id == classroom_id
+        ).order_by(EvaluationGrade.id).all()
+    return GradeMatrix(evaluations, grade_rows)
+
+
+def get_class_matrix(classroom_id):
+    """GradeMatrix d'une classe, depuis le cache si elle n'a pas changé
+    (2 requêtes sinon)."""
+    classroom_id = int(classroom_id)
+    now = time.monotonic()
+    with _lock:
+        entry = _cache.get(classroom_id)
+        if entry is not None and entry[0] > now:
+            _cache.move_to_end(classroom_id)
+            return entry[1]
+        _drop(classroom_id)
+
+    matrix = _build(classroom_id)
+    with _lock:
+        _drop(classroom_id)
+        _cache[classroom_id] = (now + GRADE_MATRIX_CACHE_TTL, matrix)
+        for ev in matrix.evaluations:
+            _evaluation_class[ev.id] = classroom_id
+        while len(_cache) > MAX_CACHED_CLASSES:
+            _drop(next(iter(_cache)))
+    return matrix
+
+
+def _drop(classroom_id):
+    entry = _cache.pop(classroom_id, None)
+    if entry is not None:
+        for ev in entry[1].evaluations:
+            _evaluation_class.pop(ev.id, None)
+
+
+def invalidate_class(classroom_id):
+    """Oublie la matrice d'une classe."""
+    with _lock:
+        _drop(classroom_id)
+
+
+def invalidate_all():
+    with _lock:
+        _cache.clear()
+        _evaluation_class.clear()
+
+
+# ---------------------------------------------------------------------------
+# Invalidation (événements ORM)
+# ---------------------------------------------------------------------------
+# Les classes touchées sont invalidées au flush (une autre requête ne relit
+# pas l'ancienne matrice) ET au commit (une matrice reconstruite entre le
+# flush et le commit depuis une autre session serait périmée).
+
+def _mark(session, classroom_id):
+    if classroom_id is None:
+        return
+    invalidate_class(classroom_id)
+    session.info.setdefault('grade_matrix_dirty', set()).add(classroom_id)
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_changes(session, flush_context, instances):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Evaluation):
+            _mark(session, obj.classroom_id)
+            if obj in session.dirty:
+                # Évaluation déplacée vers une autre classe : l'ancienne aussi
+                history = db.inspect(obj).attrs.classroom_id.history
+                for old in history.deleted or ():
+                    _mark(session, old)
+        elif isinstance(obj, EvaluationGrade):
+            classroom_id = _evaluation_class.get(obj.evaluation_id)
+            if classroom_id is None and obj.evaluation is not None:
+                classroom_id = obj.evaluation.classroom_id
+            _mark(session, classroom_id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session):
+    if session.info.pop('grade_matrix_flush_all', False):
+        invalidate_all()
+    for classroom_id in session.info.pop('grade_matrix_dirty', ()):
+        invalidate_class(classroom_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_rolled_back(session):
+    # Une matrice reconstruite après le flush contient les écritures annulées
+    if session.info.pop('grade_matrix_flush_all', False):
+        invalidate_all()
+    for classroom_id in session.info.pop('grade_matrix_dirty', ()):
+        invalidate_class(classroom_id)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _bulk_changes(orm_execute_state):
+    """``insert()`` / ``Query.delete()`` / ``update()`` ne passent pas par le
+    flush : on ne sait pas quelles classes sont touchées, tout le cache est
+    vidé."""
+    if not (orm_execute_state.is_insert or orm_execute_state.is_delete
+            or orm_execute_state.is_update):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ in (Evaluation, EvaluationGrade):
+        invalidate_all()
+        orm_execute_state.session.info['grade_matrix_flush_all'] = True
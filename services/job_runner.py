@@ -0,0 +1,460 @@
+"""Exécuteur de tâches de fond : file persistante, files bornées, tâches
+périodiques, reprise après plantage.
+
+Le travail de fond était dispersé : un pool de threads par service
+(conversions, exports, passage à la nouvelle année, outbox), un greenthread
+eventlet pour les relances d'essai démarré depuis un before_request, des
+purges lancées au passage par des pages ou à la main en CLI. Rien n'était
+visible, ni borné globalement, ni repris après un redémarrage — et tout
+partageait l'unique worker eventlet avec les requêtes.
+
+Une tâche est une fonction enregistrée par ``@task`` (ou ``@periodic``) ;
+enqueue() crée un BackgroundJob (``payload`` = arguments nommés) dans la
+transaction de l'appelant. Un exécuteur :
+
+    - réserve les tâches dues de chaque file (UPDATE conditionnel), dans la
+      limite de sa concurrence (JOB_QUEUES, sinon DEFAULT_QUEUES) ;
+    - exécute chaque tâche dans un contexte d'application ; une exception
+      la replanifie avec un délai exponentiel (RETRY_DELAY × 2^n) jusqu'à
+      ``max_attempts``, puis la marque ``failed`` ;
+    - signale les tâches en cours (``heartbeat_at``) : une tâche « running »
+      sans signal depuis STALE_AFTER (processus arrêté) est remise en file ;
+    - dépose les tâches périodiques, une par créneau (``unique_key`` =
+      ``nom@créneau``) même avec plusieurs exécuteurs.
+
+Mode (``JOB_RUNNER``) :
+    ``thread`` (défaut)  exécuteur dans le processus web, démarré à la
+                         première requête (start_in_process) ;
+    ``worker``           le processus web ne fait que déposer ; un processus
+                         séparé exécute (``python worker.py`` ou
+                         ``flask jobs-worker``) ;
+    ``eager``            tests / local : la tâche s'exécute au commit qui la
+                         dépose, dans le processus appelant.
+"""
+import importlib
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import event, func, select, update
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models.background_job import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+# Concurrence par file (par processus exécuteur)
+DEFAULT_QUEUES = {
+    'default': 2,
+    'notifications': 1,   # l'outbox parallélise elle-même ses appels fournisseur
+    'conversions': 2,
+    'previews': 1,        # rastérisation des PDF (CPU)
+    'exports': 1,         # lourd en CPU
+    'year_end': 2,
+    'maintenance': 1,
+}
+DEFAULT_MAX_ATTEMPTS = 3
+RETRY_DELAY = timedelta(seconds=30)
+MAX_RETRY_DELAY = timedelta(hours=1)
+POLL_SECONDS = 5
+STALE_AFTER = timedelta(minutes=2)
+JOB_RETENTION_DAYS = 30
+
+# Modules qui enregistrent des tâches (importés par load_tasks)
+TASK_MODULES = (
+    'services.conversion_queue',
+    'services.export_jobs',
+    'services.year_end_jobs',
+    'services.notification_outbox',
+    'services.trial_reminders',
+    'services.classroom_trash',
+    'services.r2_storage',
+    'routes.file_manager',
+    'services.job_runner',
+    'routes.devoirs',
+)
+
+Task = namedtuple('Task', 'name fn queue max_attempts')
+
+TASKS = {}
+PERIODIC = {}  # nom -> intervalle (timedelta)
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+# ---------------------------------------------------------------------------
+# Enregistrement
+# ---------------------------------------------------------------------------
+
+def task(name, queue='default', max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """Enregistre ``fn`` comme tâche ``name`` (arguments nommés JSON)."""
+    def decorator(fn):
+        TASKS[name] = Task(name, fn, queue, max_attempts)
+        return fn
+    return decorator
+
+
+def periodic(name, every, queue='maintenance', max_attempts=1):
+    """Enregistre ``fn`` (sans argument) comme tâche déposée toutes les
+    ``every`` (créneaux alignés sur l'époque Unix, en UTC)."""
+    def decorator(fn):
+        task(name, queue=queue, max_attempts=max_attempts)(fn)
+        PERIODIC[name] = every
+        return fn
+    return decorator
+
+
+def load_tasks():
+    for module in TASK_MODULES:
+        importlib.import_module(module)
+
+
+def _mode(app):
+    return app.config.get('JOB_RUNNER') or 'thread'
+
+
+def _queue_limits(app):
+    limits = dict(DEFAULT_QUEUES)
+    limits.update(app.config.get('JOB_QUEUES') or {})
+    return limits
+
+
+# ---------------------------------------------------------------------------
+# Dépôt
+# ---------------------------------------------------------------------------
+
+def enqueue(name, payload=None, run_at=None, unique_key=None, user_id=None):
+    """Dépose la tâche ``name`` (doit être enregistrée). Ne commite pas :
+    la tâche part au commit de l'appelant.
+
+    Avec ``unique_key``, une tâche en attente ou en cours de même clé est
+    renvoyée au lieu d'en créer une autre.
+    """
+    definition = TASKS[name]
+    if unique_key:
+        existing = BackgroundJob.query.filter(
+            BackgroundJob.unique_key == unique_key,
+            BackgroundJob.status.in_(('queued', 'running')),
+        ).first()
+        if existing:
+            return existing
+    job = BackgroundJob(
+        queue=definition.queue,
+        name=name,
+        payload=json.dumps(payload or {}),
+        status='queued',
+        attempts=0,
+        max_attempts=definition.max_attempts,
+        run_at=run_at or datetime.utcnow(),
+        unique_key=unique_key,
+        user_id=user_id,
+    )
+    db.session.add(job)
+    db.session.flush()
+    db.session.info.setdefault('jobs_enqueued', []).append(job.id)
+    return job
+
+
+@event.listens_for(Session, 'after_commit')
+def _dispatch_committed(session):
+    job_ids = session.info.pop('jobs_enqueued', None)
+    if not job_ids:
+        return
+    try:
+        app = current_app._get_current_object()
+    except RuntimeError:
+        return
+    if _mode(app) == 'eager':
+        # Exécutées en fin de transaction : une tâche peut importer un module
+        # qui ajoute ses propres écouteurs after_commit
+        session.info.setdefault('jobs_eager', []).extend(job_ids)
+    elif _runner is not None:
+        _runner.wake()
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _run_eager(session, transaction):
+    if transaction.parent is not None:
+        return
+    job_ids = session.info.pop('jobs_eager', None)
+    if not job_ids:
+        return
+    app = current_app._get_current_object()
+    for job_id in job_ids:
+        _claim_and_run(app, job_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_rolled_back(session):
+    session.info.pop('jobs_enqueued', None)
+
+
+# ---------------------------------------------------------------------------
+# Exécution
+# ---------------------------------------------------------------------------
+
+def _retry_delay(attempts):
+    return min(RETRY_DELAY * 2 ** max(0, attempts - 1), MAX_RETRY_DELAY)
+
+
+def _execute(app, job_id):
+    """Exécute une tâche réservée (status ``running``) et enregistre son issue."""
+    with app.app_context():
+        job = db.session.get(BackgroundJob, job_id)
+        if job is None or job.status != 'running':
+            return
+        definition = TASKS.get(job.name)
+        try:
+            if definition is None:
+                raise LookupError(f"Tâche inconnue : {job.name}")
+            result = definition.fn(**json.loads(job.payload or '{}'))
+            # Issue commitée avec le travail éventuellement non commité de la tâche
+            job = db.session.get(BackgroundJob, job_id)
+            job.status = 'done'
+            job.result = json.dumps(result, default=str) if result is not None else None
+            job.error = None
+        except Exception as e:
+            db.session.rollback()
+            logger.exception("Tâche %s (%s) échouée", job_id, getattr(job, 'name', '?'))
+            job = db.session.get(BackgroundJob, job_id)
+            job.error = f"{type(e).__name__}: {e}"
+            if job.attempts < job.max_attempts:
+                job.status = 'queued'
+                job.run_at = datetime.utcnow() + _retry_delay(job.attempts)
+                job.worker = None
+            else:
+                job.status = 'failed'
+        if job.status != 'queued':
+            job.finished_at = datetime.utcnow()
+        db.session.commit()
+
+
+def _claim(job_ids, worker):
+    """Réserve les tâches ``job_ids`` encore en attente et dues. Returns: ids réservés."""
+    now = datetime.utcnow()
+    db.session.execute(update(BackgroundJob).where(
+        BackgroundJob.id.in_(job_ids), BackgroundJob.status == 'queued', BackgroundJob.run_at <= now,
+    ).values(status='running', worker=worker, started_at=now, heartbeat_at=now,
+             attempts=BackgroundJob.attempts + 1))
+    db.session.commit()
+    return db.session.scalars(select(BackgroundJob.id).where(
+        BackgroundJob.id.in_(job_ids), BackgroundJob.status == 'running',
+        BackgroundJob.worker == worker,
+    )).all()
+
+
+def _claim_and_run(app, job_id):
+    with app.app_context():
+        claimed = _claim([job_id], f'eager:{os.getpid()}')
+    if claimed:
+        _execute(app, job_id)
+
+
+def run_pending(app=None):
+    """Exécute dans le processus courant toutes les tâches dues (tests, CLI).
+    Returns: nombre de tâches exécutées."""
+    app = app or current_app._get_current_object()
+    load_tasks()
+    count = 0
+    while True:
+        with app.app_context():
+            job_id = db.session.scalar(select(BackgroundJob.id).where(
+                BackgroundJob.status == 'queued', BackgroundJob.run_at <= datetime.utcnow(),
+            ).order_by(BackgroundJob.run_at, BackgroundJob.id).limit(1))
+        if job_id is None:
+            return count
+        _claim_and_run(app, job_id)
+        count += 1
+
+
+class _Runner:
+    """Exécuteur d'un processus : un pool par file, une boucle de réservation."""
+
+    def __init__(self, app):
+        self.app = app
+        self.worker = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.limits = _queue_limits(app)
+        self.pools = {}
+        self.running = {queue: set() for queue in self.limits}
+        self.lock = threading.Lock()
+        self.event = threading.Event()
+        self.stopped = threading.Event()
+        self.slots = {}
+
+    def wake(self):
+        self.event.set()
+
+    def stop(self):
+        self.stopped.set()
+        self.event.set()
+
+    def run_forever(self):
+        load_tasks()
+        logger.info("Exécuteur de tâches %s démarré (files : %s)", self.worker, self.limits)
+        while not self.stopped.is_set():
+            try:
+                self.tick()
+            except Exception:
+                logger.exception("Exécuteur de tâches : erreur de boucle")
+                with self.app.app_context():
+                    db.session.rollback()
+            self.event.wait(POLL_SECONDS)
+            self.event.clear()
+
+    def tick(self):
+        with self.app.app_context():
+            self._heartbeat()
+            self._recover_stale()
+            self._schedule_periodic()
+            for queue, limit in self.limits.items():
+                with self.lock:
+                    free = limit - len(self.running.setdefault(queue, set()))
+                if free <= 0:
+                    continue
+                ids = db.session.scalars(select(BackgroundJob.id).where(
+                    BackgroundJob.status == 'queued',
+                    BackgroundJob.queue == queue,
+                    BackgroundJob.run_at <= datetime.utcnow(),
+                ).order_by(BackgroundJob.run_at, BackgroundJob.id).limit(free)).all()
+                if ids:
+                    for job_id in _claim(ids, self.worker):
+                        self._submit(queue, job_id)
+
+    def _submit(self, queue, job_id):
+        with self.lock:
+            self.running[queue].add(job_id)
+            pool = self.pools.get(queue)
+            if pool is None:
+                pool = self.pools[queue] = ThreadPoolExecutor(
+                    max_workers=self.limits.get(queue, 1), thread_name_prefix=f'job-{queue}')
+        pool.submit(self._run, queue, job_id)
+
+    def _run(self, queue, job_id):
+        try:
+            _execute(self.app, job_id)
+        except Exception:
+            logger.exception("Tâche %s : échec de l'exécuteur", job_id)
+        finally:
+            with self.lock:
+                self.running[queue].discard(job_id)
+            self.wake()
+
+    def _heartbeat(self):
+        with self.lock:
+            ids = [job_id for ids in self.running.values() for job_id in ids]
+        if ids:
+            db.session.execute(update(BackgroundJob).where(
+                BackgroundJob.id.in_(ids), BackgroundJob.worker == self.worker,
+            ).values(heartbeat_at=datetime.utcnow()))
+            db.session.commit()
+
+    def _recover_stale(self):
+        """Tâches « running » d'un exécuteur arrêté : remises en file (ou en
+        échec si elles ont épuisé leurs tentatives)."""
+        stale = BackgroundJob.query.filter(
+            BackgroundJob.status == 'running',
+            BackgroundJob.heartbeat_at < datetime.utcnow() - STALE_AFTER,
+        ).all()
+        for job in stale:
+            logger.warning("Tâche %s (%s) interrompue sur %s : reprise", job.id, job.name, job.worker)
+            job.error = f"Interrompue (exécuteur {job.worker} arrêté)"
+            job.worker = None
+            if job.attempts < job.max_attempts:
+                job.status = 'queued'
+            else:
+                job.status, job.finished_at = 'failed', datetime.utcnow()
+        if stale:
+            db.session.commit()
+
+    def _schedule_periodic(self):
+        now = time.time()
+        for name, every in PERIODIC.items():
+            slot = int(now // every.total_seconds())
+            if self.slots.get(name) == slot:
+                continue
+            key = f"{name}@{slot}"
+            exists = db.session.scalar(select(BackgroundJob.id).where(
+                BackgroundJob.unique_key == key).limit(1))
+            if exists is None:
+                enqueue(name, unique_key=key)
+                db.session.commit()
+            self.slots[name] = slot
+
+
+def run_worker(app):
+    """Boucle d'un processus exécuteur dédié (``python worker.py``)."""
+    global _runner
+    with _runner_lock:
+        _runner = _Runner(app)
+    try:
+        _runner.run_forever()
+    except KeyboardInterrupt:
+        _runner.stop()
+
+
+def start_in_process(app):
+    """Démarre l'exécuteur dans le processus web (mode ``thread``). Gardée :
+    un seul exécuteur par processus."""
+    global _runner
+    if _mode(app) != 'thread':
+        return
+    with _runner_lock:
+        if _runner is not None:
+            return
+        _runner = _Runner(app)
+    thread = threading.Thread(target=_runner.run_forever, name='job-runner', daemon=True)
+    thread.start()
+
+
+# ---------------------------------------------------------------------------
+# Suivi
+# ---------------------------------------------------------------------------
+
+def queue_stats():
+    """Tâches par file et par statut, plus ancienne tâche due en attente et
+    dernière exécution de chaque tâche périodique."""
+    load_tasks()
+    now = datetime.utcnow()
+    queues = {}
+    for queue, status, count in db.session.query(
+        BackgroundJob.queue, BackgroundJob.status, func.count(BackgroundJob.id)
+    ).group_by(BackgroundJob.queue, BackgroundJob.status):
+        queues.setdefault(queue, dict.fromkeys(('queued', 'running', 'done', 'failed'), 0))[status] = count
+    for queue, oldest in db.session.query(
+        BackgroundJob.queue, func.min(BackgroundJob.run_at)
+    ).filter(BackgroundJob.status == 'queued', BackgroundJob.run_at <= now).group_by(BackgroundJob.queue):
+        queues[queue]['oldest_due_seconds'] = int((now - oldest).total_seconds())
+
+    last_runs = dict(db.session.query(BackgroundJob.name, func.max(BackgroundJob.finished_at)).filter(
+        BackgroundJob.name.in_(list(PERIODIC)), BackgroundJob.status == 'done',
+    ).group_by(BackgroundJob.name).all())
+    return {
+        'mode': _mode(current_app),
+        'queues': queues,
+        'periodic': {
+            name: {'every_seconds': int(every.total_seconds()),
+                   'last_run': last_runs[name].isoformat() if last_runs.get(name) else None}
+            for name, every in sorted(PERIODIC.items())
+        },
+    }
+
+
+@periodic('jobs.purge', every=timedelta(days=1))
+def purge_finished_jobs():
+    """Supprime les tâches terminées depuis plus de JOB_RETENTION_DAYS jours."""
+    cutoff = datetime.utcnow() - timedelta(days=JOB_RETENTION_DAYS)
+    count = BackgroundJob.query.filter(
+        BackgroundJob.status.in_(('done', 'failed')), BackgroundJob.finished_at < cutoff,
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return count
@@ -0,0 +1,324 @@
+"""Outbox des notifications (emails et push) et worker d'envoi par lots.
+
+Les emails d'annonce partaient d'un thread « fire-and-forget » qui appelait
+send_email() destinataire par destinataire (600 parents : plusieurs minutes
+d'appels HTTP en série), et chaque push ouvrait son propre thread : un
+redémarrage perdait tout ce qui était en cours, et les échecs étaient
+ignorés.
+
+enqueue_email() / enqueue_push() déposent la notification dans l'outbox
+(OutboxMessage + un OutboxDelivery par destinataire) dans la transaction de
+l'appelant, avec la tâche « outbox.drain » de l'exécuteur de tâches
+(services/job_runner.py, file ``notifications``) : elles n'existent que si
+l'action qui les déclenche est commitée. La tâche :
+
+    - réserve des lots d'envois dus (UPDATE conditionnel + ``claim_token`` :
+      deux workers ne réservent jamais le même envoi) ;
+    - les envoie par lots de PROVIDER_BATCH_SIZE via les API batch (Resend
+      batch, Expo 100 messages par requête), au plus OUTBOX_CONCURRENCY
+      (4 par défaut) appels fournisseur en parallèle ;
+    - enregistre le statut de chaque destinataire ; un échec temporaire est
+      réessayé avec un délai exponentiel (OUTBOX_RETRY_SECONDS × 2^n) jusqu'à
+      OUTBOX_MAX_ATTEMPTS tentatives, un refus définitif (jeton Expo
+      désinscrit…) passe directement en ``failed``.
+
+Elle se redépose pour la prochaine nouvelle tentative due ; un passage
+périodique (« outbox.sweep ») reprend en plus tout envoi oublié, et un
+envoi resté ``sending`` plus de CLAIM_TIMEOUT (tâche interrompue) est remis
+en attente.
+
+``OUTBOX_PROVIDER = 'memory'`` remplace Resend et Expo par des fournisseurs
+en mémoire (memory_providers) pour tester hors ligne.
+"""
+import json
+import logging
+import threading
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from itertools import groupby
+
+from flask import current_app
+from sqlalchemy import delete, func, insert, or_, select, update
+
+from extensions import db
+from models.notification_outbox import OutboxDelivery, OutboxMessage
+from services.job_runner import enqueue, periodic, task
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_RETRY_SECONDS = 30
+MAX_RETRY_DELAY = timedelta(hours=1)
+
+# Envois par appel fournisseur (limite des API batch Resend et Expo).
+PROVIDER_BATCH_SIZE = 100
+
+# Un envoi réservé depuis plus longtemps est considéré comme abandonné.
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+OUTBOX_RETENTION_DAYS = 30
+
+DeliveryResult = namedtuple('DeliveryResult', 'ok provider_id error permanent')
+
+_send_pool = None
+_send_pool_lock = threading.Lock()
+
+
+# ---------------------------------------------------------------------------
+# Fournisseurs
+# ---------------------------------------------------------------------------
+
+class MemoryProvider:
+    """Fournisseur de substitution (tests, développement hors ligne) : garde
+    les messages envoyés dans ``sent``. Les destinataires de ``failing``
+    échouent temporairement, ceux de ``rejected`` définitivement."""
+
+    def __init__(self):
+        self.sent = []
+        self.failing = set()
+        self.rejected = set()
+        self._lock = threading.Lock()
+
+    def send(self, messages):
+        results = []
+        with self._lock:
+            for message in messages:
+                if message['to'] in self.rejected:
+                    results.append(DeliveryResult(False, None, 'Destinataire refusé', True))
+                elif message['to'] in self.failing:
+                    results.append(DeliveryResult(False, None, 'Échec temporaire', False))
+                else:
+                    self.sent.append(message)
+                    results.append(DeliveryResult(True, f"mem-{len(self.sent)}", None, False))
+        return results
+
+    def reset(self):
+        with self._lock:
+            self.sent.clear()
+            self.failing.clear()
+            self.rejected.clear()
+
+
+memory_providers = {'email': MemoryProvider(), 'push': MemoryProvider()}
+
+
+def _provider(app, channel):
+    """Fonction d'envoi d'un lot (liste de messages -> liste de DeliveryResult)."""
+    if app.config.get('OUTBOX_PROVIDER') == 'memory':
+        return memory_providers[channel].send
+    if channel == 'email':
+        from services.email_service import send_email_batch
+        return send_email_batch
+    from services.push_service import send_push_batch
+    return send_push_batch
+
+
+# ---------------------------------------------------------------------------
+# Dépôt
+# ---------------------------------------------------------------------------
+
+def _enqueue(channel, recipients, subject, body, data=None, source=None):
+    recipients = list(dict.fromkeys(r for r in recipients if r))
+    if not recipients:
+        return None
+    message = OutboxMessage(
+        channel=channel,
+        source=source,
+        subject=subject[:255],
+        body=body,
+        data=json.dumps(data) if data else None,
+    )
+    db.session.add(message)
+    db.session.flush()
+    db.session.execute(insert(OutboxDelivery), [
+        {'message_id': message.id, 'recipient': recipient, 'status': 'pending', 'attempts': 0}
+        for recipient in recipients
+    ])
+    enqueue('outbox.drain', unique_key='outbox.drain')
+    return message
+
+
+def enqueue_email(recipients, subject, html, source=None):
+    """Dépose un email (un envoi par destinataire, dédupliqués) dans
+    l'outbox. Ne commite pas : l'envoi part au commit de l'appelant.
+
+    Returns:
+        L'OutboxMessage, ou None sans destinataire.
+    """
+    return _enqueue('email', recipients, subject, html, source=source)
+
+
+def enqueue_push(tokens, title, body, data=None, source=None):
+    """Dépose une notification push (jetons Expo valides seulement) dans
+    l'outbox. Ne commite pas : l'envoi part au commit de l'appelant."""
+    from services.push_service import is_expo_token
+    return _enqueue('push', [t for t in (tokens or []) if is_expo_token(t)],
+                    title, body, data=data, source=source)
+
+
+# ---------------------------------------------------------------------------
+# Worker
+# ---------------------------------------------------------------------------
+
+def _get_send_pool(app):
+    global _send_pool
+    with _send_pool_lock:
+        if _send_pool is None:
+            workers = int(app.config.get('OUTBOX_CONCURRENCY') or DEFAULT_CONCURRENCY)
+            _send_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='outbox-send')
+        return _send_pool
+
+
+@task('outbox.drain', queue='notifications', max_attempts=1)
+def drain_outbox():
+    """Envoie les envois dus, lot par lot, puis se redépose pour la
+    prochaine nouvelle tentative. Returns: nombre d'envois traités."""
+    app = current_app._get_current_object()
+    now = datetime.utcnow()
+    # Envois réservés par une tâche interrompue : remis en attente
+    db.session.execute(update(OutboxDelivery).where(
+        OutboxDelivery.status == 'sending',
+        OutboxDelivery.claimed_at < now - CLAIM_TIMEOUT,
+    ).values(status='pending', claim_token=None))
+    db.session.commit()
+
+    concurrency = int(app.config.get('OUTBOX_CONCURRENCY') or DEFAULT_CONCURRENCY)
+    processed = 0
+    while True:
+        claimed = _claim(concurrency * PROVIDER_BATCH_SIZE)
+        if not claimed:
+            break
+        _deliver(app, claimed)
+        processed += len(claimed)
+
+    next_at = db.session.scalar(select(func.min(OutboxDelivery.next_attempt_at)).where(
+        OutboxDelivery.status == 'pending'
+    ))
+    if next_at:
+        # Clé datée : la tâche en cours (éventuellement elle-même une
+        # nouvelle tentative) ne masque pas la suivante
+        enqueue('outbox.drain', run_at=next_at, unique_key=f'outbox.retry@{next_at.isoformat()}')
+        db.session.commit()
+    return processed
+
+
+@periodic('outbox.sweep', every=timedelta(minutes=10), queue='notifications')
+def sweep_outbox():
+    """Filet de sécurité : envois restés en attente (dépôt concurrent d'un
+    passage en cours, tâche perdue)."""
+    return drain_outbox()
+
+
+def _claim(limit):
+    """Réserve jusqu'à ``limit`` envois dus. Returns: lignes (id, recipient,
+    attempts, message_id, channel, subject, body, data) triées par message."""
+    now = datetime.utcnow()
+    ids = db.session.scalars(select(OutboxDelivery.id).where(
+        OutboxDelivery.status == 'pending',
+        or_(OutboxDelivery.next_attempt_at.is_(None), OutboxDelivery.next_attempt_at <= now),
+    ).order_by(OutboxDelivery.id).limit(limit)).all()
+    if not ids:
+        return []
+    token = uuid.uuid4().hex
+    db.session.execute(update(OutboxDelivery).where(
+        OutboxDelivery.id.in_(ids), OutboxDelivery.status == 'pending',
+    ).values(status='sending', claim_token=token, claimed_at=now))
+    db.session.commit()
+    return db.session.query(
+        OutboxDelivery.id, OutboxDelivery.recipient, OutboxDelivery.attempts,
+        OutboxMessage.id, OutboxMessage.channel, OutboxMessage.subject,
+        OutboxMessage.body, OutboxMessage.data,
+    ).join(OutboxMessage, OutboxMessage.id == OutboxDelivery.message_id).filter(
+        OutboxDelivery.claim_token == token
+    ).order_by(OutboxMessage.id, OutboxDelivery.id).all()
+
+
+def _provider_messages(channel, subject, body, data, rows):
+    if channel == 'email':
+        return [{'to': row.recipient, 'subject': subject, 'html': body} for row in rows]
+    data = json.loads(data) if data else {}
+    return [{'to': row.recipient, 'title': subject, 'body': body, 'data': data} for row in rows]
+
+
+def _send(send, messages):
+    try:
+        results = send(messages)
+    except Exception as e:
+        logger.warning("Outbox : lot de %s envoi(s) en échec : %s", len(messages), e)
+        return [DeliveryResult(False, None, f"{type(e).__name__}: {e}", False)] * len(messages)
+    if len(results) != len(messages):
+        return [DeliveryResult(False, None, 'Réponse fournisseur incomplète', False)] * len(messages)
+    return results
+
+
+def _deliver(app, claimed):
+    """Envoie les envois réservés (lots en parallèle) et enregistre leurs statuts."""
+    pool = _get_send_pool(app)
+    batches = []
+    for (_, channel, subject, body, data), rows in groupby(
+            claimed, key=lambda row: tuple(row[3:])):
+        rows = list(rows)
+        send = _provider(app, channel)
+        for start in range(0, len(rows), PROVIDER_BATCH_SIZE):
+            chunk = rows[start:start + PROVIDER_BATCH_SIZE]
+            batches.append((chunk, pool.submit(
+                _send, send, _provider_messages(channel, subject, body, data, chunk))))
+
+    max_attempts = int(app.config.get('OUTBOX_MAX_ATTEMPTS') or DEFAULT_MAX_ATTEMPTS)
+    retry = timedelta(seconds=int(app.config.get('OUTBOX_RETRY_SECONDS') or DEFAULT_RETRY_SECONDS))
+    now = datetime.utcnow()
+    changes = []
+    for chunk, future in batches:
+        for row, result in zip(chunk, future.result()):
+            attempts = row.attempts + 1
+            change = {'id': row[0], 'attempts': attempts, 'claim_token': None,
+                      'provider_id': result.provider_id, 'sent_at': None,
+                      'next_attempt_at': None, 'last_error': None}
+            if result.ok:
+                change.update(status='sent', sent_at=now)
+            elif result.permanent or attempts >= max_attempts:
+                change.update(status='failed', last_error=(result.error or '')[:500])
+            else:
+                delay = min(retry * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+                change.update(status='pending', next_attempt_at=now + delay,
+                              last_error=(result.error or '')[:500])
+            changes.append(change)
+    # UPDATE groupé par clé primaire (executemany)
+    db.session.execute(update(OutboxDelivery), changes)
+    db.session.commit()
+
+
+# ---------------------------------------------------------------------------
+# Purge et suivi
+# ---------------------------------------------------------------------------
+
+@periodic('outbox.purge', every=timedelta(days=1))
+def purge_outbox():
+    """Supprime les notifications dont tous les envois sont terminés depuis
+    plus de OUTBOX_RETENTION_DAYS jours. Returns: nombre de messages supprimés."""
+    cutoff = datetime.utcnow() - timedelta(days=OUTBOX_RETENTION_DAYS)
+    unfinished = select(OutboxDelivery.message_id).where(
+        OutboxDelivery.status.in_(('pending', 'sending'))
+    )
+    expired = select(OutboxMessage.id).where(
+        OutboxMessage.created_at < cutoff, OutboxMessage.id.not_in(unfinished)
+    )
+    db.session.execute(delete(OutboxDelivery).where(OutboxDelivery.message_id.in_(expired)))
+    count = db.session.execute(delete(OutboxMessage).where(
+        OutboxMessage.created_at < cutoff, OutboxMessage.id.not_in(unfinished)
+    )).rowcount
+    db.session.commit()
+    return count
+
+
+def delivery_counts(source):
+    """Nombre d'envois par statut des notifications de ``source``
+    (ex. ``'announcement:12'``)."""
+    counts = dict.fromkeys(('pending', 'sending', 'sent', 'failed'), 0)
+    counts.update(db.session.query(OutboxDelivery.status, func.count(OutboxDelivery.id)).join(
+        OutboxMessage, OutboxMessage.id == OutboxDelivery.message_id
+    ).filter(OutboxMessage.source == source).group_by(OutboxDelivery.status).all())
+    return counts
@@ -0,0 +1,274 @@
+"""Aperçus PDF rastérisés côté serveur (images et couches texte des pages).
+
+Le lecteur (clean-pdf-viewer.js) rendait chaque page côté client à partir du
+PDF complet : sur un vieil iPad, ouvrir un manuel de 200 pages dans
+lesson_view imposait de télécharger et parser tout le fichier avant
+d'afficher quoi que ce soit. Ici :
+
+    - à l'import (upload, conversion Word → PDF) ou à la première ouverture,
+      request_previews() dépose la tâche « pdf_previews.generate » dans
+      l'exécuteur de tâches (file ``previews``) ; la requête ne rastérise
+      jamais ;
+    - la tâche produit, pour chaque page, des JPEG à quelques niveaux de
+      zoom et une couche texte (mots et leurs rectangles, JSON) ;
+    - le lecteur affiche les pages à partir de ces images (chargées quand
+      elles deviennent visibles) et ne télécharge le PDF vectoriel que
+      lorsque l'enseignant zoome ou annote.
+
+Stockage adressé par contenu :
+    previews/<sha256 du PDF>/<niveau>/<page>.jpg
+    previews/<sha256 du PDF>/text/<page>.json
+Sur R2 si configuré, sinon sur disque sous UPLOAD_FOLDER/previews. Deux
+fichiers identiques (ex. copie d'un fichier perso dans une classe) partagent
+donc les mêmes aperçus. La table pdf_previews associe chaque source (fichier
+de classe v2 / legacy / UserFile) à sa version (ETag R2, sinon taille et
+date d'import) et au hash de son contenu : une source remplacée change de
+version et ses aperçus sont régénérés.
+
+Dépendance : PyMuPDF (requirements.txt). Sans elle, is_preview_enabled()
+renvoie False, les routes répondent 404 et le lecteur garde son rendu client.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime
+
+from extensions import db
+from models.pdf_preview import PdfPreview
+from services.job_runner import enqueue
+from services.r2_storage import head_r2_key, read_stored_object, write_stored_object
+
+logger = logging.getLogger(__name__)
+
+# Niveaux de zoom produits : facteur d'échelle appliqué à la taille PDF
+# (1.0 = 72 dpi). 'thumb' pour les miniatures, 'page' pour l'affichage
+# normal, 'hd' pour les écrans Retina.
+ZOOM_LEVELS = {
+    'thumb': 0.3,
+    'page': 1.5,
+    'hd': 2.5,
+}
+
+JPEG_QUALITY = 80
+
+GENERATE_TASK = 'pdf_previews.generate'
+
+
+def _fitz():
+    try:
+        import fitz  # PyMuPDF
+        return fitz
+    except ImportError:
+        return None
+
+
+def is_preview_enabled():
+    """True si PyMuPDF est installé (rastérisation disponible)."""
+    return _fitz() is not None
+
+
+# ---------------------------------------------------------------------------
+# Clés des objets (stockage R2 ou disque : r2_storage.*_stored_object)
+# ---------------------------------------------------------------------------
+
+def _image_key(content_hash, level, page):
+    return f"previews/{content_hash}/{level}/{page}.jpg"
+
+
+def _text_key(content_hash, page):
+    return f"previews/{content_hash}/text/{page}.json"
+
+
+# ---------------------------------------------------------------------------
+# Sources
+# ---------------------------------------------------------------------------
+
+def source_key(kind, obj):
+    """Identifiant stable d'une source (« userfile:5 », « v2:12 »…)."""
+    return f"{kind}:{obj.id}"
+
+
+def source_version(kind, obj):
+    """Version du contenu d'une source : ETag de l'objet R2 s'il existe,
+    sinon taille et date d'import. Change quand le fichier est remplacé."""
+    r2_key = getattr(obj, 'r2_key', None)
+    if r2_key:
+        head = head_r2_key(r2_key)
+        if head:
+            return f"etag:{head['etag']}:{head['size']}"
+    uploaded_at = getattr(obj, 'uploaded_at', None)
+    stamp = uploaded_at.isoformat() if uploaded_at else ''
+    return f"size:{obj.file_size or 0}:{stamp}"
+
+
+def request_previews(kind, obj, version=None):
+    """Dépose la génération des aperçus d'une source si elle n'est pas déjà
+    à jour (ou en cours) pour cette version. Ne commite pas.
+
+    Returns:
+        PdfPreview (status 'pending', 'ready' ou 'failed'), ou None si
+        PyMuPDF est absent.
+    """
+    if not is_preview_enabled():
+        return None
+    key = source_key(kind, obj)
+    version = version or source_version(kind, obj)
+
+    preview = PdfPreview.query.filter_by(source_key=key).first()
+    if preview and preview.source_version == version:
+        return preview
+    if preview is None:
+        preview = PdfPreview(source_key=key)
+        db.session.add(preview)
+    preview.source_version = version
+    preview.status = 'pending'
+    preview.updated_at = datetime.utcnow()
+    db.session.flush()
+    # Une tâche par version : une source remplacée pendant un rendu en
+    # dépose une nouvelle, la précédente s'arrête sur la version périmée.
+    version_tag = hashlib.sha1(version.encode('utf-8')).hexdigest()[:16]
+    enqueue(GENERATE_TASK, {'kind': kind, 'obj_id': obj.id, 'version': version},
+            unique_key=f"pdf_previews:{key}:{version_tag}")
+    return preview
+
+
+def current_preview(kind, obj):
+    """PdfPreview prêt et à jour pour cette source, sinon None (la génération
+    est alors déposée : les prochaines ouvertures en profiteront)."""
+    preview = request_previews(kind, obj)
+    if preview is None or preview.status != 'ready':
+        return None
+    return preview
+
+
+# ---------------------------------------------------------------------------
+# Génération (tâche de l'exécuteur, jamais dans une requête)
+# ---------------------------------------------------------------------------
+
+def _spool_source(chunks):
+    """Écrit les morceaux du PDF dans un fichier temporaire en calculant son
+    hash. Ne matérialise jamais le fichier entier en mémoire.
+    Returns: (content_hash, chemin du fichier temporaire)."""
+    digest = hashlib.sha256()
+    fd, path = tempfile.mkstemp(suffix='.pdf')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in chunks:
+                if chunk:
+                    digest.update(chunk)
+                    f.write(chunk)
+    except Exception:
+        os.remove(path)
+        raise
+    return digest.hexdigest(), path
+
+
+def _text_layer(page):
+    """Mots de la page et leurs rectangles (points PDF, origine en haut à gauche)."""
+    words = [[round(x0, 1), round(y0, 1), round(x1, 1), round(y1, 1), text]
+             for x0, y0, x1, y1, text, *_ in page.get_text('words')]
+    return {'width': round(page.rect.width, 2), 'height': round(page.rect.height, 2), 'words': words}
+
+
+def _render_document(fitz, path, content_hash):
+    """Rend toutes les pages (tous niveaux) et leurs couches texte.
+    Returns: (page_count, page_sizes)."""
+    with fitz.open(path) as doc:
+        page_sizes = []
+        for number, page in enumerate(doc, start=1):
+            for level, scale in ZOOM_LEVELS.items():
+                pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale), alpha=False)
+                write_stored_object(_image_key(content_hash, level, number),
+                                    pix.tobytes('jpeg', jpg_quality=JPEG_QUALITY), 'image/jpeg')
+            write_stored_object(_text_key(content_hash, number),
+                                json.dumps(_text_layer(page)).encode('utf-8'), 'application/json')
+            page_sizes.append([round(page.rect.width, 2), round(page.rect.height, 2)])
+            # Rendre la main entre deux pages (exécuteur dans le processus web)
+            time.sleep(0)
+        return doc.page_count, page_sizes
+
+
+def generate_previews(key, version, open_chunks):
+    """Génère les aperçus d'une source pour ``version``.
+
+    Args:
+        key: identifiant de la source (source_key).
+        version: version attendue ; si la source a changé depuis le dépôt,
+            la génération est abandonnée (une autre tâche a été déposée).
+        open_chunks: callable sans argument renvoyant un itérable de bytes
+            (contenu du PDF), ou None si la source est introuvable.
+
+    Returns:
+        dict de résultat pour BackgroundJob.result.
+    """
+    fitz = _fitz()
+    preview = PdfPreview.query.filter_by(source_key=key).first()
+    if fitz is None or preview is None or preview.source_version != version:
+        return {'skipped': True}
+
+    chunks = open_chunks()
+    if chunks is None:
+        preview.status = 'failed'
+        db.session.commit()
+        return {'failed': 'source introuvable'}
+
+    content_hash, path = _spool_source(chunks)
+    try:
+        # Même contenu déjà rendu via une autre source : réutiliser ses aperçus.
+        twin = PdfPreview.query.filter(
+            PdfPreview.content_hash == content_hash, PdfPreview.status == 'ready',
+        ).first()
+        if twin:
+            page_count, page_sizes = twin.page_count, twin.page_sizes
+        else:
+            try:
+                page_count, page_sizes = _render_document(fitz, path, content_hash)
+            except RuntimeError as e:  # PDF illisible (fitz.FileDataError…)
+                logger.warning("Aperçu PDF impossible pour %s: %s", key, e)
+                preview.status = 'failed'
+                db.session.commit()
+                return {'failed': str(e)}
+    finally:
+        os.remove(path)
+
+    db.session.refresh(preview)
+    if preview.source_version != version:
+        return {'skipped': True}  # remplacée pendant le rendu
+    preview.content_hash = content_hash
+    preview.page_count = page_count
+    preview.page_sizes = page_sizes
+    preview.status = 'ready'
+    preview.updated_at = datetime.utcnow()
+    db.session.commit()
+    return {'pages': page_count, 'reused': bool(twin)}
+
+
+# ---------------------------------------------------------------------------
+# Lecture
+# ---------------------------------------------------------------------------
+
+def page_image(preview, level, page):
+    """JPEG (bytes) d'une page 1-indexée, ou None (niveau ou page inconnus)."""
+    if level not in ZOOM_LEVELS or not 1 <= page <= (preview.page_count or 0):
+        return None
+    return read_stored_object(_image_key(preview.content_hash, level, page))
+
+
+def page_text(preview, page):
+    """Couche texte (bytes JSON) d'une page 1-indexée, ou None."""
+    if not 1 <= page <= (preview.page_count or 0):
+        return None
+    return read_stored_object(_text_key(preview.content_hash, page))
+
+
+def manifest(preview):
+    """Description servie au lecteur (nombre de pages, tailles, niveaux)."""
+    return {
+        'content_hash': preview.content_hash,
+        'page_count': preview.page_count,
+        'page_sizes': preview.page_sizes,
+        'levels': {name: scale for name, scale in ZOOM_LEVELS.items()},
+    }
@@ -0,0 +1,146 @@
+"""Statut Premium des enseignants, en cache.
+
+User.has_premium_access() est appelée par le middleware premium à chaque
+requête vers une page Premium, et plusieurs fois par page par base.html
+(cadenas du menu). Elle évaluait à chaque fois le tier, la date
+d'expiration et interrogeait apple_subscriptions.
+
+Ici le statut (même règle que User.is_premium()) est calculé une fois par
+enseignant et gardé en mémoire du processus (un seul worker eventlet en
+production) jusqu'à :
+
+    - son prochain changement prévisible (fin du Premium daté ou de
+      l'abonnement Apple), au plus tard PREMIUM_CACHE_TTL secondes ;
+    - une modification de l'abonnement : tier / premium_until d'un User ou
+      AppleSubscription créé, modifié ou supprimé (événements ORM, écritures
+      en masse comprises), et invalidate_premium() appelée explicitement par
+      les webhooks Stripe et App Store.
+"""
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models.apple_subscription import AppleSubscription
+from models.user import User
+
+# Durée de vie maximale d'un statut en cache (secondes).
+PREMIUM_CACHE_TTL = 300
+
+_cache = {}                      # user_id -> (expires_at, bool)
+_lock = threading.Lock()
+# Incrémentée par invalidate_premium() : un statut calculé pendant un
+# changement d'abonnement n'est pas mis en cache.
+_generation = 0
+
+# Colonnes dont dépend le statut
+_USER_ATTRS = ('subscription_tier', 'premium_until')
+_APPLE_ACTIVE = ('active', 'in_grace_period')
+
+
+def _compute(user, now):
+    """(premium, secondes de validité) d'après la base."""
+    ttl = PREMIUM_CACHE_TTL
+    premium = False
+    if user.subscription_tier == 'premium':
+        if user.premium_until is None:
+            return True, ttl  # illimité
+        if user.premium_until > now:
+            premium = True
+            ttl = min(ttl, (user.premium_until - now).total_seconds())
+
+    try:
+        apple_until = db.session.scalar(select(func.max(AppleSubscription.expires_date)).where(
+            AppleSubscription.user_id == user.id,
+            AppleSubscription.status.in_(_APPLE_ACTIVE),
+            AppleSubscription.expires_date > now,
+        ))
+    except Exception:
+        # Même repli que User.is_premium() (table pas encore créée…)
+        apple_until = None
+    if apple_until is not None:
+        premium = True
+        ttl = min(ttl, (apple_until - now).total_seconds())
+    return premium, ttl
+
+
+def has_premium(user):
+    """Statut Premium de ``user`` (enseignant), depuis le cache si possible."""
+    if user.id is None or db.inspect(user).modified:
+        # Modifications pas encore flushées : on ne met rien en cache
+        return _compute(user, datetime.utcnow())[0]
+    now = time.monotonic()
+    with _lock:
+        entry = _cache.get(user.id)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        generation = _generation
+    premium, ttl = _compute(user, datetime.utcnow())
+    with _lock:
+        if _generation == generation:
+            _cache[user.id] = (now + ttl, premium)
+    return premium
+
+
+def invalidate_premium(user_id=None):
+    """Vide le statut en cache d'un enseignant (ou de tous)."""
+    global _generation
+    with _lock:
+        _generation += 1
+        if user_id is None:
+            _cache.clear()
+        else:
+            _cache.pop(user_id, None)
+
+
+# ---------------------------------------------------------------------------
+# Invalidation (événements ORM)
+# ---------------------------------------------------------------------------
+
+def _premium_user_id(obj, session):
+    """Id de l'enseignant dont le statut change avec ``obj``, sinon None."""
+    if isinstance(obj, AppleSubscription):
+        return obj.user_id
+    if obj in session.new or obj in session.deleted:
+        return obj.id
+    attrs = db.inspect(obj).attrs
+    if any(attrs[name].history.has_changes() for name in _USER_ATTRS):
+        return obj.id
+    return None
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_premium_changes(session, flush_context, instances):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (User, AppleSubscription)):
+            user_id = _premium_user_id(obj, session)
+            if user_id is not None:
+                invalidate_premium(user_id)
+                session.info.setdefault('premium_dirty', set()).add(user_id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session):
+    for user_id in session.info.pop('premium_dirty', ()):
+        invalidate_premium(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_rolled_back(session):
+    for user_id in session.info.pop('premium_dirty', ()):
+        invalidate_premium(user_id)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _bulk_changes(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_delete
+            or orm_execute_state.is_update):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ in (User, AppleSubscription):
+        invalidate_premium()
+        # None : tous les statuts, à revider au commit
+        orm_execute_state.session.info.setdefault('premium_dirty', set()).add(None)
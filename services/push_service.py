@@ -5,50 +5,63 @@ certificat APNs à gérer côté serveur, Expo relaie vers Apple. Les jetons
 (ExponentPushToken[...]) sont enregistrés par l'app via
 POST /api/v1/student/push-token et stockés sur students.expo_push_token.
 
-send_push_async() part en thread démon (comme les emails d'annonces) pour ne
-jamais bloquer ni faire échouer la requête appelante.
+Les routes ne l'appellent pas directement : elles déposent les notifications
+dans l'outbox (services/notification_outbox.enqueue_push), dont le worker
+appelle send_push_batch() par lots de EXPO_BATCH_SIZE messages.
 """
 import logging
-import threading
 
 logger = logging.getLogger(__name__)
 
 _EXPO_PUSH_URL = 'https://exp.host/--/api/v2/push/send'
 
+# L'API Expo accepte jusqu'à 100 messages par requête.
+EXPO_BATCH_SIZE = 100
 
-def _send_push_sync(tokens, title, body, data=None):
+# Erreurs Expo définitives : inutile de réessayer ce jeton.
+_PERMANENT_ERRORS = {'DeviceNotRegistered', 'InvalidCredentials', 'MessageTooBig'}
+
+
+def is_expo_token(token):
+    return bool(token) and str(token).startswith('ExponentPushToken')
+
+
+def send_push_batch(messages):
+    """Envoie un lot de notifications (EXPO_BATCH_SIZE max) en une requête.
+
+    Args:
+        messages: liste de dicts ``to``, ``title``, ``body``, ``data``
+
+    Returns:
+        Liste de DeliveryResult (un ticket Expo par message), dans l'ordre.
+
+    Raises:
+        Exception: échec HTTP (tout le lot est à réessayer).
+    """
     import requests
+    from services.notification_outbox import DeliveryResult
 
-    tokens = [t for t in (tokens or []) if t and str(t).startswith('ExponentPushToken')]
-    if not tokens:
-        return 0
-    messages = [{
-        'to': t,
-        'title': title,
-        'body': body,
+    resp = requests.post(_EXPO_PUSH_URL, json=[{
+        'to': m['to'],
+        'title': m['title'],
+        'body': m['body'],
         'sound': 'default',
-        'data': data or {},
-    } for t in tokens]
-    sent = 0
-    # L'API Expo accepte jusqu'à 100 messages par requête.
-    for i in range(0, len(messages), 100):
-        chunk = messages[i:i + 100]
-        try:
-            resp = requests.post(_EXPO_PUSH_URL, json=chunk, timeout=10)
-            if resp.status_code == 200:
-                sent += len(chunk)
-            else:
-                logger.warning("Expo push HTTP %s: %s", resp.status_code, resp.text[:200])
-        except Exception as e:
-            logger.warning("Expo push échec: %s", e)
-    return sent
-
-
-def send_push_async(tokens, title, body, data=None):
-    """Envoie des notifications push en arrière-plan (fire-and-forget)."""
-    tokens = [t for t in (tokens or []) if t]
-    if not tokens:
-        return
-    threading.Thread(
-        target=_send_push_sync, args=(tokens, title, body, data), daemon=True
-    ).start()
+        'data': m.get('data') or {},
+    } for m in messages], timeout=10)
+    if resp.status_code != 200:
+        raise RuntimeError(f"Expo push HTTP {resp.status_code}: {resp.text[:200]}")
+
+    tickets = resp.json().get('data') or []
+    results = []
+    for i in range(len(messages)):
+        ticket = tickets[i] if i < len(tickets) else {}
+        if ticket.get('status') == 'ok':
+            results.append(DeliveryResult(True, ticket.get('id'), None, False))
+        else:
+            error = (ticket.get('details') or {}).get('error')
+            logger.warning("Expo push refusé: %s", ticket.get('message') or error)
+            results.append(DeliveryResult(
+                False, None, ticket.get('message') or error or 'Ticket Expo manquant',
+                error in _PERMANENT_ERRORS,
+            ))
+    return results
@@ -13,9 +13,12 @@ Migration progressive:
 
 import os
 import io
+import shutil
 import logging
 from flask import current_app
 
+from services.job_runner import task
+
 logger = logging.getLogger(__name__)
 
 # Client S3 global (initialisé une seule fois)
@@ -299,6 +302,18 @@ def stream_r2_key(key):
         return None
 
 
+def head_r2_key(key):
+    """Métadonnées d'un objet R2 (``{'etag', 'size'}``) sans le télécharger,
+    ou None (R2 désactivé, objet absent)."""
+    if not is_r2_enabled() or not key:
+        return None
+    try:
+        head = get_s3_client().head_object(Bucket=get_bucket_name(), Key=key)
+        return {'etag': head.get('ETag', '').strip('"'), 'size': head.get('ContentLength')}
+    except Exception:
+        return None
+
+
 def stream_file_from_r2(user_id, filename, file_type='file'):
     """Variante de download_file_from_r2 qui streame au lieu de matérialiser."""
     return stream_r2_key(_get_r2_key(user_id, filename, file_type))
@@ -433,3 +448,143 @@ def file_exists_on_r2(user_id, filename, file_type='file'):
 
     except:
         return False
+
+
+# ---------------------------------------------------------------------------
+# Objets dérivés (caches d'aperçus, de conversions…) : R2 si configuré,
+# sinon disque local sous UPLOAD_FOLDER (développement, tests).
+# ---------------------------------------------------------------------------
+
+def _local_object_path(key):
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], key)
+
+
+def read_stored_object(key):
+    """Contenu (bytes) d'un objet dérivé, ou None s'il n'existe pas."""
+    if is_r2_enabled():
+        try:
+            obj = get_s3_client().get_object(Bucket=get_bucket_name(), Key=key)
+            return obj['Body'].read()
+        except Exception:
+            return None
+    path = _local_object_path(key)
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            return f.read()
+    return None
+
+
+def write_stored_object(key, data, mime_type=None):
+    """Écrit un objet dérivé (R2, ou disque local en repli)."""
+    if is_r2_enabled() and upload_to_r2_key(data, key, mime_type=mime_type):
+        return
+    path = _local_object_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def delete_stored_object(key):
+    """Supprime un objet dérivé (R2 et/ou disque local)."""
+    if is_r2_enabled():
+        delete_r2_key(key)
+    path = _local_object_path(key)
+    if os.path.exists(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def write_stored_file(key, path, mime_type=None):
+    """Variante de write_stored_object pour un fichier sur disque (ex. ZIP
+    d'export) : upload multipart vers R2 sans charger le fichier en mémoire,
+    ou copie sur le disque local en repli."""
+    if is_r2_enabled():
+        try:
+            extra_args = {'ContentType': mime_type} if mime_type else None
+            get_s3_client().upload_file(path, get_bucket_name(), key, ExtraArgs=extra_args)
+            return
+        except Exception as e:
+            logger.error(f"Erreur upload R2 (clé {key}): {e}")
+    dest = _local_object_path(key)
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    tmp = f"{dest}.tmp"
+    shutil.copyfile(path, tmp)
+    os.replace(tmp, dest)
+
+
+def stream_stored_object(key):
+    """(générateur de chunks, taille) d'un objet dérivé, ou None s'il n'existe
+    pas. Même ordre que read_stored_object : R2 puis disque local."""
+    streamed = stream_r2_key(key)
+    if streamed is not None:
+        return streamed
+    path = _local_object_path(key)
+    if not os.path.exists(path):
+        return None
+
+    def _chunks():
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b''):
+                yield chunk
+
+    return _chunks(), os.path.getsize(path)
+
+
+@task('files.backfill_r2', queue='maintenance', max_attempts=1)
+def backfill_blobs_to_r2(dry_run=False):
+    """Migre TOUS les user_files encore stockés en BLOB DB vers R2, à la clé
+    canonique files/{user_id}/{filename} (tâche lancée par l'admin : POST
+    /file_manager/api/admin/backfill-r2). Le BLOB n'est libéré qu'APRÈS
+    vérification de la présence de l'objet sur R2 (aucun risque de perte).
+    Idempotent. Les fichiers sont chargés un par un (jamais tous les BLOBs
+    en mémoire).
+
+    Returns:
+        Rapport : candidats, migrés, miniatures, octets libérés, erreurs.
+    """
+    from extensions import db
+    from models.file_manager import UserFile
+
+    ids = [row[0] for row in db.session.query(UserFile.id).filter(
+        UserFile.file_content.isnot(None)).order_by(UserFile.id)]
+    report = {'dry_run': dry_run, 'candidates': len(ids), 'migrated': 0, 'thumbs_migrated': 0,
+              'freed_bytes': 0, 'errors': []}
+
+    for file_id in ids:
+        f = db.session.get(UserFile, file_id)
+        blob = f.file_content if f else None
+        if not blob:
+            continue
+        if dry_run:
+            report['migrated'] += 1
+            report['freed_bytes'] += len(blob)
+            db.session.expunge(f)
+            continue
+        try:
+            key = upload_file_to_r2(blob, f.user_id, f.filename, f.mime_type)
+            # Sécurité : ne jamais vider le BLOB sans confirmer l'objet sur R2.
+            if not key or not file_exists_on_r2(f.user_id, f.filename):
+                report['errors'].append({'id': f.id, 'name': f.original_filename,
+                                         'error': 'r2_upload_non_verifie'})
+                db.session.expunge(f)
+                continue
+            f.r2_key = key
+            if f.thumbnail_content:
+                tkey = upload_thumbnail_to_r2(f.thumbnail_content, f.user_id, f.filename)
+                if tkey and file_exists_on_r2(f.user_id, f.filename, file_type='thumbnail'):
+                    f.r2_thumbnail_key = tkey
+                    f.thumbnail_content = None
+                    report['thumbs_migrated'] += 1
+            report['freed_bytes'] += len(blob)
+            f.file_content = None
+            db.session.commit()
+            report['migrated'] += 1
+        except Exception as e:
+            db.session.rollback()
+            report['errors'].append({'id': file_id, 'error': str(e)})
+        db.session.expunge_all()
+    return report
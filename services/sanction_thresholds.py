@@ -0,0 +1,136 @@
+"""Évaluation des seuils de sanctions (coches) franchis.
+
+check_sanction_thresholds bouclait élèves × modèles de sanction importés et
+lançait, pour chaque couple, une requête StudentSanctionCount, une requête
+des seuils et, par seuil franchi, une requête des options actives : plus de
+300 requêtes pour 28 élèves et 6 modèles à la fin d'un cours.
+
+Ici, tout est chargé en un nombre constant de requêtes (compteurs, seuils,
+options actives) puis les franchissements sont calculés en mémoire. Un seuil
+est franchi pendant la période si ``initial < seuil <= actuel`` ; une option
+active est alors tirée au sort pour ce seuil, comme avant. Le tirage passe
+par un ``random.Random`` injectable (``rng``) : SANCTION_RANDOM_SEED dans la
+config le rend reproductible pour les tests.
+
+Toute route qui modifie des compteurs peut réutiliser ThresholdIndex /
+find_breaches avec les anciennes et nouvelles valeurs.
+"""
+import random
+from collections import namedtuple
+
+from flask import current_app
+
+from extensions import db
+from models.sanctions import SanctionOption, SanctionThreshold
+from models.student_sanctions import StudentSanctionCount
+
+# Seuil d'un modèle : nombre de coches et options actives (ordre d'affichage)
+Threshold = namedtuple('Threshold', 'id template_id check_count options')
+
+
+def get_rng():
+    """Générateur utilisé pour tirer les sanctions : graine fixe si
+    ``SANCTION_RANDOM_SEED`` est configuré, module ``random`` sinon."""
+    seed = current_app.config.get('SANCTION_RANDOM_SEED')
+    return random.Random(seed) if seed is not None else random
+
+
+class ThresholdIndex:
+    """Seuils et options actives d'un ensemble de modèles, chargés en
+    2 requêtes."""
+
+    def __init__(self, template_ids):
+        template_ids = list(template_ids)
+        self._by_template = {tid: [] for tid in template_ids}
+        if not template_ids:
+            return
+
+        options = {}
+        for option in SanctionOption.query.join(
+            SanctionThreshold, SanctionOption.threshold_id == SanctionThreshold.id
+        ).filter(
+            SanctionThreshold.template_id.in_(template_ids),
+            SanctionOption.is_active == True,
+        ).order_by(SanctionOption.order_index, SanctionOption.id):
+            options.setdefault(option.threshold_id, []).append(option)
+
+        rows = db.session.query(
+            SanctionThreshold.id, SanctionThreshold.template_id, SanctionThreshold.check_count
+        ).filter(
+            SanctionThreshold.template_id.in_(template_ids)
+        ).order_by(SanctionThreshold.check_count, SanctionThreshold.id)
+        for threshold_id, template_id, check_count in rows:
+            self._by_template[template_id].append(
+                Threshold(threshold_id, template_id, check_count, options.get(threshold_id, []))
+            )
+
+    def crossed(self, template_id, initial_value, current_value):
+        """Seuils du modèle franchis entre ``initial_value`` (exclu) et
+        ``current_value`` (inclus), par nombre de coches croissant."""
+        return [t for t in self._by_template.get(template_id, ())
+                if initial_value < t.check_count <= current_value]
+
+
+def load_counts(student_ids, template_ids):
+    """``{(student_id, template_id): check_count}`` en 1 requête."""
+    student_ids, template_ids = list(student_ids), list(template_ids)
+    if not student_ids or not template_ids:
+        return {}
+    return {
+        (student_id, template_id): check_count
+        for student_id, template_id, check_count in db.session.query(
+            StudentSanctionCount.student_id, StudentSanctionCount.template_id,
+            StudentSanctionCount.check_count,
+        ).filter(
+            StudentSanctionCount.student_id.in_(student_ids),
+            StudentSanctionCount.template_id.in_(template_ids),
+        )
+    }
+
+
+def find_breaches(changes, index, rng=None):
+    """Seuils franchis et sanctions tirées au sort.
+
+    Args:
+        changes: itérable de ``(student, template, initial_value, current_value)``.
+        index: ThresholdIndex couvrant les modèles de ``changes``.
+        rng: générateur aléatoire (get_rng() par défaut).
+
+    Returns:
+        Liste de dicts au format de /planning/check-sanction-thresholds. Un
+        seuil sans option active ne produit rien, comme avant.
+    """
+    rng = rng or get_rng()
+    breaches = []
+    for student, template, initial_value, current_value in changes:
+        for threshold in index.crossed(template.id, initial_value, current_value):
+            if not threshold.options:
+                continue
+            selected_option = rng.choice(threshold.options)
+            breaches.append({
+                'student_id': student.id,
+                'student_name': student.full_name,
+                'sanction_template': template.name,
+                'threshold': threshold.check_count,
+                'sanction_text': selected_option.description,
+                'min_days_deadline': selected_option.min_days_deadline,
+                'option_id': selected_option.id
+            })
+    return breaches
+
+
+def class_threshold_breaches(students, templates, initial_counts, rng=None):
+    """Franchissements de seuils d'une classe depuis ``initial_counts``
+    (clés ``"<student_id>_<template_id>"``, comme envoyées par la vue du
+    cours). 3 requêtes quel que soit le nombre d'élèves et de modèles."""
+    template_ids = [t.id for t in templates]
+    counts = load_counts([s.id for s in students], template_ids)
+    index = ThresholdIndex(template_ids)
+
+    changes = (
+        (student, template,
+         int(initial_counts.get(f"{student.id}_{template.id}", 0)),
+         counts.get((student.id, template.id), 0))
+        for student in students for template in templates
+    )
+    return find_breaches(changes, index, rng)
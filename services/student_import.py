@@ -0,0 +1,126 @@
+"""Création d'élèves en lot : import CSV, copie vers une autre classe,
+classes auto-créées des groupes mixtes.
+
+import_students créait les Student un par un (un flush ORM par objet, le
+hook before_insert pour email_hash), et la détection des doublons chargeait
+et déchiffrait tous les champs des élèves existants. Le script
+copy_students_to_classroom.py et l'ajout d'élèves à un groupe mixte avaient
+la même forme, avec en plus une requête par élève source.
+
+Ici :
+    - existing_name_keys() ne lit que (prénom, nom) des élèves de la classe
+      cible, en 1 requête ;
+    - plan_import() écarte les doublons (classe existante et fichier) et
+      rapporte chaque ligne écartée avec sa raison ;
+    - bulk_insert_students() insère par paquets de INSERT_BATCH_SIZE en un
+      INSERT multi-lignes : le chiffrement des colonnes se fait pendant la
+      préparation du paquet (TypeDecorator), email_hash est calculé ici
+      (les hooks before_insert ne s'appliquent pas aux insertions en masse) ;
+    - copy_students() copie des élèves existants (1 requête de lecture).
+
+Un import de 500 élèves = une poignée de requêtes au lieu de 500+ flush.
+"""
+from sqlalchemy import insert
+
+from extensions import db
+from models.student import Student
+from utils.encryption import encryption_engine
+
+# Lignes par INSERT multi-lignes.
+INSERT_BATCH_SIZE = 500
+
+# Lignes maximum par import CSV (un fichier d'établissement tient dedans).
+MAX_IMPORT_ROWS = 1000
+
+# Champs copiés d'un élève à l'autre (identité + contacts, sans
+# authentification élève ni jeton push).
+COPIED_FIELDS = ('first_name', 'last_name', 'email', 'date_of_birth',
+                 'parent_email_mother', 'parent_email_father', 'additional_info')
+
+
+def name_key(first_name, last_name):
+    """Clé de doublon : prénom et nom, sans casse ni espaces autour."""
+    return ((first_name or '').strip().lower(), (last_name or '').strip().lower())
+
+
+def existing_name_keys(classroom_id, key=name_key, user_id=None):
+    """Clés des élèves déjà présents dans la classe. 1 requête, seuls le
+    prénom et le nom sont déchiffrés."""
+    query = db.session.query(Student.first_name, Student.last_name).filter(
+        Student.classroom_id == classroom_id)
+    if user_id is not None:
+        query = query.filter(Student.user_id == user_id)
+    return {key(first, last) for first, last in query}
+
+
+def plan_import(rows, existing_keys, key=name_key):
+    """Sépare les lignes à créer des doublons.
+
+    Returns:
+        ``(to_create, skipped)`` — ``skipped`` : dicts ``line``, ``name``,
+        ``reason`` (existe déjà dans la classe / doublon dans le fichier).
+    """
+    seen = set()
+    to_create, skipped = [], []
+    for r in rows:
+        k = key(r['first_name'], r['last_name'])
+        name = f"{r['first_name']} {r['last_name'] or ''}".strip()
+        if k in existing_keys:
+            skipped.append({'line': r.get('line'), 'name': name,
+                            'reason': 'Existe déjà dans la classe'})
+        elif k in seen:
+            skipped.append({'line': r.get('line'), 'name': name,
+                            'reason': 'Doublon dans le fichier'})
+        else:
+            seen.add(k)
+            to_create.append(r)
+    return to_create, skipped
+
+
+def bulk_insert_students(rows, classroom_id, user_id):
+    """Insère les élèves ``rows`` (dicts avec les champs de COPIED_FIELDS,
+    tous optionnels sauf le prénom) dans la classe. Ne commite pas.
+
+    Returns:
+        Nombre d'élèves insérés.
+    """
+    values = []
+    for r in rows:
+        entry = {field: r.get(field) for field in COPIED_FIELDS}
+        entry['last_name'] = entry['last_name'] or ''
+        entry['classroom_id'] = classroom_id
+        entry['user_id'] = user_id
+        entry['email_hash'] = encryption_engine.hash_email(entry['email']) if entry['email'] else None
+        values.append(entry)
+
+    for start in range(0, len(values), INSERT_BATCH_SIZE):
+        db.session.execute(insert(Student), values[start:start + INSERT_BATCH_SIZE])
+    return len(values)
+
+
+def copy_students(student_ids, classroom_id, user_id, key=name_key, skip_existing=True):
+    """Copie des élèves existants dans ``classroom_id`` (identité + contacts).
+    Les élèves déjà présents (même clé de nom) sont ignorés si
+    ``skip_existing``. Ne commite pas.
+
+    Returns:
+        ``(copiés, ignorés)``.
+    """
+    student_ids = list(dict.fromkeys(student_ids))
+    if not student_ids:
+        return 0, 0
+    sources = db.session.query(*(getattr(Student, f) for f in COPIED_FIELDS)).filter(
+        Student.id.in_(student_ids)
+    ).order_by(Student.id).all()
+
+    existing = existing_name_keys(classroom_id, key) if skip_existing else set()
+    rows, ignored = [], 0
+    for source in sources:
+        row = dict(zip(COPIED_FIELDS, source))
+        k = key(row['first_name'], row['last_name'])
+        if skip_existing and k in existing:
+            ignored += 1
+            continue
+        existing.add(k)
+        rows.append(row)
+    return bulk_insert_students(rows, classroom_id, user_id), ignored
@@ -0,0 +1,417 @@
+"""Données du rapport d'un élève (ou de toute une classe) : présences,
+notes, coches, aménagements, remarques envoyées aux parents.
+
+Le rapport élève de routes/planning.py (notes, coches, absences,
+aménagements, résumé de comportement), le tableau de bord parent et ses
+onglets (routes/parent_auth.py) et les endpoints parent de l'application
+mobile (routes/api.py) interrogeaient chacun ces tables séparément : un
+User.query par aménagement, une requête par import de coches et par modèle
+de coches, une requête par classe dérivée pour retrouver les copies de
+l'élève...
+
+get_student_reports() charge les rapports de plusieurs élèves en un nombre
+fixe de requêtes (8, quel que soit le nombre d'élèves) et renvoie des
+structures simples (namedtuples) que chaque vue filtre selon le rôle de
+l'utilisateur et met en forme. Les droits (maître de classe, mode
+centralisé) restent dans les vues : le rapport ne dépend que de l'élève.
+
+Cache : un StudentReport par élève, en mémoire du processus (un seul worker
+eventlet en production), invalidé quand une des tables sources est modifiée
+(événements ORM, INSERT/DELETE/UPDATE en masse compris) : par élève pour
+les lignes d'un élève (présence, note, coche, aménagement, remarque), en
+entier pour les tables partagées (évaluations, classes, modèles,
+enseignants). REPORT_CACHE_TTL borne la durée de vie d'une entrée pour les
+écritures hors ORM.
+"""
+import threading
+import time
+from collections import namedtuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models.accommodation import AccommodationTemplate, StudentAccommodation
+from models.attendance import Attendance
+from models.class_collaboration import SharedClassroom
+from models.classroom import Classroom
+from models.evaluation import Evaluation, EvaluationGrade
+from models.lesson_memo import StudentRemark
+from models.sanctions import ClassroomSanctionImport, SanctionTemplate
+from models.student import Student
+from models.student_sanctions import StudentSanctionCount
+from models.user import User
+
+# Durée de vie maximale d'un rapport en cache (secondes).
+REPORT_CACHE_TTL = 300
+
+# Au-delà, les entrées expirées sont purgées à chaque ajout.
+REPORT_CACHE_MAX = 5000
+
+StudentReport = namedtuple(
+    'StudentReport',
+    'student_id first_name last_name classroom_id classroom_name subject teacher_id teacher_name '
+    'attendance grades sanctions sanction_imports accommodations remarks'
+)
+# Absences et retards (les présences ne sont pas chargées). ``teacher_*`` :
+# propriétaire de la classe ; ``recorded_by_*`` : enseignant qui a saisi.
+AttendanceRow = namedtuple(
+    'AttendanceRow',
+    'id student_id date period_number status late_minutes comment classroom_id classroom_name '
+    'subject teacher_id teacher_name recorded_by_id recorded_by_name'
+)
+GradeRow = namedtuple(
+    'GradeRow',
+    'evaluation_id student_id title type ta_group_name date max_points points classroom_id '
+    'classroom_name subject teacher_id teacher_name'
+)
+# Compteurs de coches non nuls ; ``teacher_*`` : propriétaire du modèle.
+SanctionRow = namedtuple(
+    'SanctionRow',
+    'template_id student_id name description is_active count teacher_id teacher_name'
+)
+# Modèles de coches importés (actifs) dans la classe de l'élève.
+SanctionImportRow = namedtuple('SanctionImportRow', 'template_id name')
+AccommodationRow = namedtuple(
+    'AccommodationRow', 'id name emoji time_multiplier template_owner_id template_owner_name'
+)
+# Remarques envoyées aux parents et à l'élève.
+RemarkRow = namedtuple(
+    'RemarkRow',
+    'id student_id student_name teacher_id teacher_name content source_date source_period '
+    'created_at is_viewed_by_parent'
+)
+
+_cache = {}                      # student_id -> (expires_at, StudentReport)
+_lock = threading.Lock()
+# Incrémentée par invalidate_reports() : des rapports chargés pendant une
+# invalidation ne sont pas mis en cache (ils peuvent précéder l'écriture).
+_generation = 0
+
+
+# ---------------------------------------------------------------------------
+# Chargement
+# ---------------------------------------------------------------------------
+
+def _group(rows):
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(row.student_id, []).append(row)
+    return grouped
+
+
+def load_student_reports(student_ids):
+    """Rapports des élèves ``student_ids`` lus en base (sans cache), en 8
+    requêtes. Les élèves inexistants sont absents du résultat.
+
+    Returns:
+        dict ``student_id -> StudentReport`` ; les lignes sont triées
+        (présences et remarques récentes d'abord, notes par date).
+    """
+    student_ids = list(dict.fromkeys(student_ids))
+    if not student_ids:
+        return {}
+
+    students = db.session.query(
+        Student.id, Student.first_name, Student.last_name, Student.classroom_id,
+        Classroom.name, Classroom.subject, Classroom.user_id,
+    ).outerjoin(Classroom, Classroom.id == Student.classroom_id).filter(
+        Student.id.in_(student_ids)
+    ).all()
+    if not students:
+        return {}
+    student_ids = [s[0] for s in students]
+    classroom_ids = {s[3] for s in students if s[3] is not None}
+
+    attendance = db.session.query(
+        Attendance.id, Attendance.student_id, Attendance.date, Attendance.period_number,
+        Attendance.status, Attendance.late_minutes, Attendance.comment, Attendance.classroom_id,
+        Classroom.name, Classroom.subject, Classroom.user_id, Attendance.user_id,
+    ).outerjoin(Classroom, Classroom.id == Attendance.classroom_id).filter(
+        Attendance.student_id.in_(student_ids),
+        Attendance.status.in_(('absent', 'late')),
+    ).order_by(Attendance.date.desc(), Attendance.period_number, Attendance.id).all()
+
+    grades = db.session.query(
+        EvaluationGrade.evaluation_id, EvaluationGrade.student_id, Evaluation.title, Evaluation.type,
+        Evaluation.ta_group_name, Evaluation.date, Evaluation.max_points, EvaluationGrade.points,
+        Evaluation.classroom_id, Classroom.name, Classroom.subject, Classroom.user_id,
+    ).join(
+        Evaluation, Evaluation.id == EvaluationGrade.evaluation_id
+    ).join(
+        Classroom, Classroom.id == Evaluation.classroom_id
+    ).filter(
+        EvaluationGrade.student_id.in_(student_ids)
+    ).order_by(Evaluation.date, Evaluation.id).all()
+
+    sanctions = db.session.query(
+        StudentSanctionCount.template_id, StudentSanctionCount.student_id, SanctionTemplate.name,
+        SanctionTemplate.description, SanctionTemplate.is_active, StudentSanctionCount.check_count,
+        SanctionTemplate.user_id,
+    ).join(
+        SanctionTemplate, SanctionTemplate.id == StudentSanctionCount.template_id
+    ).filter(
+        StudentSanctionCount.student_id.in_(student_ids),
+        StudentSanctionCount.check_count > 0,
+    ).order_by(StudentSanctionCount.id).all()
+
+    imports = {}
+    if classroom_ids:
+        for classroom_id, template_id, name in db.session.query(
+            ClassroomSanctionImport.classroom_id, SanctionTemplate.id, SanctionTemplate.name
+        ).join(
+            SanctionTemplate, SanctionTemplate.id == ClassroomSanctionImport.template_id
+        ).filter(
+            ClassroomSanctionImport.classroom_id.in_(classroom_ids),
+            ClassroomSanctionImport.is_active == True,
+        ).order_by(ClassroomSanctionImport.id):
+            imports.setdefault(classroom_id, []).append(SanctionImportRow(template_id, name))
+
+    accommodations = db.session.query(
+        StudentAccommodation.id, StudentAccommodation.student_id,
+        StudentAccommodation.custom_name, StudentAccommodation.custom_emoji,
+        StudentAccommodation.custom_time_multiplier, AccommodationTemplate.id,
+        AccommodationTemplate.name, AccommodationTemplate.emoji,
+        AccommodationTemplate.time_multiplier, AccommodationTemplate.user_id,
+    ).outerjoin(
+        AccommodationTemplate, AccommodationTemplate.id == StudentAccommodation.template_id
+    ).filter(
+        StudentAccommodation.student_id.in_(student_ids),
+        StudentAccommodation.is_active == True,
+    ).order_by(StudentAccommodation.id).all()
+
+    remarks = db.session.query(
+        StudentRemark.id, StudentRemark.student_id, StudentRemark.user_id, StudentRemark.content,
+        StudentRemark.source_date, StudentRemark.source_period, StudentRemark.created_at,
+        StudentRemark.is_viewed_by_parent,
+    ).filter(
+        StudentRemark.student_id.in_(student_ids),
+        StudentRemark.send_to_parent_and_student == True,
+    ).order_by(StudentRemark.created_at.desc(), StudentRemark.id.desc()).all()
+
+    # Noms de tous les enseignants cités, en une requête
+    user_ids = {s[6] for s in students}
+    user_ids.update(a[10] for a in attendance)
+    user_ids.update(a[11] for a in attendance)
+    user_ids.update(g[11] for g in grades)
+    user_ids.update(s[6] for s in sanctions)
+    user_ids.update(a[9] for a in accommodations)
+    user_ids.update(r[2] for r in remarks)
+    user_ids.discard(None)
+    usernames = dict(db.session.query(User.id, User.username).filter(User.id.in_(user_ids))) \
+        if user_ids else {}
+
+    names = {s[0]: f"{s[1]} {s[2]}" for s in students}
+    attendance = _group(
+        AttendanceRow(*row[:11], usernames.get(row[10]), row[11], usernames.get(row[11]))
+        for row in attendance
+    )
+    grades = _group(GradeRow(*row, usernames.get(row[11])) for row in grades)
+    sanctions = _group(SanctionRow(*row, usernames.get(row[6])) for row in sanctions)
+    accommodations_by_student = {}
+    for (acc_id, student_id, custom_name, custom_emoji, custom_multiplier,
+         template_id, name, emoji, multiplier, owner_id) in accommodations:
+        if template_id is not None:
+            # Aménagement prédéfini (modèle encore présent)
+            row = AccommodationRow(acc_id, name, emoji, multiplier, owner_id, usernames.get(owner_id))
+        else:
+            row = AccommodationRow(acc_id, custom_name, custom_emoji, custom_multiplier, None, None)
+        accommodations_by_student.setdefault(student_id, []).append(row)
+    remarks = _group(
+        RemarkRow(row[0], row[1], names[row[1]], row[2], usernames.get(row[2]), *row[3:])
+        for row in remarks
+    )
+
+    return {
+        student_id: StudentReport(
+            student_id, first_name, last_name, classroom_id, classroom_name, subject,
+            teacher_id, usernames.get(teacher_id),
+            tuple(attendance.get(student_id, ())),
+            tuple(grades.get(student_id, ())),
+            tuple(sanctions.get(student_id, ())),
+            tuple(imports.get(classroom_id, ())),
+            tuple(accommodations_by_student.get(student_id, ())),
+            tuple(remarks.get(student_id, ())),
+        )
+        for student_id, first_name, last_name, classroom_id, classroom_name, subject, teacher_id
+        in students
+    }
+
+
+def get_student_reports(student_ids):
+    """Rapports des élèves ``student_ids``, depuis le cache quand ils n'ont
+    pas changé ; les élèves manquants sont chargés ensemble (8 requêtes).
+
+    Returns:
+        dict ``student_id -> StudentReport`` (élèves existants seulement).
+    """
+    now = time.monotonic()
+    reports, missing = {}, []
+    with _lock:
+        for student_id in dict.fromkeys(student_ids):
+            entry = _cache.get(student_id)
+            if entry is not None and entry[0] > now:
+                reports[student_id] = entry[1]
+            else:
+                missing.append(student_id)
+        generation = _generation
+    if not missing:
+        return reports
+
+    loaded = load_student_reports(missing)
+    with _lock:
+        if len(_cache) > REPORT_CACHE_MAX:
+            for student_id in [k for k, (expires_at, _) in _cache.items() if expires_at <= now]:
+                del _cache[student_id]
+        if _generation == generation:
+            for student_id, report in loaded.items():
+                _cache[student_id] = (now + REPORT_CACHE_TTL, report)
+    reports.update(loaded)
+    return reports
+
+
+def get_student_report(student_id):
+    """Rapport d'un élève (None s'il n'existe pas)."""
+    return get_student_reports([student_id]).get(student_id)
+
+
+def linked_student_ids(student_id):
+    """Ids de l'élève et de ses copies dans les classes dérivées de sa classe
+    (même prénom et nom ; la première copie de chaque classe dérivée). 2
+    requêtes ; liste vide si l'élève n'existe pas.
+
+    Les noms sont chiffrés : ils sont comparés après déchiffrement.
+    """
+    original = db.session.query(
+        Student.classroom_id, Student.first_name, Student.last_name
+    ).filter(Student.id == student_id).first()
+    if original is None:
+        return []
+
+    linked = [student_id]
+    matched_classrooms = set()
+    for derived_id, classroom_id, first_name, last_name in db.session.query(
+        Student.id, Student.classroom_id, Student.first_name, Student.last_name
+    ).join(
+        SharedClassroom, SharedClassroom.derived_classroom_id == Student.classroom_id
+    ).filter(
+        SharedClassroom.original_classroom_id == original.classroom_id
+    ).order_by(SharedClassroom.id, Student.id):
+        if classroom_id in matched_classrooms:
+            continue
+        if (first_name, last_name) == (original.first_name, original.last_name):
+            matched_classrooms.add(classroom_id)
+            linked.append(derived_id)
+    return linked
+
+
+def get_linked_reports(student_id):
+    """Rapports de l'élève puis de ses copies dans les classes dérivées
+    (vues parent : un enfant suivi par plusieurs enseignants). Liste vide
+    si l'élève n'existe pas."""
+    student_ids = linked_student_ids(student_id)
+    reports = get_student_reports(student_ids)
+    return [reports[i] for i in student_ids if i in reports]
+
+
+def invalidate_reports(student_ids=None):
+    """Oublie les rapports de ``student_ids`` (de tous les élèves par
+    défaut)."""
+    global _generation
+    with _lock:
+        _generation += 1
+        if student_ids is None:
+            _cache.clear()
+        else:
+            for student_id in student_ids:
+                _cache.pop(student_id, None)
+
+
+# ---------------------------------------------------------------------------
+# Invalidation (événements ORM)
+# ---------------------------------------------------------------------------
+# Comme services/access_control.py : le cache est vidé au flush (les lectures
+# suivantes de la même session voient les écritures) et au commit (un
+# rapport rechargé entre-temps par une autre session serait périmé).
+
+# Lignes propres à un élève (colonne student_id)
+_STUDENT_ROWS = (Attendance, EvaluationGrade, StudentSanctionCount, StudentAccommodation, StudentRemark)
+
+# Tables partagées entre élèves, et colonnes reprises dans les rapports
+_SHARED_ATTRS = {
+    Student: ('first_name', 'last_name', 'classroom_id'),
+    Evaluation: ('classroom_id', 'title', 'type', 'ta_group_name', 'date', 'max_points'),
+    Classroom: ('name', 'subject', 'user_id'),
+    SanctionTemplate: ('name', 'description', 'is_active', 'user_id'),
+    ClassroomSanctionImport: ('classroom_id', 'template_id', 'is_active'),
+    AccommodationTemplate: ('name', 'emoji', 'time_multiplier', 'user_id'),
+    User: ('username',),
+}
+_WATCHED = _STUDENT_ROWS + tuple(_SHARED_ATTRS)
+
+_DIRTY_KEY = 'student_report_dirty'
+
+
+def _mark_dirty(session, student_ids):
+    """Note les élèves touchés par la transaction (None : tous)."""
+    invalidate_reports(student_ids)
+    dirty = session.info.get(_DIRTY_KEY, set())
+    if student_ids is None or dirty is None:
+        session.info[_DIRTY_KEY] = None
+    else:
+        session.info[_DIRTY_KEY] = dirty | set(student_ids)
+
+
+def _touched_student_ids(obj, session):
+    """Élèves dont le rapport change avec ``obj`` (set), None pour tous,
+    ou un set vide si ``obj`` n'y change rien."""
+    if isinstance(obj, _STUDENT_ROWS):
+        history = db.inspect(obj).attrs.student_id.history
+        return {obj.student_id, *history.deleted} - {None}
+    if obj in session.new:
+        # Nouvel élève, classe, évaluation... : aucun rapport en cache ne le
+        # contient, sauf un import de coches dans une classe existante
+        return None if isinstance(obj, ClassroomSanctionImport) else set()
+    if obj not in session.deleted:
+        attrs = db.inspect(obj).attrs
+        if not any(attrs[name].history.has_changes() for name in _SHARED_ATTRS[type(obj)]):
+            return set()
+    return {obj.id} if isinstance(obj, Student) else None
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_report_changes(session, flush_context, instances):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, _WATCHED):
+            continue
+        student_ids = _touched_student_ids(obj, session)
+        if student_ids is None or student_ids:
+            _mark_dirty(session, student_ids)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session):
+    if _DIRTY_KEY in session.info:
+        invalidate_reports(session.info.pop(_DIRTY_KEY))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_rolled_back(session):
+    if _DIRTY_KEY in session.info:
+        # Les rapports rechargés avec les écritures annulées sont faux
+        invalidate_reports(session.info.pop(_DIRTY_KEY))
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _bulk_changes(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_delete
+            or orm_execute_state.is_update):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or mapper.class_ not in _WATCHED:
+        return
+    if orm_execute_state.is_insert and mapper.class_ in _SHARED_ATTRS \
+            and mapper.class_ is not ClassroomSanctionImport:
+        # Import d'élèves, nouvelles classes : aucun rapport en cache concerné
+        return
+    _mark_dirty(orm_execute_state.session, None)
@@ -11,23 +11,42 @@ relance bien espacés :
 Idempotence : `User.trial_reminder_stage` mémorise la dernière relance
 envoyée, donc chaque email part UNE SEULE fois même si la vérification
 tourne plusieurs fois par jour. Les abonnés payants (Stripe/Apple) sont
-exclus via `get_trial_info()`.
-
-Déclenchement : un greenthread eventlet dans render_production.py appelle
-`send_due_trial_reminders()` toutes les 6 h (process unique = pas de
-doublon). Aussi exposé en CLI : `flask send-trial-reminders`.
+exclus.
+
+L'étape due est calculée en SQL (même règle que `User.get_trial_info()`,
+seuils sur `premium_until`) : seuls les profs à relancer sont lus, par lots
+de BATCH_SIZE. Pour chaque lot, les emails sont déposés dans l'outbox des
+notifications (un message par contenu, envoi groupé et réessayé par
+services/notification_outbox.py) et les étapes sont mises à jour en une
+seule requête, dans la même transaction.
+
+Déclenchement : tâche périodique « trial_reminders.send » de l'exécuteur
+de tâches (services/job_runner.py), toutes les 6 h — une seule exécution
+par créneau même avec plusieurs exécuteurs. Aussi exposé en CLI :
+`flask send-trial-reminders`.
 """
 
 import os
+import math
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
+from itertools import groupby
+
+from sqlalchemy import case, exists, func, select, update
 
 from extensions import db
+from models.apple_subscription import AppleSubscription
 from models.user import User
-from services.email_service import send_email
+from services.job_runner import periodic
+from services.notification_outbox import enqueue_email
 
 logger = logging.getLogger(__name__)
 
+# Profs traités par transaction.
+BATCH_SIZE = 500
+
+STAGE_KEYS = {1: 'j5', 2: 'j1', 3: 'expired'}
+
 PRICING_URL = (os.environ.get('APP_BASE_URL', 'https://profcalendar.org')
                .rstrip('/') + '/subscription/pricing')
 
@@ -113,93 +132,105 @@ def _content_for_stage(new_stage, days_remaining):
                           body, "Passer à Premium")
 
 
-def send_due_trial_reminders():
-    """Envoie toutes les relances d'essai dues. Idempotent.
+def _due_stage(now):
+    """Expression SQL : étape de relance due d'après ``premium_until``
+    (3 expiré, 2 dernier jour, 1 cinq derniers jours, 0 aucune)."""
+    return case(
+        (User.premium_until <= now, 3),
+        (User.premium_until <= now + timedelta(days=1), 2),
+        (User.premium_until <= now + timedelta(days=5), 1),
+        else_=0,
+    )
 
-    Retourne un dict de compteurs : {'sent': {...}, 'failed': N, 'candidates': N}.
-    """
-    sent = {'j5': 0, 'j1': 0, 'expired': 0}
-    failed = 0
 
-    # Candidats : ont eu un premium daté ET n'ont pas encore reçu les 3 relances.
-    candidates = User.query.filter(
+def _due_filter(now):
+    """Profs à relancer : essai daté, pas abonnés (Stripe ou Apple actif),
+    étape due au-delà de la dernière relance envoyée."""
+    current_stage = func.coalesce(User.trial_reminder_stage, 0)
+    apple_active = exists().where(
+        AppleSubscription.user_id == User.id,
+        AppleSubscription.status.in_(('active', 'in_grace_period')),
+        AppleSubscription.expires_date > now,
+    )
+    return (
         User.premium_until.isnot(None),
-        db.or_(User.trial_reminder_stage.is_(None),
-               User.trial_reminder_stage < 3),
-    ).all()
-
-    for user in candidates:
-        if not user.email:
-            continue
-
-        info = user.get_trial_info()
-        stage = user.trial_reminder_stage or 0
-        decision = None  # (new_stage, compteur_key, days)
-
-        if info['state'] == 'trial_expired' and stage < 3:
-            decision = (3, 'expired', 0)
-        elif info['state'] == 'trial_active':
-            days = info.get('days_remaining') or 0
-            if days <= 1 and stage < 2:
-                decision = (2, 'j1', days)
-            elif days <= 5 and stage < 1:
-                decision = (1, 'j5', days)
-        # états 'paying' / 'unlimited' / 'free' : aucune relance
-
-        if not decision:
-            continue
-
-        new_stage, key, days = decision
-        subject, html = _content_for_stage(new_stage, days)
-        ok = send_email(user.email, subject, html)
-        if ok:
-            user.trial_reminder_stage = new_stage
-            db.session.commit()
-            sent[key] += 1
-        else:
-            db.session.rollback()
-            failed += 1
-
-    total = sent['j5'] + sent['j1'] + sent['expired']
-    logger.info(
-        "[trial_reminders] candidats=%s envoyés=%s (J-5=%s, J-1=%s, exp=%s) échecs=%s",
-        len(candidates), total, sent['j5'], sent['j1'], sent['expired'], failed,
+        User.premium_until <= now + timedelta(days=5),
+        current_stage < 3,
+        User.email.isnot(None),
+        User.email != '',
+        User.stripe_subscription_id.is_(None),
+        ~apple_active,
+        _due_stage(now) > current_stage,
     )
-    return {'sent': sent, 'failed': failed, 'candidates': len(candidates)}
 
 
-# Garde de démarrage unique (par process). Empêche de lancer la boucle deux
-# fois (ex. appelée à la fois depuis render_production et depuis before_request).
-_loop_started = False
+def _days_remaining(premium_until, now):
+    return max(1, math.ceil((premium_until - now).total_seconds() / 86400))
 
 
-def start_background_loop(app):
-    """Démarre la boucle de fond (greenthread eventlet) qui envoie les
-    relances toutes les 6 h. Idempotent au niveau process : un seul loop.
+def count_due_trial_reminders(now=None):
+    """Nombre de relances dues par étape, sans rien envoyer.
+    Returns: {'j5': N, 'j1': N, 'expired': N}."""
+    now = now or datetime.utcnow()
+    stage = _due_stage(now)
+    counts = dict.fromkeys(STAGE_KEYS.values(), 0)
+    for due, count in db.session.execute(
+        select(stage, func.count()).where(*_due_filter(now)).group_by(stage)
+    ):
+        counts[STAGE_KEYS[due]] = count
+    return counts
 
-    Robuste au point d'entrée : peut être appelée depuis render_production
-    (mono-process eventlet) ET depuis un hook before_request (worker gunicorn
-    eventlet). La garde `_loop_started` évite tout double démarrage.
+
+@periodic('trial_reminders.send', every=timedelta(hours=6), queue='notifications')
+def send_due_trial_reminders(dry_run=False):
+    """Envoie toutes les relances d'essai dues. Idempotent.
+
+    Avec ``dry_run``, compte seulement les relances dues.
+
+    Retourne un dict de compteurs : {'sent': {...}, 'candidates': N, 'dry_run': bool}.
     """
-    global _loop_started
-    if _loop_started:
-        return
-    try:
-        import eventlet
-    except Exception:
-        logger.warning("[trial_reminders] eventlet indisponible — boucle non démarrée")
-        return
-    _loop_started = True
-
-    def _loop():
-        eventlet.sleep(120)  # laisser l'app démarrer
-        while True:
-            try:
-                with app.app_context():
-                    send_due_trial_reminders()
-            except Exception:
-                logger.exception("[trial_reminders] erreur dans la boucle de fond")
-            eventlet.sleep(6 * 3600)  # toutes les 6 heures
-
-    eventlet.spawn_n(_loop)
-    logger.info("[trial_reminders] boucle de fond démarrée (vérif toutes les 6 h)")
+    now = datetime.utcnow()
+    if dry_run:
+        sent = count_due_trial_reminders(now)
+        return {'sent': sent, 'candidates': sum(sent.values()), 'dry_run': True}
+
+    sent = dict.fromkeys(STAGE_KEYS.values(), 0)
+    stage = _due_stage(now)
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(User.id, User.email, User.premium_until, stage)
+            .where(User.id > last_id, *_due_filter(now))
+            .order_by(User.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        # Un message par contenu : l'étape, et pour J-5 le nombre de jours
+        def content_key(row):
+            due = row[3]
+            return due, _days_remaining(row.premium_until, now) if due == 1 else 0
+
+        for (due, days), group in groupby(sorted(rows, key=content_key), key=content_key):
+            emails = [row.email for row in group]
+            subject, html = _content_for_stage(due, days)
+            enqueue_email(emails, subject, html, source=f'trial_reminder:{due}')
+            sent[STAGE_KEYS[due]] += len(emails)
+
+        db.session.execute(
+            update(User)
+            .where(User.id.in_([row.id for row in rows]),
+                   func.coalesce(User.trial_reminder_stage, 0) < stage)
+            .values(trial_reminder_stage=stage)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+    total = sum(sent.values())
+    logger.info(
+        "[trial_reminders] relances déposées=%s (J-5=%s, J-1=%s, exp=%s)",
+        total, sent['j5'], sent['j1'], sent['expired'],
+    )
+    return {'sent': sent, 'candidates': total, 'dry_run': False}
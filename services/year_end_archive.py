@@ -48,107 +48,16 @@ def _get_students_data_for_archive(original_classroom_id, master_teacher_id,
         derived_classroom_id: ID de la classe dérivée (optionnel, pour les évals de l'enseignant spécialisé)
         specialized_teacher_id: ID de l'enseignant spécialisé (optionnel, pour absences/remarques)
     """
-    from models.student import Student, Grade
-    from models.attendance import Attendance
-    from models.evaluation import Evaluation, EvaluationGrade
-    from models.student_sanctions import StudentSanctionCount
-    from models.lesson_memo import StudentRemark
-
-    # Les élèves sont dans la classe originale, propriété du maître
-    students = Student.query.filter_by(
-        classroom_id=original_classroom_id, user_id=master_teacher_id
-    ).order_by(Student.last_name, Student.first_name).all()
-
-    # Pour les évaluations et données : utiliser la classe dérivée si disponible
-    eval_classroom_id = derived_classroom_id or original_classroom_id
-    data_teacher_id = specialized_teacher_id or master_teacher_id
-
-    students_data = []
-    for student in students:
-        # Absences et retards (de l'enseignant concerné)
-        attendances = Attendance.query.filter_by(
-            student_id=student.id, user_id=data_teacher_id
-        ).all()
-        absences_count = sum(1 for a in attendances if a.status == 'absent')
-        late_count = sum(1 for a in attendances if a.status == 'late')
-        late_minutes_total = sum(a.late_minutes or 0 for a in attendances if a.status == 'late')
-
-        # Notes — uniquement de la classe concernée (dérivée pour enseignant spécialisé)
-        evals = Evaluation.query.filter_by(
-            classroom_id=eval_classroom_id
-        ).all()
-        grades_list = []
-        total_points = 0
-        total_max = 0
-        grade_count = 0
-        for ev in evals:
-            eg = EvaluationGrade.query.filter_by(
-                evaluation_id=ev.id, student_id=student.id
-            ).first()
-            if eg and eg.points is not None:
-                grades_list.append({
-                    'title': ev.title,
-                    'points': eg.points,
-                    'max': ev.max_points,
-                    'date': ev.date,
-                })
-                total_points += eg.points
-                total_max += (ev.max_points or 0)
-                grade_count += 1
-
-        # Notes legacy
-        legacy_grades = Grade.query.filter_by(
-            student_id=student.id, classroom_id=eval_classroom_id
-        ).all()
-        for lg in legacy_grades:
-            grades_list.append({
-                'title': lg.title,
-                'points': lg.grade,
-                'max': lg.max_grade,
-                'date': lg.date,
-            })
-            if lg.grade is not None and lg.max_grade:
-                total_points += lg.grade
-                total_max += lg.max_grade
-                grade_count += 1
-
-        average = None
-        if grade_count > 0 and total_max > 0:
-            average = (total_points / total_max) * 6  # Note suisse sur 6
-
-        # Sanctions
-        sanction_counts = StudentSanctionCount.query.filter_by(
-            student_id=student.id
-        ).all()
-        sanctions = []
-        for sc in sanction_counts:
-            if sc.check_count > 0:
-                sanctions.append({
-                    'name': sc.template.name if sc.template else 'Inconnu',
-                    'count': sc.check_count,
-                })
-
-        # Remarques (de l'enseignant concerné)
-        remarks = StudentRemark.query.filter_by(
-            student_id=student.id, user_id=data_teacher_id
-        ).order_by(StudentRemark.created_at.desc()).all()
-        remarks_list = [{
-            'content': r.content,
-            'date': r.created_at,
-        } for r in remarks]
-
-        students_data.append({
-            'student': student,
-            'absences_count': absences_count,
-            'late_count': late_count,
-            'late_minutes_total': late_minutes_total,
-            'grades': grades_list,
-            'average': average,
-            'sanctions': sanctions,
-            'remarks': remarks_list,
-        })
-
-    return students_data
+    from services.class_report import load_class_report_data
+
+    # Les élèves sont dans la classe originale, propriété du maître ; les
+    # évaluations et données viennent de la classe dérivée si disponible.
+    return load_class_report_data(
+        original_classroom_id, master_teacher_id,
+        data_classroom_id=derived_classroom_id,
+        data_teacher_id=specialized_teacher_id,
+        remark_date='created_at',
+    )
 
 
 def generate_and_store_backup_pdfs(classroom_id, master_teacher):
@@ -167,7 +76,7 @@ def generate_and_store_backup_pdfs(classroom_id, master_teacher):
     from models.classroom import Classroom
     from models.user import User
     from models.file_manager import UserFile
-    from services.year_end_pdf import generate_class_report_pdf
+    from services.class_report import render_class_report
 
     # Récupérer les classes dérivées partagées
     shared_records = SharedClassroom.query.filter_by(
@@ -211,7 +120,7 @@ def generate_and_store_backup_pdfs(classroom_id, master_teacher):
 
         # Générer le PDF
         teacher_name = specialized_teacher.username or 'Enseignant'
-        pdf_bytes = generate_class_report_pdf(
+        pdf_bytes = render_class_report(
             derived_classroom, students_data, year_label, teacher_name
         )
 
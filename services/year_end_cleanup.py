@@ -1,17 +1,47 @@
 """
 Service de nettoyage de fin d'année.
 Supprime les données opérationnelles de l'année écoulée et met à jour la configuration.
+
+Le nettoyage est découpé en étapes (plan_cleanup_steps / run_cleanup_step) :
+données de l'enseignant, une étape par classe, groupes mixtes, dates. Le job
+de services/year_end_jobs commite chaque étape séparément et reprend à la
+première étape non terminée après une interruption. Les suppressions sont
+des DELETE ensemblistes sans synchronisation de la session.
 """
-from datetime import date, timedelta
+import logging
+import re
+
+from sqlalchemy import delete, select, update
+
 from extensions import db
 
+logger = logging.getLogger(__name__)
+
+
+def _bulk_delete(model, *criteria):
+    """DELETE ensembliste, sans synchronisation de la session (les objets
+    supprimés ne sont pas recherchés dans la session). Retourne le nombre
+    de lignes supprimées."""
+    return db.session.execute(
+        delete(model).where(*criteria).execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def _bulk_update(model, values, *criteria):
+    """UPDATE ensembliste, sans synchronisation de la session."""
+    return db.session.execute(
+        update(model).where(*criteria).values(values).execution_options(synchronize_session=False)
+    ).rowcount
+
 
 def _delete_student_dependencies(student_ids):
     """
     Supprime toutes les données liées aux élèves (FK) avant de pouvoir supprimer les élèves.
-    Doit être appelé AVANT Student.query.delete().
+    Doit être appelé AVANT la suppression des élèves.
+
+    ``student_ids`` : liste d'ids ou sous-requête SELECT d'ids d'élèves.
     """
-    if not student_ids:
+    if isinstance(student_ids, (list, tuple, set, frozenset)) and not student_ids:
         return
 
     from models.attendance import Attendance
@@ -34,36 +64,20 @@ def _delete_student_dependencies(student_ids):
     from models.exercise_progress import StudentExerciseAttempt, StudentBlockAnswer
 
     # Supprimer toutes les tables avec FK vers students
-    Attendance.query.filter(Attendance.student_id.in_(student_ids)).delete(synchronize_session='fetch')
-    AbsenceJustification.query.filter(AbsenceJustification.student_id.in_(student_ids)).delete(synchronize_session='fetch')
-    EvaluationGrade.query.filter(EvaluationGrade.student_id.in_(student_ids)).delete(synchronize_session='fetch')
-    Grade.query.filter(Grade.student_id.in_(student_ids)).delete(synchronize_session='fetch')
-    StudentRemark.query.filter(StudentRemark.student_id.in_(student_ids)).delete(synchronize_session='fetch')
-    StudentSanctionRecord.query.filter(StudentSanctionRecord.student_id.in_(student_ids)).delete(synchronize_session='fetch')
-    StudentSanctionCount.query.filter(StudentSanctionCount.student_id.in_(student_ids)).delete(synchronize_session='fetch')
-    StudentGroupMembership.query.filter(StudentGroupMembership.student_id.in_(student_ids)).delete(synchronize_session='fetch')
-    MixedGroupStudent.query.filter(MixedGroupStudent.student_id.in_(student_ids)).delete(synchronize_session='fetch')
-    StudentAccommodation.query.filter(StudentAccommodation.student_id.in_(student_ids)).delete(synchronize_session='fetch')
-    StudentInfoHistory.query.filter(StudentInfoHistory.student_id.in_(student_ids)).delete(synchronize_session='fetch')
-    StudentFileShare.query.filter(StudentFileShare.student_id.in_(student_ids)).delete(synchronize_session='fetch')
-    StudentClassroomLink.query.filter(StudentClassroomLink.student_id.in_(student_ids)).delete(synchronize_session='fetch')
-    ParentChild.query.filter(ParentChild.student_id.in_(student_ids)).delete(synchronize_session='fetch')
-    StudentAccessCode.query.filter(StudentAccessCode.student_id.in_(student_ids)).delete(synchronize_session='fetch')
-    StudentFile.query.filter(StudentFile.student_id.in_(student_ids)).delete(synchronize_session='fetch')
+    for model in (Attendance, AbsenceJustification, EvaluationGrade, Grade, StudentRemark,
+                  StudentSanctionRecord, StudentSanctionCount, StudentGroupMembership,
+                  MixedGroupStudent, StudentAccommodation, StudentInfoHistory, StudentFileShare,
+                  StudentClassroomLink, ParentChild, StudentAccessCode, StudentFile):
+        _bulk_delete(model, model.student_id.in_(student_ids))
 
     # Système RPG / combat / exercices (FK vers students, sans ON DELETE CASCADE en base).
     # student_block_answers dépend de student_exercise_attempts → supprimer les réponses d'abord.
-    attempt_ids = [a.id for a in StudentExerciseAttempt.query.filter(
-        StudentExerciseAttempt.student_id.in_(student_ids)).all()]
-    if attempt_ids:
-        StudentBlockAnswer.query.filter(
-            StudentBlockAnswer.attempt_id.in_(attempt_ids)
-        ).delete(synchronize_session='fetch')
-    StudentExerciseAttempt.query.filter(StudentExerciseAttempt.student_id.in_(student_ids)).delete(synchronize_session='fetch')
-    StudentRPGProfile.query.filter(StudentRPGProfile.student_id.in_(student_ids)).delete(synchronize_session='fetch')
-    StudentBadge.query.filter(StudentBadge.student_id.in_(student_ids)).delete(synchronize_session='fetch')
-    StudentItem.query.filter(StudentItem.student_id.in_(student_ids)).delete(synchronize_session='fetch')
-    CombatParticipant.query.filter(CombatParticipant.student_id.in_(student_ids)).delete(synchronize_session='fetch')
+    _bulk_delete(StudentBlockAnswer, StudentBlockAnswer.attempt_id.in_(
+        select(StudentExerciseAttempt.id).where(StudentExerciseAttempt.student_id.in_(student_ids))
+    ))
+    for model in (StudentExerciseAttempt, StudentRPGProfile, StudentBadge, StudentItem,
+                  CombatParticipant):
+        _bulk_delete(model, model.student_id.in_(student_ids))
 
 
 def _delete_classroom_dependencies(classroom_id):
@@ -71,6 +85,9 @@ def _delete_classroom_dependencies(classroom_id):
     Supprime toutes les données liées à une classe (FK) avant de pouvoir supprimer la classe.
     Gère aussi la chaîne de collaboration (classes dérivées des enseignants spécialisés).
     Doit être appelé AVANT db.session.delete(classroom).
+
+    Les suppressions sont des instructions ensemblistes (sous-requêtes plutôt
+    que listes d'ids chargées en Python) qui ne synchronisent pas la session.
     """
     from models.class_file import ClassFile, ClassFolder
     from models.class_collaboration import SharedClassroom, StudentClassroomLink, ClassMaster
@@ -103,131 +120,81 @@ def _delete_classroom_dependencies(classroom_id):
 
     # Supprimer uniquement les enregistrements SharedClassroom (le lien)
     # Les classes dérivées et toutes leurs données restent intactes
-    SharedClassroom.query.filter_by(original_classroom_id=classroom_id).delete(synchronize_session='fetch')
-    SharedClassroom.query.filter_by(derived_classroom_id=classroom_id).delete(synchronize_session='fetch')
+    _bulk_delete(SharedClassroom, SharedClassroom.original_classroom_id == classroom_id)
+    _bulk_delete(SharedClassroom, SharedClassroom.derived_classroom_id == classroom_id)
 
     # --- 2. Supprimer les élèves de cette classe et leurs dépendances ---
-    class_student_ids = [s.id for s in Student.query.filter_by(classroom_id=classroom_id).all()]
-    if class_student_ids:
-        _delete_student_dependencies(class_student_ids)
-        Student.query.filter_by(classroom_id=classroom_id).delete(synchronize_session='fetch')
+    _delete_student_dependencies(select(Student.id).where(Student.classroom_id == classroom_id))
+    _bulk_delete(Student, Student.classroom_id == classroom_id)
 
     # --- 3. Supprimer toutes les tables avec FK vers classrooms ---
-    # Fichiers et dossiers de classe
-    ClassFile.query.filter_by(classroom_id=classroom_id).delete(synchronize_session='fetch')
-    ClassFolder.query.filter_by(classroom_id=classroom_id).delete(synchronize_session='fetch')
-
-    # Liens élèves-classes
-    StudentClassroomLink.query.filter_by(classroom_id=classroom_id).delete(synchronize_session='fetch')
-
-    # Codes d'accès de classe
-    ClassroomAccessCode.query.filter_by(classroom_id=classroom_id).delete(synchronize_session='fetch')
-
-    # Import de sanctions
-    ClassroomSanctionImport.query.filter_by(classroom_id=classroom_id).delete(synchronize_session='fetch')
-
-    # Codes de classe (parents)
-    ClassCode.query.filter_by(classroom_id=classroom_id).delete(synchronize_session='fetch')
-
-    # Fichiers legacy
-    LegacyClassFile.query.filter_by(classroom_id=classroom_id).delete(synchronize_session='fetch')
-
-    # Chapitres de classe
-    ClassroomChapter.query.filter_by(classroom_id=classroom_id).delete(synchronize_session='fetch')
+    # Fichiers et dossiers de classe, liens élèves-classes, codes d'accès de
+    # classe, import de sanctions, codes de classe (parents), fichiers legacy,
+    # chapitres de classe
+    for model in (ClassFile, ClassFolder, StudentClassroomLink, ClassroomAccessCode,
+                  ClassroomSanctionImport, ClassCode, LegacyClassFile, ClassroomChapter):
+        _bulk_delete(model, model.classroom_id == classroom_id)
 
     # Évaluations (supprimer d'abord les notes des évals)
-    eval_ids = [e.id for e in Evaluation.query.filter_by(classroom_id=classroom_id).all()]
-    if eval_ids:
-        EvaluationGrade.query.filter(EvaluationGrade.evaluation_id.in_(eval_ids)).delete(synchronize_session='fetch')
-    Evaluation.query.filter_by(classroom_id=classroom_id).delete(synchronize_session='fetch')
-
-    # Notes legacy
-    Grade.query.filter_by(classroom_id=classroom_id).delete(synchronize_session='fetch')
-
-    # Présences
-    Attendance.query.filter_by(classroom_id=classroom_id).delete(synchronize_session='fetch')
+    _bulk_delete(EvaluationGrade, EvaluationGrade.evaluation_id.in_(
+        select(Evaluation.id).where(Evaluation.classroom_id == classroom_id)
+    ))
+    _bulk_delete(Evaluation, Evaluation.classroom_id == classroom_id)
 
-    # Mémos de cours (nullable)
-    LessonMemo.query.filter(LessonMemo.classroom_id == classroom_id).delete(synchronize_session='fetch')
-
-    # Feuilles blanches (nullable)
-    LessonBlankSheet.query.filter(LessonBlankSheet.classroom_id == classroom_id).delete(synchronize_session='fetch')
-
-    # Plans de classe
-    SeatingPlan.query.filter_by(classroom_id=classroom_id).delete(synchronize_session='fetch')
+    # Notes legacy, présences, mémos de cours et feuilles blanches (nullable),
+    # plans de classe
+    for model in (Grade, Attendance, LessonMemo, LessonBlankSheet, SeatingPlan):
+        _bulk_delete(model, model.classroom_id == classroom_id)
 
     # Groupes d'élèves (supprimer d'abord les memberships)
-    group_ids = [g.id for g in StudentGroup.query.filter_by(classroom_id=classroom_id).all()]
-    if group_ids:
-        StudentGroupMembership.query.filter(
-            StudentGroupMembership.group_id.in_(group_ids)
-        ).delete(synchronize_session='fetch')
-    StudentGroup.query.filter_by(classroom_id=classroom_id).delete(synchronize_session='fetch')
-
-    # Découpage
-    DecoupageAssignment.query.filter_by(classroom_id=classroom_id).delete(synchronize_session='fetch')
+    _bulk_delete(StudentGroupMembership, StudentGroupMembership.group_id.in_(
+        select(StudentGroup.id).where(StudentGroup.classroom_id == classroom_id)
+    ))
+    _bulk_delete(StudentGroup, StudentGroup.classroom_id == classroom_id)
 
-    # Horaires
-    Schedule.query.filter_by(classroom_id=classroom_id).delete(synchronize_session='fetch')
-
-    # Plannings (nullable)
-    Planning.query.filter(Planning.classroom_id == classroom_id).delete(synchronize_session='fetch')
-
-    # Partages de fichiers (nullable)
-    FileShare.query.filter(FileShare.classroom_id == classroom_id).delete(synchronize_session='fetch')
+    # Découpage, horaires, plannings (nullable), partages de fichiers (nullable)
+    for model in (DecoupageAssignment, Schedule, Planning, FileShare):
+        _bulk_delete(model, model.classroom_id == classroom_id)
 
     # Invitations de classe
-    InvitationClassroom.query.filter_by(target_classroom_id=classroom_id).delete(synchronize_session='fetch')
+    _bulk_delete(InvitationClassroom, InvitationClassroom.target_classroom_id == classroom_id)
 
     # TeacherInvitation (FK target_classroom_id)
     try:
         from models.teacher_invitation import TeacherInvitation
-        TeacherInvitation.query.filter_by(target_classroom_id=classroom_id).delete(synchronize_session='fetch')
+        _bulk_delete(TeacherInvitation, TeacherInvitation.target_classroom_id == classroom_id)
     except (ImportError, AttributeError):
         pass
 
     # MixedGroup auto_classroom_id (nullable - mettre à NULL)
-    MixedGroup.query.filter_by(auto_classroom_id=classroom_id).update(
-        {'auto_classroom_id': None}, synchronize_session='fetch'
-    )
+    _bulk_update(MixedGroup, {'auto_classroom_id': None}, MixedGroup.auto_classroom_id == classroom_id)
 
     # Préférences de sanctions
-    UserSanctionPreferences.query.filter_by(classroom_id=classroom_id).delete(synchronize_session='fetch')
+    _bulk_delete(UserSanctionPreferences, UserSanctionPreferences.classroom_id == classroom_id)
 
     # ClassMaster a ondelete='CASCADE' mais on le supprime explicitement par sécurité
-    ClassMaster.query.filter_by(classroom_id=classroom_id).delete(synchronize_session='fetch')
+    _bulk_delete(ClassMaster, ClassMaster.classroom_id == classroom_id)
 
     # --- 4. Système combat (combat_sessions a une FK NOT NULL vers classrooms) ---
-    combat_session_ids = [s.id for s in CombatSession.query.filter_by(classroom_id=classroom_id).all()]
-    if combat_session_ids:
-        CombatParticipant.query.filter(
-            CombatParticipant.combat_session_id.in_(combat_session_ids)
-        ).delete(synchronize_session='fetch')
-        CombatMonster.query.filter(
-            CombatMonster.combat_session_id.in_(combat_session_ids)
-        ).delete(synchronize_session='fetch')
-        CombatSession.query.filter_by(classroom_id=classroom_id).delete(synchronize_session='fetch')
+    combat_session_ids = select(CombatSession.id).where(CombatSession.classroom_id == classroom_id)
+    _bulk_delete(CombatParticipant, CombatParticipant.combat_session_id.in_(combat_session_ids))
+    _bulk_delete(CombatMonster, CombatMonster.combat_session_id.in_(combat_session_ids))
+    _bulk_delete(CombatSession, CombatSession.classroom_id == classroom_id)
 
     # --- 5. Publications d'exercices (FK NOT NULL vers classrooms) ---
     # On supprime les publications et leurs tentatives, mais on CONSERVE les exercices
     # eux-mêmes (classroom_id est nullable) : ils restent dans la bibliothèque de l'enseignant.
-    pub_ids = [p.id for p in ExercisePublication.query.filter_by(classroom_id=classroom_id).all()]
-    if pub_ids:
-        pub_attempt_ids = [a.id for a in StudentExerciseAttempt.query.filter(
-            StudentExerciseAttempt.publication_id.in_(pub_ids)).all()]
-        if pub_attempt_ids:
-            StudentBlockAnswer.query.filter(
-                StudentBlockAnswer.attempt_id.in_(pub_attempt_ids)
-            ).delete(synchronize_session='fetch')
-            StudentExerciseAttempt.query.filter(
-                StudentExerciseAttempt.id.in_(pub_attempt_ids)
-            ).delete(synchronize_session='fetch')
-        ExercisePublication.query.filter_by(classroom_id=classroom_id).delete(synchronize_session='fetch')
+    pub_attempt_ids = select(StudentExerciseAttempt.id).where(
+        StudentExerciseAttempt.publication_id.in_(
+            select(ExercisePublication.id).where(ExercisePublication.classroom_id == classroom_id)
+        )
+    )
+    _bulk_delete(StudentBlockAnswer, StudentBlockAnswer.attempt_id.in_(pub_attempt_ids))
+    _bulk_delete(StudentExerciseAttempt, StudentExerciseAttempt.id.in_(pub_attempt_ids))
+    _bulk_delete(ExercisePublication, ExercisePublication.classroom_id == classroom_id)
 
     # Détacher les exercices de la classe (classroom_id nullable) — conserver le contenu créé.
-    Exercise.query.filter_by(classroom_id=classroom_id).update(
-        {'classroom_id': None}, synchronize_session='fetch'
-    )
+    _bulk_update(Exercise, {'classroom_id': None}, Exercise.classroom_id == classroom_id)
 
 
 def get_classroom_collaboration_info(classroom_id):
@@ -285,250 +252,233 @@ def get_classroom_collaboration_info(classroom_id):
     }
 
 
-def execute_year_end_cleanup(user, class_actions, new_year_start, new_year_end, holiday_action='clear'):
+SUMMARY_KEYS = (
+    'plannings_deleted', 'attendance_deleted', 'justifications_deleted',
+    'evaluations_deleted', 'grades_deleted', 'memos_deleted', 'remarks_deleted',
+    'sanctions_deleted', 'sanctions_reset', 'seating_plans_deleted',
+    'classes_deleted', 'classes_renamed', 'classes_kept', 'mixed_groups_deleted',
+    'collab_classes_deleted', 'backup_pdfs_generated',
+)
+
+
+def plan_cleanup_steps(user):
     """
-    Exécute le nettoyage complet de fin d'année en une transaction.
+    Découpe le nettoyage de ``user`` en étapes exécutables séparément :
+    ``'user'`` (données rattachées à l'enseignant), une étape ``'class:<id>'``
+    par classe, ``'mixed_groups'`` puis ``'settings'`` (dates et vacances).
 
-    Args:
-        user: objet User (current_user)
-        class_actions: dict {classroom_id: {'action': 'keep'|'rename'|'delete', 'new_name': str}}
-                       Inclut aussi les mixed_groups avec clé 'mg_<id>'
-        new_year_start: date - nouvelle date de début d'année
-        new_year_end: date - nouvelle date de fin d'année
-        holiday_action: 'shift' (décaler d'un an) ou 'clear' (supprimer)
+    Chaque étape est idempotente : rejouée après une interruption, elle ne
+    supprime que ce qui reste.
+    """
+    from models.classroom import Classroom
 
-    Returns:
-        dict avec le résumé des actions effectuées
+    classroom_ids = [cid for (cid,) in db.session.query(Classroom.id).filter(
+        Classroom.user_id == user.id).order_by(Classroom.name, Classroom.id)]
+    return ['user'] + [f'class:{cid}' for cid in classroom_ids] + ['mixed_groups', 'settings']
+
+
+def run_cleanup_step(user, step, options, summary):
     """
+    Exécute une étape de plan_cleanup_steps() sans commiter.
+
+    Args:
+        user: objet User
+        step: clé d'étape ('user', 'class:<id>', 'mixed_groups', 'settings')
+        options: dict avec class_actions, new_year_start, new_year_end, holiday_action
+        summary: dict des compteurs (SUMMARY_KEYS), complété sur place
+    """
+    if step == 'user':
+        _cleanup_user_data(user, summary)
+    elif step.startswith('class:'):
+        _cleanup_classroom(user, int(step.split(':', 1)[1]), options['class_actions'], summary)
+    elif step == 'mixed_groups':
+        _cleanup_mixed_groups(user, options['class_actions'], summary)
+    elif step == 'settings':
+        _update_school_year(user, options['new_year_start'], options['new_year_end'],
+                            options.get('holiday_action', 'clear'))
+    else:
+        raise ValueError(f"Étape de nettoyage inconnue : {step}")
+
+
+def _cleanup_user_data(user, summary):
+    """Données opérationnelles rattachées à l'enseignant ou à ses élèves."""
     from models.planning import Planning
     from models.attendance import Attendance
     from models.absence_justification import AbsenceJustification
-    from models.evaluation import Evaluation, EvaluationGrade
-    from models.student import Grade, Student
+    from models.student import Student
     from models.lesson_memo import LessonMemo, StudentRemark
     from models.sanctions import StudentSanctionRecord
     from models.student_sanctions import StudentSanctionCount
+    from models.schedule import Schedule
+
+    user_student_ids = select(Student.id).where(Student.user_id == user.id)
+
+    # Plannings (leçons concrètes avec dates), présences
+    summary['plannings_deleted'] += _bulk_delete(Planning, Planning.user_id == user.id)
+    summary['attendance_deleted'] += _bulk_delete(Attendance, Attendance.user_id == user.id)
+
+    # Justifications d'absence
+    summary['justifications_deleted'] += _bulk_delete(
+        AbsenceJustification, AbsenceJustification.student_id.in_(user_student_ids))
+
+    # Mémos de cours, remarques élèves
+    summary['memos_deleted'] += _bulk_delete(LessonMemo, LessonMemo.user_id == user.id)
+    summary['remarks_deleted'] += _bulk_delete(StudentRemark, StudentRemark.user_id == user.id)
+
+    # Sanctions attribuées (records), compteurs remis à 0
+    summary['sanctions_deleted'] += _bulk_delete(
+        StudentSanctionRecord, StudentSanctionRecord.student_id.in_(user_student_ids))
+    summary['sanctions_reset'] += _bulk_update(
+        StudentSanctionCount, {'check_count': 0},
+        StudentSanctionCount.student_id.in_(user_student_ids))
+
+    # Horaires (Schedule) — remis à zéro pour la nouvelle année (classes + groupes
+    # mixtes). Sinon la vue annuelle du calendrier garde les "cases actives" des
+    # classes conservées (has_schedule reste vrai même sans planning).
+    _bulk_delete(Schedule, Schedule.user_id == user.id)
+
+
+def _cleanup_classroom(user, classroom_id, class_actions, summary):
+    """Données de l'année d'une classe, puis action choisie (garder,
+    renommer, supprimer). Une classe déjà supprimée est ignorée."""
+    from models.classroom import Classroom
+    from models.evaluation import Evaluation, EvaluationGrade
+    from models.student import Grade
     from models.seating_plan import SeatingPlan
     from models.student_group import StudentGroup, StudentGroupMembership
     from models.decoupage import DecoupageAssignment
-    from models.classroom import Classroom
+    from models.class_file import ClassFile, ClassFolder
+
+    classroom = Classroom.query.filter_by(id=classroom_id, user_id=user.id).first()
+    if classroom is None:
+        return
+
+    # Évaluations et notes
+    summary['grades_deleted'] += _bulk_delete(EvaluationGrade, EvaluationGrade.evaluation_id.in_(
+        select(Evaluation.id).where(Evaluation.classroom_id == classroom_id)
+    ))
+    summary['evaluations_deleted'] += _bulk_delete(Evaluation, Evaluation.classroom_id == classroom_id)
+
+    # Anciennes notes (legacy Grade model)
+    summary['grades_deleted'] += _bulk_delete(Grade, Grade.classroom_id == classroom_id)
+
+    # Plans de classe, assignations de découpage
+    summary['seating_plans_deleted'] += _bulk_delete(SeatingPlan, SeatingPlan.classroom_id == classroom_id)
+    _bulk_delete(DecoupageAssignment, DecoupageAssignment.classroom_id == classroom_id)
+
+    # Fichiers et dossiers de classe — retirés (y compris des classes conservées).
+    _bulk_delete(ClassFile, ClassFile.classroom_id == classroom_id)
+    _bulk_delete(ClassFolder, ClassFolder.classroom_id == classroom_id)
+
+    action_info = class_actions.get(str(classroom_id), {'action': 'keep'})
+    action = action_info.get('action', 'keep')
+
+    if action == 'delete':
+        # Vérifier les collaborations et compter les classes dérivées supprimées
+        collab_info = get_classroom_collaboration_info(classroom_id)
+        if collab_info['has_collaborations']:
+            summary['collab_classes_deleted'] += len(collab_info['derived_classrooms'])
+
+            # Générer des PDFs de sauvegarde pour les enseignants spécialisés
+            # AVANT la suppression des données (même transaction que l'étape :
+            # une étape rejouée ne les duplique pas)
+            try:
+                from services.year_end_archive import generate_and_store_backup_pdfs
+                summary['backup_pdfs_generated'] += generate_and_store_backup_pdfs(classroom_id, user)
+            except Exception as e:
+                logger.error(f"Erreur génération PDF backup pour classe {classroom_id}: {e}")
+
+        # Supprimer TOUTES les dépendances FK (y compris la chaîne de collaboration)
+        _delete_classroom_dependencies(classroom_id)
+
+        # Supprimer la classe elle-même
+        db.session.delete(classroom)
+        summary['classes_deleted'] += 1
+        return
+
+    if action == 'rename':
+        new_name = action_info.get('new_name', classroom.name)
+        classroom.name = new_name
+        # Recalculer class_group (clé de regroupement des classes dans l'app,
+        # ex. page manage-classes) avec la même règle qu'à la création :
+        # la partie du nom située avant le tiret.
+        m = re.match(r'^([^-]+?)(?:\s*-\s*.*)?$', new_name.strip())
+        classroom.class_group = m.group(1).strip() if m else new_name
+        summary['classes_renamed'] += 1
+    else:  # keep
+        summary['classes_kept'] += 1
+
+    # Vider les groupes d'élèves (les compositions changent)
+    _bulk_delete(StudentGroupMembership, StudentGroupMembership.group_id.in_(
+        select(StudentGroup.id).where(StudentGroup.classroom_id == classroom_id)
+    ))
+
+
+def _cleanup_mixed_groups(user, class_actions, summary):
     from models.mixed_group import MixedGroup, MixedGroupStudent
-    from models.user import Holiday
     from models.schedule import Schedule
-    from models.class_file import ClassFile, ClassFolder
 
-    summary = {
-        'plannings_deleted': 0,
-        'attendance_deleted': 0,
-        'justifications_deleted': 0,
-        'evaluations_deleted': 0,
-        'grades_deleted': 0,
-        'memos_deleted': 0,
-        'remarks_deleted': 0,
-        'sanctions_deleted': 0,
-        'sanctions_reset': 0,
-        'seating_plans_deleted': 0,
-        'classes_deleted': 0,
-        'classes_renamed': 0,
-        'classes_kept': 0,
-        'mixed_groups_deleted': 0,
-        'collab_classes_deleted': 0,
-        'backup_pdfs_generated': 0,
-    }
+    for mg in MixedGroup.query.filter_by(teacher_id=user.id).all():
+        action_info = class_actions.get(f'mg_{mg.id}', {'action': 'keep'})
+
+        # Vider les membres du groupe (à reconfigurer)
+        _bulk_delete(MixedGroupStudent, MixedGroupStudent.mixed_group_id == mg.id)
+        if action_info.get('action', 'keep') == 'delete':
+            _bulk_delete(Schedule, Schedule.user_id == user.id, Schedule.mixed_group_id == mg.id)
+            db.session.delete(mg)
+            summary['mixed_groups_deleted'] += 1
+
 
+def _update_school_year(user, new_year_start, new_year_end, holiday_action):
+    from models.user import Holiday
+
+    # Mettre à jour les dates de l'année scolaire
+    user.school_year_start = new_year_start
+    user.school_year_end = new_year_end
+
+    # Gérer les vacances
+    if holiday_action == 'shift':
+        # Décaler toutes les vacances d'un an
+        holidays = Holiday.query.filter_by(user_id=user.id).all()
+        for h in holidays:
+            year_diff = new_year_start.year - user.school_year_start.year if user.school_year_start else 1
+            if year_diff < 1:
+                year_diff = 1
+            h.start_date = h.start_date.replace(year=h.start_date.year + year_diff)
+            h.end_date = h.end_date.replace(year=h.end_date.year + year_diff)
+    else:
+        # Supprimer toutes les vacances
+        _bulk_delete(Holiday, Holiday.user_id == user.id)
+
+
+def execute_year_end_cleanup(user, class_actions, new_year_start, new_year_end, holiday_action='clear'):
+    """
+    Exécute le nettoyage complet de fin d'année en une transaction.
+
+    La route passe par services/year_end_jobs (une transaction par étape, en
+    arrière-plan) ; cette version synchrone sert aux scripts.
+
+    Args:
+        user: objet User (current_user)
+        class_actions: dict {classroom_id: {'action': 'keep'|'rename'|'delete', 'new_name': str}}
+                       Inclut aussi les mixed_groups avec clé 'mg_<id>'
+        new_year_start: date - nouvelle date de début d'année
+        new_year_end: date - nouvelle date de fin d'année
+        holiday_action: 'shift' (décaler d'un an) ou 'clear' (supprimer)
+
+    Returns:
+        dict avec le résumé des actions effectuées
+    """
+    summary = dict.fromkeys(SUMMARY_KEYS, 0)
+    options = {
+        'class_actions': class_actions,
+        'new_year_start': new_year_start,
+        'new_year_end': new_year_end,
+        'holiday_action': holiday_action,
+    }
     # Utiliser no_autoflush pour éviter les erreurs de FK pendant le nettoyage
     with db.session.no_autoflush:
-
-        # Collecter les IDs avant de commencer les suppressions
-        all_student_ids = [s.id for s in Student.query.filter_by(user_id=user.id).all()]
-        classroom_ids = [c.id for c in Classroom.query.filter_by(user_id=user.id).all()]
-
-        # =========================================================
-        # 1. Supprimer les données opérationnelles liées à l'année
-        # =========================================================
-
-        # Plannings (leçons concrètes avec dates)
-        count = Planning.query.filter_by(user_id=user.id).delete()
-        summary['plannings_deleted'] = count
-
-        # Présences
-        count = Attendance.query.filter_by(user_id=user.id).delete()
-        summary['attendance_deleted'] = count
-
-        # Justifications d'absence
-        if all_student_ids:
-            count = AbsenceJustification.query.filter(
-                AbsenceJustification.student_id.in_(all_student_ids)
-            ).delete(synchronize_session='fetch')
-            summary['justifications_deleted'] = count
-
-        # Évaluations et notes
-        if classroom_ids:
-            eval_ids = [e.id for e in Evaluation.query.filter(
-                Evaluation.classroom_id.in_(classroom_ids)
-            ).all()]
-            if eval_ids:
-                count = EvaluationGrade.query.filter(
-                    EvaluationGrade.evaluation_id.in_(eval_ids)
-                ).delete(synchronize_session='fetch')
-                summary['grades_deleted'] += count
-
-            count = Evaluation.query.filter(
-                Evaluation.classroom_id.in_(classroom_ids)
-            ).delete(synchronize_session='fetch')
-            summary['evaluations_deleted'] = count
-
-        # Anciennes notes (legacy Grade model)
-        if classroom_ids:
-            count = Grade.query.filter(
-                Grade.classroom_id.in_(classroom_ids)
-            ).delete(synchronize_session='fetch')
-            summary['grades_deleted'] += count
-
-        # Mémos de cours
-        count = LessonMemo.query.filter_by(user_id=user.id).delete()
-        summary['memos_deleted'] = count
-
-        # Remarques élèves
-        count = StudentRemark.query.filter_by(user_id=user.id).delete()
-        summary['remarks_deleted'] = count
-
-        # Sanctions attribuées (records)
-        if all_student_ids:
-            count = StudentSanctionRecord.query.filter(
-                StudentSanctionRecord.student_id.in_(all_student_ids)
-            ).delete(synchronize_session='fetch')
-            summary['sanctions_deleted'] = count
-
-        # Remettre les compteurs de sanctions à 0
-        if all_student_ids:
-            count = StudentSanctionCount.query.filter(
-                StudentSanctionCount.student_id.in_(all_student_ids)
-            ).update({'check_count': 0}, synchronize_session='fetch')
-            summary['sanctions_reset'] = count
-
-        # Plans de classe
-        if classroom_ids:
-            count = SeatingPlan.query.filter(
-                SeatingPlan.classroom_id.in_(classroom_ids)
-            ).delete(synchronize_session='fetch')
-            summary['seating_plans_deleted'] = count
-
-        # Assignations de découpage
-        if classroom_ids:
-            DecoupageAssignment.query.filter(
-                DecoupageAssignment.classroom_id.in_(classroom_ids)
-            ).delete(synchronize_session='fetch')
-
-        # Horaires (Schedule) — remis à zéro pour la nouvelle année (classes + groupes
-        # mixtes). Sinon la vue annuelle du calendrier garde les "cases actives" des
-        # classes conservées (has_schedule reste vrai même sans planning).
-        Schedule.query.filter_by(user_id=user.id).delete(synchronize_session='fetch')
-
-        # Fichiers et dossiers de classe — retirés (y compris des classes conservées).
-        if classroom_ids:
-            ClassFile.query.filter(
-                ClassFile.classroom_id.in_(classroom_ids)
-            ).delete(synchronize_session='fetch')
-            ClassFolder.query.filter(
-                ClassFolder.classroom_id.in_(classroom_ids)
-            ).delete(synchronize_session='fetch')
-
-        # =========================================================
-        # 2. Gérer les classes selon les choix de l'utilisateur
-        # =========================================================
-        for classroom in Classroom.query.filter_by(user_id=user.id).all():
-            key = str(classroom.id)
-            action_info = class_actions.get(key, {'action': 'keep'})
-            action = action_info.get('action', 'keep')
-
-            if action == 'delete':
-                # Vérifier les collaborations et compter les classes dérivées supprimées
-                collab_info = get_classroom_collaboration_info(classroom.id)
-                if collab_info['has_collaborations']:
-                    summary['collab_classes_deleted'] += len(collab_info['derived_classrooms'])
-
-                    # Générer des PDFs de sauvegarde pour les enseignants spécialisés
-                    # AVANT la suppression des données
-                    try:
-                        from services.year_end_archive import generate_and_store_backup_pdfs
-                        pdf_count = generate_and_store_backup_pdfs(classroom.id, user)
-                        summary['backup_pdfs_generated'] += pdf_count
-                    except Exception as e:
-                        import logging
-                        logging.getLogger(__name__).error(
-                            f"Erreur génération PDF backup pour classe {classroom.id}: {e}"
-                        )
-
-                # Supprimer TOUTES les dépendances FK (y compris la chaîne de collaboration)
-                _delete_classroom_dependencies(classroom.id)
-
-                # Supprimer la classe elle-même
-                db.session.delete(classroom)
-                summary['classes_deleted'] += 1
-
-            elif action == 'rename':
-                new_name = action_info.get('new_name', classroom.name)
-                classroom.name = new_name
-                # Recalculer class_group (clé de regroupement des classes dans l'app,
-                # ex. page manage-classes) avec la même règle qu'à la création :
-                # la partie du nom située avant le tiret.
-                import re
-                m = re.match(r'^([^-]+?)(?:\s*-\s*.*)?$', new_name.strip())
-                classroom.class_group = m.group(1).strip() if m else new_name
-                summary['classes_renamed'] += 1
-                # Vider les groupes d'élèves (les compositions changent)
-                groups = StudentGroup.query.filter_by(classroom_id=classroom.id).all()
-                for g in groups:
-                    StudentGroupMembership.query.filter_by(group_id=g.id).delete()
-
-            else:  # keep
-                summary['classes_kept'] += 1
-                # Vider les groupes d'élèves
-                groups = StudentGroup.query.filter_by(classroom_id=classroom.id).all()
-                for g in groups:
-                    StudentGroupMembership.query.filter_by(group_id=g.id).delete()
-
-        # Groupes mixtes
-        for mg in MixedGroup.query.filter_by(teacher_id=user.id).all():
-            key = f'mg_{mg.id}'
-            action_info = class_actions.get(key, {'action': 'keep'})
-            action = action_info.get('action', 'keep')
-
-            if action == 'delete':
-                MixedGroupStudent.query.filter_by(mixed_group_id=mg.id).delete()
-                Schedule.query.filter_by(user_id=user.id, mixed_group_id=mg.id).delete()
-                db.session.delete(mg)
-                summary['mixed_groups_deleted'] += 1
-            else:
-                # Vider les membres du groupe (à reconfigurer)
-                MixedGroupStudent.query.filter_by(mixed_group_id=mg.id).delete()
-
-        # =========================================================
-        # 3. Mettre à jour les dates de l'année scolaire
-        # =========================================================
-        user.school_year_start = new_year_start
-        user.school_year_end = new_year_end
-
-        # =========================================================
-        # 4. Gérer les vacances
-        # =========================================================
-        if holiday_action == 'shift':
-            # Décaler toutes les vacances d'un an
-            holidays = Holiday.query.filter_by(user_id=user.id).all()
-            for h in holidays:
-                year_diff = new_year_start.year - user.school_year_start.year if user.school_year_start else 1
-                if year_diff < 1:
-                    year_diff = 1
-                h.start_date = h.start_date.replace(year=h.start_date.year + year_diff)
-                h.end_date = h.end_date.replace(year=h.end_date.year + year_diff)
-        else:
-            # Supprimer toutes les vacances
-            Holiday.query.filter_by(user_id=user.id).delete()
-
-    # =========================================================
-    # 5. Commit (en dehors du no_autoflush)
-    # =========================================================
+        for step in plan_cleanup_steps(user):
+            run_cleanup_step(user, step, options, summary)
     db.session.commit()
-
     return summary
@@ -0,0 +1,145 @@
+"""Passage à la nouvelle année en arrière-plan.
+
+Fin juin, tous les enseignants lancent le nettoyage en même temps :
+exécuté dans la requête (dizaines de DELETE par classe, PDFs de sauvegarde
+reportlab pour les collaborations), il dépassait le timeout et s'arrêtait au
+milieu. submit_year_end() crée un YearEndJob avec la liste des étapes
+(services/year_end_cleanup.plan_cleanup_steps : données de l'enseignant, une
+étape par classe, groupes mixtes, dates) et dépose une tâche
+« year_end.run » dans l'exécuteur de tâches (services/job_runner.py, file
+``year_end``, 2 à la fois) ; la requête répond tout de suite.
+
+Chaque étape est commitée avec ``steps_done`` et le résumé cumulé dans la
+même transaction : après un plantage, l'exécuteur remet la tâche en file
+et le job reprend à la première étape non commitée (retry_job() pour un job
+en échec).
+"""
+import json
+import logging
+from datetime import date, datetime
+
+from extensions import db
+from models.year_end_job import YearEndJob
+from services.job_runner import enqueue, task
+from services.year_end_cleanup import SUMMARY_KEYS, plan_cleanup_steps, run_cleanup_step
+
+logger = logging.getLogger(__name__)
+
+class YearEndInProgress(Exception):
+    """Un passage à la nouvelle année est déjà en cours pour cet utilisateur."""
+
+    def __init__(self, job):
+        super().__init__("Un passage à la nouvelle année est déjà en cours")
+        self.job = job
+
+
+def _dispatch(job):
+    enqueue('year_end.run', {'job_id': job.id}, unique_key=f'year_end:{job.id}', user_id=job.user_id)
+
+
+def submit_year_end(user, class_actions, new_year_start, new_year_end, holiday_action='clear'):
+    """Crée et lance le job de passage à la nouvelle année de ``user``.
+
+    Raises:
+        YearEndInProgress: un job de cet utilisateur n'est pas terminé.
+    """
+    active = YearEndJob.query.filter(
+        YearEndJob.user_id == user.id,
+        YearEndJob.status.in_(('queued', 'running')),
+    ).first()
+    if active:
+        raise YearEndInProgress(active)
+
+    job = YearEndJob(
+        user_id=user.id,
+        status='queued',
+        options=json.dumps({
+            'class_actions': class_actions,
+            'new_year_start': new_year_start.isoformat(),
+            'new_year_end': new_year_end.isoformat(),
+            'holiday_action': holiday_action,
+        }),
+        steps=json.dumps(plan_cleanup_steps(user)),
+        summary=json.dumps(dict.fromkeys(SUMMARY_KEYS, 0)),
+    )
+    db.session.add(job)
+    db.session.flush()
+    _dispatch(job)
+    db.session.commit()
+    return job
+
+
+def _load_options(raw):
+    options = json.loads(raw)
+    options['new_year_start'] = date.fromisoformat(options['new_year_start'])
+    options['new_year_end'] = date.fromisoformat(options['new_year_end'])
+    return options
+
+
+def _step_label(step):
+    if step.startswith('class:'):
+        from models.classroom import Classroom
+        classroom = db.session.get(Classroom, int(step.split(':', 1)[1]))
+        return f"Classe {classroom.name}" if classroom else "Classe"
+    return {
+        'user': "Données de l'année",
+        'mixed_groups': 'Groupes mixtes',
+        'settings': 'Dates et vacances',
+    }.get(step, step)
+
+
+@task('year_end.run', queue='year_end')
+def run_year_end_job(job_id):
+    """Exécute les étapes restantes d'un job (tâche de l'exécuteur). Un job
+    terminé n'est pas rejoué ; un job « running » reprend à sa première
+    étape non commitée."""
+    from models.user import User
+
+    claimed = YearEndJob.query.filter(
+        YearEndJob.id == job_id, YearEndJob.status.in_(('queued', 'running')),
+    ).update({'status': 'running', 'started_at': datetime.utcnow()}, synchronize_session=False)
+    db.session.commit()
+    if not claimed:
+        return
+    job = db.session.get(YearEndJob, job_id)
+    options = _load_options(job.options)
+    steps = job.step_list
+    summary = dict.fromkeys(SUMMARY_KEYS, 0)
+    summary.update(job.summary_dict)
+
+    try:
+        while job.steps_done < len(steps):
+            step = steps[job.steps_done]
+            job.current_step = _step_label(step)
+            db.session.commit()
+
+            user = db.session.get(User, job.user_id)
+            with db.session.no_autoflush:
+                run_cleanup_step(user, step, options, summary)
+            # L'étape et sa progression sont commitées ensemble : une
+            # reprise ne rejoue jamais une étape terminée.
+            job.steps_done += 1
+            job.summary = json.dumps(summary)
+            db.session.commit()
+        job.status, job.current_step = 'done', None
+    except Exception as e:
+        db.session.rollback()
+        logger.exception("Passage à la nouvelle année %s interrompu", job_id)
+        job.status, job.error = 'failed', f"Erreur lors du nettoyage : {e}"
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+
+
+def get_job(job_id, user_id):
+    """Job ``job_id`` de ``user_id`` (None s'il n'existe pas)."""
+    return YearEndJob.query.filter_by(id=job_id, user_id=user_id).first()
+
+
+def retry_job(job):
+    """Relance un job en échec à partir de l'étape qui a échoué."""
+    if job.status != 'failed':
+        return job
+    job.status, job.error, job.finished_at = 'queued', None, None
+    _dispatch(job)
+    db.session.commit()
+    return job
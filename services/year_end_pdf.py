@@ -1,9 +1,29 @@
 """
 Service de génération PDF pour l'archivage de fin d'année.
 Génère un rapport PDF consolidé avec les données élèves d'une classe.
+
+La mise en page reportlab est purement CPU : exécutée dans le worker eventlet,
+elle bloquait toutes les autres greenthreads (sockets des combats compris).
+generate_class_report_pdf découpe le rapport (page de garde + récapitulatif,
+puis des groupes de fiches élèves), rend les morceaux dans un pool de
+processus et les fusionne avec PyMuPDF (requirements.txt). Chaque fiche
+commençant sur une nouvelle page, le résultat est le même qu'un rendu d'un
+seul tenant. Le rendu reste séquentiel pour une petite classe, si le pool
+est cassé, ou si PyMuPDF manque (installation incomplète : un avertissement
+est journalisé).
+
+Ce module n'importe ni Flask ni les modèles : les processus du pool ne
+chargent que reportlab.
 """
 import io
+import logging
+import multiprocessing
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from types import SimpleNamespace
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -14,6 +34,21 @@ from reportlab.platypus import (
 )
 from reportlab.lib.enums import TA_LEFT, TA_CENTER, TA_RIGHT
 
+# Processus de rendu par défaut (borné : la machine sert aussi les requêtes)
+DEFAULT_PROCESSES = min(4, os.cpu_count() or 1)
+
+# En dessous, le démarrage des morceaux coûte plus qu'il ne rapporte
+PARALLEL_MIN_STUDENTS = 8
+
+# Élève tel que transmis aux processus de rendu (sérialisable, sans ORM)
+ReportStudent = namedtuple('ReportStudent', 'id first_name last_name')
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_workers = None
+_pool_lock = threading.Lock()
+
 
 def _safe_str(value):
     """Convertit une valeur en string de manière sûre (gère le chiffrement)."""
@@ -25,40 +60,15 @@ def _safe_str(value):
         return '[données non lisibles]'
 
 
-def generate_class_report_pdf(classroom, students_data, school_year_label, teacher_name):
-    """
-    Génère un PDF de rapport pour une classe entière.
-
-    Args:
-        classroom: objet Classroom
-        students_data: liste de dicts avec les données par élève
-            [{
-                'student': Student,
-                'absences_count': int,
-                'late_count': int,
-                'late_minutes_total': int,
-                'grades': [{'title': str, 'points': float, 'max': float, 'date': date}],
-                'average': float or None,
-                'sanctions': [{'name': str, 'count': int}],
-                'remarks': [{'content': str, 'date': datetime}],
-            }]
-        school_year_label: str (ex: "2025-2026")
-        teacher_name: str
-
-    Returns:
-        bytes: contenu PDF
-    """
-    buffer = io.BytesIO()
+def _fitz():
+    try:
+        import fitz  # PyMuPDF
+        return fitz
+    except ImportError:
+        return None
 
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=A4,
-        rightMargin=2 * cm,
-        leftMargin=2 * cm,
-        topMargin=2 * cm,
-        bottomMargin=2 * cm,
-    )
 
+def _build_styles():
     styles = getSampleStyleSheet()
 
     # Styles personnalisés
@@ -104,7 +114,26 @@ def generate_class_report_pdf(classroom, students_data, school_year_label, teach
         fontSize=8,
         textColor=colors.HexColor('#6B7280'),
     ))
+    return styles
 
+
+def _render(elements):
+    buffer = io.BytesIO()
+
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=A4,
+        rightMargin=2 * cm,
+        leftMargin=2 * cm,
+        topMargin=2 * cm,
+        bottomMargin=2 * cm,
+    )
+    doc.build(elements)
+    buffer.seek(0)
+    return buffer.getvalue()
+
+
+def _cover_elements(classroom, students_data, school_year_label, teacher_name, generated_at, styles):
     elements = []
 
     # --- Page de garde ---
@@ -118,7 +147,7 @@ def generate_class_report_pdf(classroom, students_data, school_year_label, teach
     elements.append(Paragraph(f'Année scolaire : {school_year_label}', styles['Normal']))
     elements.append(Paragraph(f'Enseignant : {teacher_name}', styles['Normal']))
     elements.append(Paragraph(
-        f'Généré le : {datetime.now().strftime("%d/%m/%Y à %H:%M")}',
+        f'Généré le : {generated_at.strftime("%d/%m/%Y à %H:%M")}',
         styles['Normal']
     ))
     elements.append(Paragraph(
@@ -158,10 +187,17 @@ def generate_class_report_pdf(classroom, students_data, school_year_label, teach
             ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
         ]))
         elements.append(summary_table)
+    return elements
+
+
+def _student_elements(students_data, styles, starts_document=False):
+    elements = []
 
     # --- Fiches individuelles ---
-    for sd in students_data:
-        elements.append(PageBreak())
+    for i, sd in enumerate(students_data):
+        # Un document de fiches seules commence déjà sur une page vierge
+        if i or not starts_document:
+            elements.append(PageBreak())
         s = sd['student']
         full_name = f'{_safe_str(s.first_name)} {_safe_str(s.last_name)}'
 
@@ -243,8 +279,118 @@ def generate_class_report_pdf(classroom, students_data, school_year_label, teach
                     styles['CellText']
                 ))
                 elements.append(Spacer(1, 1 * mm))
+    return elements
 
-    # Build PDF
-    doc.build(elements)
-    buffer.seek(0)
-    return buffer.getvalue()
+
+def render_report_part(part, args):
+    """Rend un morceau du rapport (exécuté dans un processus du pool).
+
+    ``part`` : ``'cover'`` (page de garde + récapitulatif) ou ``'students'``
+    (fiches, la première en tête de document). Retourne les octets PDF.
+    """
+    styles = _build_styles()
+    if part == 'cover':
+        return _render(_cover_elements(*args, styles=styles))
+    return _render(_student_elements(args, styles, starts_document=True))
+
+
+def _get_pool(processes):
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None:
+            # « spawn » : pas de fork d'un worker eventlet (monkey-patché,
+            # connexions ouvertes) ; les processus n'importent que ce module.
+            _pool = ProcessPoolExecutor(
+                max_workers=processes, mp_context=multiprocessing.get_context('spawn'))
+            _pool_workers = processes
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _plain_students_data(students_data):
+    """Données élèves sans objets ORM (sérialisables vers les processus)."""
+    plain = []
+    for sd in students_data:
+        s = sd['student']
+        if not isinstance(s, ReportStudent):
+            s = ReportStudent(getattr(s, 'id', None), _safe_str(s.first_name), _safe_str(s.last_name))
+        plain.append(dict(sd, student=s))
+    return plain
+
+
+def _chunks(items, count):
+    size, extra = divmod(len(items), count)
+    start = 0
+    for i in range(count):
+        end = start + size + (1 if i < extra else 0)
+        if end > start:
+            yield items[start:end]
+        start = end
+
+
+def generate_class_report_pdf(classroom, students_data, school_year_label, teacher_name, processes=None):
+    """
+    Génère un PDF de rapport pour une classe entière.
+
+    Args:
+        classroom: objet Classroom (ou tout objet avec ``name`` et ``subject``)
+        students_data: liste de dicts avec les données par élève
+            [{
+                'student': Student ou ReportStudent,
+                'absences_count': int,
+                'late_count': int,
+                'late_minutes_total': int,
+                'grades': [{'title': str, 'points': float, 'max': float, 'date': date}],
+                'average': float or None,
+                'sanctions': [{'name': str, 'count': int}],
+                'remarks': [{'content': str, 'date': datetime}],
+            }]
+        school_year_label: str (ex: "2025-2026")
+        teacher_name: str
+        processes: processus de rendu (DEFAULT_PROCESSES par défaut, 1 =
+            rendu séquentiel dans le processus courant)
+
+    Returns:
+        bytes: contenu PDF
+    """
+    processes = DEFAULT_PROCESSES if processes is None else max(1, int(processes))
+    classroom = SimpleNamespace(name=_safe_str(classroom.name), subject=_safe_str(classroom.subject or ''))
+    students_data = _plain_students_data(students_data)
+    cover_args = (classroom, students_data, school_year_label, teacher_name, datetime.now())
+
+    fitz = _fitz()
+    parallel = processes > 1 and len(students_data) >= PARALLEL_MIN_STUDENTS
+    if parallel and fitz is None:
+        logger.warning("PyMuPDF absent : rapport de %s rendu séquentiellement "
+                       "dans le worker web", classroom.name)
+    if parallel and fitz is not None:
+        try:
+            pool = _get_pool(processes)
+            futures = [pool.submit(render_report_part, 'cover', cover_args)]
+            futures += [pool.submit(render_report_part, 'students', chunk)
+                        for chunk in _chunks(students_data, _pool_workers)]
+            parts = [f.result() for f in futures]
+        except Exception:
+            # Pool cassé (processus tué…) : on le recrée à la prochaine
+            # demande et on rend ce rapport-ci séquentiellement.
+            _reset_pool()
+        else:
+            merged = fitz.open()
+            for part in parts:
+                with fitz.open(stream=part, filetype='pdf') as src:
+                    merged.insert_pdf(src)
+            data = merged.tobytes(garbage=3, deflate=True)
+            merged.close()
+            return data
+
+    styles = _build_styles()
+    elements = _cover_elements(*cover_args, styles=styles)
+    elements += _student_elements(students_data, styles)
+    return _render(elements)
@@ -319,19 +319,29 @@ class ClassFileManager {
     
     async copyFolderToClass(folderId, classId, folderPath = '') {
         try {
-            const response = await fetch('/api/class-files/copy-folder', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({
-                    folder_id: folderId,
-                    class_id: classId,
-                    folder_path: folderPath
-                })
-            });
-            
-            const result = await response.json();
+            // Gros dossier : le serveur s'arrête au bout d'un budget de temps
+            // (réponse « partial ») et la copie est relancée avec « resume ».
+            let resume = null;
+            let result;
+            while (true) {
+                const response = await fetch('/api/class-files/copy-folder', {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': 'application/json',
+                    },
+                    body: JSON.stringify({
+                        folder_id: folderId,
+                        class_id: classId,
+                        folder_path: folderPath,
+                        resume
+                    })
+                });
+
+                result = await response.json();
+                if (!result.success || !result.partial) break;
+                resume = result.resume;
+                this.showNotification('info', result.message);
+            }
             
             if (result.success) {
                 this.showNotification('success', result.message);
@@ -190,6 +190,9 @@ class CleanPDFViewer {
         // Sauvegarde automatique
         this.autoSaveTimer = null;
         this.isDirty = false;
+        // Dernier état sauvegardé de chaque page (JSON) : l'autosave n'envoie
+        // que les pages modifiées depuis (PATCH /api/annotations/<id>/pages)
+        this.savedPageSnapshots = new Map();
 
         // Éléments DOM
         this.elements = {};
@@ -898,6 +901,24 @@ class CleanPDFViewer {
                 z-index: 1;
             }
 
+            /* Couche texte des aperçus serveur : invisible, sert à la
+               recherche dans la page et aux lecteurs d'écran */
+            .preview-text-layer {
+                position: absolute;
+                top: 0;
+                left: 0;
+                right: 0;
+                bottom: 0;
+                overflow: hidden;
+                color: transparent;
+                line-height: 1;
+            }
+
+            .preview-text-layer span {
+                position: absolute;
+                white-space: pre;
+            }
+
             /* Classe ajoutée dynamiquement quand stylet détecté */
             .annotation-canvas.pen-active {
                 /* GARDER pointer-events: none PERMANENT */
@@ -2270,6 +2291,8 @@ class CleanPDFViewer {
             console.log('[Zoom Detection] Scale:', scale, 'isZoomed:', isZoomed);
 
             if (isZoomed) {
+                this.upgradeToVector();
+
                 // Afficher la mini-toolbar
                 console.log('[Zoom Detection] Affichage de la mini-toolbar');
                 this.elements.miniToolbar.classList.add('visible');
@@ -2364,6 +2387,17 @@ class CleanPDFViewer {
                 this.options.pdfUrl = url;
             }
 
+            // Aperçus serveur (images des pages générées à l'import) : les
+            // pages s'affichent sans télécharger le PDF, qui n'est chargé
+            // qu'au zoom ou à l'annotation (ensureVectorDocument). Sans
+            // aperçus prêts, rendu PDF.js complet comme avant.
+            this.resetPreviewMode();
+            const manifest = await this.fetchPreviewManifest();
+            if (manifest) {
+                await this.openFromPreviews(url, manifest);
+                return;
+            }
+
             // Charger avec PDF.js
             console.log('[loadPDF] Création de la tâche de chargement...');
             const loadingTask = pdfjsLib.getDocument(url);
@@ -2637,6 +2671,15 @@ class CleanPDFViewer {
         console.log('[renderThumbnailCanvas] Canvas element:', canvas);
         console.log('[renderThumbnailCanvas] Canvas parent:', canvas.parentElement);
 
+        if (!this.pdf && this.previewManifest) {
+            const [pageWidth, pageHeight] = this.previewManifest.page_sizes[pageNum - 1];
+            canvas.width = pageWidth * 0.2;
+            canvas.height = pageHeight * 0.2;
+            canvas.dataset.previewPage = pageNum;
+            this.observePreview(canvas);
+            return;
+        }
+
         const page = await this.pdf.getPage(pageNum);
         const viewport = page.getViewport({scale: 0.2});
 
@@ -2842,6 +2885,13 @@ class CleanPDFViewer {
      * Rendre une page PDF sur canvas
      */
     async renderPDFPage(pdfCanvas, annotationCanvas, pageNum, pageId) {
+        if (!this.pdf && this.previewManifest) {
+            // Les aperçus ne sont pas tournés : rotation = rendu vectoriel
+            if (!this.rotation || !(await this.ensureVectorDocument())) {
+                this.renderPreviewPage(pdfCanvas, annotationCanvas, pageNum, pageId);
+                return;
+            }
+        }
         const page = await this.pdf.getPage(pageNum);
 
         // Calculer le scale pour occuper 95% de la largeur du viewer
@@ -2895,6 +2945,8 @@ class CleanPDFViewer {
             const viewport = referencePage.getViewport({scale: scale});
             width = viewport.width;
             height = viewport.height;
+        } else if (this.previewManifest) {
+            ({width, height} = this.previewPageSize(1));
         } else {
             // Fallback: Page A4 à 96 DPI
             const viewerWidth = this.elements.viewer.clientWidth;
@@ -2937,6 +2989,8 @@ class CleanPDFViewer {
             const viewport = referencePage.getViewport({scale: scale});
             width = viewport.width;
             height = viewport.height;
+        } else if (this.previewManifest) {
+            ({width, height} = this.previewPageSize(1));
         } else {
             // Fallback: Page A4 à 96 DPI
             const viewerWidth = this.elements.viewer.clientWidth;
@@ -3191,6 +3245,8 @@ class CleanPDFViewer {
             const viewport = referencePage.getViewport({scale: scale});
             width = viewport.width;
             height = viewport.height;
+        } else if (this.previewManifest) {
+            ({width, height} = this.previewPageSize(1));
         } else {
             const viewerWidth = this.elements.viewer.clientWidth;
             const targetWidth = viewerWidth * 0.95;
@@ -3274,6 +3330,8 @@ class CleanPDFViewer {
             const viewport = referencePage.getViewport({scale: scale});
             width = viewport.width;
             height = viewport.height;
+        } else if (this.previewManifest) {
+            ({width, height} = this.previewPageSize(1));
         } else {
             const viewerWidth = this.elements.viewer.clientWidth;
             const targetWidth = viewerWidth * 0.95;
@@ -6181,6 +6239,7 @@ class CleanPDFViewer {
         }
 
         console.log('[StartAnnotation] pageId:', pageId, 'type:', typeof pageId);
+        this.upgradeToVector();
         this.isDrawing = true;
         this.currentCanvas = canvas;
         this.currentPageId = pageId;
@@ -9851,6 +9910,7 @@ class CleanPDFViewer {
     // Activer PencilKit pour le dessin natif
     activatePencilKit() {
         if (!this.isPencilKitAvailable) return;
+        this.upgradeToVector();
         
         this.pencilKitActive = true;
         // Mémoriser la page d'encre native courante (sert au flush lors d'un
@@ -11813,7 +11873,7 @@ class CleanPDFViewer {
      * Exporter le PDF avec annotations
      */
     async exportPDFWithAnnotations() {
-        if (!this.pdf) {
+        if (!this.pdf && !(await this.ensureVectorDocument())) {
             throw new Error('Aucun PDF chargé');
         }
 
@@ -12364,6 +12424,7 @@ class CleanPDFViewer {
                     }, 100);
 
                     // Marquer comme non modifié puisqu'on vient de charger
+                    this.rememberSavedPages(annotationsData);
                     this.isDirty = false;
                 } else {
                     console.log('[Load] Aucune annotation à charger');
@@ -12378,6 +12439,34 @@ class CleanPDFViewer {
         }
     }
 
+    /**
+     * Mémoriser l'état sauvegardé de chaque page (sauvegarde incrémentale)
+     */
+    rememberSavedPages(annotationsData) {
+        this.savedPageSnapshots = new Map();
+        for (const [pageId, pageAnnotations] of Object.entries(annotationsData)) {
+            this.savedPageSnapshots.set(String(pageId), JSON.stringify(pageAnnotations));
+        }
+    }
+
+    /**
+     * Pages modifiées depuis la dernière sauvegarde (null = page effacée)
+     */
+    collectChangedPages(annotationsData) {
+        const changed = {};
+        for (const [pageId, pageAnnotations] of Object.entries(annotationsData)) {
+            if (this.savedPageSnapshots.get(String(pageId)) !== JSON.stringify(pageAnnotations)) {
+                changed[pageId] = pageAnnotations;
+            }
+        }
+        this.savedPageSnapshots.forEach((_, pageId) => {
+            if (!(pageId in annotationsData)) {
+                changed[pageId] = null;
+            }
+        });
+        return changed;
+    }
+
     /**
      * Sauvegarder les annotations (version asynchrone)
      */
@@ -12431,19 +12520,38 @@ class CleanPDFViewer {
                 }
             }
 
-            const response = await fetch('/file_manager/api/save-annotations', {
-                method: 'POST',
+            // Sauvegarde incrémentale : seules les pages modifiées depuis la
+            // dernière sauvegarde partent au serveur. Repli sur la sauvegarde
+            // complète si la route PATCH échoue.
+            const changedPages = this.collectChangedPages(annotationsData);
+            console.log('[Save] Pages modifiées:', Object.keys(changedPages));
+
+            let response = await fetch(`/file_manager/api/annotations/${this.options.fileId}/pages`, {
+                method: 'PATCH',
                 headers: {'Content-Type': 'application/json'},
                 body: JSON.stringify({
-                    file_id: this.options.fileId,
-                    annotations: annotationsData,
+                    pages: changedPages,
                     custom_pages: customPages
                 })
             });
 
+            if (!response.ok) {
+                console.warn('[Save] Sauvegarde incrémentale refusée (HTTP', response.status, '), sauvegarde complète');
+                response = await fetch('/file_manager/api/save-annotations', {
+                    method: 'POST',
+                    headers: {'Content-Type': 'application/json'},
+                    body: JSON.stringify({
+                        file_id: this.options.fileId,
+                        annotations: annotationsData,
+                        custom_pages: customPages
+                    })
+                });
+            }
+
             if (response.ok) {
                 const result = await response.json();
                 console.log('[Save] Sauvegarde réussie:', result);
+                this.rememberSavedPages(annotationsData);
                 this.isDirty = false;
             } else {
                 console.error('[Save] Erreur HTTP:', response.status);
@@ -12689,6 +12797,7 @@ class CleanPDFViewer {
 
             if (xhr.status === 200) {
                 console.log('[SaveSync] ✅ Sauvegarde synchrone réussie');
+                this.rememberSavedPages(annotationsData);
                 this.isDirty = false;
             } else {
                 console.error('[SaveSync] ❌ Erreur HTTP:', xhr.status, xhr.responseText);
@@ -12775,6 +12884,218 @@ class CleanPDFViewer {
         }
     }
 
+    /**
+     * Manifeste des aperçus serveur (/file_manager/api/previews) : nombre de
+     * pages, tailles, hash du contenu. Fichiers de classe / perso uniquement
+     * (fileId numérique) ; null si les aperçus ne sont pas (encore) prêts.
+     */
+    async fetchPreviewManifest() {
+        if (!/^\d+$/.test(String(this.options.fileId || '')) || this.options.sourceIsImage) {
+            return null;
+        }
+        try {
+            const resp = await fetch(`/file_manager/api/previews/${this.options.fileId}/manifest`,
+                                     { credentials: 'same-origin' });
+            if (!resp.ok) return null;
+            const data = await resp.json();
+            return data.success ? data : null;
+        } catch (e) {
+            return null;
+        }
+    }
+
+    /**
+     * Oublier le document précédent (changement de fichier dans le même lecteur)
+     */
+    resetPreviewMode() {
+        if (this._previewObserver) this._previewObserver.disconnect();
+        this._previewObserver = null;
+        this.previewManifest = null;
+        this._vectorUrl = null;
+        this._vectorLoading = null;
+    }
+
+    /**
+     * Ouvrir un document à partir de ses aperçus serveur : pages et
+     * miniatures dimensionnées d'après le manifeste, images chargées quand
+     * elles deviennent visibles.
+     */
+    async openFromPreviews(url, manifest) {
+        this.pdf = null;
+        this.previewManifest = manifest;
+        this.previewBase = `/file_manager/api/previews/${this.options.fileId}/${manifest.content_hash}`;
+        this._vectorUrl = url;
+        this.totalPages = manifest.page_count;
+        this.pageOrder = Array.from({length: this.totalPages}, (_, i) => i + 1);
+        for (let i = 1; i <= this.totalPages; i++) {
+            this.pages.set(i, {type: 'pdf', pageNum: i});
+        }
+        await this.renderThumbnails();
+        await this.renderPages();
+        this.goToPage(1);
+    }
+
+    /**
+     * Taille d'affichage d'une page d'après le manifeste (même calcul que
+     * renderPDFPage, sans le PDF vectoriel)
+     */
+    previewPageSize(pageNum) {
+        const [pageWidth, pageHeight] = this.previewManifest.page_sizes[pageNum - 1];
+        const targetWidth = this.elements.viewer.clientWidth * 0.95;
+        const scale = this.scale === 1.0 ? targetWidth / pageWidth : this.scale;
+        return {width: pageWidth * scale, height: pageHeight * scale, scale};
+    }
+
+    /**
+     * Page PDF en mode aperçu : canvas dimensionnés, annotations redessinées,
+     * image chargée à l'approche de la zone visible (observePreview)
+     */
+    renderPreviewPage(pdfCanvas, annotationCanvas, pageNum, pageId) {
+        const {width, height, scale} = this.previewPageSize(pageNum);
+        this.currentScale = scale;
+
+        pdfCanvas.width = width;
+        pdfCanvas.height = height;
+        annotationCanvas.width = width;
+        annotationCanvas.height = height;
+        pdfCanvas.dataset.previewPage = pageNum;
+
+        this.redrawAnnotations(annotationCanvas, pageId);
+        this.observePreview(pdfCanvas);
+    }
+
+    /**
+     * Charger l'aperçu d'un canvas (page ou miniature) quand il approche de
+     * la zone visible : seules les pages consultées sont téléchargées.
+     */
+    observePreview(canvas) {
+        if (!this._previewObserver) {
+            this._previewObserver = new IntersectionObserver((entries) => {
+                for (const entry of entries) {
+                    if (!entry.isIntersecting) continue;
+                    this._previewObserver.unobserve(entry.target);
+                    this.paintPreview(entry.target);
+                }
+            }, { rootMargin: '100% 0px' });
+        }
+        this._previewObserver.observe(canvas);
+    }
+
+    async paintPreview(canvas) {
+        const pageNum = parseInt(canvas.dataset.previewPage, 10);
+        const isThumb = canvas.classList.contains('thumbnail-canvas');
+        if (!isThumb && this.pdf) {
+            // Passé en vectoriel (zoom, annotation) : plus besoin de l'aperçu
+            await this.renderVectorPage(canvas, pageNum);
+            return;
+        }
+
+        const pageWidth = this.previewManifest.page_sizes[pageNum - 1][0];
+        const level = isThumb ? 'thumb'
+            : (canvas.width / pageWidth > this.previewManifest.levels.page ? 'hd' : 'page');
+        const img = new Image();
+        img.src = `${this.previewBase}/${level}/${pageNum}`;
+        try {
+            await img.decode();
+        } catch (e) {
+            console.warn('[Preview] Aperçu indisponible, page', pageNum);
+            return;
+        }
+        if (canvas.dataset.vector === '1') return;  // rendu vectoriel arrivé entre-temps
+        canvas.getContext('2d').drawImage(img, 0, 0, canvas.width, canvas.height);
+        if (!isThumb) await this.addPreviewTextLayer(canvas, pageNum);
+    }
+
+    /**
+     * Couche texte invisible posée sur l'aperçu (recherche dans la page,
+     * lecteurs d'écran) : mots positionnés en % de la page.
+     */
+    async addPreviewTextLayer(canvas, pageNum) {
+        const container = canvas.parentElement;
+        if (!container || container.querySelector('.preview-text-layer')) return;
+        let layer;
+        try {
+            const resp = await fetch(`${this.previewBase}/text/${pageNum}`, { credentials: 'same-origin' });
+            if (!resp.ok) return;
+            layer = await resp.json();
+        } catch (e) {
+            return;
+        }
+
+        const div = document.createElement('div');
+        div.className = 'preview-text-layer';
+        const pxPerPoint = canvas.getBoundingClientRect().width / layer.width;
+        const fragment = document.createDocumentFragment();
+        for (const [x0, y0, x1, y1, text] of layer.words) {
+            const span = document.createElement('span');
+            span.textContent = text + ' ';
+            span.style.left = (x0 / layer.width * 100) + '%';
+            span.style.top = (y0 / layer.height * 100) + '%';
+            span.style.width = ((x1 - x0) / layer.width * 100) + '%';
+            span.style.fontSize = ((y1 - y0) * pxPerPoint) + 'px';
+            fragment.appendChild(span);
+        }
+        div.appendChild(fragment);
+        container.insertBefore(div, canvas.nextSibling);
+    }
+
+    /**
+     * Charger le PDF vectoriel (une seule fois) en mode aperçu.
+     * Retourne le document PDF.js, ou null (hors mode aperçu / échec).
+     */
+    ensureVectorDocument() {
+        if (this.pdf) return Promise.resolve(this.pdf);
+        if (!this.previewManifest) return Promise.resolve(null);
+        if (!this._vectorLoading) {
+            this._vectorLoading = pdfjsLib.getDocument(this._vectorUrl).promise.then((pdf) => {
+                this.pdf = pdf;
+                return pdf;
+            }).catch((error) => {
+                console.error('[Preview] Chargement du PDF vectoriel échoué:', error);
+                this._vectorLoading = null;
+                return null;
+            });
+        }
+        return this._vectorLoading;
+    }
+
+    /**
+     * Zoom ou annotation : passer les pages visibles en rendu vectoriel (les
+     * suivantes le seront à leur affichage, voir paintPreview)
+     */
+    async upgradeToVector() {
+        if (this.pdf || !this.previewManifest) return;
+        if (!(await this.ensureVectorDocument())) return;
+        const viewerRect = this.elements.viewer.getBoundingClientRect();
+        const canvases = this.elements.pagesContainer.querySelectorAll('.pdf-canvas[data-preview-page]');
+        for (const canvas of canvases) {
+            const rect = canvas.getBoundingClientRect();
+            if (rect.bottom >= viewerRect.top && rect.top <= viewerRect.bottom) {
+                await this.renderVectorPage(canvas, parseInt(canvas.dataset.previewPage, 10));
+            }
+        }
+    }
+
+    /**
+     * Rendu PDF.js d'une page affichée en aperçu, dans le même canvas (mêmes
+     * dimensions : les annotations restent alignées) ; ajoute les liens.
+     */
+    async renderVectorPage(pdfCanvas, pageNum) {
+        if (pdfCanvas.dataset.vector === '1') return;
+        pdfCanvas.dataset.vector = '1';
+        const page = await this.pdf.getPage(pageNum);
+        const baseViewport = page.getViewport({scale: 1});
+        const viewport = page.getViewport({scale: pdfCanvas.width / baseViewport.width});
+        await page.render({
+            canvasContext: pdfCanvas.getContext('2d'),
+            viewport: viewport
+        }).promise;
+
+        const wrapper = pdfCanvas.closest('.pdf-page-wrapper');
+        const pageId = wrapper ? parseInt(wrapper.dataset.pageId, 10) : pageNum;
+        await this.renderPageLinks(page, viewport, pdfCanvas.parentElement, pageId);
+    }
+
     /**
      * Afficher/masquer le loading
      */
@@ -857,21 +857,33 @@ async function handleTreeFolderDrop(e) {
     }
 }
 
-// Copier un dossier complet vers une classe
-async function copyFolderToClass(folderId, classId) {
-    try {
-        const response = await fetch('/file_manager/copy-folder-to-class', {
+// Copie de dossier vers une classe. Le serveur s'arrête au bout d'un budget
+// de temps sur les très gros dossiers (réponse « partial ») : on relance la
+// même copie, qui reprend là où elle s'est arrêtée, jusqu'à la fin.
+async function postFolderCopy(url, payload) {
+    let resume = null;
+    while (true) {
+        const response = await fetch(url, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
             },
-            body: JSON.stringify({
-                folder_id: folderId,
-                class_id: classId
-            })
+            body: JSON.stringify({ ...payload, resume })
         });
-
         const result = await response.json();
+        if (!result.success || !result.partial) return result;
+        resume = result.resume;
+        showNotification('info', result.message);
+    }
+}
+
+// Copier un dossier complet vers une classe
+async function copyFolderToClass(folderId, classId) {
+    try {
+        const result = await postFolderCopy('/file_manager/copy-folder-to-class', {
+            folder_id: folderId,
+            class_id: classId
+        });
 
         if (result.success) {
             const className = classes.find(c => c.id == classId)?.name || 'la classe';
@@ -947,20 +959,12 @@ async function copyFileToClassFolder(fileId, classId, folderName) {
 // Copier un dossier vers un dossier spécifique d'une classe
 async function copyFolderToClassFolder(folderId, classId, folderName) {
     try {
-        const response = await fetch('/file_manager/copy-folder-to-class-folder', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({
-                folder_id: folderId,
-                class_id: classId,
-                folder_name: folderName
-            })
+        const result = await postFolderCopy('/file_manager/copy-folder-to-class-folder', {
+            folder_id: folderId,
+            class_id: classId,
+            folder_name: folderName
         });
 
-        const result = await response.json();
-
         if (result.success) {
             showNotification('success', result.message || `Dossier copié dans ${folderName}`);
             showCopyWarnings(result.warnings);
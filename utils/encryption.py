@@ -3,6 +3,7 @@ Moteur de chiffrement pour ProfCalendar.
 Utilise Fernet (AES-128-CBC) pour le chiffrement symétrique des données sensibles.
 """
 import os
+import base64
 import hashlib
 import logging
 from cryptography.fernet import Fernet
@@ -97,6 +98,29 @@ class EncryptionEngine:
             logger.debug(f"Déchiffrement échoué (données non chiffrées ?): {e}")
             return ciphertext if isinstance(ciphertext, str) else ciphertext.decode('utf-8')
 
+    def encrypt_bytes(self, data):
+        """
+        Chiffre des données binaires (ex. morceau d'archive compressé).
+        Retourne un jeton texte (base64), simplement encodé si le chiffrement est désactivé.
+        """
+        if not self.is_enabled:
+            return base64.urlsafe_b64encode(data).decode('ascii')
+        return self._fernet.encrypt(data).decode('ascii')
+
+    def decrypt_bytes(self, token):
+        """
+        Déchiffre un jeton produit par encrypt_bytes.
+        Un jeton simplement encodé (chiffrement désactivé à l'écriture) est aussi accepté.
+        """
+        if isinstance(token, str):
+            token = token.encode('ascii')
+        if self.is_enabled:
+            try:
+                return self._fernet.decrypt(token)
+            except Exception as e:
+                logger.debug(f"Déchiffrement binaire échoué (données non chiffrées ?): {e}")
+        return base64.urlsafe_b64decode(token)
+
     @staticmethod
     def hash_email(email):
         """
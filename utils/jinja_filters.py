@@ -1,7 +1,11 @@
 from datetime import datetime
+import json
 import locale
 import re
 
+from utils.template_cache import memoize_filter
+
+@memoize_filter()
 def format_date_full(date_obj):
     """Formate une date en français complet (ex: lundi 23 août 2025)"""
     if not date_obj:
@@ -28,6 +32,7 @@ def format_date_full(date_obj):
     
     return f"{jour_semaine} {date_obj.day} {nom_mois} {date_obj.year}"
 
+@memoize_filter()
 def format_date(date_obj):
     """Formate une date courte (ex: 23 août 2025)"""
     if not date_obj:
@@ -52,13 +57,21 @@ def render_planning_with_checkboxes(planning):
     """Transforme le texte de planification en HTML avec checkboxes interactives"""
     if not planning or not planning.description:
         return ''
-    
-    # Récupérer les états des checkboxes
-    states = planning.get_checklist_states()
+    return _render_checklist(planning.description, planning.checklist_states)
+
+@memoize_filter(maxsize=256)
+def _render_checklist(description, checklist_states):
+    """Rendu de render_planning_with_checkboxes, mémoïsé selon le texte et
+    l'état JSON des checkboxes (colonnes de Planning)"""
+    # Récupérer les états des checkboxes (comme Planning.get_checklist_states)
+    try:
+        states = json.loads(checklist_states) if checklist_states else {}
+    except ValueError:
+        states = {}
     
     # Pattern pour détecter les checkboxes
     checkbox_pattern = r'^(\s*)\[([ x])\]\s*(.*)$'
-    lines = planning.description.split('\n')
+    lines = description.split('\n')
     result_lines = []
     checkbox_index = 0
     
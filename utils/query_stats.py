@@ -0,0 +1,271 @@
+"""Instrumentation des requêtes SQL et de la latence, par requête HTTP.
+
+Rien ne montrait combien de requêtes SQL une page émet (calendar_view,
+lesson_view, live_tracking, student_dashboard mobile…) : il fallait lire
+le code. Ici, chaque requête SQL exécutée pendant une requête HTTP est
+comptée et chronométrée (événements moteur SQLAlchemy) :
+
+    - QueryStats par requête HTTP (flask.g) : nombre, durée SQL, durée
+      totale, et nombre d'exécutions par « forme » de requête (SQL sans
+      paramètres, listes IN repliées) ;
+    - agrégats par endpoint en mémoire du processus (endpoint_stats(),
+      /admin/query-stats) ;
+    - journal : requête SQL lente (SLOW_QUERY_MS), requête HTTP lente
+      (SLOW_REQUEST_MS), et même forme exécutée au moins
+      N_PLUS_ONE_THRESHOLD fois dans une requête HTTP (N+1 probable) ;
+    - en-têtes X-DB-Queries / X-DB-Time-ms / Server-Timing si
+      QUERY_STATS_HEADERS (opt-in, désactivé en production).
+
+Hors requête HTTP (tâches de fond, scripts), capture_queries() enregistre
+les requêtes d'un bloc ; assert_max_queries() échoue au-delà d'un budget :
+
+    with assert_max_queries(12):
+        client.get('/planning/calendar')
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from functools import lru_cache
+
+from flask import g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SLOW_QUERY_MS = 200
+DEFAULT_SLOW_REQUEST_MS = 1000
+DEFAULT_N_PLUS_ONE_THRESHOLD = 10
+
+# Formes conservées par requête HTTP pour le rapport (les plus répétées)
+REPORT_SHAPES = 5
+
+_PLACEHOLDER = r"(?:\?|%s|%\(\w+\)s|:\w+|\$\d+)"
+_IN_LIST = re.compile(r"\(\s*" + _PLACEHOLDER + r"(?:\s*,\s*" + _PLACEHOLDER + r")*\s*\)")
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+_SPACES = re.compile(r"\s+")
+
+# Blocs capture_queries() actifs, par thread (pile)
+_local = threading.local()
+
+
+@lru_cache(maxsize=4096)
+def statement_shape(statement):
+    """Forme d'une requête : littéraux et listes de paramètres repliés, pour
+    regrouper les exécutions d'une même requête avec d'autres valeurs."""
+    shape = _LITERAL.sub('?', statement)
+    shape = _IN_LIST.sub('(?)', shape)
+    return _SPACES.sub(' ', shape).strip()
+
+
+class QueryStats:
+    """Requêtes SQL d'une requête HTTP (ou d'un bloc capture_queries)."""
+
+    def __init__(self, label=None):
+        self.label = label
+        self.count = 0
+        self.duration = 0.0          # secondes passées en SQL
+        self.shapes = Counter()      # forme -> exécutions
+        self.slow = []               # (ms, forme)
+        self.started = time.perf_counter()
+        self.elapsed = None          # secondes, à la fin de la requête HTTP
+
+    def record(self, statement, duration, slow_ms):
+        shape = statement_shape(statement)
+        self.count += 1
+        self.duration += duration
+        self.shapes[shape] += 1
+        if duration * 1000 >= slow_ms:
+            self.slow.append((round(duration * 1000, 1), shape))
+
+    def repeated(self, threshold):
+        """Formes exécutées au moins ``threshold`` fois (N+1 probables)."""
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+    @property
+    def duration_ms(self):
+        return round(self.duration * 1000, 1)
+
+    def report(self):
+        """Résumé lisible (message d'assertion, CLI)."""
+        lines = [f"{self.label or 'bloc'} : {self.count} requêtes SQL, {self.duration_ms} ms"]
+        for shape, n in self.shapes.most_common(REPORT_SHAPES):
+            lines.append(f"  {n:>4} × {shape[:200]}")
+        return '\n'.join(lines)
+
+
+# ---------------------------------------------------------------------------
+# Événements moteur
+# ---------------------------------------------------------------------------
+
+def _active_recorders():
+    recorders = list(getattr(_local, 'captures', ()))
+    if has_app_context():
+        stats = g.get('query_stats')
+        if stats is not None:
+            recorders.append(stats)
+    return recorders
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('query_start')
+    if not starts:
+        return
+    duration = time.perf_counter() - starts.pop()
+    slow_ms = _setting('SLOW_QUERY_MS', DEFAULT_SLOW_QUERY_MS)
+    for stats in _active_recorders():
+        stats.record(statement, duration, slow_ms)
+    # Journalisée aussi hors requête HTTP (tâches de fond)
+    if duration * 1000 >= slow_ms:
+        logger.warning("Requête SQL lente (%.0f ms, %s) : %s", duration * 1000,
+                       _current_endpoint(), statement_shape(statement)[:500])
+
+
+def _setting(name, default):
+    if has_app_context():
+        from flask import current_app
+        return current_app.config.get(name, default)
+    return default
+
+
+def _current_endpoint():
+    try:
+        return request.endpoint
+    except RuntimeError:
+        return None
+
+
+# ---------------------------------------------------------------------------
+# Capture hors requête HTTP (tests, scripts)
+# ---------------------------------------------------------------------------
+
+@contextmanager
+def capture_queries(label=None):
+    """Enregistre les requêtes SQL du bloc (requêtes HTTP du client de test
+    comprises, dans le même thread). Yields: QueryStats."""
+    stats = QueryStats(label)
+    captures = getattr(_local, 'captures', None)
+    if captures is None:
+        captures = _local.captures = []
+    captures.append(stats)
+    try:
+        yield stats
+    finally:
+        captures.remove(stats)
+        stats.elapsed = time.perf_counter() - stats.started
+
+
+@contextmanager
+def assert_max_queries(budget, label=None):
+    """Échoue (AssertionError avec les formes les plus répétées) si le bloc
+    émet plus de ``budget`` requêtes SQL."""
+    with capture_queries(label) as stats:
+        yield stats
+    if stats.count > budget:
+        raise AssertionError(f"Budget de {budget} requêtes dépassé\n{stats.report()}")
+
+
+# ---------------------------------------------------------------------------
+# Agrégats par endpoint
+# ---------------------------------------------------------------------------
+
+class _EndpointTotals:
+    __slots__ = ('requests', 'queries', 'max_queries', 'db_time', 'time', 'max_time', 'n_plus_one')
+
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.max_queries = 0
+        self.db_time = 0.0
+        self.time = 0.0
+        self.max_time = 0.0
+        self.n_plus_one = 0          # requêtes HTTP avec une forme répétée
+
+    def to_dict(self):
+        n = self.requests or 1
+        return {
+            'requests': self.requests,
+            'avg_queries': round(self.queries / n, 1),
+            'max_queries': self.max_queries,
+            'avg_db_ms': round(self.db_time * 1000 / n, 1),
+            'avg_ms': round(self.time * 1000 / n, 1),
+            'max_ms': round(self.max_time * 1000, 1),
+            'n_plus_one': self.n_plus_one,
+        }
+
+
+_totals = defaultdict(_EndpointTotals)
+_totals_lock = threading.Lock()
+
+
+def endpoint_stats():
+    """Agrégats par endpoint depuis le démarrage (ou reset_endpoint_stats),
+    par nombre moyen de requêtes SQL décroissant. Returns: liste de dicts."""
+    with _totals_lock:
+        stats = [dict(endpoint=endpoint, **totals.to_dict()) for endpoint, totals in _totals.items()]
+    return sorted(stats, key=lambda row: -row['avg_queries'])
+
+
+def reset_endpoint_stats():
+    with _totals_lock:
+        _totals.clear()
+
+
+# ---------------------------------------------------------------------------
+# Hooks Flask
+# ---------------------------------------------------------------------------
+
+def init_query_stats(app):
+    """Active l'instrumentation (QUERY_STATS_ENABLED, activé par défaut)."""
+    if not app.config.get('QUERY_STATS_ENABLED', True):
+        return
+
+    @app.before_request
+    def _start_query_stats():
+        g.query_stats = QueryStats()
+
+    @app.after_request
+    def _finish_query_stats(response):
+        stats = g.pop('query_stats', None)
+        if stats is None:
+            return response
+        stats.elapsed = time.perf_counter() - stats.started
+        endpoint = request.endpoint or '<aucun>'
+        stats.label = endpoint
+        threshold = app.config.get('N_PLUS_ONE_THRESHOLD', DEFAULT_N_PLUS_ONE_THRESHOLD)
+        repeated = stats.repeated(threshold)
+
+        with _totals_lock:
+            totals = _totals[endpoint]
+            totals.requests += 1
+            totals.queries += stats.count
+            totals.max_queries = max(totals.max_queries, stats.count)
+            totals.db_time += stats.duration
+            totals.time += stats.elapsed
+            totals.max_time = max(totals.max_time, stats.elapsed)
+            totals.n_plus_one += bool(repeated)
+
+        for shape, n in repeated:
+            logger.warning("N+1 probable (%s) : %s exécutions de %s", endpoint, n, shape[:500])
+        if stats.elapsed * 1000 >= app.config.get('SLOW_REQUEST_MS', DEFAULT_SLOW_REQUEST_MS):
+            logger.warning("Requête lente %s %s : %.0f ms, %s requêtes SQL (%.0f ms)",
+                           request.method, request.path, stats.elapsed * 1000,
+                           stats.count, stats.duration * 1000)
+
+        if app.config.get('QUERY_STATS_HEADERS'):
+            response.headers['X-DB-Queries'] = str(stats.count)
+            response.headers['X-DB-Time-ms'] = str(stats.duration_ms)
+            response.headers['Server-Timing'] = (
+                f"db;dur={stats.duration_ms};desc=\"{stats.count} queries\", "
+                f"app;dur={round(stats.elapsed * 1000, 1)}"
+            )
+        return response
@@ -0,0 +1,99 @@
+"""Politique par endpoint des middlewares de requête (app.py).
+
+Les hooks before_request / after_request recalculaient à chaque requête ce
+qui ne dépend que de l'endpoint : parcours des préfixes premium avec
+startswith, liste des pages sans cache, et réécriture de la session même
+pour les fichiers statiques. La table endpoint -> EndpointPolicy est
+compilée une fois au démarrage (compile_policies) ; un endpoint inconnu
+(blueprint enregistré plus tard) est compilé à la première requête puis
+mémorisé.
+
+    premium  : réservé aux enseignants Premium (redirection vers pricing)
+    session  : la requête utilise le cookie de session (session permanente)
+    no_cache : page à ne jamais mettre en cache (lecteur PDF)
+    auth     : 'teacher' | 'student' | 'parent' | 'token' (API mobile JWT)
+               | 'public' (fichiers statiques)
+
+PolicySessionInterface ne renvoie pas le cookie de session (rafraîchi à
+chaque requête pour une session permanente) aux endpoints sans session.
+Les requêtes Socket.IO (polling compris) sont servies par le middleware
+Socket.IO et n'atteignent pas ces hooks.
+"""
+from collections import namedtuple
+
+from flask import request
+from flask.sessions import SecureCookieSessionInterface
+
+EndpointPolicy = namedtuple('EndpointPolicy', 'premium session no_cache auth')
+
+# Blueprints réservés aux enseignants Premium (préfixes d'endpoint)
+PREMIUM_BLUEPRINTS = (
+    'evaluations.', 'attendance.', 'sanctions.',
+    'collaboration.', 'file_manager.', 'class_files.',
+    'exercises.',
+)
+PREMIUM_EXACT = frozenset({'planning.manage_classes', 'planning.decoupage'})
+
+# Pages du lecteur PDF : le cache persistant du WebView iPad figerait le
+# cache-bust de clean-pdf-viewer.js (voir no_cache_viewer_pages)
+NO_CACHE_ENDPOINTS = frozenset({'planning.lesson_view', 'planning.calendar_view'})
+
+# Type d'utilisateur attendu selon le blueprint (enseignant par défaut)
+AUTH_BLUEPRINTS = (
+    ('student_auth.', 'student'),
+    ('parent_auth.', 'parent'),
+    ('api.', 'token'),
+)
+
+# Requêtes sans session : fichiers statiques, API mobile authentifiée par jeton
+_SESSIONLESS_AUTH = ('public', 'token')
+
+DEFAULT_POLICY = EndpointPolicy(premium=False, session=True, no_cache=False, auth='teacher')
+
+
+def compute_policy(endpoint):
+    """Politique d'un endpoint (sans cache)."""
+    if endpoint is None:
+        return DEFAULT_POLICY
+    if endpoint == 'static' or endpoint.endswith('.static'):
+        auth = 'public'
+    else:
+        auth = next((kind for prefix, kind in AUTH_BLUEPRINTS if endpoint.startswith(prefix)),
+                    'teacher')
+    premium = auth == 'teacher' and (
+        endpoint in PREMIUM_EXACT or endpoint.startswith(PREMIUM_BLUEPRINTS)
+    )
+    return EndpointPolicy(
+        premium=premium,
+        session=auth not in _SESSIONLESS_AUTH,
+        no_cache=endpoint in NO_CACHE_ENDPOINTS,
+        auth=auth,
+    )
+
+
+def compile_policies(app):
+    """Compile la table des politiques pour tous les endpoints de l'app."""
+    policies = {endpoint: compute_policy(endpoint) for endpoint in app.view_functions}
+    app.extensions['endpoint_policies'] = policies
+    return policies
+
+
+def policy_for(app, endpoint):
+    """Politique de ``endpoint`` : une recherche dans la table compilée."""
+    policies = app.extensions.get('endpoint_policies')
+    if policies is None:
+        policies = compile_policies(app)
+    policy = policies.get(endpoint)
+    if policy is None:
+        policy = policies[endpoint] = compute_policy(endpoint)
+    return policy
+
+
+class PolicySessionInterface(SecureCookieSessionInterface):
+    """Cookie de session signé (comme Flask), pas réécrit pour les
+    endpoints dont la politique n'utilise pas la session."""
+
+    def should_set_cookie(self, app, session):
+        if not policy_for(app, request.endpoint).session:
+            return False
+        return super().should_set_cookie(app, session)
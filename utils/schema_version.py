@@ -0,0 +1,62 @@
+"""Version du schéma : la base est-elle à la tête des migrations ?
+
+Le schéma n'évolue plus que par les migrations Flask-Migrate
+(migrations/versions/) : `flask db upgrade` avant le service (render.yaml,
+render_production.py). Au démarrage, create_app ne fait qu'une vérification
+— une lecture de alembic_version comparée aux têtes des scripts — et
+journalise une erreur si la base est en retard, au lieu de rejouer des
+ALTER TABLE idempotents à chaque processus.
+
+    flask schema-status      # révision de la base / têtes, code 1 si en retard
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def head_revisions(app):
+    """Têtes des scripts de migration (normalement une seule)."""
+    from alembic.script import ScriptDirectory
+    return set(ScriptDirectory(app.extensions['migrate'].directory).get_heads())
+
+
+def current_revisions(app):
+    """Révisions enregistrées dans alembic_version (vide si jamais migrée)."""
+    from alembic.migration import MigrationContext
+    from extensions import db
+    with app.app_context(), db.engine.connect() as connection:
+        return set(MigrationContext.configure(connection).get_current_heads())
+
+
+def schema_status(app):
+    """Returns: dict current, heads, is_current."""
+    current, heads = current_revisions(app), head_revisions(app)
+    return {'current': sorted(current), 'heads': sorted(heads), 'is_current': current == heads}
+
+
+def check_schema(app):
+    """Vérification du démarrage : journalise si la base n'est pas à jour.
+    Ne lève jamais (une base injoignable ne doit pas empêcher le démarrage).
+    Returns: bool|None (None si la vérification a échoué)."""
+    try:
+        status = schema_status(app)
+    except Exception as e:
+        logger.warning("Version du schéma non vérifiée : %s", e)
+        return None
+    if not status['is_current']:
+        logger.error("Schéma en retard : base %s, migrations %s — lancer `flask db upgrade`",
+                     ', '.join(status['current']) or '(aucune)', ', '.join(status['heads']))
+        print(f"⚠️ Schéma en retard sur les migrations ({', '.join(status['heads'])}) : "
+              f"lancer `flask db upgrade`", flush=True)
+    return status['is_current']
+
+
+def upgrade_if_behind(app):
+    """Applique les migrations manquantes (démarrage hors `flask db upgrade`,
+    ex. Procfile). Returns: True si une mise à jour a été appliquée."""
+    if schema_status(app)['is_current']:
+        return False
+    from flask_migrate import upgrade
+    with app.app_context():
+        upgrade()
+    return True
@@ -0,0 +1,165 @@
+"""Démarrage de l'application : enregistrement des blueprints et profil.
+
+create_app importait et enregistrait ~25 blueprints dans autant de blocs
+try/except avec print, sans mesure : impossible de savoir ce qui rendait le
+démarrage à froid lent (et les connexions Socket.IO coupées pendant un
+déploiement). Ici :
+
+    - BLUEPRINTS liste les blueprints (module, attribut) dans l'ordre
+      d'enregistrement ; register_blueprints() les importe et les
+      enregistre en chronométrant chacun (import compris : un module
+      partagé est compté au premier blueprint qui l'importe) ;
+    - StartupProfile garde la durée de chaque phase du démarrage, exposée
+      dans app.extensions['startup_profile'] ; le résumé est journalisé,
+      le détail affiché si STARTUP_PROFILE est activé ;
+    - lazy_module() remplace l'import d'un module lourd et optionnel
+      (stripe, PIL, resend…) par un module chargé au premier attribut lu.
+
+scripts/profile_startup.py mesure un démarrage à froid et échoue au-delà
+du budget.
+"""
+import importlib
+import importlib.util
+import logging
+import sys
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# (module, attribut du blueprint, requis). Un blueprint non requis absent
+# (ImportError) est signalé et ignoré, comme avant.
+BLUEPRINTS = [
+    ('routes.auth', 'auth_bp', True),
+    ('routes.planning', 'planning_bp', True),
+    ('routes.schedule', 'schedule_bp', True),
+    ('routes.setup', 'setup_bp', True),
+    ('routes.parent_auth', 'parent_auth_bp', False),
+    ('routes.student_auth', 'student_auth_bp', False),
+    ('routes.collaboration', 'collaboration_bp', False),
+    ('routes.evaluations', 'evaluations_bp', False),
+    ('routes.announcements', 'announcements_bp', False),
+    ('routes.devoirs', 'devoirs_bp', False),
+    ('routes.attendance', 'attendance_bp', False),
+    ('routes.sanctions', 'sanctions_bp', False),
+    ('routes.settings', 'settings_bp', False),
+    ('routes.file_manager', 'file_manager_bp', False),
+    ('routes.class_files', 'class_files_bp', False),
+    ('migrate_schedule_fields', 'migrate_schedule_bp', False),  # temporaire
+    ('routes.push', 'push_bp', False),
+    ('routes.debug_constraint', 'debug_bp', False),
+    ('routes.diagnostic', 'diagnostic_bp', False),
+    ('routes.send_to_students', 'send_to_students_bp', False),
+    ('routes.api', 'api_bp', False),
+    ('routes.year_end', 'year_end_bp', False),
+    ('routes.subscription', 'subscription_bp', False),
+    ('routes.iap', 'iap_bp', False),
+    ('routes.resources', 'resources_bp', False),
+    ('routes.exercises', 'exercises_bp', False),
+    ('routes.combat', 'combat_bp', False),
+    ('routes.admin', 'admin_bp', False),
+    ('routes.jobs', 'jobs_bp', False),
+]
+
+# Phases détaillées dans le résumé journalisé
+REPORT_SLOWEST = 5
+
+
+def lazy_module(name):
+    """Module ``name`` chargé au premier accès à un de ses attributs
+    (importlib.util.LazyLoader). Lève ImportError tout de suite si le module
+    est introuvable, comme un import ordinaire."""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def module_loaded(name):
+    """Vrai si ``name`` est réellement exécuté (pas seulement déclaré par
+    lazy_module)."""
+    module = sys.modules.get(name)
+    # Un module de LazyLoader garde la classe _LazyModule jusqu'au 1er accès
+    return module is not None and type(module).__name__ != '_LazyModule'
+
+
+class StartupProfile:
+    """Durées des phases du démarrage, dans l'ordre."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = []             # (nom, secondes, erreur ou None)
+        self.total = None
+
+    @contextmanager
+    def phase(self, name, optional=False):
+        """Chronomètre le bloc. ``optional`` : une ImportError est
+        enregistrée et journalisée au lieu d'interrompre le démarrage."""
+        t0 = time.perf_counter()
+        error = None
+        try:
+            yield
+        except ImportError as e:
+            if not optional:
+                raise
+            error = str(e)
+            logger.warning("Démarrage : %s non chargé (%s)", name, e)
+        finally:
+            self.phases.append((name, time.perf_counter() - t0, error))
+
+    def finish(self):
+        self.total = time.perf_counter() - self.started
+        return self.total
+
+    def to_dict(self):
+        return {
+            'total_ms': round((self.total or 0) * 1000, 1),
+            'phases': [{'name': name, 'ms': round(seconds * 1000, 1), 'error': error}
+                       for name, seconds, error in self.phases],
+        }
+
+    def report(self, limit=None):
+        """Résumé lisible, phases les plus lentes d'abord."""
+        phases = sorted(self.phases, key=lambda p: -p[1])[:limit]
+        lines = [f"Démarrage : {(self.total or 0) * 1000:.0f} ms"]
+        for name, seconds, error in phases:
+            suffix = f"  (échec : {error})" if error else ''
+            lines.append(f"  {seconds * 1000:7.1f} ms  {name}{suffix}")
+        return '\n'.join(lines)
+
+
+def get_profile(app):
+    """Profil du démarrage de ``app`` (créé au premier appel)."""
+    return app.extensions.setdefault('startup_profile', StartupProfile())
+
+
+def register_blueprints(app, blueprints=BLUEPRINTS):
+    """Importe et enregistre ``blueprints``, chacun chronométré.
+    Returns: {nom du module: module importé} des blueprints enregistrés."""
+    profile = get_profile(app)
+    loaded = {}
+    for module_name, attribute, required in blueprints:
+        with profile.phase(f'blueprint {module_name}', optional=not required):
+            module = importlib.import_module(module_name)
+            app.register_blueprint(getattr(module, attribute))
+            loaded[module_name] = module
+    return loaded
+
+
+def finish_startup(app):
+    """Clôt le profil et le journalise (détail complet si STARTUP_PROFILE)."""
+    profile = get_profile(app)
+    profile.finish()
+    if app.config.get('STARTUP_PROFILE'):
+        print(profile.report(), flush=True)
+    else:
+        logger.info(profile.report(REPORT_SLOWEST))
+    return profile
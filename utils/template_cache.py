@@ -0,0 +1,93 @@
+"""Rendu des templates : compilation unique, cache de bytecode, filtres mémoïsés.
+
+create_app forçait TEMPLATES_AUTO_RELOAD en toutes circonstances : à chaque
+rendu, Jinja relisait la date de modification de chaque template utilisé
+(calendar_view.html, lesson_view.html et base.html font ~20 000 lignes), et
+chaque processus recompilait ces templates à son premier rendu. Ici :
+
+    - configure_templates() : rechargement automatique seulement si
+      TEMPLATES_AUTO_RELOAD (développement) ; en production un template est
+      compilé une fois par processus puis gardé en mémoire ;
+    - JINJA_BYTECODE_CACHE_DIR : cache de bytecode sur disque partagé par
+      les processus et les redémarrages (clé : nom du template + empreinte
+      de sa source, un template modifié est donc recompilé) ;
+    - `flask compile-templates` : remplit ce cache à l'avance ;
+    - memoize_filter : mémoïse un filtre pur selon ses arguments.
+
+scripts/benchmark_templates.py compare le rendu de calendar_view dans les
+deux modes.
+"""
+import functools
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Taille du cache mémoire de Jinja (nombre de templates compilés gardés) :
+# au-dessus du nombre de templates du projet pour ne jamais en évincer.
+TEMPLATE_CACHE_SIZE = 1000
+
+
+def memoize_filter(maxsize=1024):
+    """Mémoïse un filtre pur (même arguments -> même résultat). Un appel avec
+    un argument non hachable n'est pas mis en cache. La fonction d'origine
+    reste accessible par ``__wrapped__``."""
+    def decorator(fn):
+        cached = functools.lru_cache(maxsize=maxsize)(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args):
+            try:
+                hash(args)
+            except TypeError:
+                return fn(*args)
+            return cached(*args)
+
+        wrapper.cache_info = cached.cache_info
+        wrapper.cache_clear = cached.cache_clear
+        return wrapper
+    return decorator
+
+
+def configure_templates(app):
+    """Applique le mode de rendu de la configuration à ``app.jinja_env``
+    (à appeler avant le premier rendu)."""
+    from jinja2 import FileSystemBytecodeCache
+    from jinja2.utils import LRUCache
+
+    env = app.jinja_env
+    env.auto_reload = bool(app.config.get('TEMPLATES_AUTO_RELOAD'))
+    env.cache = LRUCache(TEMPLATE_CACHE_SIZE)
+    cache_dir = app.config.get('JINJA_BYTECODE_CACHE_DIR')
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+
+
+def compile_templates(app):
+    """Compile tous les templates de l'application (et remplit le cache de
+    bytecode s'il est configuré). Returns: (compilés, [(nom, erreur)])."""
+    env = app.jinja_env
+    compiled, failures = 0, []
+    with app.app_context():
+        for name in env.list_templates(extensions=('html', 'txt', 'xml', 'j2')):
+            try:
+                env.get_template(name)
+                compiled += 1
+            except Exception as e:
+                failures.append((name, str(e)))
+    return compiled, failures
+
+
+def register_template_commands(app):
+    @app.cli.command('compile-templates')
+    def _compile_templates_cmd():
+        """Compile les templates dans JINJA_BYTECODE_CACHE_DIR."""
+        if not app.config.get('JINJA_BYTECODE_CACHE_DIR'):
+            print("⚠️ JINJA_BYTECODE_CACHE_DIR non défini : compilation sans cache disque")
+        compiled, failures = compile_templates(app)
+        for name, error in failures:
+            print(f"❌ {name}: {error}")
+        print(f"✅ {compiled} templates compilés")
+        if failures:
+            raise SystemExit(1)
@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+"""
+ProfCalendar - Processus exécuteur de tâches de fond
+
+Exécute les tâches de services/job_runner.py (conversions, exports, passage
+à la nouvelle année, notifications, relances d'essai, purges) hors du
+worker web eventlet. À utiliser avec JOB_RUNNER=worker sur le service web,
+pour qu'il ne fasse plus que déposer les tâches :
+
+    python worker.py
+"""
+import os
+
+from app import create_app
+from services.job_runner import run_worker
+
+os.environ['FLASK_ENV'] = 'production'
+
+app = create_app('production')
+
+if __name__ == "__main__":
+    run_worker(app)